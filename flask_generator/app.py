@@ -15,14 +15,14 @@ Flask Generator API - Микросервис для генерации конт
 # =============================================================================
 import os
 import json
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from dotenv import load_dotenv
 
 # Загружаем переменные окружения из .env файла
 load_dotenv()
 
 # Импортируем модули генерации
-from text_gen import generate_text
+from text_gen import generate_text, stream_text
 from image_gen import generate_image_prompt_from_text, generate_image_dalle
 from crypto_utils import encrypt_data, decrypt_data
 
@@ -47,7 +47,7 @@ def health_check():
     return jsonify({
         'status': 'ok',
         'message': 'Flask Generator API is running',
-        'endpoints': ['/generate-text', '/generate-image', '/health']
+        'endpoints': ['/generate-text', '/generate-text-stream', '/generate-image', '/health']
     })
 
 @app.route('/test', methods=['GET', 'POST'])
@@ -114,18 +114,20 @@ def generate_text_route():
             payload = {'topic': 'Тестовая тема', 'platform_specific': ['VK']}
             print(f"Используем fallback payload: {payload}")
         
-        # Генерируем текст через OpenAI или mock
-        text = generate_text(payload)
+        # Генерируем текст через OpenAI или mock (usage — фактический расход токенов)
+        usage = {}
+        text = generate_text(payload, usage)
         print(f"Generated text: {text[:100]}...")
         
         # Генерируем промпт для изображения
-        image_prompt = generate_image_prompt_from_text(text, payload) if text else None
+        image_prompt = generate_image_prompt_from_text(text, payload, usage) if text else None
         print(f"Generated image prompt: {image_prompt}")
         
         # Подготавливаем результат
         result = {
             'text': text,
-            'image_prompt': image_prompt
+            'image_prompt': image_prompt,
+            'tokens_used': usage.get('total_tokens', 0)
         }
         
         # Шифруем и возвращаем результат
@@ -139,6 +141,57 @@ def generate_text_route():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/generate-text-stream', methods=['POST'])
+def generate_text_stream_route():
+    """
+    Endpoint для потоковой генерации текста (Server-Sent Events)
+    
+    Принимает те же зашифрованные параметры, что и /generate-text,
+    и отдаёт текст дельтами по мере генерации. Каждое событие зашифровано.
+    
+    Request format:
+        POST /generate-text-stream
+        Content-Type: application/json
+        Body: {"data": "encrypted_form_parameters"}
+    
+    Response format (text/event-stream):
+        event: delta / data: encrypted {"text": "..."}
+        event: done  / data: encrypted {"tokens_used": N}
+    
+    Returns:
+        Response: Поток событий
+    """
+    request_data = request.get_json() or {}
+    encrypted = request_data.get('data')
+    if not encrypted:
+        return jsonify({'error': 'No encrypted data provided'}), 400
+    
+    try:
+        decrypted = decrypt_data(encrypted)
+        payload = json.loads(decrypted.decode() if isinstance(decrypted, bytes) else decrypted)
+    except Exception as decrypt_error:
+        print(f"ERROR: Ошибка расшифровки: {decrypt_error}")
+        return jsonify({'error': 'Invalid encrypted data'}), 400
+    
+    def sse(event, data):
+        return f"event: {event}\ndata: {encrypt_data(json.dumps(data).encode())}\n\n"
+    
+    def events():
+        usage = {}
+        try:
+            for delta in stream_text(payload, usage):
+                yield sse('delta', {'text': delta})
+        except Exception as e:
+            print(f"ERROR: Error in generate_text_stream_route: {e}")
+            yield sse('error', {'error': str(e)})
+        yield sse('done', {'tokens_used': usage.get('total_tokens', 0)})
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/generate-image', methods=['POST'])
 def generate_image_route():
     """
@@ -10,9 +10,10 @@ if os.environ.get('OPENAI_API_KEY'):
 
 # OpenAI DALL-E настройки (используем тот же клиент)
 
-def generate_image_prompt_from_text(text, form_data):
+def generate_image_prompt_from_text(text, form_data, usage=None):
     """
     Генерирует промпт для генератора изображения на основе текста поста и параметров формы (через OpenAI).
+    Расход токенов из ответа OpenAI добавляется в usage['total_tokens'] (если передан).
     """
     print(f"=== Flask: generate_image_prompt_from_text вызван ===")
     print(f"Text: {text[:100]}...")
@@ -45,6 +46,8 @@ def generate_image_prompt_from_text(text, form_data):
             ]
         )
         prompt = response.choices[0].message.content
+        if usage is not None and response.usage:
+            usage['total_tokens'] = usage.get('total_tokens', 0) + response.usage.total_tokens
         print(f"OK: Промпт сгенерирован через OpenAI: {prompt}")
         return prompt.strip()
     except Exception as e:
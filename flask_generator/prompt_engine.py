@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Общий компилятор системных промптов
+
+Единый источник словарей критериев и сборки промпта для Django (GigaChat)
+и Flask (OpenAI). Модуль не зависит от Django и лежит в flask_generator,
+чтобы микросервис можно было развернуть отдельной папкой.
+
+Критерии формы приводятся к каноническому хешируемому ключу, а собранные
+промпты кэшируются в LRU со статистикой попаданий:
+- PromptCompiler.canonical_key(): нормализация str/list и отброс пустых значений
+- PromptCompiler.compile(): сборка промпта с кэшированием
+- run_benchmark(): микро-бенчмарк стоимости вызова
+
+Бенчмарк:
+    python flask_generator/prompt_engine.py --combinations 10000
+"""
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+import os
+import random
+import time
+from functools import lru_cache
+
+# Размер LRU-кэша собранных промптов на процесс
+PROMPT_CACHE_SIZE = int(os.environ.get('PROMPT_CACHE_SIZE', '1024'))
+
+# =============================================================================
+# PROMPT FRAGMENTS DICTIONARIES
+# =============================================================================
+VOICE_TONE_PROMPTS = {
+    "Дружелюбный": "Тон сообщения — дружелюбный и открытый.",
+    "Профессиональный": "Тон сообщения — профессиональный и уверенный.",
+    "Неформальный": "Тон сообщения — неформальный, разговорный.",
+    "Юмористический": "Тон сообщения — с юмором, иронией.",
+    "Вдохновляющий": "Тон сообщения — вдохновляющий, мотивирующий.",
+    "Серьезный": "Тон сообщения — серьезный, авторитетный.",
+    "Эмпатичный": "Тон сообщения — эмпатичный, заботливый.",
+    "Провокационный": "Тон сообщения — провокационный, смелый.",
+    "Официальный": "Тон сообщения — официальный, деловой.",
+}
+CONTENT_PURPOSE_PROMPTS = {
+    "Информативный": "Цель поста — информировать или обучать аудиторию.",
+    "Развлекательный": "Цель поста — развлечь аудиторию.",
+    "Вовлекающий": "Цель поста — вовлечь, задать вопрос или провести опрос.",
+    "Продающий": "Цель поста — презентовать продукт или услугу.",
+    "Приводящий": "Цель поста — привести на сайт, блог или мероприятие.",
+    "Имиджевый": "Цель поста — укрепить лояльность или имидж бренда.",
+    "Новостной": "Цель поста — сообщить новости или оповестить.",
+    "Обучающий": "Цель поста — обучить, дать инструкцию (how-to).",
+    "Вдохновляющий": "Цель поста — вдохновить, рассказать историю успеха.",
+}
+EMOTIONAL_TONE_PROMPTS = {
+    "Радостный": "Пост должен вызывать радость и позитив.",
+    "Спокойный": "Пост должен создавать ощущение спокойствия.",
+    "Взволнованный": "Пост должен быть энергичным, взволнованным.",
+    "Любопытный": "Пост должен вызывать любопытство, интригу.",
+    "Ностальгический": "Пост должен вызывать ностальгию.",
+    "Удивленный": "Пост должен удивлять, восхищать.",
+    "Сопереживающий": "Пост должен поддерживать, сопереживать.",
+    "Срочный": "Пост должен создавать ощущение срочности (FOMO).",
+}
+CONTENT_FORMAT_PROMPTS = {
+    "Краткий": "Формат — кратко, тезисно.",
+    "Подробный": "Формат — подробно, развернуто.",
+    "Списки": "Используй списки или перечни.",
+    "FAQ": "Формат — вопрос-ответ (FAQ).",
+    "История": "Формат — история или кейс.",
+    "Пошаговая": "Формат — пошаговая инструкция.",
+    "Сравнение": "Формат — сравнение или сопоставление.",
+    "Цитата": "Используй цитату или высказывание.",
+    "Миф": "Формат — миф vs. реальность.",
+}
+DELIVERY_STYLE_PROMPTS = {
+    "Прямой": "Стиль подачи — прямой, без прикрас.",
+    "Повествовательный": "Стиль подачи — повествовательный, историйный.",
+    "Диалоговый": "Стиль подачи — диалоговый, интерактивный.",
+    "Визуальный": "Сделай акцент на визуальных элементах.",
+    "Экспертный": "Стиль подачи — экспертный, аналитический.",
+    "Персонализированный": "Обращайся к читателю персонально (ты/вы).",
+    "Новостной": "Стиль подачи — новостной, репортажный.",
+}
+CTA_PROMPTS = {
+    "Узнать больше": "В конце добавь призыв узнать больше (ссылка).",
+    "Купить": "В конце добавь призыв купить или заказать.",
+    "Записаться": "В конце добавь призыв записаться или зарегистрироваться.",
+    "Скачать": "В конце добавь призыв скачать.",
+    "Посмотреть": "В конце добавь призыв посмотреть видео.",
+    "Поделиться": "В конце добавь призыв поделиться постом.",
+    "Прокомментировать": "В конце добавь призыв прокомментировать или ответить.",
+    "Опрос": "В конце добавь призыв пройти опрос или проголосовать.",
+    "Сохранить": "В конце добавь призыв сохранить пост.",
+    "Подписаться": "В конце добавь призыв подписаться.",
+}
+PLATFORM_SPECIFIC_PROMPTS = {
+    "Instagram": "Оптимизируй под Instagram: акцент на визуал, короткий текст.",
+    "Twitter": "Оптимизируй под Twitter/X: краткость, треды, хэштеги.",
+    "LinkedIn": "Оптимизируй под LinkedIn: профессионализм, длинные посты.",
+    "Facebook": "Оптимизируй под Facebook: смешанный формат, группы.",
+    "TikTok": "Оптимизируй под TikTok/Reels: видео-ориентированный, тренды.",
+    "VK": "Оптимизируй под VK: допускаются длинные тексты, встроенные опросы, ссылки, акцент на вовлечённость.",
+    "Дзен": "Оптимизируй под Дзен: развернутые статьи, аналитика, цепляющий заголовок, формат блога.",
+    "Telegram": "Оптимизируй под Telegram: краткие абзацы, разговорный стиль, минимум визуала, акцент на пересылку и вовлечённость.",
+}
+FORMALITY_LEVEL_PROMPTS = {
+    "Высокоформальный": "Язык — высокоформальный, официальный.",
+    "Деловой": "Язык — деловой, профессиональный.",
+    "Полуформальный": "Язык — полуформальный, дружелюбный.",
+    "Неформальный": "Язык — неформальный, разговорный.",
+    "Сленговый": "Язык — сленговый, мемный, молодежный.",
+}
+BRAND_VOICE_PROMPTS = {
+    "Экспертный": "Голос бренда — экспертный.",
+    "Инновационный": "Голос бренда — инновационный.",
+    "Надежный": "Голос бренда — надежный, традиционный.",
+    "Любознательный": "Голос бренда — любознательный.",
+    "Игривый": "Голос бренда — игривый.",
+    "Заботливый": "Голос бренда — заботливый.",
+    "Бунтарский": "Голос бренда — бунтарский.",
+    "Люкс": "Голос бренда — люкс, премиум.",
+    "Простой": "Голос бренда — простой, практичный.",
+}
+POST_LENGTH_PROMPTS = {
+    "Очень короткий": "Сделай пост очень коротким (1 предложение).",
+    "Короткий": "Сделай пост коротким (1-2 абзаца).",
+    "Средний": "Сделай пост средним (2-4 абзаца).",
+    "Длинный": "Сделай пост длинным (более 4 абзацев, статья).",
+}
+HASHTAG_USAGE_PROMPTS = {
+    "Без хэштегов": "Не используй хэштеги.",
+    "Минимум": "Используй минимум хэштегов (1-3).",
+    "Оптимально": "Используй оптимальное количество хэштегов (4-10).",
+    "Максимум": "Используй максимум хэштегов (10+).",
+}
+MENTIONS_PROMPTS = {
+    "Без упоминаний": "Не используй упоминания.",
+    "Партнеры": "Упомяни партнеров.",
+    "Клиенты": "Упомяни клиентов или отзывы.",
+    "Лидеры": "Упомяни лидеров мнений.",
+}
+AUDIENCE_PROMPTS = {
+    "Новички": "Адаптируй под новичков в теме.",
+    "Продвинутые": "Адаптируй под продвинутых пользователей.",
+    "Существующие клиенты": "Ориентируйся на существующих клиентов.",
+    "Потенциальные клиенты": "Ориентируйся на потенциальных клиентов.",
+    "Молодежь": "Ориентируйся на молодежь.",
+    "Профессионалы": "Ориентируйся на профессионалов.",
+}
+
+# Порядок полей определяет порядок фрагментов в промпте:
+# (поле формы, словарь фрагментов, допускается ли несколько значений)
+CRITERIA_FIELDS = (
+    ('voice_tone', VOICE_TONE_PROMPTS, True),
+    ('content_purpose', CONTENT_PURPOSE_PROMPTS, True),
+    ('emotional_tone', EMOTIONAL_TONE_PROMPTS, True),
+    ('content_format', CONTENT_FORMAT_PROMPTS, True),
+    ('delivery_style', DELIVERY_STYLE_PROMPTS, True),
+    ('cta', CTA_PROMPTS, False),
+    ('platform_specific', PLATFORM_SPECIFIC_PROMPTS, True),
+    ('formality_level', FORMALITY_LEVEL_PROMPTS, True),
+    ('brand_voice', BRAND_VOICE_PROMPTS, True),
+    ('post_length', POST_LENGTH_PROMPTS, False),
+    ('hashtag_usage', HASHTAG_USAGE_PROMPTS, False),
+    ('mentions', MENTIONS_PROMPTS, True),
+    ('audience', AUDIENCE_PROMPTS, True),
+)
+
+# Допустимые значения каждого поля (только с непустым фрагментом)
+_CRITERIA_KEYS = tuple(
+    (field, frozenset(k for k, v in fragments.items() if v), multiple)
+    for field, fragments, multiple in CRITERIA_FIELDS
+)
+
+# =============================================================================
+# PROMPT COMPILER
+# =============================================================================
+
+class PromptCompiler:
+    """
+    Компилятор системного промпта с LRU-кэшем
+    
+    Args:
+        preamble: Вступительная часть промпта (своя у каждого провайдера)
+        maxsize: Размер LRU-кэша собранных промптов
+    """
+    
+    def __init__(self, preamble, maxsize=PROMPT_CACHE_SIZE):
+        self.preamble = preamble
+        self._compile_key = lru_cache(maxsize=maxsize)(self._build)
+    
+    @staticmethod
+    def canonical_key(data):
+        """
+        Приводит критерии формы к каноническому хешируемому ключу
+        
+        Строка и список из одной строки дают одинаковый ключ, пустые
+        и неизвестные значения (они не добавляют текста) отбрасываются.
+        Порядок значений сохраняется, т.к. определяет порядок фрагментов.
+        
+        Args:
+            data (dict): Параметры генерации из формы
+        
+        Returns:
+            tuple: Кортеж кортежей значений по каждому полю CRITERIA_FIELDS
+        """
+        key = []
+        append = key.append
+        get = data.get
+        for field, valid, multiple in _CRITERIA_KEYS:
+            value = get(field)
+            if not value:
+                append(())
+            elif isinstance(value, str):
+                append((value,) if value in valid else ())
+            elif multiple:
+                append(tuple([v for v in value if isinstance(v, str) and v in valid]))
+            else:
+                append(())
+        return tuple(key)
+    
+    def _build(self, key):
+        prompt_parts = [self.preamble] if self.preamble else []
+        for (field, fragments, multiple), values in zip(CRITERIA_FIELDS, key):
+            prompt_parts.extend(fragments[v] for v in values)
+        return '\n'.join(prompt_parts)
+    
+    def compile(self, data):
+        """
+        Собирает системный промпт из выбранных пользователем критериев
+        
+        Args:
+            data (dict): Параметры генерации из формы
+        
+        Returns:
+            str: Системный промпт
+        """
+        return self._compile_key(self.canonical_key(data))
+    
+    def build_uncached(self, data):
+        """Собирает промпт без кэша (для сравнения в бенчмарке)"""
+        return self._build(self.canonical_key(data))
+    
+    def cache_info(self):
+        """
+        Статистика кэша
+        
+        Returns:
+            dict: hits, misses, size, maxsize, hit_rate
+        """
+        info = self._compile_key.cache_info()
+        total = info.hits + info.misses
+        return {
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+            'maxsize': info.maxsize,
+            'hit_rate': round(info.hits / total, 4) if total else 0.0,
+        }
+    
+    def cache_clear(self):
+        """Очищает кэш и статистику"""
+        self._compile_key.cache_clear()
+
+# =============================================================================
+# BENCHMARK
+# =============================================================================
+
+def random_criteria(rng):
+    """Случайный набор критериев формы (для бенчмарка)"""
+    data = {}
+    for field, fragments, multiple in CRITERIA_FIELDS:
+        options = list(fragments)
+        if multiple:
+            data[field] = rng.sample(options, rng.randint(0, min(3, len(options))))
+        else:
+            data[field] = rng.choice(options + [''])
+    return data
+
+
+def run_benchmark(compiler, combinations=10000, seed=42):
+    """
+    Микро-бенчмарк стоимости сборки промпта
+    
+    Генерирует `combinations` различных наборов критериев и замеряет
+    среднее время вызова: без кэша, с промахом кэша и с попаданием.
+    
+    Args:
+        compiler: PromptCompiler для замера
+        combinations: Количество различных комбинаций
+        seed: Зерно генератора случайных чисел
+    
+    Returns:
+        dict: Время на вызов в микросекундах и статистика кэша
+    """
+    rng = random.Random(seed)
+    samples = []
+    seen = set()
+    while len(samples) < combinations:
+        data = random_criteria(rng)
+        key = compiler.canonical_key(data)
+        if key not in seen:
+            seen.add(key)
+            samples.append(data)
+    
+    # Кэш на время замера должен вмещать все комбинации
+    bench = PromptCompiler(compiler.preamble, maxsize=combinations)
+    
+    def per_call(func):
+        start = time.perf_counter()
+        for data in samples:
+            func(data)
+        return (time.perf_counter() - start) / len(samples) * 1e6
+    
+    uncached_us = per_call(bench.build_uncached)
+    miss_us = per_call(bench.compile)
+    hit_us = per_call(bench.compile)
+    
+    return {
+        'combinations': combinations,
+        'uncached_us': round(uncached_us, 3),
+        'miss_us': round(miss_us, 3),
+        'hit_us': round(hit_us, 3),
+        'speedup': round(uncached_us / hit_us, 1) if hit_us else None,
+        'cache': bench.cache_info(),
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Бенчмарк сборки промптов')
+    parser.add_argument('--combinations', type=int, default=10000)
+    args = parser.parse_args()
+    
+    stats = run_benchmark(PromptCompiler(''), combinations=args.combinations)
+    print(f"Комбинаций: {stats['combinations']}")
+    print(f"Без кэша:   {stats['uncached_us']} мкс/вызов")
+    print(f"Промах:     {stats['miss_us']} мкс/вызов")
+    print(f"Попадание:  {stats['hit_us']} мкс/вызов (x{stats['speedup']})")
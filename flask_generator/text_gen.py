@@ -33,7 +33,7 @@ if os.environ.get('OPENAI_API_KEY'):
 # TEXT GENERATION FUNCTIONS
 # =============================================================================
 
-def generate_text(data):
+def generate_text(data, usage=None):
     """
     Генерация текста для социальных сетей
     
@@ -47,6 +47,8 @@ def generate_text(data):
             - post_length: длина поста
             - cta: призыв к действию
             - и другие параметры формы
+        usage (dict): Необязательный словарь, в который записывается
+            'total_tokens' из ответа OpenAI
     
     Returns:
         str: Сгенерированный текст поста
@@ -136,10 +138,62 @@ INFO: {cta if cta else 'Попробуйте сами и убедитесь в 
             ]
         )
         text = response.choices[0].message.content
+        if usage is not None and response.usage:
+            usage['total_tokens'] = usage.get('total_tokens', 0) + response.usage.total_tokens
         print(f"OK: Текст сгенерирован через OpenAI: {text[:100]}...")
         return text
     except Exception as e:
         print(f"ERROR: Ошибка при генерации текста через OpenAI: {e}")
         import traceback
         traceback.print_exc()
-        return f"WARNING: Ошибка при генерации текста: {str(e)[:100]}" 
\ No newline at end of file
+        return f"WARNING: Ошибка при генерации текста: {str(e)[:100]}" 
+
+
+def stream_text(data, usage=None):
+    """
+    Потоковая генерация текста для социальных сетей
+    
+    Отдаёт текст дельтами по мере генерации через OpenAI (stream=True).
+    При отсутствии API ключа отдаёт mock ответ по строкам.
+    
+    Args:
+        data (dict): Параметры генерации из Django формы
+        usage (dict): Необязательный словарь, в который после окончания
+            потока записывается 'total_tokens'
+    
+    Yields:
+        str: Очередной фрагмент текста
+    """
+    if usage is None:
+        usage = {}
+    
+    if not openai_client:
+        mock_text = generate_text(data)
+        for line in mock_text.splitlines(keepends=True):
+            yield line
+        usage['total_tokens'] = 0
+        return
+    
+    try:
+        system_prompt = assemble_prompt_from_criteria(data)
+        user_prompt = f"Напиши пост для {data.get('platform', '')}. Тема: {data.get('topic', '')}"
+        model = os.environ.get('OPENAI_MODEL', 'gpt-4o-mini')
+        print(f"INFO: Потоковая генерация текста через OpenAI ({model})...")
+        
+        stream = openai_client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        for chunk in stream:
+            if chunk.usage:
+                usage['total_tokens'] = chunk.usage.total_tokens
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    except Exception as e:
+        print(f"ERROR: Ошибка при потоковой генерации текста через OpenAI: {e}")
+        yield f"WARNING: Ошибка при генерации текста: {str(e)[:100]}"
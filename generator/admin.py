@@ -1,9 +1,10 @@
-from .models import UserProfile, Generation, TemporaryAccessToken, GenerationTemplate, GigaChatTokenUsage, SubscriptionButtonClick, Payment, SupportTicket, Review, SupportChat
+from .models import UserProfile, Generation, TemporaryAccessToken, GenerationTemplate, GigaChatTokenUsage, SubscriptionButtonClick, Payment, SupportTicket, Review, SupportChat, GenerationJob, TokenReservation, BlockedNetwork, SchedulerLease, SchedulerRun
 from django.contrib import admin
 from django.utils.html import format_html
 from django.db.models import Sum, Count, Avg
 from django.utils import timezone
 from datetime import timedelta
+from .token_cache import invalidate_token_state
 
 
 @admin.register(TemporaryAccessToken)
@@ -42,7 +43,9 @@ class TemporaryAccessTokenAdmin(admin.ModelAdmin):
         'current_ip',
         'total_used',
         'gigachat_tokens_used',
-        'openai_tokens_used'
+        'openai_tokens_used',
+        'gigachat_tokens_reserved',
+        'openai_tokens_reserved'
     ]
     
     fieldsets = (
@@ -53,11 +56,11 @@ class TemporaryAccessTokenAdmin(admin.ModelAdmin):
             'fields': ('created_at', 'expires_at')
         }),
         ('Лимиты токенов GigaChat', {
-            'fields': ('gigachat_tokens_limit', 'gigachat_tokens_used'),
+            'fields': ('gigachat_tokens_limit', 'gigachat_tokens_used', 'gigachat_tokens_reserved'),
             'description': 'Лимит токенов GigaChat (-1 = безлимит)'
         }),
         ('Лимиты токенов OpenAI', {
-            'fields': ('openai_tokens_limit', 'openai_tokens_used'),
+            'fields': ('openai_tokens_limit', 'openai_tokens_used', 'openai_tokens_reserved'),
             'description': 'Лимит токенов OpenAI (-1 = безлимит, 0 = недоступен)'
         }),
         ('Подписки', {
@@ -99,13 +102,18 @@ class TemporaryAccessTokenAdmin(admin.ModelAdmin):
     
     def deactivate_tokens(self, request, queryset):
         """Действие для деактивации выбранных токенов"""
+        # update() минует save(), поэтому кэш состояния токенов очищается явно
+        tokens = list(queryset.values_list('token', flat=True))
         count = queryset.update(is_active=False)
+        invalidate_token_state(*tokens)
         self.message_user(request, f'Деактивировано токенов: {count}')
     deactivate_tokens.short_description = 'Деактивировать выбранные токены'
     
     def activate_tokens(self, request, queryset):
         """Действие для активации выбранных токенов"""
+        tokens = list(queryset.values_list('token', flat=True))
         count = queryset.update(is_active=True)
+        invalidate_token_state(*tokens)
         self.message_user(request, f'Активировано токенов: {count}')
     activate_tokens.short_description = 'Активировать выбранные токены'
     
@@ -160,10 +168,12 @@ class TemporaryAccessTokenAdmin(admin.ModelAdmin):
     
     def reset_token_usage(self, request, queryset):
         """Действие для сброса использованных токенов (для тестирования)"""
+        tokens = list(queryset.values_list('token', flat=True))
         count = queryset.update(
             gigachat_tokens_used=0,
             openai_tokens_used=0
         )
+        invalidate_token_state(*tokens)
         self.message_user(request, f'Сброшено использование токенов для {count} записей')
     reset_token_usage.short_description = 'Сбросить использование токенов'
     
@@ -247,7 +257,9 @@ class GigaChatTokenUsageAdmin(admin.ModelAdmin):
     list_filter = [
         'operation_type',
         'created_at',
-        'platform'
+        'platform',
+        'from_cache',
+        'source'
     ]
     
     search_fields = [
@@ -269,12 +281,14 @@ class GigaChatTokenUsageAdmin(admin.ModelAdmin):
         'response_length',
         'created_at',
         'topic',
-        'platform'
+        'platform',
+        'from_cache',
+        'source'
     ]
     
     fieldsets = (
         ('Основная информация', {
-            'fields': ('operation_type', 'created_at', 'topic', 'platform')
+            'fields': ('operation_type', 'created_at', 'topic', 'platform', 'from_cache')
         }),
         ('Связи', {
             'fields': ('generation', 'user', 'token')
@@ -284,10 +298,11 @@ class GigaChatTokenUsageAdmin(admin.ModelAdmin):
                 'estimated_prompt_tokens',
                 'estimated_completion_tokens',
                 'estimated_total_tokens',
+                'source',
                 'prompt_length',
                 'response_length'
             ),
-            'description': 'Оценочные значения на основе длины промпта и ответа'
+            'description': 'Расход из ответа API (provider) или оценка локальным токенизатором (estimated)'
         }),
     )
     
@@ -296,6 +311,7 @@ class GigaChatTokenUsageAdmin(admin.ModelAdmin):
         colors = {
             'TEXT_GENERATION': '#2196F3',
             'IMAGE_PROMPT': '#FF9800',
+            'IMAGE_PROMPT_DRAFT': '#FFC107',
             'IMAGE_GENERATION': '#4CAF50'
         }
         color = colors.get(obj.operation_type, '#757575')
@@ -715,5 +731,42 @@ class SupportChatAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at']
 
 
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'status', 'generator_type', 'token', 'worker', 'created_at', 'started_at', 'finished_at']
+    list_filter = ['status', 'generator_type', 'created_at']
+    search_fields = ['id', 'worker', 'error']
+    readonly_fields = ['created_at', 'started_at', 'finished_at']
+
+
+@admin.register(TokenReservation)
+class TokenReservationAdmin(admin.ModelAdmin):
+    list_display = ['id', 'token', 'provider', 'amount', 'settled_tokens', 'status', 'created_at', 'expires_at']
+    list_filter = ['status', 'provider', 'created_at']
+    search_fields = ['token__token']
+    readonly_fields = ['created_at', 'closed_at']
+
+
+@admin.register(BlockedNetwork)
+class BlockedNetworkAdmin(admin.ModelAdmin):
+    list_display = ['network', 'source', 'reason', 'created_at', 'expires_at']
+    list_filter = ['source', 'created_at']
+    search_fields = ['network', 'reason']
+    readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(SchedulerLease)
+class SchedulerLeaseAdmin(admin.ModelAdmin):
+    list_display = ['name', 'holder', 'acquired_at', 'heartbeat_at', 'expires_at']
+    readonly_fields = ['name', 'holder', 'acquired_at', 'heartbeat_at', 'expires_at']
+
+
+@admin.register(SchedulerRun)
+class SchedulerRunAdmin(admin.ModelAdmin):
+    list_display = ['job_id', 'status', 'started_at', 'finished_at', 'result', 'holder']
+    list_filter = ['job_id', 'status']
+    readonly_fields = ['job_id', 'holder', 'status', 'started_at', 'finished_at', 'result', 'error']
+
+
 admin.site.register(UserProfile)
 admin.site.register(Generation) 
\ No newline at end of file
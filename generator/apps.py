@@ -17,6 +17,7 @@ class GeneratorConfig(AppConfig):
         """
         # Импортируем здесь чтобы избежать ошибок при миграциях
         import sys
+        from django.conf import settings
         
         # Не запускаем планировщик при выполнении команд управления
         # (migrate, makemigrations, collectstatic и т.д.)
@@ -26,3 +27,11 @@ class GeneratorConfig(AppConfig):
                 start_scheduler()
             except Exception as e:
                 logger.error(f"Не удалось запустить планировщик: {e}")
+
+            # Фоновые воркеры очереди задач генерации
+            if getattr(settings, 'GENERATION_JOBS_ENABLED', False) and getattr(settings, 'GENERATION_JOBS_INPROCESS', False):
+                try:
+                    from .jobs import start_job_worker
+                    start_job_worker()
+                except Exception as e:
+                    logger.error(f"Не удалось запустить воркер задач генерации: {e}")
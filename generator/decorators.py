@@ -9,6 +9,8 @@ from functools import wraps
 from django.shortcuts import redirect
 from django.utils import timezone
 from .models import TemporaryAccessToken
+from .session_sync import sync_session
+from .token_cache import get_request_token
 
 
 def consume_generation(view_func):
@@ -42,11 +44,8 @@ def consume_generation(view_func):
             return redirect('token_required_page')
         
         try:
-            # Получаем объект токена из базы данных
-            token = TemporaryAccessToken.objects.get(
-                token=token_str,
-                is_active=True
-            )
+            # Токен уже загружен TokenAccessMiddleware (request.token) или берётся из кэша
+            token = get_request_token(request)
             
             # Проверяем срок действия
             if token.is_expired():
@@ -67,21 +66,20 @@ def consume_generation(view_func):
             if token.openai_tokens_limit > 0 and not can_oa and can_gc:
                 return redirect('openai_limit_exceeded_page')
             
-            # Сохраняем токен в request для использования в views
-            request.token = token
-            
             # Получаем IP адрес пользователя
             ip_address = get_client_ip(request)
             
             # Обновляем статистику использования (legacy)
             token.consume_generation(ip_address=ip_address)
             
-            # Обновляем данные в сессии
-            request.session['gigachat_tokens_limit'] = token.gigachat_tokens_limit
-            request.session['gigachat_tokens_used'] = token.gigachat_tokens_used
-            request.session['openai_tokens_limit'] = token.openai_tokens_limit
-            request.session['openai_tokens_used'] = token.openai_tokens_used
-            request.session['total_used'] = token.total_used
+            # Обновляем данные в сессии (только изменившиеся)
+            sync_session(request.session, {
+                'gigachat_tokens_limit': token.gigachat_tokens_limit,
+                'gigachat_tokens_used': token.gigachat_tokens_used,
+                'openai_tokens_limit': token.openai_tokens_limit,
+                'openai_tokens_used': token.openai_tokens_used,
+                'total_used': token.total_used,
+            })
             
         except TemporaryAccessToken.DoesNotExist:
             # Токен не найден - очищаем сессию
@@ -146,20 +144,14 @@ def token_required(view_func):
             return redirect('token_required_page')
         
         try:
-            # Проверяем существование и валидность токена
-            token = TemporaryAccessToken.objects.get(
-                token=token_str,
-                is_active=True
-            )
+            # Проверяем существование и валидность токена (request.token, кэш, БД)
+            token = get_request_token(request)
             
             # Проверяем срок действия
             if token.is_expired():
                 request.session.flush()
                 return redirect('invalid_token_page')
             
-            # Добавляем информацию о токене в request для использования в view
-            request.token = token
-            
         except TemporaryAccessToken.DoesNotExist:
             request.session.flush()
             return redirect('invalid_token_page')
@@ -8,6 +8,7 @@
 Функции:
 - generate_text_and_prompt(): Генерация текста и промпта для изображения
 - generate_image(): Генерация изображения по промпту
+- stream_text(): Потоковая генерация текста (SSE)
 - encrypt_data() / decrypt_data(): Шифрование/расшифровка данных
 """
 
@@ -25,6 +26,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 FLASK_GEN_URL = os.environ.get('FLASK_GEN_URL', 'http://localhost:5000')
+OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4o-mini')
 ENCRYPTION_KEY = os.environ.get('GENERATOR_ENCRYPTION_KEY')
 
 if not ENCRYPTION_KEY:
@@ -81,7 +83,84 @@ def decrypt_data(token: str) -> dict:
 # API CLIENT FUNCTIONS
 # =============================================================================
 
-def generate_text_and_prompt(payload: dict, token=None) -> dict:
+OPENAI_LIMIT_WARNING = 'WARNING: Лимит токенов OpenAI исчерпан. Пожалуйста, обновите подписку или выберите другой тариф.'
+
+# Оценка расхода DALL-E, если Flask API не вернул tokens_used
+DALLE_TOKENS_ESTIMATE = 1000
+
+
+def _reserve_openai_tokens(token, prompt_text, completion_tokens):
+    """
+    Резервирует верхнюю оценку расхода до запроса к Flask API
+    
+    Returns:
+        tuple: (bool, TokenReservation или None) — False, если остатка не хватает
+    """
+    from generator.token_accounting import reservation_estimate
+    
+    if not token:
+        return True, None
+    try:
+        reservation = token.reserve_tokens('openai', reservation_estimate(prompt_text, completion_tokens, 'openai'))
+    except Exception as e:
+        print(f"Ошибка при резервировании токенов OpenAI: {e}")
+        return True, None
+    return reservation is not None, reservation
+
+
+def _settle_openai_tokens(token, reservation, tokens_used):
+    """
+    Списывает фактический расход OpenAI и закрывает резерв
+    
+    Returns:
+        bool: False, если лимит исчерпан (только без резерва)
+    """
+    if not token:
+        return True
+    try:
+        if reservation is None:
+            return token.consume_openai_tokens(tokens_used)
+        return token.settle_reservation(reservation, tokens_used) or True
+    except Exception as e:
+        print(f"Ошибка при учёте токенов OpenAI: {e}")
+        return True
+
+
+def _release_openai_tokens(token, reservation):
+    """Освобождает резерв, если запрос к Flask API не дал результата."""
+    if not token or reservation is None:
+        return
+    try:
+        token.release_reservation(reservation)
+    except Exception as e:
+        print(f"Ошибка при освобождении резерва токенов OpenAI: {e}")
+
+
+def _estimate_openai_tokens(payload, *response_texts):
+    """Оценка расхода OpenAI, если Flask API не вернул usage."""
+    from generator.token_accounting import count_tokens_batch
+    
+    texts = [json.dumps(payload, ensure_ascii=False)] + [t for t in response_texts if t]
+    return sum(count_tokens_batch(texts, 'openai'))
+
+
+def _log_cached_openai(payload, cached, user=None, token=None):
+    """Логирует попадание в кэш ответов OpenAI так же, как для GigaChat (from_cache=True)."""
+    from generator.gigachat_api import log_token_usage
+    
+    log_token_usage(
+        operation_type='TEXT_GENERATION',
+        prompt_text=json.dumps(payload, ensure_ascii=False),
+        response_text=cached.get('text'),
+        user=user,
+        token=token,
+        topic=payload.get('topic'),
+        platform=payload.get('platform'),
+        from_cache=True
+    )
+
+
+def generate_text_and_prompt(payload: dict, token=None, use_cache=True, user=None) -> dict:
     """
     Генерирует текст и промпт для изображения через Flask API
     
@@ -91,6 +170,8 @@ def generate_text_and_prompt(payload: dict, token=None) -> dict:
     Args:
         payload (dict): Параметры генерации из Django формы
         token: TemporaryAccessToken для учёта токенов OpenAI (опционально)
+        use_cache: Разрешить ответ из кэша ответов (False для перегенерации)
+        user: Пользователь Django для логирования попадания в кэш (опционально)
     
     Returns:
         dict: {'text': str, 'image_prompt': str, 'tokens_used': int}
@@ -98,6 +179,26 @@ def generate_text_and_prompt(payload: dict, token=None) -> dict:
     Raises:
         Exception: При ошибках подключения или обработки данных
     """
+    from generator.response_cache import response_cache, make_cache_key, is_enabled_for
+    from generator.token_accounting import IMAGE_PROMPT_TOKENS_ESTIMATE, TEXT_TOKENS_ESTIMATE
+    
+    cache_key = None
+    if use_cache and is_enabled_for(token):
+        cache_key = make_cache_key(payload, 'openai', OPENAI_MODEL)
+        cached = response_cache.get(cache_key)
+        if cached:
+            print("Ответ OpenAI взят из кэша ответов")
+            _log_cached_openai(payload, cached, user=user, token=token)
+            # Токены OpenAI за повтор не списываются
+            return dict(cached, tokens_used=0, from_cache=True)
+    
+    # Лимит проверяется до платного запроса: ответ — текст и промпт изображения
+    limit_ok, reservation = _reserve_openai_tokens(
+        token, json.dumps(payload, ensure_ascii=False), TEXT_TOKENS_ESTIMATE + IMAGE_PROMPT_TOKENS_ESTIMATE
+    )
+    if not limit_ok:
+        return {'text': OPENAI_LIMIT_WARNING, 'image_prompt': None, 'tokens_used': 0}
+    
     url = f'{FLASK_GEN_URL}/generate-text'
     print(f"Отправка запроса к Flask API: {url}")
     print(f"Payload: {payload}")
@@ -122,20 +223,24 @@ def generate_text_and_prompt(payload: dict, token=None) -> dict:
             result = decrypt_data(data)
             print(f"Данные расшифрованы: {result}")
             
-            # Учитываем токены OpenAI (если Flask API вернул информацию о токенах)
-            tokens_used = result.get('tokens_used', 0)
-            if token and tokens_used > 0:
-                try:
-                    if not token.consume_openai_tokens(tokens_used):
-                        # Лимит исчерпан
-                        return {
-                            'text': 'WARNING: Лимит токенов OpenAI исчерпан. Пожалуйста, обновите подписку или выберите другой тариф.',
-                            'image_prompt': None,
-                            'tokens_used': 0
-                        }
-                except Exception as e:
-                    print(f"Ошибка при учёте токенов OpenAI: {e}")
+            # Учитываем токены OpenAI: расход из ответа OpenAI, а если Flask API
+            # его не вернул — оценка локальным токенизатором
+            tokens_used = result.get('tokens_used')
+            if tokens_used is None:
+                tokens_used = _estimate_openai_tokens(payload, result.get('text'), result.get('image_prompt'))
+                result['tokens_used'] = tokens_used
+            if tokens_used > 0:
+                settled = _settle_openai_tokens(token, reservation, tokens_used)
+                reservation = None
+                if not settled:
+                    # Лимит исчерпан
+                    return {'text': OPENAI_LIMIT_WARNING, 'image_prompt': None, 'tokens_used': 0}
             
+            if cache_key and result.get('text') and not str(result['text']).startswith('WARNING'):
+                response_cache.set(cache_key, {
+                    'text': result['text'],
+                    'image_prompt': result.get('image_prompt'),
+                })
             return result
         except Exception as decrypt_error:
             print(f"ERROR: Ошибка расшифровки ответа: {decrypt_error}")
@@ -157,8 +262,11 @@ def generate_text_and_prompt(payload: dict, token=None) -> dict:
     except Exception as e:
         print(f"Ошибка при обращении к Flask API: {e}")
         raise
+    finally:
+        # Расход не списан (ошибка или пустой ответ) — резерв не нужен
+        _release_openai_tokens(token, reservation)
 
-def generate_image(image_prompt: str) -> str:
+def generate_image(image_prompt: str, token=None) -> str:
     """
     Генерирует изображение через Flask API (DALL-E)
     
@@ -167,10 +275,15 @@ def generate_image(image_prompt: str) -> str:
     
     Args:
         image_prompt (str): Промпт для генерации изображения
+        token: TemporaryAccessToken для учёта токенов OpenAI (опционально)
     
     Returns:
         str: URL сгенерированного изображения или None при ошибке
     """
+    limit_ok, reservation = _reserve_openai_tokens(token, image_prompt, DALLE_TOKENS_ESTIMATE)
+    if not limit_ok:
+        return None
+    
     url = f'{FLASK_GEN_URL}/generate-image'
     print(f"Отправка запроса на генерацию изображения: {url}")
     print(f"Image prompt: {image_prompt}")
@@ -191,17 +304,87 @@ def generate_image(image_prompt: str) -> str:
         print(f"Изображение получено: {result}")
         
         # Учитываем токены OpenAI для DALL-E (примерная оценка: ~1000 токенов на изображение)
-        tokens_used = result.get('tokens_used', 1000)
-        if token:
-            try:
-                if not token.consume_openai_tokens(tokens_used):
-                    # Лимит исчерпан
-                    return None
-            except Exception as e:
-                print(f"Ошибка при учёте токенов OpenAI: {e}")
+        tokens_used = result.get('tokens_used', DALLE_TOKENS_ESTIMATE)
+        settled = _settle_openai_tokens(token, reservation, tokens_used)
+        reservation = None
+        if not settled:
+            # Лимит исчерпан
+            return None
         
         return result.get('image_url')
         
     except Exception as e:
         print(f"Ошибка при генерации изображения через Flask API: {e}")
-        return None 
\ No newline at end of file
+        return None
+    finally:
+        _release_openai_tokens(token, reservation)
+
+def stream_text(payload: dict, token=None):
+    """
+    Потоковая генерация текста через Flask API (OpenAI stream)
+    
+    Читает Server-Sent Events от /generate-text-stream и отдаёт
+    расшифрованные дельты текста. Токены OpenAI списываются после
+    окончания потока, в том числе если клиент отключился раньше.
+    
+    Args:
+        payload (dict): Параметры генерации из Django формы
+        token: TemporaryAccessToken для учёта токенов OpenAI (опционально)
+    
+    Yields:
+        str: Очередной фрагмент текста
+    
+    Raises:
+        Exception: При ошибках подключения к Flask API
+    """
+    from generator.token_accounting import TEXT_TOKENS_ESTIMATE
+    
+    # Лимит проверяется до платного запроса
+    limit_ok, reservation = _reserve_openai_tokens(token, json.dumps(payload, ensure_ascii=False), TEXT_TOKENS_ESTIMATE)
+    if not limit_ok:
+        raise Exception("Лимит токенов OpenAI исчерпан")
+    
+    url = f'{FLASK_GEN_URL}/generate-text-stream'
+    print(f"Потоковый запрос к Flask API: {url}")
+    
+    tokens_used = 0
+    received = []
+    done = False
+    try:
+        resp = requests.post(url, json={'data': encrypt_data(payload)}, stream=True, timeout=(5, 120))
+        resp.raise_for_status()
+    except requests.exceptions.ConnectionError as e:
+        print(f"Ошибка подключения к Flask API: {e}")
+        _release_openai_tokens(token, reservation)
+        raise Exception("Flask Generator не запущен или недоступен")
+    except Exception:
+        _release_openai_tokens(token, reservation)
+        raise
+    
+    try:
+        event = 'message'
+        for line in resp.iter_lines(decode_unicode=True):
+            if line.startswith('event:'):
+                event = line[len('event:'):].strip()
+            elif line.startswith('data:'):
+                data = decrypt_data(line[len('data:'):].strip())
+                if event == 'delta':
+                    text = data.get('text', '')
+                    received.append(text)
+                    yield text
+                elif event == 'error':
+                    raise Exception(data.get('error', 'Ошибка Flask API'))
+                elif event == 'done':
+                    tokens_used = data.get('tokens_used', 0)
+                    done = True
+            elif not line:
+                event = 'message'
+    finally:
+        resp.close()
+        if not done and received:
+            # Поток оборвался до итогового события — оцениваем расход по полученному тексту
+            tokens_used = _estimate_openai_tokens(payload, ''.join(received))
+        if tokens_used > 0:
+            _settle_openai_tokens(token, reservation, tokens_used)
+        else:
+            _release_openai_tokens(token, reservation)
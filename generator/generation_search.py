@@ -0,0 +1,185 @@
+"""
+Полнотекстовый поиск по истории генераций (тема и текст поста)
+
+Индекс ведёт сама БД и обновляет его при каждом INSERT/UPDATE/DELETE
+(в том числе bulk_create и QuerySet.update), поэтому отдельной
+синхронизации в коде нет. Индекс создаёт миграция 0027_generation_search:
+
+- PostgreSQL: генерируемый столбец search_vector (tsvector с русской
+  морфологией, тема весит больше текста) и GIN индекс по нему; ранжирование
+  ts_rank_cd.
+- SQLite (локальная разработка): внешняя таблица FTS5
+  generator_generation_fts и триггеры; ранжирование bm25. Морфологии в
+  FTS5 нет — длинные слова ищутся по префиксу без окончания.
+- Другие БД: icontains по теме и тексту (без ранжирования).
+
+Страницы отдаются по номеру: LIMIT/OFFSET без COUNT по всем совпадениям.
+Порядок — ранг по всем совпадениям, при равном ранге новые раньше
+(created_at, затем id): он не зависит от номера страницы, поэтому
+результаты не переходят между страницами и не повторяются.
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from .models import Generation
+from .wall_feed import card_queryset
+
+FTS_TABLE = 'generator_generation_fts'
+
+# Тема важнее текста поста
+TOPIC_WEIGHT = 2.0
+RESULT_WEIGHT = 1.0
+
+# Лимит слов в запросе: длинные вставки текста не должны превращаться в тяжёлый запрос
+MAX_QUERY_TERMS = 8
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _page_size():
+    return getattr(settings, 'WALL_PAGE_SIZE', 24)
+
+
+def backend():
+    """Способ поиска для текущей БД: 'postgresql', 'sqlite' или 'icontains'."""
+    if connection.vendor in ('postgresql', 'sqlite'):
+        return connection.vendor
+    return 'icontains'
+
+
+def query_terms(query):
+    """Слова запроса в нижнем регистре (не больше MAX_QUERY_TERMS)."""
+    return _WORD_RE.findall((query or '').lower())[:MAX_QUERY_TERMS]
+
+
+def fts5_query(query):
+    """
+    Запрос FTS5 из пользовательского текста
+
+    Каждое слово экранируется кавычками (операторы FTS5 из ввода не
+    работают) и ищется по префиксу; у слов длиннее 5 символов отбрасывается
+    окончание ("генерации" → "генерац*"), что заменяет стемминг.
+
+    Returns:
+        str: Запрос для MATCH или '' (нет слов)
+    """
+    parts = []
+    for term in query_terms(query):
+        stem = term[:-2] if len(term) > 5 else term
+        parts.append('"%s"*' % stem.replace('"', '""'))
+    return ' '.join(parts)
+
+
+def _owner_clause(user, alias):
+    if user is not None and user.is_authenticated:
+        return f'{alias}.user_id = %s', [user.pk]
+    return f'{alias}.user_id IS NULL', []
+
+
+def search_ids(user, query, limit, offset=0):
+    """
+    id генераций пользователя по запросу, от самых релевантных
+
+    Args:
+        user: Пользователь (None или аноним — генерации без пользователя)
+        query: Текст запроса
+        limit: Сколько id вернуть
+        offset: Сколько первых совпадений пропустить
+
+    Returns:
+        list[int]
+    """
+    kind = backend()
+    if kind == 'icontains':
+        return icontains_ids(user, query, limit, offset)
+    owner, owner_params = _owner_clause(user, 'g')
+    # Полный порядок (ранг, created_at, id) по всем совпадениям — одинаковый для всех страниц
+    if kind == 'postgresql':
+        text = ' '.join(query_terms(query))
+        if not text:
+            return []
+        sql = (
+            "WITH q AS (SELECT websearch_to_tsquery('russian', %s) AS query) "
+            "SELECT g.id FROM generator_generation g, q "
+            f"WHERE g.search_vector @@ q.query AND {owner} "
+            "ORDER BY ts_rank_cd(g.search_vector, q.query) DESC, g.created_at DESC, g.id DESC "
+            "LIMIT %s OFFSET %s"
+        )
+        params = [text, *owner_params, limit, offset]
+    else:
+        match = fts5_query(query)
+        if not match:
+            return []
+        # bm25 в FTS5: чем меньше, тем релевантнее
+        sql = (
+            f"SELECT g.id FROM {FTS_TABLE} JOIN generator_generation g ON g.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH %s AND {owner} "
+            f"ORDER BY bm25({FTS_TABLE}, {TOPIC_WEIGHT}, {RESULT_WEIGHT}), g.created_at DESC, g.id DESC "
+            "LIMIT %s OFFSET %s"
+        )
+        params = [match, *owner_params, limit, offset]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def icontains_ids(user, query, limit, offset=0):
+    """
+    Поиск подстрокой (icontains) по теме и тексту, от новых к старым
+
+    Запасной вариант для БД без полнотекстового индекса и база для
+    сравнения в benchmark_generation_search: каждый запрос читает все
+    генерации владельца.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+    if user is not None and user.is_authenticated:
+        queryset = Generation.objects.filter(user=user)
+    else:
+        queryset = Generation.objects.filter(user__isnull=True)
+    for term in terms:
+        queryset = queryset.filter(Q(topic__icontains=term) | Q(result__icontains=term))
+    return list(queryset.order_by('-created_at', '-id').values_list('id', flat=True)[offset:offset + limit])
+
+
+def search_generations(user, query, page=1, per_page=None):
+    """
+    Страница результатов поиска в виде карточек стены
+
+    Args:
+        user: Пользователь (request.user)
+        query: Текст запроса
+        page: Номер страницы (с 1)
+        per_page: Размер страницы (по умолчанию WALL_PAGE_SIZE)
+
+    Returns:
+        (generations, has_next): карточки в порядке релевантности
+    """
+    per_page = per_page or _page_size()
+    page = max(int(page), 1)
+    ids = search_ids(user, query, per_page + 1, (page - 1) * per_page)
+    has_next = len(ids) > per_page
+    ids = ids[:per_page]
+    cards = card_queryset(Generation.objects.filter(id__in=ids)).in_bulk()
+    return [cards[pk] for pk in ids if pk in cards], has_next
+
+
+def rebuild_index():
+    """
+    Перестраивает индекс FTS5 по таблице генераций (только SQLite)
+
+    В PostgreSQL столбец search_vector вычисляется самой БД и перестройки не требует.
+
+    Returns:
+        bool: True, если индекс перестроен
+    """
+    if backend() != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES('rebuild')")
+    return True
@@ -1,7 +1,6 @@
 import os
 import base64
 import re
-import time
 from dotenv import load_dotenv
 from bs4 import BeautifulSoup
 
@@ -10,6 +9,14 @@ from langchain_core.messages import SystemMessage, HumanMessage
 from gigachat import GigaChat as GigaChatDirect
 from gigachat.models import Chat, Messages, MessagesRole
 
+from generator.gigachat_pool import GigaChatClientPool, is_auth_error
+from generator.rate_governor import RateGovernor, is_rate_limit_error, retry_after_from_error
+from generator.response_cache import response_cache, make_cache_key, is_enabled_for as response_cache_enabled_for
+from generator.token_accounting import (
+    count_tokens, measure_usage, usage_from_response, reservation_estimate,
+    IMAGE_TOKENS_ESTIMATE, IMAGE_PROMPT_TOKENS_ESTIMATE, TEXT_TOKENS_ESTIMATE,
+)
+
 try:
     from gigachat.exceptions import ResponseError as GigaChatResponseError
 except ImportError:
@@ -17,7 +24,7 @@ except ImportError:
 
 # Импорт для логирования токенов
 try:
-    from generator.models import GigaChatTokenUsage, Generation
+    from generator.usage_sink import usage_sink
     TOKEN_TRACKING_ENABLED = True
 except ImportError:
     TOKEN_TRACKING_ENABLED = False
@@ -33,6 +40,9 @@ CLIENT_SECRET = os.getenv("GIGACHAT_CLIENT_SECRET")
 
 SCOPE = os.getenv("GIGACHAT_SCOPE", "GIGACHAT_API_PERS")
 
+# Модель для генерации текста (по умолчанию — модель SDK)
+GIGACHAT_MODEL = os.getenv("GIGACHAT_MODEL")
+
 # Отладочный вывод для диагностики проблем с переменными окружения
 print("=" * 60)
 print("GigaChat Configuration:")
@@ -82,6 +92,7 @@ def _init_client():
     return GigaChat(
         credentials=credentials,
         scope=SCOPE,
+        model=GIGACHAT_MODEL,
         verify_ssl_certs=False,
         timeout=120  # 2 минуты для текста
     )
@@ -98,6 +109,27 @@ def _init_direct_client():
         timeout=300  # 5 минут для изображений (они генерируются дольше)
     )
 
+# Реестр клиентов на воркер: переиспользуем авторизованные клиенты и их пулы соединений
+_client_pool = GigaChatClientPool({
+    'text': _init_client,
+    'image': _init_direct_client,
+})
+
+def get_client_pool_stats():
+    """Возвращает счётчики переиспользования клиентов GigaChat в текущем воркере"""
+    return _client_pool.get_stats()
+
+# Общий для всех воркеров регулятор частоты запросов к GigaChat (вместо фиксированных пауз)
+_rate_governor = RateGovernor('gigachat')
+
+def get_rate_governor_stats():
+    """Возвращает метрики регулятора частоты запросов к GigaChat"""
+    return _rate_governor.get_stats()
+
+def _call_gigachat(kind, func):
+    """Выполняет func(клиент) через пул клиентов с разрешения регулятора частоты"""
+    return _client_pool.call(kind, lambda giga: _rate_governor.call(lambda: func(giga)))
+
 # --- SYSTEM PROMPT PREAMBLE ---
 SYSTEM_PROMPT_PREAMBLE = r'''
 **Цель:** Сгенерировать высококачественный, цепляющий, SEO-оптимизированный контент для социальных сетей (укажите платформу: Instagram, Twitter/X, LinkedIn, Facebook, TikTok, VK, Дзен, Telegram или общий шаблон) на тему: "[ТЕМА КОНТЕНТА]". Целевая аудитория: [Опишите ЦА: например, "IT-специалисты 25-45 лет, интересующиеся новыми технологиями"].
@@ -182,223 +214,26 @@ SYSTEM_PROMPT_PREAMBLE = r'''
 '''
 
 # --- PROMPT FRAGMENTS DICTIONARIES ---
-VOICE_TONE_PROMPTS = {
-    "Дружелюбный": "Тон сообщения — дружелюбный и открытый.",
-    "Профессиональный": "Тон сообщения — профессиональный и уверенный.",
-    "Неформальный": "Тон сообщения — неформальный, разговорный.",
-    "Юмористический": "Тон сообщения — с юмором, иронией.",
-    "Вдохновляющий": "Тон сообщения — вдохновляющий, мотивирующий.",
-    "Серьезный": "Тон сообщения — серьезный, авторитетный.",
-    "Эмпатичный": "Тон сообщения — эмпатичный, заботливый.",
-    "Провокационный": "Тон сообщения — провокационный, смелый.",
-    "Официальный": "Тон сообщения — официальный, деловой.",
-}
-CONTENT_PURPOSE_PROMPTS = {
-    "Информативный": "Цель поста — информировать или обучать аудиторию.",
-    "Развлекательный": "Цель поста — развлечь аудиторию.",
-    "Вовлекающий": "Цель поста — вовлечь, задать вопрос или провести опрос.",
-    "Продающий": "Цель поста — презентовать продукт или услугу.",
-    "Приводящий": "Цель поста — привести на сайт, блог или мероприятие.",
-    "Имиджевый": "Цель поста — укрепить лояльность или имидж бренда.",
-    "Новостной": "Цель поста — сообщить новости или оповестить.",
-    "Обучающий": "Цель поста — обучить, дать инструкцию (how-to).",
-    "Вдохновляющий": "Цель поста — вдохновить, рассказать историю успеха.",
-}
-EMOTIONAL_TONE_PROMPTS = {
-    "Радостный": "Пост должен вызывать радость и позитив.",
-    "Спокойный": "Пост должен создавать ощущение спокойствия.",
-    "Взволнованный": "Пост должен быть энергичным, взволнованным.",
-    "Любопытный": "Пост должен вызывать любопытство, интригу.",
-    "Ностальгический": "Пост должен вызывать ностальгию.",
-    "Удивленный": "Пост должен удивлять, восхищать.",
-    "Сопереживающий": "Пост должен поддерживать, сопереживать.",
-    "Срочный": "Пост должен создавать ощущение срочности (FOMO).",
-}
-CONTENT_FORMAT_PROMPTS = {
-    "Краткий": "Формат — кратко, тезисно.",
-    "Подробный": "Формат — подробно, развернуто.",
-    "Списки": "Используй списки или перечни.",
-    "FAQ": "Формат — вопрос-ответ (FAQ).",
-    "История": "Формат — история или кейс.",
-    "Пошаговая": "Формат — пошаговая инструкция.",
-    "Сравнение": "Формат — сравнение или сопоставление.",
-    "Цитата": "Используй цитату или высказывание.",
-    "Миф": "Формат — миф vs. реальность.",
-}
-DELIVERY_STYLE_PROMPTS = {
-    "Прямой": "Стиль подачи — прямой, без прикрас.",
-    "Повествовательный": "Стиль подачи — повествовательный, историйный.",
-    "Диалоговый": "Стиль подачи — диалоговый, интерактивный.",
-    "Визуальный": "Сделай акцент на визуальных элементах.",
-    "Экспертный": "Стиль подачи — экспертный, аналитический.",
-    "Персонализированный": "Обращайся к читателю персонально (ты/вы).",
-    "Новостной": "Стиль подачи — новостной, репортажный.",
-}
-CTA_PROMPTS = {
-    "Узнать больше": "В конце добавь призыв узнать больше (ссылка).",
-    "Купить": "В конце добавь призыв купить или заказать.",
-    "Записаться": "В конце добавь призыв записаться или зарегистрироваться.",
-    "Скачать": "В конце добавь призыв скачать.",
-    "Посмотреть": "В конце добавь призыв посмотреть видео.",
-    "Поделиться": "В конце добавь призыв поделиться постом.",
-    "Прокомментировать": "В конце добавь призыв прокомментировать или ответить.",
-    "Опрос": "В конце добавь призыв пройти опрос или проголосовать.",
-    "Сохранить": "В конце добавь призыв сохранить пост.",
-    "Подписаться": "В конце добавь призыв подписаться.",
-}
-PLATFORM_SPECIFIC_PROMPTS = {
-    "Instagram": "Оптимизируй под Instagram: акцент на визуал, короткий текст.",
-    "Twitter": "Оптимизируй под Twitter/X: краткость, треды, хэштеги.",
-    "LinkedIn": "Оптимизируй под LinkedIn: профессионализм, длинные посты.",
-    "Facebook": "Оптимизируй под Facebook: смешанный формат, группы.",
-    "TikTok": "Оптимизируй под TikTok/Reels: видео-ориентированный, тренды.",
-    "VK": "Оптимизируй под VK: допускаются длинные тексты, встроенные опросы, ссылки, акцент на вовлечённость.",
-    "Дзен": "Оптимизируй под Дзен: развернутые статьи, аналитика, цепляющий заголовок, формат блога.",
-    "Telegram": "Оптимизируй под Telegram: краткие абзацы, разговорный стиль, минимум визуала, акцент на пересылку и вовлечённость.",
-}
-FORMALITY_LEVEL_PROMPTS = {
-    "Высокоформальный": "Язык — высокоформальный, официальный.",
-    "Деловой": "Язык — деловой, профессиональный.",
-    "Полуформальный": "Язык — полуформальный, дружелюбный.",
-    "Неформальный": "Язык — неформальный, разговорный.",
-    "Сленговый": "Язык — сленговый, мемный, молодежный.",
-}
-BRAND_VOICE_PROMPTS = {
-    "Экспертный": "Голос бренда — экспертный.",
-    "Инновационный": "Голос бренда — инновационный.",
-    "Надежный": "Голос бренда — надежный, традиционный.",
-    "Любознательный": "Голос бренда — любознательный.",
-    "Игривый": "Голос бренда — игривый.",
-    "Заботливый": "Голос бренда — заботливый.",
-    "Бунтарский": "Голос бренда — бунтарский.",
-    "Люкс": "Голос бренда — люкс, премиум.",
-    "Простой": "Голос бренда — простой, практичный.",
-}
-POST_LENGTH_PROMPTS = {
-    "Очень короткий": "Сделай пост очень коротким (1 предложение).",
-    "Короткий": "Сделай пост коротким (1-2 абзаца).",
-    "Средний": "Сделай пост средним (2-4 абзаца).",
-    "Длинный": "Сделай пост длинным (более 4 абзацев, статья).",
-}
-HASHTAG_USAGE_PROMPTS = {
-    "Без хэштегов": "Не используй хэштеги.",
-    "Минимум": "Используй минимум хэштегов (1-3).",
-    "Оптимально": "Используй оптимальное количество хэштегов (4-10).",
-    "Максимум": "Используй максимум хэштегов (10+).",
-}
-MENTIONS_PROMPTS = {
-    "Без упоминаний": "Не используй упоминания.",
-    "Партнеры": "Упомяни партнеров.",
-    "Клиенты": "Упомяни клиентов или отзывы.",
-    "Лидеры": "Упомяни лидеров мнений.",
-}
-AUDIENCE_PROMPTS = {
-    "Новички": "Адаптируй под новичков в теме.",
-    "Продвинутые": "Адаптируй под продвинутых пользователей.",
-    "Существующие клиенты": "Ориентируйся на существующих клиентов.",
-    "Потенциальные клиенты": "Ориентируйся на потенциальных клиентов.",
-    "Молодежь": "Ориентируйся на молодежь.",
-    "Профессионалы": "Ориентируйся на профессионалов.",
-}
+# Словари критериев общие с Flask-генератором (flask_generator/prompt_engine.py)
+from flask_generator.prompt_engine import PromptCompiler  # noqa: E402
 
 # --- PROMPT ASSEMBLY FUNCTION ---
+# Компилятор с LRU-кэшем: одинаковые наборы критериев собираются один раз на воркер
+prompt_compiler = PromptCompiler(SYSTEM_PROMPT_PREAMBLE)
+
 def assemble_prompt_from_criteria(data):
     """
     Собирает системный промпт из выбранных пользователем критериев.
     Только заполненные поля добавляются в prompt.
     """
-    prompt_parts = [SYSTEM_PROMPT_PREAMBLE]
-    # Тон голоса (может быть список)
-    voice_tone = data.get('voice_tone', [])
-    if isinstance(voice_tone, str):
-        voice_tone = [voice_tone]
-    for v in voice_tone:
-        if v:
-            prompt_parts.append(VOICE_TONE_PROMPTS.get(v, ''))
-    # Цель контента
-    content_purpose = data.get('content_purpose', [])
-    if isinstance(content_purpose, str):
-        content_purpose = [content_purpose]
-    for v in content_purpose:
-        if v:
-            prompt_parts.append(CONTENT_PURPOSE_PROMPTS.get(v, ''))
-    # Эмоциональный окрас
-    emotional_tone = data.get('emotional_tone', [])
-    if isinstance(emotional_tone, str):
-        emotional_tone = [emotional_tone]
-    for v in emotional_tone:
-        if v:
-            prompt_parts.append(EMOTIONAL_TONE_PROMPTS.get(v, ''))
-    # Формат изложения
-    content_format = data.get('content_format', [])
-    if isinstance(content_format, str):
-        content_format = [content_format]
-    for v in content_format:
-        if v:
-            prompt_parts.append(CONTENT_FORMAT_PROMPTS.get(v, ''))
-    # Стиль подачи
-    delivery_style = data.get('delivery_style', [])
-    if isinstance(delivery_style, str):
-        delivery_style = [delivery_style]
-    for v in delivery_style:
-        if v:
-            prompt_parts.append(DELIVERY_STYLE_PROMPTS.get(v, ''))
-    # Призыв к действию
-    cta = data.get('cta')
-    if cta:
-        prompt_parts.append(CTA_PROMPTS.get(cta, ''))
-    # Адаптация под платформу
-    platform_specific = data.get('platform_specific', [])
-    if isinstance(platform_specific, str):
-        platform_specific = [platform_specific]
-    for v in platform_specific:
-        if v:
-            prompt_parts.append(PLATFORM_SPECIFIC_PROMPTS.get(v, ''))
-    # Уровень формальности
-    formality_level = data.get('formality_level', [])
-    if isinstance(formality_level, str):
-        formality_level = [formality_level]
-    for v in formality_level:
-        if v:
-            prompt_parts.append(FORMALITY_LEVEL_PROMPTS.get(v, ''))
-    # Брендовый голос
-    brand_voice = data.get('brand_voice', [])
-    if isinstance(brand_voice, str):
-        brand_voice = [brand_voice]
-    for v in brand_voice:
-        if v:
-            prompt_parts.append(BRAND_VOICE_PROMPTS.get(v, ''))
-    # Длина поста
-    post_length = data.get('post_length')
-    if post_length:
-        prompt_parts.append(POST_LENGTH_PROMPTS.get(post_length, ''))
-    # Хэштеги
-    hashtag_usage = data.get('hashtag_usage')
-    if hashtag_usage:
-        prompt_parts.append(HASHTAG_USAGE_PROMPTS.get(hashtag_usage, ''))
-    # Упоминания
-    mentions = data.get('mentions', [])
-    if isinstance(mentions, str):
-        mentions = [mentions]
-    for v in mentions:
-        if v:
-            prompt_parts.append(MENTIONS_PROMPTS.get(v, ''))
-    # Аудитория
-    audience = data.get('audience', [])
-    if isinstance(audience, str):
-        audience = [audience]
-    for v in audience:
-        if v:
-            prompt_parts.append(AUDIENCE_PROMPTS.get(v, ''))
-    return '\n'.join([p for p in prompt_parts if p])
+    return prompt_compiler.compile(data)
 
 def estimate_tokens(text):
     """
     Оценивает количество токенов в тексте
     
-    Для русского языка: ~1 токен = 2-3 символа
-    Для английского: ~1 токен = 4 символа
-    Используем среднее значение: ~1 токен = 2.5 символа для смешанного текста
+    Используется, только если GigaChat не вернул фактический расход
+    (см. generator/token_accounting.py).
     
     Args:
         text: Текст для оценки
@@ -406,14 +241,12 @@ def estimate_tokens(text):
     Returns:
         int: Оценочное количество токенов
     """
-    if not text:
-        return 0
-    # Оценка: 1 токен ≈ 2.5 символа для смешанного русско-английского текста
-    return int(len(str(text)) / 2.5)
+    return count_tokens(text, 'gigachat')
 
 
 def log_token_usage(operation_type, prompt_text, response_text, generation_id=None, 
-                    user=None, token=None, topic=None, platform=None):
+                    user=None, token=None, topic=None, platform=None, from_cache=False,
+                    usage=None):
     """
     Логирует использование токенов GigaChat
     
@@ -426,99 +259,365 @@ def log_token_usage(operation_type, prompt_text, response_text, generation_id=No
         token: TemporaryAccessToken (опционально)
         topic: Тема генерации (опционально)
         platform: Платформа (опционально)
+        from_cache: Ответ взят из кэша (токены не списывались, это экономия)
+        usage: TokenUsage с расходом (если не передан — оценка по текстам)
     """
     if not TOKEN_TRACKING_ENABLED:
         return
     
     try:
-        prompt_tokens = estimate_tokens(prompt_text)
-        completion_tokens = estimate_tokens(response_text)
-        total_tokens = prompt_tokens + completion_tokens
+        if usage is None:
+            usage = measure_usage(prompt_text, response_text)
         
-        generation = None
-        if generation_id:
-            try:
-                generation = Generation.objects.get(id=generation_id)
-            except Generation.DoesNotExist:
-                pass
-        
-        GigaChatTokenUsage.objects.create(
-            generation=generation,
-            user=user,
-            token=token,
+        # Запись сохраняется фоновым сбросом очереди (generator/usage_sink.py)
+        usage_sink.enqueue(dict(
+            generation_id=generation_id,
+            user_id=user.pk if user is not None else None,
+            token_id=token.pk if token is not None else None,
             operation_type=operation_type,
-            estimated_prompt_tokens=prompt_tokens,
-            estimated_completion_tokens=completion_tokens,
-            estimated_total_tokens=total_tokens,
+            estimated_prompt_tokens=usage.prompt_tokens,
+            estimated_completion_tokens=usage.completion_tokens,
+            estimated_total_tokens=usage.total_tokens,
+            source=usage.source,
             prompt_length=len(str(prompt_text)),
             response_length=len(str(response_text)),
             topic=topic,
-            platform=platform
-        )
+            platform=platform,
+            from_cache=from_cache
+        ))
     except Exception as e:
         # Не прерываем выполнение при ошибке логирования
         print(f"Ошибка при логировании токенов: {e}")
 
 
+# Служебные строки, которые удаляются из финального поста
+_SERVICE_LINE_PATTERNS = [re.compile(pat, re.IGNORECASE) for pat in (
+    r'^\s*Заголовок\s*[:\-]',
+    r'^\s*Контент\s*[:\-]',
+    r'^\s*Агент[\s\w:–-]+:',
+    r'^\s*Критик[\s\w:–-]*:',
+    r'^\s*Круг \d+[:\-]',
+    r'^\s*Версия \d+\.\d+[:\-]',
+    r'^\s*Черновик[:\-]',
+    r'^\s*Оценка Критика[:\-]?.*',
+    r'^\s*Резюме улучшений[:\-]?.*',
+    r'^\s*Финальная оценка[:\-]?.*',
+    r'^\s*Рекомендации по визуалу[:\-]?.*',
+    r'^\s*Ключевые слова[:\-]?.*',
+    r'^\s*Хештеги[:\-]?.*',
+    r'^\s*CTA[:\-]?.*',
+    r'^\s*\*{2,}',
+    r'^\s*_{2,}',
+    r'^\s*-{2,}',
+)]
+_FINAL_START_RE = re.compile(r'Финальный Результат|\*\*Текст поста:\*\*', re.IGNORECASE)
+_FINAL_CUT_RE = re.compile(r'Критик|Оценка', re.IGNORECASE)
+# Разделители строк как у str.splitlines()
+_LINE_BREAK_RE = re.compile(r'\r\n|[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]')
+
+
+class FinalResultFilter:
+    """
+    Инкрементальный фильтр финального поста.
+
+    Принимает текст кусками (например, дельты стриминга) и сразу отдаёт
+    события для клиента:
+        ('delta', текст) — новый фрагмент поста
+        ('reset', None)  — найден блок "Финальный Результат", показанный
+                           ранее черновик нужно очистить
+
+    После блока "Критик"/"Оценка" вывод прекращается, служебные строки
+    отбрасываются. result() возвращает тот же текст, что и
+    postprocess_final_result() для полного ответа.
+
+    Args:
+        partial_lines: Отдавать длинные незавершённые строки по частям
+                       (для стриминга; на result() не влияет)
+    """
+
+    # Незавершённая строка отдаётся частями, когда она длиннее PARTIAL_MIN;
+    # последние HOLDBACK символов придерживаются до конца строки
+    PARTIAL_MIN = 80
+    HOLDBACK = 24
+
+    def __init__(self, partial_lines=True):
+        self._partial = partial_lines
+        self._raw = []
+        self._buffer = ''
+        self._buffer_emitted = 0
+        self._final_found = False
+        self._cut = False
+        self._final_lines = []
+        self._emitted_any = False
+        self._blank_run = 0
+
+    def _emit(self, text):
+        if not text:
+            return []
+        self._emitted_any = True
+        return [('delta', text)]
+
+    def _process_line(self, line):
+        emitted = self._buffer_emitted
+        self._buffer_emitted = 0
+
+        if not self._final_found:
+            if _FINAL_START_RE.search(line):
+                # Всё, что было до финального блока, — черновики
+                self._final_found = True
+                events = [('reset', None)] if self._emitted_any else []
+                self._emitted_any = False
+                self._blank_run = 0
+                return events
+            return self._emit(line[emitted:] + '\n')
+
+        if self._cut:
+            return []
+        if _FINAL_CUT_RE.search(line):
+            self._cut = True
+            return []
+        if any(pat.match(line) for pat in _SERVICE_LINE_PATTERNS):
+            return []
+
+        self._final_lines.append(line)
+        if not line.strip():
+            # Не начинаем пост с пустых строк и схлопываем повторяющиеся
+            if not self._emitted_any:
+                return []
+            self._blank_run += 1
+            if self._blank_run > 1:
+                return []
+        else:
+            self._blank_run = 0
+        return self._emit(line[emitted:] + '\n')
+
+    def _flush_partial(self):
+        line = self._buffer
+        if not self._partial or self._cut or len(line) < self.PARTIAL_MIN:
+            return []
+        if _FINAL_START_RE.search(line):
+            return []
+        if self._final_found and (
+            _FINAL_CUT_RE.search(line) or any(pat.match(line) for pat in _SERVICE_LINE_PATTERNS)
+        ):
+            return []
+        end = len(line) - self.HOLDBACK
+        if end <= self._buffer_emitted:
+            return []
+        text = line[self._buffer_emitted:end]
+        self._buffer_emitted = end
+        self._blank_run = 0
+        return self._emit(text)
+
+    def feed(self, chunk):
+        """
+        Обрабатывает очередной фрагмент текста.
+
+        Returns:
+            list: События ('delta', текст) / ('reset', None)
+        """
+        if not chunk:
+            return []
+        self._raw.append(chunk)
+        self._buffer += chunk
+        events = []
+        while True:
+            match = _LINE_BREAK_RE.search(self._buffer)
+            # '\r' в конце может оказаться началом '\r\n' — ждём следующий фрагмент
+            if not match or (match.group() == '\r' and match.end() == len(self._buffer)):
+                break
+            line = self._buffer[:match.start()]
+            self._buffer = self._buffer[match.end():]
+            events.extend(self._process_line(line))
+        events.extend(self._flush_partial())
+        return events
+
+    def finish(self):
+        """Обрабатывает остаток текста после окончания потока."""
+        events = []
+        if self._buffer.endswith('\r'):
+            self._buffer = self._buffer[:-1]
+            events.extend(self._process_line(self._buffer))
+        elif self._buffer:
+            events.extend(self._process_line(self._buffer))
+        self._buffer = ''
+        return events
+
+    @property
+    def raw_text(self):
+        """Полный необработанный текст ответа."""
+        return ''.join(self._raw)
+
+    def result(self):
+        """Итоговый финальный пост (как у postprocess_final_result)."""
+        if not self._final_found:
+            return self.raw_text.strip()
+        return re.sub(r'\n{3,}', '\n\n', '\n'.join(self._final_lines)).strip()
+
+
 def postprocess_final_result(text):
     """
     Оставляет только финальный пост (блок после 'Финальный Результат' или '**Текст поста:**'), 
     удаляя все промежуточные этапы, подписи и служебные строки.
     """
-    import re
     if not text:
         return text
+    result_filter = FinalResultFilter(partial_lines=False)
+    result_filter.feed(text)
+    result_filter.finish()
+    return result_filter.result()
+
+TEXT_LIMIT_WARNING = "WARNING: Лимит токенов GigaChat исчерпан. Пожалуйста, обновите подписку или выберите другой тариф."
+
+
+def _reserve_tokens(token, prompt_text, completion_tokens):
+    """
+    Резервирует верхнюю оценку расхода до запроса к GigaChat
+    
+    Returns:
+        tuple: (bool, TokenReservation или None) — False, если остатка не хватает.
+               Если резерв не удался из-за ошибки, расход спишется как раньше
+    """
+    if not token:
+        return True, None
+    try:
+        reservation = token.reserve_tokens('gigachat', reservation_estimate(prompt_text, completion_tokens))
+    except Exception as e:
+        print(f"Ошибка при резервировании токенов GigaChat: {e}")
+        return True, None
+    return reservation is not None, reservation
 
-    # 1. Найти начало финального блока
-    final_start = None
-    lines = text.splitlines()
-    for i, line in enumerate(lines):
-        if re.search(r'Финальный Результат', line, re.IGNORECASE) or re.search(r'\*\*Текст поста:\*\*', line):
-            final_start = i
-            break
-
-    if final_start is None:
-        # Если не нашли, возвращаем как есть (или можно вернуть пусто)
-        return text.strip()
-
-    # 2. Собрать только строки после этого блока (включая саму строку)
-    final_lines = lines[final_start+1:]  # +1 чтобы не включать сам заголовок
-
-    # 3. Обрезать всё после блока "Критик:" или "Оценка:" (если есть)
-    for j, line in enumerate(final_lines):
-        if re.search(r'Критик', line, re.IGNORECASE) or re.search(r'Оценка', line, re.IGNORECASE):
-            final_lines = final_lines[:j]
-            break
-
-    # 4. Удалить подписи и лишние пустые строки
-    patterns = [
-        r'^\s*Заголовок\s*[:\-]',
-        r'^\s*Контент\s*[:\-]',
-        r'^\s*Агент[\s\w:–-]+:',
-        r'^\s*Критик[\s\w:–-]*:',
-        r'^\s*Круг \d+[:\-]',
-        r'^\s*Версия \d+\.\d+[:\-]',
-        r'^\s*Черновик[:\-]',
-        r'^\s*Оценка Критика[:\-]?.*',
-        r'^\s*Резюме улучшений[:\-]?.*',
-        r'^\s*Финальная оценка[:\-]?.*',
-        r'^\s*Рекомендации по визуалу[:\-]?.*',
-        r'^\s*Ключевые слова[:\-]?.*',
-        r'^\s*Хештеги[:\-]?.*',
-        r'^\s*CTA[:\-]?.*',
-        r'^\s*\*{2,}',
-        r'^\s*_{2,}',
-        r'^\s*-{2,}',
+
+def _settle_tokens(token, reservation, tokens_count):
+    """
+    Списывает фактический расход GigaChat по резерву
+    
+    Returns:
+        bool: False, если лимит исчерпан (только без резерва)
+    """
+    if not token:
+        return True
+    try:
+        if reservation is None:
+            return token.consume_gigachat_tokens(tokens_count)
+        return token.settle_reservation(reservation, tokens_count) or True
+    except Exception as e:
+        print(f"Ошибка при учёте токенов GigaChat: {e}")
+        return True
+
+
+def _release_tokens(token, reservation):
+    """Освобождает резерв, если запрос к GigaChat не дал результата."""
+    if not token or reservation is None:
+        return
+    try:
+        token.release_reservation(reservation)
+    except Exception as e:
+        print(f"Ошибка при освобождении резерва токенов GigaChat: {e}")
+
+
+def _build_text_messages(data):
+    """
+    Собирает сообщения для генерации текста поста.
+    
+    Returns:
+        tuple: (список сообщений, полный промпт для логирования)
+    """
+    system_prompt = assemble_prompt_from_criteria(data)
+    user_message = f"Напиши {data.get('template_type', '')} пост для {data.get('platform', '')}. Тема: {data.get('topic', '')}"
+    messages = [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=user_message)
     ]
-    filtered = []
-    for line in final_lines:
-        if any(re.match(pat, line, flags=re.IGNORECASE) for pat in patterns):
-            continue
-        filtered.append(line)
-    result = re.sub(r'\n{3,}', '\n\n', '\n'.join(filtered))
-    return result.strip()
+    return messages, f"{system_prompt}\n\n{user_message}"
+
 
-def generate_text(data, user=None, token=None, generation_id=None):
+def _finalize_text_usage(data, full_prompt, response_text, user=None, token=None, generation_id=None,
+                         usage=None, reservation=None):
+    """
+    Списывает токены за генерацию текста и логирует расход.
+    
+    Расход берётся из usage ответа GigaChat, при его отсутствии
+    оценивается по текстам. Резерв (если есть) закрывается фактическим расходом.
+    
+    Returns:
+        bool: False, если лимит токенов исчерпан
+    """
+    # Подсчёт использованных токенов
+    usage = usage or measure_usage(full_prompt, response_text)
+    
+    # Учёт токенов в TemporaryAccessToken (если передан)
+    if not _settle_tokens(token, reservation, usage.total_tokens):
+        # Лимит исчерпан
+        return False
+    
+    # Логирование использования токенов
+    log_token_usage(
+        operation_type='TEXT_GENERATION',
+        prompt_text=full_prompt,
+        response_text=response_text,
+        generation_id=generation_id,
+        user=user,
+        token=token,
+        topic=data.get('topic'),
+        platform=data.get('platform'),
+        usage=usage
+    )
+    return True
+
+
+def _text_cache_key(data, token, use_cache):
+    """Ключ кэша ответа или None, если кэш для запроса не используется."""
+    if not use_cache or not response_cache_enabled_for(token):
+        return None
+    return make_cache_key(data, 'gigachat', GIGACHAT_MODEL or 'GigaChat')
+
+
+def _get_cached_text(cache_key, data, full_prompt, user=None, token=None, generation_id=None):
+    """
+    Ищет ответ в кэше и логирует попадание отдельно (from_cache=True).
+    
+    Returns:
+        str или None: Закэшированный текст поста
+    """
+    if not cache_key:
+        return None
+    cached = response_cache.get(cache_key)
+    if not cached:
+        return None
+    print("Текст взят из кэша ответов")
+    log_token_usage(
+        operation_type='TEXT_GENERATION',
+        prompt_text=full_prompt,
+        response_text=cached['result'],
+        generation_id=generation_id,
+        user=user,
+        token=token,
+        topic=data.get('topic'),
+        platform=data.get('platform'),
+        from_cache=True
+    )
+    return cached['result']
+
+
+def _store_cached_text(cache_key, result):
+    """Сохраняет успешный ответ в кэш (предупреждения не кэшируются)."""
+    if cache_key and result and not result.startswith('WARNING'):
+        response_cache.set(cache_key, {'result': result})
+
+
+def _text_error_message(e):
+    """Текст предупреждения для пользователя по ошибке GigaChat."""
+    if "429" in str(e) or "Too Many Requests" in str(e):
+        return "WARNING: Превышен лимит запросов к GigaChat. Попробуйте позже."
+    elif "401" in str(e) or "Unauthorized" in str(e):
+        return "WARNING: Ошибка аутентификации. Проверьте настройки GigaChat."
+    elif "403" in str(e) or "Forbidden" in str(e):
+        return "WARNING: Доступ запрещен. Проверьте права доступа к GigaChat."
+    else:
+        return f"WARNING: Ошибка при генерации текста: {str(e)[:100]}"
+
+def generate_text(data, user=None, token=None, generation_id=None, use_cache=True):
     """
     Генерирует текст через GigaChat API
     
@@ -527,136 +626,202 @@ def generate_text(data, user=None, token=None, generation_id=None):
         user: Пользователь Django (опционально, для логирования)
         token: TemporaryAccessToken (опционально, для логирования)
         generation_id: ID генерации (опционально, для логирования)
+        use_cache: Разрешить ответ из кэша (False для явной перегенерации)
     
     Returns:
         str: Сгенерированный текст
     """
     try:
-        print("Инициализация клиента GigaChat для генерации текста...")
-        giga = _init_client()
-        print("Клиент успешно инициализирован")
-        system_prompt = assemble_prompt_from_criteria(data)
-        user_message = f"Напиши {data.get('template_type', '')} пост для {data.get('platform', '')}. Тема: {data.get('topic', '')}"
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_message)
-        ]
+        messages, full_prompt = _build_text_messages(data)
+        
+        cache_key = _text_cache_key(data, token, use_cache)
+        cached = _get_cached_text(cache_key, data, full_prompt, user, token, generation_id)
+        if cached:
+            return cached
         
-        # Подготовка промпта для логирования
-        full_prompt = f"{system_prompt}\n\n{user_message}"
+        # Лимит проверяется до платного запроса
+        limit_ok, reservation = _reserve_tokens(token, full_prompt, TEXT_TOKENS_ESTIMATE)
+        if not limit_ok:
+            return TEXT_LIMIT_WARNING
         
         print("Отправка запроса на генерацию текста...")
-        resp = giga.invoke(messages)
+        try:
+            resp = _call_gigachat('text', lambda giga: giga.invoke(messages))
+        except Exception:
+            _release_tokens(token, reservation)
+            raise
         print("Текст успешно сгенерирован")
         
         # --- Постобработка: убираем подписи и промежуточные этапы ---
         clean_result = postprocess_final_result(resp.content)
         
-        # Подсчёт использованных токенов
-        tokens_used = estimate_tokens(full_prompt) + estimate_tokens(resp.content)
-        
-        # Учёт токенов в TemporaryAccessToken (если передан)
-        if token:
-            try:
-                if not token.consume_gigachat_tokens(tokens_used):
-                    # Лимит исчерпан
-                    return "WARNING: Лимит токенов GigaChat исчерпан. Пожалуйста, обновите подписку или выберите другой тариф."
-            except Exception as e:
-                print(f"Ошибка при учёте токенов GigaChat: {e}")
-        
-        # Логирование использования токенов
-        log_token_usage(
-            operation_type='TEXT_GENERATION',
-            prompt_text=full_prompt,
-            response_text=resp.content,
-            generation_id=generation_id,
-            user=user,
-            token=token,
-            topic=data.get('topic'),
-            platform=data.get('platform')
-        )
+        if not _finalize_text_usage(data, full_prompt, resp.content, user, token, generation_id,
+                                    usage_from_response(resp), reservation):
+            return TEXT_LIMIT_WARNING
         
+        _store_cached_text(cache_key, clean_result)
         return clean_result
     except Exception as e:
         print(f"Ошибка при генерации текста: {e}")
         print(f"Тип ошибки: {type(e)}")
-        if "429" in str(e) or "Too Many Requests" in str(e):
-            return "WARNING: Превышен лимит запросов к GigaChat. Попробуйте позже."
-        elif "401" in str(e) or "Unauthorized" in str(e):
-            return "WARNING: Ошибка аутентификации. Проверьте настройки GigaChat."
-        elif "403" in str(e) or "Forbidden" in str(e):
-            return "WARNING: Доступ запрещен. Проверьте права доступа к GigaChat."
-        else:
-            return f"WARNING: Ошибка при генерации текста: {str(e)[:100]}"
+        return _text_error_message(e)
+
 
-def generate_image_prompt_from_text(text, form_data, user=None, token=None, generation_id=None):
+def stream_text(data, user=None, token=None, generation_id=None, use_cache=True):
     """
-    Генерирует промпт для генератора изображения на основе сгенерированного текста поста и параметров формы.
-    Возвращает строку-промпт для генерации иллюстрации.
+    Потоковая генерация текста через GigaChat API
+    
+    Отдаёт события по мере получения дельт от GigaChat. Черновики и блоки
+    критика отфильтровываются на лету (FinalResultFilter). Учёт токенов
+    выполняется после окончания потока, в том числе если клиент отключился.
     
     Args:
-        text: Сгенерированный текст поста
-        form_data: Параметры формы
+        data: Параметры генерации
         user: Пользователь Django (опционально, для логирования)
         token: TemporaryAccessToken (опционально, для логирования)
         generation_id: ID генерации (опционально, для логирования)
+        use_cache: Разрешить ответ из кэша (False для явной перегенерации)
+    
+    Yields:
+        tuple: ('delta', текст), ('reset', None) и в конце ('done', итоговый
+               текст) или ('error', сообщение), если поток оборвался
+    """
+    messages, full_prompt = _build_text_messages(data)
+    
+    cache_key = _text_cache_key(data, token, use_cache)
+    cached = _get_cached_text(cache_key, data, full_prompt, user, token, generation_id)
+    if cached:
+        yield ('delta', cached)
+        yield ('done', cached)
+        return
+    
+    # Лимит проверяется до платного запроса
+    limit_ok, reservation = _reserve_tokens(token, full_prompt, TEXT_TOKENS_ESTIMATE)
+    if not limit_ok:
+        yield ('done', TEXT_LIMIT_WARNING)
+        return
+    
+    result_filter = FinalResultFilter()
+    stream_usage = None
+    finished = False
+    try:
+        print("Отправка потокового запроса на генерацию текста...")
+        for attempt in range(2):
+            giga = _client_pool.get('text')
+            _rate_governor.acquire()
+            try:
+                for chunk in giga.stream(messages):
+                    # Расход токенов приходит в последнем фрагменте потока
+                    stream_usage = usage_from_response(chunk) or stream_usage
+                    for event in result_filter.feed(chunk.content):
+                        yield event
+                _rate_governor.report()
+                break
+            except Exception as e:
+                if is_rate_limit_error(e):
+                    _rate_governor.report(throttled=True, retry_after=retry_after_from_error(e))
+                # Пересоздаём клиента при ошибке авторизации, пока ничего не получено
+                if attempt == 0 and not result_filter.raw_text and is_auth_error(e):
+                    _client_pool.invalidate('text', giga)
+                    continue
+                raise
+        for event in result_filter.finish():
+            yield event
+        finished = True
+    except GeneratorExit:
+        print("Клиент отключился во время потоковой генерации")
+        raise
+    except Exception as e:
+        print(f"Ошибка при потоковой генерации текста: {e}")
+        # Оборванный пост не выдаётся за готовый и не попадает в кэш ответов
+        yield ('error', _text_error_message(e))
+    finally:
+        # Учитываем токены и при обрыве потока: ответ уже частично оплачен
+        raw_text = result_filter.raw_text
+        if raw_text:
+            limit_ok = _finalize_text_usage(data, full_prompt, raw_text, user, token, generation_id,
+                                            stream_usage, reservation)
+        else:
+            _release_tokens(token, reservation)
+    
+    if finished:
+        print("Потоковая генерация текста завершена")
+        result = result_filter.result() if limit_ok else TEXT_LIMIT_WARNING
+        _store_cached_text(cache_key, result)
+        yield ('done', result)
+
+IMAGE_PROMPT_SYSTEM = (
+    "Ты — креативный визуализатор. "
+    "Проанализируй следующий текст поста для соцсетей и выдели ключевые визуальные образы, которые должны быть отражены на иллюстрации. "
+    "Сформулируй короткий, ёмкий промпт для генерации изображения в стиле соцсетей. "
+    "Учитывай платформу, аудиторию, стиль и цель поста."
+)
+
+IMAGE_PROMPT_DRAFT_SYSTEM = (
+    "Ты — креативный визуализатор. "
+    "Текст поста для соцсетей ещё пишется: по его теме и параметрам выдели ключевые визуальные образы для иллюстрации. "
+    "Сформулируй короткий, ёмкий промпт для генерации изображения в стиле соцсетей. "
+    "Учитывай платформу, аудиторию, стиль и цель поста."
+)
+
+
+def _image_prompt_context(form_data):
+    """Строки с параметрами формы для промпта изображения"""
+    platform = form_data.get('platform', '')
+    audience = ', '.join(form_data.get('audience', [])) if form_data.get('audience') else ''
+    style = ', '.join(form_data.get('delivery_style', [])) if form_data.get('delivery_style') else ''
+    purpose = ', '.join(form_data.get('content_purpose', [])) if form_data.get('content_purpose') else ''
+    return (
+        f"Платформа: {platform}\n"
+        f"Аудитория: {audience}\n"
+        f"Стиль: {style}\n"
+        f"Цель: {purpose}"
+    )
+
+
+def _request_image_prompt(sys_prompt, user_prompt, form_data, operation_type,
+                          user=None, token=None, generation_id=None):
+    """
+    Запрашивает у GigaChat промпт изображения, списывает и логирует токены
     
     Returns:
-        str: Промпт для генерации изображения
+        str: Промпт или None (ошибка или исчерпан лимит)
     """
+    full_prompt = f"{sys_prompt}\n\n{user_prompt}"
+    limit_ok, reservation = _reserve_tokens(token, full_prompt, IMAGE_PROMPT_TOKENS_ESTIMATE)
+    if not limit_ok:
+        return None
     try:
-        giga = _init_client()
-        # Системный промпт для визуального генератора
-        sys_prompt = (
-            "Ты — креативный визуализатор. "
-            "Проанализируй следующий текст поста для соцсетей и выдели ключевые визуальные образы, которые должны быть отражены на иллюстрации. "
-            "Сформулируй короткий, ёмкий промпт для генерации изображения в стиле соцсетей. "
-            "Учитывай платформу, аудиторию, стиль и цель поста."
-        )
-        # Собираем параметры для контекста
-        platform = form_data.get('platform', '')
-        audience = ', '.join(form_data.get('audience', [])) if form_data.get('audience') else ''
-        style = ', '.join(form_data.get('delivery_style', [])) if form_data.get('delivery_style') else ''
-        purpose = ', '.join(form_data.get('content_purpose', [])) if form_data.get('content_purpose') else ''
-        # Формируем полный промпт
-        user_prompt = (
-            f"Текст поста: {text}\n"
-            f"Платформа: {platform}\n"
-            f"Аудитория: {audience}\n"
-            f"Стиль: {style}\n"
-            f"Цель: {purpose}"
-        )
-        full_prompt = f"{sys_prompt}\n\n{user_prompt}"
-        
         messages = [
             SystemMessage(content=sys_prompt),
             HumanMessage(content=user_prompt)
         ]
-        resp = giga.invoke(messages)
+        try:
+            resp = _call_gigachat('text', lambda giga: giga.invoke(messages))
+        except Exception:
+            _release_tokens(token, reservation)
+            raise
         result = resp.content.strip()
         
         # Подсчёт использованных токенов
-        tokens_used = estimate_tokens(full_prompt) + estimate_tokens(resp.content)
+        usage = measure_usage(full_prompt, resp.content, resp)
         
         # Учёт токенов в TemporaryAccessToken (если передан)
-        if token:
-            try:
-                if not token.consume_gigachat_tokens(tokens_used):
-                    # Лимит исчерпан
-                    return None
-            except Exception as e:
-                print(f"Ошибка при учёте токенов GigaChat: {e}")
+        if not _settle_tokens(token, reservation, usage.total_tokens):
+            # Лимит исчерпан
+            return None
         
         # Логирование использования токенов
         log_token_usage(
-            operation_type='IMAGE_PROMPT',
+            operation_type=operation_type,
             prompt_text=full_prompt,
             response_text=resp.content,
             generation_id=generation_id,
             user=user,
             token=token,
             topic=form_data.get('topic'),
-            platform=platform
+            platform=form_data.get('platform', ''),
+            usage=usage
         )
         
         return result
@@ -664,6 +829,53 @@ def generate_image_prompt_from_text(text, form_data, user=None, token=None, gene
         print(f"Ошибка при генерации промпта для изображения: {e}")
         return None
 
+
+def generate_image_prompt_from_text(text, form_data, user=None, token=None, generation_id=None, draft=None):
+    """
+    Генерирует промпт для генератора изображения на основе сгенерированного текста поста и параметров формы.
+    Возвращает строку-промпт для генерации иллюстрации.
+    
+    Args:
+        text: Сгенерированный текст поста
+        form_data: Параметры формы
+        user: Пользователь Django (опционально, для логирования)
+        token: TemporaryAccessToken (опционально, для логирования)
+        generation_id: ID генерации (опционально, для логирования)
+        draft: Черновик промпта по теме (опционально, уточняется по тексту)
+    
+    Returns:
+        str: Промпт для генерации изображения
+    """
+    user_prompt = f"Текст поста: {text}\n"
+    if draft:
+        user_prompt += f"Черновик промпта (уточни по тексту): {draft}\n"
+    user_prompt += _image_prompt_context(form_data)
+    return _request_image_prompt(
+        IMAGE_PROMPT_SYSTEM, user_prompt, form_data, 'IMAGE_PROMPT',
+        user=user, token=token, generation_id=generation_id
+    )
+
+
+def generate_image_prompt_draft(form_data, user=None, token=None, generation_id=None):
+    """
+    Генерирует черновик промпта изображения по теме и параметрам формы,
+    не дожидаясь текста поста (запускается параллельно с генерацией текста).
+    
+    Args:
+        form_data: Параметры формы
+        user: Пользователь Django (опционально, для логирования)
+        token: TemporaryAccessToken (опционально, для логирования)
+        generation_id: ID генерации (опционально, для логирования)
+    
+    Returns:
+        str: Черновик промпта или None
+    """
+    user_prompt = f"Тема поста: {form_data.get('topic', '')}\n" + _image_prompt_context(form_data)
+    return _request_image_prompt(
+        IMAGE_PROMPT_DRAFT_SYSTEM, user_prompt, form_data, 'IMAGE_PROMPT_DRAFT',
+        user=user, token=token, generation_id=generation_id
+    )
+
 # Модифицированная функция генерации изображения
 
 def generate_image_gigachat(image_prompt, user=None, token=None, generation_id=None):
@@ -677,17 +889,15 @@ def generate_image_gigachat(image_prompt, user=None, token=None, generation_id=N
         generation_id: ID генерации (опционально, для логирования)
     
     Returns:
-        str: Base64 изображение или None
+        bytes или str (base64 / data:image) изображения либо None;
+        сохраняется через image_store.persist_image
     """
+    system_message = "Ты — талантливый художник, специализирующийся на создании иллюстраций для социальных сетей"
+    full_prompt = f"{system_message}\n\n{image_prompt}"
+    limit_ok, reservation = _reserve_tokens(token, full_prompt, IMAGE_TOKENS_ESTIMATE)
+    if not limit_ok:
+        return None
     try:
-        print("Инициализация клиента GigaChat для генерации изображения...")
-        giga = _init_direct_client()
-        print("Клиент для изображений успешно инициализирован")
-        time.sleep(1)
-        
-        system_message = "Ты — талантливый художник, специализирующийся на создании иллюстраций для социальных сетей"
-        full_prompt = f"{system_message}\n\n{image_prompt}"
-        
         payload = Chat(
             messages=[
                 Messages(role=MessagesRole.SYSTEM, content=system_message),
@@ -699,16 +909,14 @@ def generate_image_gigachat(image_prompt, user=None, token=None, generation_id=N
         last_error = None
         for attempt in range(3):
             try:
-                response = giga.chat(payload)
+                response = _call_gigachat('image', lambda giga: giga.chat(payload))
                 response_content = response.choices[0].message.content
                 break
             except Exception as chat_err:
                 last_error = chat_err
-                err_str = str(chat_err)
-                if ("429" in err_str or "Too Many Requests" in err_str) and attempt < 2:
-                    wait_sec = 15 * (attempt + 1)
-                    print(f"GigaChat 429 Too Many Requests, повтор через {wait_sec} с (попытка {attempt + 1}/3)")
-                    time.sleep(wait_sec)
+                if is_rate_limit_error(chat_err) and attempt < 2:
+                    # Регулятор уже снизил скорость и выдержит Retry-After перед повтором
+                    print(f"GigaChat 429 Too Many Requests, повтор (попытка {attempt + 1}/3)")
                 else:
                     raise
         else:
@@ -721,17 +929,16 @@ def generate_image_gigachat(image_prompt, user=None, token=None, generation_id=N
             print("Получено готовое base64 изображение от GigaChat")
             result = response_content.strip()
             
-            # Подсчёт использованных токенов (для изображений используем оценку на основе промпта)
-            tokens_used = estimate_tokens(full_prompt) + 1000  # Примерная оценка для изображения
+            # Подсчёт использованных токенов (usage ответа, иначе оценка с добавкой за изображение)
+            usage = measure_usage(full_prompt, response_content, response,
+                                  extra_completion_tokens=IMAGE_TOKENS_ESTIMATE)
             
             # Учёт токенов в TemporaryAccessToken (если передан)
-            if token:
-                try:
-                    if not token.consume_gigachat_tokens(tokens_used):
-                        # Лимит исчерпан
-                        return None
-                except Exception as e:
-                    print(f"Ошибка при учёте токенов GigaChat: {e}")
+            settled = _settle_tokens(token, reservation, usage.total_tokens)
+            reservation = None
+            if not settled:
+                # Лимит исчерпан
+                return None
             
             # Логирование использования токенов
             log_token_usage(
@@ -740,36 +947,38 @@ def generate_image_gigachat(image_prompt, user=None, token=None, generation_id=N
                 response_text=response_content[:500] if len(response_content) > 500 else response_content,  # Ограничиваем для логирования
                 generation_id=generation_id,
                 user=user,
-                token=token
+                token=token,
+                usage=usage
             )
             
             return result
         
         file_id = extract_image_id(response_content)
         if file_id:
-            image_data = download_image(giga, file_id)
+            image_data = _call_gigachat('image', lambda giga: download_image(giga, file_id))
             
-            # Подсчёт использованных токенов (для изображений используем оценку на основе промпта)
-            tokens_used = estimate_tokens(full_prompt) + 1000  # Примерная оценка для изображения
+            # Подсчёт использованных токенов (usage ответа, иначе оценка с добавкой за изображение)
+            usage = measure_usage(full_prompt, response_content, response,
+                                  extra_completion_tokens=IMAGE_TOKENS_ESTIMATE)
             
             # Учёт токенов в TemporaryAccessToken (если передан)
-            if token and image_data:
-                try:
-                    if not token.consume_gigachat_tokens(tokens_used):
-                        # Лимит исчерпан
-                        return None
-                except Exception as e:
-                    print(f"Ошибка при учёте токенов GigaChat: {e}")
+            if image_data:
+                settled = _settle_tokens(token, reservation, usage.total_tokens)
+                reservation = None
+                if not settled:
+                    # Лимит исчерпан
+                    return None
             
             # Логирование использования токенов
             if image_data:
                 log_token_usage(
                     operation_type='IMAGE_GENERATION',
                     prompt_text=full_prompt,
-                    response_text=f"Image generated (size: {len(image_data)} chars)" if isinstance(image_data, str) else "Image generated",
+                    response_text=f"Image generated (size: {len(image_data)})",
                     generation_id=generation_id,
                     user=user,
-                    token=token
+                    token=token,
+                    usage=usage
                 )
             
             return image_data
@@ -786,6 +995,9 @@ def generate_image_gigachat(image_prompt, user=None, token=None, generation_id=N
         elif "403" in str(e) or "Forbidden" in str(e):
             print("Доступ запрещен к GigaChat")
         return None
+    finally:
+        # Изображение не получено — резерв не нужен
+        _release_tokens(token, reservation)
 
 def extract_image_id(response_content):
     """Извлекает ID изображения из HTML-ответа GigaChat"""
@@ -853,7 +1065,13 @@ def extract_image_id(response_content):
         return None
 
 def download_image(giga_client, file_id):
-    """Скачивает изображение по ID и возвращает base64 данные"""
+    """
+    Скачивает изображение по ID
+
+    Returns:
+        bytes, base64 строка (как её вернул SDK) или data:image строка;
+        None при ошибке. Сохранение — generator/image_store.py
+    """
     try:
         # Если пришла уже готовая строка data:image — вернуть сразу
         if isinstance(file_id, str) and file_id.startswith("data:image"):
@@ -863,12 +1081,11 @@ def download_image(giga_client, file_id):
         # Если это ссылка http/https — скачать напрямую без авторизации
         if isinstance(file_id, str) and file_id.startswith("http"):
             print("file_id является полной ссылкой — скачиваем через requests")
-            import requests, base64
+            import requests
             try:
                 resp = requests.get(file_id, timeout=20, verify=False)
                 if resp.status_code == 200:
-                    image_base64 = base64.b64encode(resp.content).decode('utf-8')
-                    return f"data:image/jpeg;base64,{image_base64}"
+                    return resp.content
                 else:
                     print(f"Не удалось скачать изображение по ссылке, код: {resp.status_code}")
             except Exception as ex:
@@ -888,15 +1105,14 @@ def download_image(giga_client, file_id):
                         print("Изображение получено от GigaChat (str data:image)")
                         return content
                     if len(content) > 1000:
+                        # base64 без префикса: декодируется при сохранении (image_store)
                         print(f"Изображение получено от GigaChat (str), размер: {len(content)}")
-                        return f"data:image/jpeg;base64,{content}"
+                        return content
                     print(f"Строка content слишком короткая: {len(content)}")
                     return None
                 if isinstance(content, bytes):
-                    import base64
-                    image_base64 = base64.b64encode(content).decode('utf-8')
-                    print(f"Изображение получено от GigaChat (bytes), размер base64: {len(image_base64)}")
-                    return f"data:image/jpeg;base64,{image_base64}"
+                    print(f"Изображение получено от GigaChat (bytes), размер: {len(content)}")
+                    return content
                 # Возможно content — dict/list (ответ API в другом формате)
                 if hasattr(content, '__iter__') and not isinstance(content, (str, bytes)):
                     print(f"content итерируемый, не str/bytes: {type(content)}")
@@ -945,11 +1161,8 @@ def download_image(giga_client, file_id):
                 img_response = requests.get(image_url, headers=headers, verify=False)
                 
                 if img_response.status_code == 200:
-                    import base64
-                    image_base64 = base64.b64encode(img_response.content).decode('utf-8')
-                    result = f"data:image/jpeg;base64,{image_base64}"
-                    print(f"Альтернативный способ успешен, длина: {len(image_base64)}")
-                    return result
+                    print(f"Альтернативный способ успешен, размер: {len(img_response.content)}")
+                    return img_response.content
                 else:
                     print(f"Ошибка при скачивании через requests: {img_response.status_code}")
                     return None
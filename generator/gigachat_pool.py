@@ -0,0 +1,200 @@
+"""
+Пул клиентов GigaChat на уровне воркера.
+
+Каждый вызов _init_client()/_init_direct_client() создаёт новый httpx-клиент
+и заново проходит OAuth-авторизацию. Реестр хранит по одному
+аутентифицированному клиенту каждого вида на процесс, заранее обновляет
+access token до истечения срока и пересоздаёт клиента после ошибок
+авторизации.
+"""
+
+import os
+import threading
+import time
+
+
+# Обновляем токен заранее, если до истечения осталось меньше N секунд
+TOKEN_REFRESH_MARGIN = int(os.getenv("GIGACHAT_TOKEN_REFRESH_MARGIN", "120"))
+
+
+def _sdk_client(client):
+    """
+    Возвращает объект SDK gigachat, который хранит токен и пул соединений.
+
+    Для langchain-обёртки это её кэшированный атрибут _client,
+    для прямого клиента — он сам.
+    """
+    return getattr(client, '_client', None) if hasattr(client, 'invoke') else client
+
+
+def is_auth_error(error):
+    """Проверяет, что исключение вызвано ошибкой авторизации (401)."""
+    try:
+        from gigachat.exceptions import AuthenticationError
+        if isinstance(error, AuthenticationError):
+            return True
+    except ImportError:
+        pass
+    message = str(error)
+    return "401" in message or "Unauthorized" in message
+
+
+class _PoolEntry:
+    """Клиент в реестре вместе с собственной блокировкой."""
+
+    def __init__(self, client):
+        self.client = client
+        self.lock = threading.Lock()
+        self.created_at = time.time()
+        self.uses = 0
+
+
+class GigaChatClientPool:
+    """
+    Потокобезопасный реестр клиентов GigaChat (по одному на вид клиента).
+
+    Args:
+        factories: Словарь {вид клиента: функция без аргументов, создающая клиента}
+        refresh_margin: За сколько секунд до истечения обновлять access token
+    """
+
+    def __init__(self, factories, refresh_margin=TOKEN_REFRESH_MARGIN):
+        self._factories = dict(factories)
+        self._refresh_margin = refresh_margin
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'created': 0,
+            'reused': 0,
+            'handshakes_saved': 0,
+            'token_refreshes': 0,
+            'rebuilds': 0,
+        }
+
+    def _bump(self, key, value=1):
+        with self._lock:
+            self._stats[key] += value
+
+    def _get_entry(self, kind):
+        entry = self._entries.get(kind)
+        if entry is not None:
+            return entry, False
+        with self._lock:
+            entry = self._entries.get(kind)
+            if entry is None:
+                entry = _PoolEntry(self._factories[kind]())
+                self._entries[kind] = entry
+                self._stats['created'] += 1
+                return entry, True
+        return entry, False
+
+    def get(self, kind):
+        """
+        Возвращает клиента нужного вида, при необходимости создавая его.
+
+        Если access token скоро истечёт, он обновляется заранее, чтобы
+        запрос генерации не платил за авторизацию.
+
+        Args:
+            kind: Вид клиента ('text' или 'image')
+
+        Returns:
+            Готовый к работе клиент GigaChat
+        """
+        entry, created = self._get_entry(kind)
+        if not created:
+            entry.uses += 1
+            self._bump('reused')
+            if self._has_valid_token(entry.client):
+                self._bump('handshakes_saved')
+        self._refresh_token_if_needed(entry)
+        return entry.client
+
+    def _has_valid_token(self, client):
+        sdk = _sdk_client(client)
+        token = getattr(sdk, '_access_token', None)
+        if token is None:
+            return False
+        return token.expires_at / 1000 - time.time() > 0
+
+    def _refresh_token_if_needed(self, entry):
+        sdk = _sdk_client(entry.client)
+        token = getattr(sdk, '_access_token', None)
+        if sdk is None or token is None:
+            # Токен ещё не получали — SDK авторизуется при первом запросе
+            return
+        if token.expires_at / 1000 - time.time() > self._refresh_margin:
+            return
+        with entry.lock:
+            token = getattr(sdk, '_access_token', None)
+            if token is not None and token.expires_at / 1000 - time.time() > self._refresh_margin:
+                return
+            try:
+                sdk._reset_token()
+                sdk.get_token()
+                self._bump('token_refreshes')
+                print("GigaChat: access token обновлён заранее")
+            except Exception as e:
+                # Не мешаем запросу: SDK повторит авторизацию сам
+                print(f"GigaChat: не удалось заранее обновить токен: {e}")
+
+    def invalidate(self, kind, client=None):
+        """
+        Удаляет клиента из реестра и закрывает его соединения.
+
+        Args:
+            kind: Вид клиента
+            client: Если передан, клиент удаляется только если он всё ещё текущий
+                    (защита от повторного пересоздания параллельными потоками)
+        """
+        with self._lock:
+            entry = self._entries.get(kind)
+            if entry is None or (client is not None and entry.client is not client):
+                return
+            del self._entries[kind]
+            self._stats['rebuilds'] += 1
+        self._close(entry.client)
+
+    def call(self, kind, func):
+        """
+        Выполняет func(client) с клиентом из реестра.
+
+        При ошибке авторизации клиент пересоздаётся и вызов повторяется один раз.
+        """
+        client = self.get(kind)
+        try:
+            return func(client)
+        except Exception as e:
+            if not is_auth_error(e):
+                raise
+            print(f"GigaChat: ошибка авторизации, пересоздаём клиента '{kind}'")
+            self.invalidate(kind, client)
+            return func(self.get(kind))
+
+    def _close(self, client):
+        sdk = _sdk_client(client)
+        try:
+            if sdk is not None:
+                sdk.close()
+        except Exception as e:
+            print(f"GigaChat: ошибка при закрытии клиента: {e}")
+
+    def close_all(self):
+        """Закрывает все клиенты (например, при остановке воркера)."""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._close(entry.client)
+
+    def get_stats(self):
+        """
+        Возвращает счётчики реестра.
+
+        Returns:
+            dict: created, reused, handshakes_saved, token_refreshes, rebuilds, active
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['active'] = len(self._entries)
+        return stats
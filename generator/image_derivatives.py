@@ -0,0 +1,181 @@
+"""
+Уменьшенные копии изображений генераций (thumbnail / medium, JPEG и WebP)
+
+Стена и страница генерации показывали оригиналы 1024×1024 даже в
+карточках высотой 120px. Для каждого изображения в MEDIA_ROOT создаются
+копии шириной DERIVATIVE_WIDTHS в JPEG и WebP:
+
+    generated/ab/abcd….jpg → derivatives/generated/ab/abcd…_320.jpg
+                             derivatives/generated/ab/abcd…_320.webp
+
+Копии создаются при сохранении изображения (image_store.persist_image),
+для старых изображений — командой generate_image_derivatives. Шаблоны
+только проверяют, есть ли копии на диске, и без них показывают оригинал:
+декодировать полноразмерные изображения во время ответа на запрос
+нельзя. Внешние URL (OpenAI) не обрабатываются. Без Pillow модуль ничего
+не делает, и шаблоны показывают оригиналы.
+"""
+
+import logging
+import os
+import tempfile
+from urllib.parse import urlsplit, urlunsplit
+
+from django.conf import settings
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - Pillow есть в requirements.txt
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Ширина копий (px): карточка стены и страница генерации
+DERIVATIVE_WIDTHS = (320, 640)
+
+DERIVATIVE_DIR = 'derivatives'
+
+# Формат копии → (формат Pillow, параметры сохранения)
+FORMATS = {
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+}
+
+
+def is_enabled():
+    """Включено ли создание копий (настройка IMAGE_DERIVATIVES_ENABLED и наличие Pillow)."""
+    return Image is not None and getattr(settings, 'IMAGE_DERIVATIVES_ENABLED', True)
+
+
+def _media_root():
+    return os.path.realpath(str(settings.MEDIA_ROOT))
+
+
+def media_path_from_url(url):
+    """
+    Путь файла внутри MEDIA_ROOT по URL изображения
+
+    Args:
+        url: Абсолютный или относительный URL (например, https://site/media/generated/…)
+
+    Returns:
+        str: Относительный путь или None для внешних и некорректных URL
+    """
+    if not url:
+        return None
+    path = urlsplit(url).path
+    media_url = settings.MEDIA_URL
+    if not path.startswith(media_url):
+        return None
+    rel_path = os.path.normpath(path[len(media_url):])
+    if rel_path.startswith(('..', '/')) or rel_path.startswith(DERIVATIVE_DIR + os.sep):
+        return None
+    return rel_path
+
+
+def derivative_path(rel_path, width, extension):
+    """Путь копии изображения внутри MEDIA_ROOT."""
+    base, _ = os.path.splitext(rel_path)
+    return os.path.join(DERIVATIVE_DIR, f"{base}_{width}.{extension}")
+
+
+def _save_atomic(image, full_path, extension):
+    pil_format, options = FORMATS[extension]
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(full_path), suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            image.save(tmp, pil_format, **options)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, full_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def ensure_derivatives(rel_path, force=False):
+    """
+    Создаёт недостающие копии изображения
+
+    Оригинал декодируется один раз и только если какой-то копии нет.
+
+    Args:
+        rel_path: Путь оригинала внутри MEDIA_ROOT
+        force: Пересоздать существующие копии
+
+    Returns:
+        int: Число созданных файлов
+    """
+    if not is_enabled() or not rel_path:
+        return 0
+    media_root = _media_root()
+    source = os.path.join(media_root, rel_path)
+    missing = [
+        (width, extension, os.path.join(media_root, derivative_path(rel_path, width, extension)))
+        for width in DERIVATIVE_WIDTHS
+        for extension in FORMATS
+    ]
+    if not force:
+        missing = [item for item in missing if not os.path.exists(item[2])]
+    if not missing or not os.path.isfile(source):
+        return 0
+
+    created = 0
+    with Image.open(source) as original:
+        original.draft('RGB', (max(DERIVATIVE_WIDTHS), max(DERIVATIVE_WIDTHS)))
+        original = original.convert('RGB')
+        for width in sorted({w for w, _, _ in missing}, reverse=True):
+            resized = original.copy()
+            # Копия не больше оригинала: маленькие изображения только перекодируются
+            resized.thumbnail((width, original.height), Image.LANCZOS)
+            for w, extension, full_path in missing:
+                if w == width:
+                    _save_atomic(resized, full_path, extension)
+                    created += 1
+    return created
+
+
+def has_derivatives(url):
+    """
+    Есть ли на диске все копии изображения (без их создания)
+
+    Returns:
+        bool: False для внешних URL и изображений без копий
+    """
+    rel_path = media_path_from_url(url)
+    if rel_path is None or not is_enabled():
+        return False
+    media_root = _media_root()
+    return all(
+        os.path.exists(os.path.join(media_root, derivative_path(rel_path, width, extension)))
+        for width in DERIVATIVE_WIDTHS
+        for extension in FORMATS
+    )
+
+
+def derivative_url(url, width, extension):
+    """URL копии с той же схемой и хостом, что и у оригинала."""
+    rel_path = media_path_from_url(url)
+    parts = urlsplit(url)
+    path = settings.MEDIA_URL + derivative_path(rel_path, width, extension).replace(os.sep, '/')
+    return urlunsplit((parts.scheme, parts.netloc, path, '', ''))
+
+
+def srcset(url, extension='jpg'):
+    """
+    Значение атрибута srcset для изображения
+
+    Args:
+        url: URL оригинала
+        extension: 'jpg' или 'webp'
+
+    Returns:
+        str: "…_320.webp 320w, …_640.webp 640w" или '' для внешних URL и
+        изображений без копий
+    """
+    if extension not in FORMATS or not has_derivatives(url):
+        return ''
+    return ', '.join(f"{derivative_url(url, width, extension)} {width}w" for width in DERIVATIVE_WIDTHS)
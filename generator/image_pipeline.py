@@ -0,0 +1,204 @@
+"""
+Конвейерная генерация текста и изображения GigaChat
+
+Последовательный путь — текст, затем промпт изображения по тексту, затем
+изображение — складывает задержки всех трёх запросов. Когда пользователь
+сразу просит изображение, черновик промпта можно получить по теме и
+критериям формы, не дожидаясь текста:
+
+- draft:  черновик промпта и изображение по нему выполняются в фоновом
+          потоке параллельно с генерацией текста (минимальная задержка);
+- refine: черновик готовится параллельно с текстом, затем уточняется по
+          готовому тексту, и только после этого запускается изображение.
+
+Если текст не получен (ошибка GigaChat или исчерпан лимит — ответ
+WARNING), изображение не генерируется, а уже готовое отбрасывается.
+То же при исключении или закрытии SSE-потока клиентом (ImagePipeline.cancel):
+уже начатый запрос GigaChat не прерывается, но следующие платные этапы
+не запускаются.
+
+Конвейер включается настройкой GENERATION_IMAGE_PIPELINE (по умолчанию
+off — последовательный путь).
+
+Расход токенов каждого этапа логируется отдельно (IMAGE_PROMPT_DRAFT,
+IMAGE_PROMPT, IMAGE_GENERATION) и привязан к одной записи Generation.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_OFF = 'off'
+PIPELINE_DRAFT = 'draft'
+PIPELINE_REFINE = 'refine'
+
+
+def pipeline_mode():
+    """Режим конвейера из настройки GENERATION_IMAGE_PIPELINE."""
+    mode = getattr(settings, 'GENERATION_IMAGE_PIPELINE', PIPELINE_OFF)
+    return mode if mode in (PIPELINE_DRAFT, PIPELINE_REFINE) else PIPELINE_OFF
+
+
+def text_failed(result):
+    """Текст не получен: пустой ответ или предупреждение WARNING (ошибка, лимит)."""
+    return not result or str(result).startswith('WARNING')
+
+
+def _in_thread(func):
+    """Выполняет func в фоновом потоке и закрывает его соединение с БД."""
+    try:
+        return func()
+    finally:
+        close_old_connections()
+
+
+class ImagePipeline:
+    """
+    Подготовка изображения параллельно с генерацией текста
+
+    Использование: start() до генерации текста, finish(текст) после неё;
+    cancel(), если текст не будет получен (ошибка, клиент закрыл поток).
+
+    Args:
+        form_data: Очищенные данные GenerationForm
+        generation: Запись Generation, к которой привязывается расход токенов
+        user: Пользователь Django (опционально)
+        token: TemporaryAccessToken (опционально)
+        mode: PIPELINE_DRAFT или PIPELINE_REFINE
+    """
+
+    def __init__(self, form_data, generation, user=None, token=None, mode=PIPELINE_DRAFT):
+        self.form_data = form_data
+        self.generation_id = generation.id
+        self.user = user
+        self.token = token
+        self.mode = mode
+        self.timings = {}
+        self._executor = None
+        self._background = None
+        self._started = None
+        self._cancelled = threading.Event()
+        self._finished = False
+
+    def _timed(self, stage, func):
+        stage_started = time.monotonic()
+        try:
+            return func()
+        finally:
+            self.timings[stage] = round(time.monotonic() - stage_started, 3)
+
+    def _draft(self):
+        from .gigachat_api import generate_image_prompt_draft
+
+        return self._timed('image_prompt_draft', lambda: generate_image_prompt_draft(
+            self.form_data, user=self.user, token=self.token, generation_id=self.generation_id
+        ))
+
+    def _image(self, prompt):
+        from .gigachat_api import generate_image_gigachat
+
+        return self._timed('image', lambda: generate_image_gigachat(
+            prompt or self.form_data.get('topic', ''),
+            user=self.user, token=self.token, generation_id=self.generation_id
+        ))
+
+    def _draft_then_image(self):
+        if self._cancelled.is_set():
+            return None, None
+        draft = self._draft()
+        if self._cancelled.is_set():
+            # Текст уже не получен — изображение не нужно
+            return draft, None
+        return draft, self._image(draft)
+
+    def start(self):
+        """Запускает черновик промпта (и в режиме draft — изображение) в фоне."""
+        self._started = time.monotonic()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-pipeline')
+        task = self._draft_then_image if self.mode == PIPELINE_DRAFT else self._draft
+        self._background = self._executor.submit(_in_thread, task)
+        return self
+
+    def cancel(self):
+        """
+        Отменяет фоновые этапы, если конвейер ещё не завершён
+
+        Ещё не начатый черновик не запускается, изображение после уже
+        начатого черновика — тоже. После finish() ничего не делает.
+        """
+        if self._executor is None or self._finished:
+            return
+        self._finished = True
+        self._cancelled.set()
+        self._background.cancel()
+        self._executor.shutdown(wait=False)
+        logger.info(f"Конвейер текст+изображение: изображение для генерации {self.generation_id} отменено")
+
+    def finish(self, result):
+        """
+        Дожидается изображения; в режиме refine уточняет промпт по тексту
+
+        Args:
+            result: Сгенерированный текст поста
+
+        Returns:
+            tuple: (промпт изображения, данные изображения); без текста — (None, None)
+        """
+        from .gigachat_api import generate_image_prompt_from_text
+
+        if text_failed(result) or self._finished:
+            # Фоновый этап не ждём: изображение ещё не начато — не начнётся, готовое отбрасывается
+            self.cancel()
+            return None, None
+
+        self._finished = True
+        try:
+            if self.mode == PIPELINE_DRAFT:
+                image_prompt, image_data = self._background.result()
+            else:
+                image_prompt = self._background.result()
+                refined = self._timed('image_prompt', lambda: generate_image_prompt_from_text(
+                    result, self.form_data, user=self.user, token=self.token,
+                    generation_id=self.generation_id, draft=image_prompt
+                ))
+                image_prompt = refined or image_prompt
+                image_data = self._image(image_prompt)
+        finally:
+            self._executor.shutdown(wait=False)
+        self.timings['total'] = round(time.monotonic() - self._started, 3)
+        logger.info(f"Конвейер текст+изображение ({self.mode}) для генерации {self.generation_id}: {self.timings}")
+        return image_prompt, image_data
+
+
+def run_text_and_image(form_data, generation, user=None, token=None, mode=PIPELINE_DRAFT):
+    """
+    Генерирует текст и изображение с параллельной подготовкой промпта
+
+    Args:
+        form_data: Очищенные данные GenerationForm
+        generation: Запись Generation, к которой привязывается расход токенов
+        user: Пользователь Django (опционально)
+        token: TemporaryAccessToken (опционально)
+        mode: PIPELINE_DRAFT или PIPELINE_REFINE
+
+    Returns:
+        tuple: (текст, промпт изображения, данные изображения, длительности этапов)
+    """
+    from .gigachat_api import generate_text
+
+    pipeline = ImagePipeline(form_data, generation, user=user, token=token, mode=mode).start()
+    try:
+        result = pipeline._timed('text', lambda: generate_text(
+            form_data, user=user, token=token, generation_id=generation.id
+        ))
+    except BaseException:
+        pipeline.cancel()
+        raise
+    image_prompt, image_data = pipeline.finish(result)
+    return result, image_prompt, image_data, pipeline.timings
@@ -0,0 +1,218 @@
+"""
+Сохранение сгенерированных изображений в MEDIA_ROOT
+
+Раньше изображение проходило через несколько полных копий в памяти:
+bytes → base64 → строка data:image → split → b64decode → запись в файл.
+Сервис принимает данные в том виде, в котором их вернул провайдер
+(bytes, поток, итератор частей, base64 или data URI), и пишет их в файл
+частями по CHUNK_SIZE без промежуточных копий целого изображения.
+
+Имя файла — SHA-256 содержимого (generated/ab/abcdef….jpg): одинаковые
+изображения хранятся один раз, а повторное сохранение только возвращает
+уже существующий путь. Запись идёт во временный файл в том же каталоге и
+атомарно переименовывается, поэтому частично записанный файл никогда не
+виден по публичному URL. Уменьшенные копии для шаблонов создаёт
+image_derivatives.py.
+"""
+
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from collections import namedtuple
+
+from django.conf import settings
+
+from .image_derivatives import ensure_derivatives
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# Каталог внутри MEDIA_ROOT
+IMAGE_DIR = 'generated'
+
+# Длина имени файла (символов hex SHA-256)
+_NAME_LENGTH = 32
+
+# Кратно 4, чтобы каждую часть base64 можно было декодировать отдельно
+_BASE64_CHUNK = CHUNK_SIZE // 3 * 4
+
+# Переводы строк и пробелы внутри base64 (многие кодировщики переносят строки по 76 символов)
+_BASE64_WHITESPACE = b' \t\r\n\v\f'
+_BASE64_WHITESPACE_RE = re.compile(rb'\s')
+
+_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF8', 'gif'),
+)
+
+StoredImage = namedtuple('StoredImage', ['path', 'size', 'sha256', 'deduplicated'])
+
+
+def _base64_chunks(text, start=0):
+    """
+    Декодирует base64 строку частями, не создавая копию целиком
+
+    Пробельные символы пропускаются; остаток части, не кратный 4 символам,
+    переносится в следующую. Прочие символы вне алфавита base64 — ошибка.
+    """
+    end = len(text)
+    carry = b''
+    while start < end:
+        stop = min(start + _BASE64_CHUNK, end)
+        # UnicodeEncodeError (символ не ASCII) — тоже ValueError
+        part = text[start:stop].encode('ascii')
+        if _BASE64_WHITESPACE_RE.search(part):
+            part = part.translate(None, _BASE64_WHITESPACE)
+        if carry:
+            part = carry + part
+        usable = len(part) if stop == end else len(part) - len(part) % 4
+        carry = part[usable:]
+        if usable < len(part):
+            part = part[:usable]
+        if part:
+            decoded = base64.b64decode(part, validate=True)
+            # Закодированная часть не держится, пока потребитель пишет декодированную
+            part = None
+            yield decoded
+            decoded = None
+        start = stop
+
+
+def iter_image_chunks(data):
+    """
+    Части изображения в байтах
+
+    Args:
+        data: bytes/bytearray/memoryview, файлоподобный объект с read(),
+              итератор bytes, строка data:image;base64 или base64 без префикса
+
+    Returns:
+        Итератор bytes-подобных частей
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        view = memoryview(data)
+        return (view[i:i + CHUNK_SIZE] for i in range(0, len(view), CHUNK_SIZE))
+    if isinstance(data, str):
+        start = 0
+        if data.startswith('data:'):
+            start = data.find(',') + 1
+            if not start or ';base64' not in data[:start]:
+                raise ValueError("Поддерживаются только data URI в base64")
+        return _base64_chunks(data, start)
+    if hasattr(data, 'read'):
+        return iter(lambda: data.read(CHUNK_SIZE), b'')
+    return iter(data)
+
+
+def _extension(head):
+    for signature, extension in _SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return 'jpg'
+
+
+def image_path(sha256, extension):
+    """Путь изображения внутри MEDIA_ROOT по хешу содержимого."""
+    name = sha256[:_NAME_LENGTH]
+    return f"{IMAGE_DIR}/{name[:2]}/{name}.{extension}"
+
+
+def save_image(data):
+    """
+    Сохраняет изображение по хешу содержимого
+
+    Args:
+        data: Данные изображения (см. iter_image_chunks)
+
+    Returns:
+        StoredImage или None, если данные пустые
+
+    Raises:
+        ValueError: Некорректный base64 или неподдерживаемый формат данных
+    """
+    media_root = str(settings.MEDIA_ROOT)
+    tmp_dir = os.path.join(media_root, IMAGE_DIR)
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    hasher = hashlib.sha256()
+    head = b''
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            for chunk in iter_image_chunks(data):
+                if not chunk:
+                    continue
+                if len(head) < 16:
+                    head += bytes(chunk[:16 - len(head)])
+                hasher.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+        if not size:
+            os.remove(tmp_path)
+            return None
+
+        sha256 = hasher.hexdigest()
+        path = image_path(sha256, _extension(head))
+        full_path = os.path.join(media_root, path)
+        if os.path.exists(full_path):
+            os.remove(tmp_path)
+            return StoredImage(path, size, sha256, True)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, full_path)
+        return StoredImage(path, size, sha256, False)
+    except binascii.Error as e:
+        _discard(tmp_path)
+        raise ValueError(f"Некорректные base64 данные изображения: {e}") from e
+    except BaseException:
+        _discard(tmp_path)
+        raise
+
+
+def _discard(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def persist_image(data, base_url=''):
+    """
+    Сохраняет изображение провайдера и возвращает его URL
+
+    Ссылки http(s) возвращаются как есть (изображение уже хранится
+    у провайдера).
+
+    Args:
+        data: Данные изображения или URL
+        base_url: Абсолютный URL сайта (например, request.build_absolute_uri('/'))
+
+    Returns:
+        str: URL изображения или None, если данных нет
+    """
+    if not data:
+        return None
+    if isinstance(data, str) and data.startswith(('http://', 'https://')):
+        return data
+    stored = save_image(data)
+    if stored is None:
+        return None
+    logger.info(
+        f"Изображение {'уже сохранено' if stored.deduplicated else 'сохранено'}: "
+        f"{stored.path} ({stored.size} байт)"
+    )
+    try:
+        ensure_derivatives(stored.path)
+    except Exception as e:
+        # Без копий шаблоны покажут оригинал, копии можно создать позже
+        logger.warning(f"Не удалось создать копии изображения {stored.path}: {e}")
+    return base_url.rstrip('/') + settings.MEDIA_URL + stored.path
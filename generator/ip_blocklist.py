@@ -0,0 +1,329 @@
+"""
+Блоклист IP адресов и подсетей в памяти процесса
+
+BlockList хранил только отдельные IP (ключи blocked_ip:<ip> в кэше), и
+каждый запрос делал обращение к Redis, чтобы их проверить. Теперь записи
+(адреса, подсети CIDR, списки подсетей по ASN) хранятся в BlockedNetwork,
+а каждый воркер держит их в памяти в дереве префиксов (PrefixTree):
+проверка — несколько обращений к dict, без сети.
+
+Версия блоклиста хранится в кэше (ключ ip_blocklist:version) и
+увеличивается при каждом изменении (bump_version). Фоновый поток воркера
+раз в IP_BLOCKLIST_REFRESH_INTERVAL секунд сравнивает версию и при смене
+перечитывает таблицу. Если версии в кэше нет (кэш очищен, DummyCache),
+версией служит отпечаток таблицы: число записей и последнее изменение.
+"""
+
+import ipaddress
+import logging
+import os
+import socket
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'ip_blocklist:version'
+
+_V4_MAPPED_PREFIX = b'\x00' * 10 + b'\xff\xff'
+
+_MISS = object()
+
+
+class BlockEntry(namedtuple('BlockEntry', ['network', 'reason', 'source', 'expires_at'])):
+    """Запись блоклиста; expires_at — unix-время или None (бессрочно)."""
+
+    __slots__ = ()
+
+    def info(self):
+        """Данные блокировки в формате BlockList.get_blocked_info."""
+        expires_at = 'Never'
+        if self.expires_at is not None:
+            expires_at = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(self.expires_at))
+        return {
+            'reason': self.reason,
+            'network': self.network,
+            'source': self.source,
+            'expires_at': expires_at,
+        }
+
+
+def normalize_network(value):
+    """
+    Каноническая запись сети ('10.1.2.3' → '10.1.2.3/32', '10.1.2.0/16' → '10.1.0.0/16')
+
+    Raises:
+        ValueError: Не IP адрес и не сеть
+    """
+    return str(ipaddress.ip_network(value.strip(), strict=False))
+
+
+def _parse_ip(ip):
+    """(версия, целое значение, число бит) или None для некорректного адреса."""
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), 'big'), 32
+    except (OSError, TypeError):
+        pass
+    try:
+        packed = socket.inet_pton(socket.AF_INET6, ip)
+    except (OSError, TypeError):
+        return None
+    if packed[:12] == _V4_MAPPED_PREFIX:
+        # ::ffff:1.2.3.4 проверяется по правилам IPv4
+        return 4, int.from_bytes(packed[12:], 'big'), 32
+    return 6, int.from_bytes(packed, 'big'), 128
+
+
+class PrefixTree:
+    """
+    Поиск самого длинного совпадающего префикса
+
+    Уровни дерева хранятся таблицами по длине префикса: {длина: {префикс: запись}}.
+    Поиск проверяет только длины, которые реально встречаются в блоклисте
+    (обычно несколько), от самой длинной к самой короткой. Разбор адреса
+    дороже самого поиска, поэтому результаты для недавних IP запоминаются
+    (клиенты повторяются); память сбрасывается при любом изменении дерева.
+
+    Args:
+        memo_size: Сколько последних IP помнить (0 — не запоминать)
+    """
+
+    def __init__(self, memo_size=65536):
+        self._tables = {4: {}, 6: {}}
+        self._lengths = {4: (), 6: ()}
+        self._memo = {}
+        self.memo_size = memo_size
+
+    def __len__(self):
+        return sum(len(table) for tables in self._tables.values() for table in tables.values())
+
+    def add(self, network, entry):
+        """
+        Добавляет сеть (заменяет запись для той же сети)
+
+        Args:
+            network: Адрес или сеть CIDR
+            entry: BlockEntry
+        """
+        net = ipaddress.ip_network(network, strict=False)
+        bits = net.max_prefixlen
+        tables = self._tables[net.version]
+        tables.setdefault(net.prefixlen, {})[int(net.network_address) >> (bits - net.prefixlen)] = entry
+        self._lengths[net.version] = tuple(sorted(tables, reverse=True))
+        self._memo = {}
+
+    def remove(self, network):
+        """Удаляет сеть, если она есть."""
+        net = ipaddress.ip_network(network, strict=False)
+        tables = self._tables[net.version]
+        table = tables.get(net.prefixlen)
+        if table is None:
+            return
+        table.pop(int(net.network_address) >> (net.max_prefixlen - net.prefixlen), None)
+        if not table:
+            del tables[net.prefixlen]
+            self._lengths[net.version] = tuple(sorted(tables, reverse=True))
+        self._memo = {}
+
+    def lookup(self, ip, now=None):
+        """
+        Самая специфичная действующая запись, содержащая IP
+
+        Args:
+            ip: IP адрес (строка)
+            now: Текущее unix-время (для проверки expires_at)
+
+        Returns:
+            BlockEntry или None
+        """
+        entry = self._memo.get(ip, _MISS)
+        if entry is None:
+            return None
+        if entry is _MISS or (entry.expires_at is not None and entry.expires_at <= (now or time.time())):
+            entry = self._match(ip, now)
+            if self.memo_size:
+                memo = self._memo
+                if len(memo) >= self.memo_size:
+                    memo.clear()
+                memo[ip] = entry
+        return entry
+
+    def _match(self, ip, now=None):
+        parsed = _parse_ip(ip)
+        if parsed is None:
+            return None
+        version, value, bits = parsed
+        tables = self._tables[version]
+        for length in self._lengths[version]:
+            entry = tables[length].get(value >> (bits - length))
+            if entry is not None:
+                if entry.expires_at is not None and entry.expires_at <= (now or time.time()):
+                    continue
+                return entry
+        return None
+
+
+def bump_version():
+    """Отмечает изменение блоклиста: воркеры перечитают его при следующей проверке."""
+    try:
+        cache.add(VERSION_KEY, 0, None)
+        cache.incr(VERSION_KEY)
+    except Exception as e:
+        # Без версии в кэше воркеры сравнивают отпечаток таблицы
+        logger.debug(f"Блоклист: версия в кэше не обновлена ({e})")
+
+
+def current_version():
+    """Версия блоклиста: из кэша или отпечаток таблицы BlockedNetwork."""
+    try:
+        version = cache.get(VERSION_KEY)
+    except Exception:
+        version = None
+    if version is not None:
+        return ('cache', version)
+    from django.db.models import Count, Max
+    from .models import BlockedNetwork
+    stats = BlockedNetwork.objects.aggregate(count=Count('id'), changed=Max('updated_at'))
+    return ('db', stats['count'], stats['changed'])
+
+
+class IPBlocklist:
+    """
+    Блоклист процесса: дерево префиксов + фоновое обновление по версии
+
+    Args:
+        refresh_interval: Период проверки версии (секунды); 0 — без фонового потока
+    """
+
+    def __init__(self, refresh_interval=None):
+        self.refresh_interval = refresh_interval
+        self._tree = PrefixTree()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._pid = None
+        self.version = None
+        self.loaded_at = None
+        self.reloads = 0
+
+    def _ensure_loaded(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            if self.refresh_interval is None:
+                self.refresh_interval = getattr(settings, 'IP_BLOCKLIST_REFRESH_INTERVAL', 30)
+            # После fork поток родителя не существует — загружаем и запускаем свой
+            self._pid = pid
+            try:
+                self.reload()
+            except Exception as e:
+                logger.warning(f"Блоклист: не удалось загрузить сети ({e})")
+            if self.refresh_interval:
+                self._stopped.clear()
+                threading.Thread(target=self._run, name='ip-blocklist', daemon=True).start()
+
+    def _run(self):
+        while not self._stopped.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Блоклист: ошибка обновления ({e})")
+            finally:
+                close_old_connections()
+
+    def reload(self):
+        """Перечитывает все действующие записи из БД и атомарно подменяет дерево."""
+        from django.db.models import Q
+        from django.utils import timezone
+        from .models import BlockedNetwork
+
+        version = current_version()
+        tree = PrefixTree()
+        rows = BlockedNetwork.objects.filter(
+            Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now())
+        ).values_list('network', 'reason', 'source', 'expires_at')
+        for network, reason, source, expires_at in rows.iterator(chunk_size=5000):
+            try:
+                tree.add(network, BlockEntry(
+                    network, reason, source, expires_at.timestamp() if expires_at else None
+                ))
+            except ValueError:
+                logger.warning(f"Блоклист: некорректная сеть {network!r}")
+        self._tree = tree
+        self.version = version
+        self.loaded_at = time.time()
+        self.reloads += 1
+        logger.info(f"Блоклист загружен: {len(tree)} сетей, версия {version}")
+
+    def refresh(self):
+        """
+        Перечитывает блоклист, если версия изменилась
+
+        Returns:
+            bool: True, если блоклист перечитан
+        """
+        if current_version() == self.version:
+            return False
+        self.reload()
+        return True
+
+    def lookup(self, ip):
+        """
+        Запись блоклиста для IP
+
+        Returns:
+            BlockEntry или None
+        """
+        if not ip:
+            return None
+        self._ensure_loaded()
+        return self._tree.lookup(ip)
+
+    def is_blocked(self, ip):
+        """Заблокирован ли IP (адресом или подсетью)."""
+        return self.lookup(ip) is not None
+
+    def add_local(self, network, reason='', source='manual', expires_at=None):
+        """
+        Добавляет сеть в дерево этого процесса сразу, не дожидаясь обновления
+
+        Запись в БД и bump_version делает вызывающий код (BlockList.block_network).
+        """
+        self._ensure_loaded()
+        with self._lock:
+            self._tree.add(network, BlockEntry(network, reason, source, expires_at))
+
+    def remove_local(self, network):
+        """Удаляет сеть из дерева этого процесса."""
+        self._ensure_loaded()
+        with self._lock:
+            self._tree.remove(network)
+
+    def stop(self):
+        """Останавливает фоновое обновление."""
+        self._stopped.set()
+        self._pid = None
+
+    def get_stats(self):
+        """
+        Состояние блоклиста процесса
+
+        Returns:
+            dict: networks, version, loaded_at, reloads
+        """
+        return {
+            'networks': len(self._tree),
+            'version': self.version,
+            'loaded_at': self.loaded_at,
+            'reloads': self.reloads,
+        }
+
+
+ip_blocklist = IPBlocklist()
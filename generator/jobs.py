@@ -0,0 +1,289 @@
+"""
+Очередь фоновых задач генерации
+
+POST на генератор больше не держит gunicorn-воркер минутами: он создаёт
+GenerationJob и сразу возвращает её ID. Пайплайн GigaChat/Flask выполняют
+фоновые потоки (в процессе веб-сервера) или отдельный процесс
+`python manage.py run_generation_worker`. Хранилище очереди — база данных,
+захват задачи выполняется условным UPDATE, поэтому несколько воркеров
+не возьмут одну задачу дважды.
+"""
+
+import logging
+import os
+import socket
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Количество фоновых потоков в процессе веб-сервера
+JOB_WORKER_THREADS = int(os.getenv('GENERATION_JOB_WORKERS', '2'))
+
+# Как часто воркер проверяет очередь, если его не разбудили (секунды)
+JOB_POLL_INTERVAL = float(os.getenv('GENERATION_JOB_POLL_INTERVAL', '2'))
+
+# Через сколько задача в статусе "running" считается зависшей (секунды)
+JOB_STALE_AFTER = int(os.getenv('GENERATION_JOB_STALE_AFTER', '1200'))
+
+
+def jobs_enabled():
+    """Включена ли асинхронная генерация через очередь задач."""
+    return getattr(settings, 'GENERATION_JOBS_ENABLED', False)
+
+
+def enqueue_generation_job(form_data, generator_type='gigachat', generate_image_flag=False,
+                           user=None, token=None, base_url='', allow_similar=True, session_key=''):
+    """
+    Ставит задачу генерации в очередь.
+
+    Args:
+        form_data: Очищенные данные GenerationForm
+        generator_type: 'gigachat' или 'openai'
+        generate_image_flag: Генерировать ли изображение
+        user: Пользователь Django (опционально)
+        token: TemporaryAccessToken (опционально)
+        base_url: Абсолютный URL сайта для ссылок на изображения
+        allow_similar: Разрешить ответ из генерации с похожей темой
+        session_key: Ключ сессии создателя (по нему задачу без токена и
+            пользователя видит только создавшая её сессия)
+
+    Returns:
+        GenerationJob: Созданная задача
+    """
+    from .models import GenerationJob
+
+    job = GenerationJob.objects.create(
+        user=user,
+        token=token,
+        session_key=session_key or '',
+        generator_type=generator_type,
+        payload={
+            'form_data': form_data,
+            'generate_image': generate_image_flag,
+            'base_url': base_url,
+            'allow_similar': allow_similar,
+        },
+    )
+    if _worker is not None:
+        _worker.notify()
+    return job
+
+
+def claim_next_job(worker_name):
+    """
+    Захватывает самую старую задачу из очереди.
+
+    Захват выполняется условным UPDATE по статусу: если задачу уже взял
+    другой воркер, rowcount будет 0 и берётся следующая.
+
+    Returns:
+        GenerationJob или None, если очередь пуста
+    """
+    from .models import GenerationJob
+
+    candidates = GenerationJob.objects.filter(
+        status=GenerationJob.STATUS_PENDING
+    ).order_by('created_at').values_list('id', flat=True)[:10]
+
+    for job_id in candidates:
+        claimed = GenerationJob.objects.filter(
+            id=job_id,
+            status=GenerationJob.STATUS_PENDING
+        ).update(
+            status=GenerationJob.STATUS_RUNNING,
+            started_at=timezone.now(),
+            worker=worker_name[:100],
+        )
+        if claimed:
+            return GenerationJob.objects.select_related('user', 'token').get(id=job_id)
+    return None
+
+
+def execute_job(job):
+    """
+    Выполняет пайплайн генерации для задачи и сохраняет результат.
+
+    Итоговый JSON совпадает с ответом generator_view. Результат
+    записывается условным UPDATE: если задачу уже пометил ошибкой
+    fail_stale_jobs (или её перехватил другой воркер), поздний результат
+    отбрасывается.
+    """
+    from .models import GenerationJob
+    from .views import run_generation_pipeline
+
+    payload = job.payload or {}
+    try:
+        result = run_generation_pipeline(
+            payload.get('form_data') or {},
+            generator_type=job.generator_type,
+            generate_image_flag=payload.get('generate_image', False),
+            user=job.user,
+            token=job.token,
+            base_url=payload.get('base_url', ''),
+            allow_similar=payload.get('allow_similar', True),
+        )
+        job.result = result
+        job.status = GenerationJob.STATUS_DONE if result.get('success') else GenerationJob.STATUS_FAILED
+        job.error = '' if result.get('success') else str(result.get('error', ''))
+    except Exception as e:
+        logger.exception(f"Ошибка выполнения задачи генерации {job.id}")
+        job.status = GenerationJob.STATUS_FAILED
+        job.error = str(e)
+        job.result = {'success': False, 'error': str(e)}
+    job.finished_at = timezone.now()
+    saved = GenerationJob.objects.filter(
+        id=job.id,
+        status=GenerationJob.STATUS_RUNNING,
+        worker=job.worker,
+    ).update(
+        status=job.status,
+        result=job.result,
+        error=job.error,
+        finished_at=job.finished_at,
+    )
+    if not saved:
+        logger.warning(f"Задача генерации {job.id} уже завершена без воркера {job.worker}, результат отброшен")
+        job.refresh_from_db()
+    return job
+
+
+def fail_stale_jobs():
+    """
+    Помечает ошибкой задачи, зависшие в статусе "running"
+    (например, если процесс воркера был убит).
+
+    Returns:
+        int: Количество помеченных задач
+    """
+    from .models import GenerationJob
+
+    threshold = timezone.now() - timedelta(seconds=JOB_STALE_AFTER)
+    return GenerationJob.objects.filter(
+        status=GenerationJob.STATUS_RUNNING,
+        started_at__lt=threshold
+    ).update(
+        status=GenerationJob.STATUS_FAILED,
+        error='Превышено время выполнения задачи',
+        result={'success': False, 'error': 'Превышено время выполнения задачи'},
+        finished_at=timezone.now(),
+    )
+
+
+class GenerationJobWorker:
+    """
+    Пул потоков, разбирающих очередь задач генерации.
+
+    Args:
+        threads: Количество потоков
+        poll_interval: Интервал опроса очереди (секунды)
+    """
+
+    def __init__(self, threads=JOB_WORKER_THREADS, poll_interval=JOB_POLL_INTERVAL):
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+
+    def notify(self):
+        """Будит воркеры сразу после постановки задачи."""
+        self._wakeup.set()
+
+    def run_once(self, thread_name=None):
+        """
+        Захватывает и выполняет одну задачу.
+
+        Returns:
+            bool: True, если задача была выполнена
+        """
+        try:
+            job = claim_next_job(thread_name or self.name)
+            if job is None:
+                return False
+            logger.info(f"▶️ Задача генерации {job.id} взята воркером {thread_name or self.name}")
+            execute_job(job)
+            logger.info(f"✅ Задача генерации {job.id} завершена: {job.status}")
+            return True
+        finally:
+            close_old_connections()
+
+    def _loop(self, index):
+        thread_name = f"{self.name}:{index}"
+        while not self._stop.is_set():
+            try:
+                if index == 0:
+                    fail_stale_jobs()
+                if self.run_once(thread_name):
+                    continue
+            except Exception as e:
+                logger.error(f"❌ Ошибка воркера задач генерации: {e}")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def start(self):
+        """Запускает фоновые потоки воркера."""
+        for index in range(self.threads):
+            thread = threading.Thread(
+                target=self._loop,
+                args=(index,),
+                name=f"generation-job-worker-{index}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"✅ Воркер задач генерации запущен ({self.threads} потоков)")
+
+    def stop(self, timeout=None):
+        """Останавливает потоки после завершения текущих задач."""
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def run_forever(self):
+        """Блокирующий режим для отдельного процесса воркера."""
+        self.start()
+        try:
+            while any(t.is_alive() for t in self._threads):
+                for thread in self._threads:
+                    thread.join(1)
+        except KeyboardInterrupt:
+            self.stop()
+
+
+# Воркер текущего процесса (если запущен)
+_worker = None
+
+
+def start_job_worker(threads=None):
+    """
+    Запускает фоновый воркер задач в текущем процессе.
+
+    Вызывается из GeneratorConfig.ready() для runserver/gunicorn.
+    """
+    global _worker
+
+    if _worker is not None:
+        return _worker
+    count = JOB_WORKER_THREADS if threads is None else threads
+    if count <= 0:
+        return None
+    _worker = GenerationJobWorker(threads=count)
+    _worker.start()
+    return _worker
+
+
+def stop_job_worker():
+    """Останавливает фоновый воркер текущего процесса."""
+    global _worker
+
+    if _worker is not None:
+        _worker.stop(timeout=5)
+        _worker = None
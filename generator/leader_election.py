@@ -0,0 +1,332 @@
+"""
+Выбор лидера среди процессов приложения
+
+Планировщик (generator/scheduler.py) запускается в каждом воркере
+gunicorn каждого контейнера; задачи должен выполнять только один из них.
+Лидер держит аренду (lease) с TTL и продлевает её фоновым потоком каждые
+SCHEDULER_LEADER_HEARTBEAT секунд. Остальные процессы с тем же периодом
+пытаются забрать аренду — если лидер завершился или завис, новый лидер
+появится не позже чем через SCHEDULER_LEADER_TTL секунд.
+
+Хранилища аренды:
+- redis: ключ leader:<имя> (SET NX PX, продление и снятие Lua-скриптами
+  только владельцем);
+- db: строка SchedulerLease, захват и продление — условный UPDATE по
+  часам БД (работает на PostgreSQL и SQLite, без advisory-блокировок,
+  привязанных к соединению);
+- auto: redis, если кэш default — django_redis, иначе db.
+
+Хранилище выбирается только по настройкам, одинаковым для всего кластера.
+Если выбран Redis, а он недоступен, процесс не становится лидером (и
+переподключается с паузой), а не переходит на БД: иначе процессы, которые
+видят Redis, и процессы, которые его не видят, держали бы две разные
+аренды и выбрали двух лидеров.
+
+Процесс считает себя лидером только до момента, когда его аренда могла
+истечь (с запасом в один период продления), поэтому при потере связи с
+хранилищем он перестаёт запускать задачи раньше, чем аренду заберёт другой.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Q
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from . import redis_backend
+
+logger = logging.getLogger(__name__)
+
+BACKEND_AUTO = 'auto'
+BACKEND_REDIS = 'redis'
+BACKEND_DB = 'db'
+
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def make_holder_id():
+    """Идентификатор процесса: хост, pid и случайный суффикс (pid повторяются в контейнерах)."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class _RedisLease:
+    """
+    Аренда в Redis: значение ключа — владелец, TTL ключа — срок аренды
+
+    Пока Redis недоступен, операции выбрасывают исключение (процесс не
+    лидер); подключение восстанавливается с паузой (RedisLink).
+    """
+
+    def __init__(self, name, client=None):
+        self.key = f"leader:{name}"
+        self._scripts = None
+        self._link = redis_backend.RedisLink(
+            'Выбор лидера', 'лидерство не захватывается',
+            client=client, on_connect=self._register_scripts,
+        )
+
+    def _register_scripts(self, client):
+        self._scripts = (
+            client.register_script(_RENEW_SCRIPT),
+            client.register_script(_RELEASE_SCRIPT),
+        )
+
+    def _call(self, operation):
+        client = self._link.get()
+        if client is None:
+            raise ConnectionError('Redis недоступен')
+        try:
+            return operation(client, *self._scripts)
+        except Exception as e:
+            self._link.failed(e)
+            raise
+
+    def acquire(self, holder, ttl):
+        ttl_ms = int(ttl * 1000)
+
+        def take(client, renew, release):
+            if renew(keys=[self.key], args=[holder, ttl_ms]):
+                return True
+            return bool(client.set(self.key, holder, nx=True, px=ttl_ms))
+
+        return self._call(take)
+
+    def release(self, holder):
+        self._call(lambda client, renew, release: release(keys=[self.key], args=[holder]))
+
+    def current(self):
+        holder, ttl_ms = self._call(lambda client, renew, release: (client.get(self.key), client.pttl(self.key)))
+        if holder is None:
+            return None
+        return {
+            'holder': holder.decode() if isinstance(holder, bytes) else holder,
+            'expires_in': round(ttl_ms / 1000, 1) if ttl_ms and ttl_ms > 0 else None,
+        }
+
+
+class _DatabaseLease:
+    """Аренда в таблице SchedulerLease (сроки по часам БД)."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def acquire(self, holder, ttl):
+        from .models import SchedulerLease
+
+        expires = Now() + timedelta(seconds=ttl)
+        # Продление своей аренды или захват истёкшей — одним условным UPDATE
+        renewed = SchedulerLease.objects.filter(name=self.name, holder=holder).update(
+            expires_at=expires, heartbeat_at=Now()
+        )
+        if renewed:
+            return True
+        taken = SchedulerLease.objects.filter(
+            Q(expires_at__lt=Now()) | Q(holder=''), name=self.name
+        ).update(holder=holder, expires_at=expires, acquired_at=Now(), heartbeat_at=Now())
+        if taken:
+            return True
+        if SchedulerLease.objects.filter(name=self.name).exists():
+            return False
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                SchedulerLease.objects.create(
+                    name=self.name, holder=holder, acquired_at=now, heartbeat_at=now,
+                    expires_at=now + timedelta(seconds=ttl),
+                )
+            return True
+        except IntegrityError:
+            # Другой процесс создал строку одновременно с нами
+            return False
+
+    def release(self, holder):
+        from .models import SchedulerLease
+        SchedulerLease.objects.filter(name=self.name, holder=holder).update(holder='', expires_at=Now())
+
+    def current(self):
+        from .models import SchedulerLease
+        lease = SchedulerLease.objects.filter(name=self.name).first()
+        if lease is None or not lease.holder or lease.expires_at <= timezone.now():
+            return None
+        return {
+            'holder': lease.holder,
+            'acquired_at': lease.acquired_at.isoformat() if lease.acquired_at else None,
+            'expires_in': round((lease.expires_at - timezone.now()).total_seconds(), 1),
+        }
+
+
+class LeaderElector:
+    """
+    Участник выборов лидера
+
+    Args:
+        name: Имя аренды (одна аренда — один лидер)
+        backend: 'auto' (redis, если кэш — django_redis, иначе db), 'redis' или 'db'
+        ttl: Срок аренды в секундах
+        heartbeat: Период продления/попыток захвата в секундах
+        on_elected: Вызывается (в потоке продления), когда процесс стал лидером
+        on_demoted: Вызывается, когда процесс потерял лидерство
+    """
+
+    def __init__(self, name='scheduler', backend=None, ttl=None, heartbeat=None,
+                 on_elected=None, on_demoted=None):
+        self.name = name
+        self.backend = backend
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.holder = make_holder_id()
+        self._lease = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._valid_until = 0.0
+        self.elected_at = None
+        self.last_heartbeat = None
+        self.elections = 0
+        self.errors = 0
+
+    def _configure(self):
+        self.backend = self.backend or getattr(settings, 'SCHEDULER_LEADER_BACKEND', BACKEND_AUTO)
+        self.ttl = self.ttl or getattr(settings, 'SCHEDULER_LEADER_TTL', 30)
+        self.heartbeat = self.heartbeat or getattr(settings, 'SCHEDULER_LEADER_HEARTBEAT', 10)
+        if self.backend == BACKEND_AUTO:
+            # По настройкам, а не по доступности Redis: выбор одинаков во всех процессах
+            self.backend = BACKEND_REDIS if redis_backend.is_configured() else BACKEND_DB
+        if self.backend == BACKEND_REDIS:
+            return _RedisLease(self.name)
+        self.backend = BACKEND_DB
+        return _DatabaseLease(self.name)
+
+    def _get_lease(self):
+        if self._lease is None:
+            with self._lock:
+                if self._lease is None:
+                    self._lease = self._configure()
+        return self._lease
+
+    def is_leader(self):
+        """Лидер ли этот процесс (аренда продлена и ещё не могла истечь)."""
+        return time.monotonic() < self._valid_until
+
+    def tick(self):
+        """
+        Одна попытка продлить или захватить аренду
+
+        Returns:
+            bool: Лидер ли процесс после попытки
+        """
+        was_leader = self.is_leader()
+        started = time.monotonic()
+        try:
+            acquired = self._get_lease().acquire(self.holder, self.ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Выбор лидера: ошибка хранилища аренды ({e})")
+            acquired = False
+        if acquired:
+            # Запас в один период продления: перестаём считать себя лидером раньше, чем истечёт аренда
+            self._valid_until = started + max(self.ttl - self.heartbeat, self.ttl / 2)
+            self.last_heartbeat = timezone.now()
+        else:
+            # Аренду забрал другой процесс (или хранилище недоступно) — сразу перестаём быть лидером
+            self._valid_until = 0.0
+
+        if acquired and not was_leader:
+            self.elected_at = timezone.now()
+            self.elections += 1
+            logger.info(f"Выбор лидера: {self.holder} стал лидером ({self.name}, {self.backend})")
+            self._notify(self.on_elected)
+        elif was_leader and not acquired:
+            logger.warning(f"Выбор лидера: {self.holder} потерял лидерство ({self.name})")
+            self.elected_at = None
+            self._notify(self.on_demoted)
+        return acquired
+
+    def _notify(self, callback):
+        if callback is None:
+            return
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"Выбор лидера: ошибка обработчика смены лидера ({e})")
+
+    def start(self):
+        """Первая попытка захвата сразу и фоновое продление."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self.tick()
+        self._thread = threading.Thread(target=self._run, name=f'leader-{self.name}', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.heartbeat):
+            try:
+                self.tick()
+            finally:
+                close_old_connections()
+
+    def stop(self, release=True):
+        """
+        Останавливает продление
+
+        Args:
+            release: Снять аренду сразу, чтобы другой процесс не ждал её истечения
+        """
+        self._stopped.set()
+        was_leader = self.is_leader()
+        self._valid_until = 0.0
+        if release and self._lease is not None:
+            try:
+                self._lease.release(self.holder)
+                if was_leader:
+                    logger.info(f"Выбор лидера: {self.holder} снял аренду ({self.name})")
+            except Exception as e:
+                logger.warning(f"Выбор лидера: не удалось снять аренду ({e})")
+
+    def get_status(self):
+        """
+        Состояние выборов для get_scheduler_status
+
+        Returns:
+            dict: backend, holder (этот процесс), is_leader, leader (текущий
+            владелец аренды), elected_at, last_heartbeat, elections, errors
+        """
+        try:
+            leader = self._get_lease().current()
+        except Exception as e:
+            leader = {'error': str(e)}
+        return {
+            'backend': self.backend,
+            'holder': self.holder,
+            'is_leader': self.is_leader(),
+            'leader': leader,
+            'ttl': self.ttl,
+            'heartbeat': self.heartbeat,
+            'elected_at': self.elected_at.isoformat() if self.elected_at else None,
+            'last_heartbeat': self.last_heartbeat.isoformat() if self.last_heartbeat else None,
+            'elections': self.elections,
+            'errors': self.errors,
+        }
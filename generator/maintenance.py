@@ -0,0 +1,262 @@
+"""
+Пакетное обслуживание таблиц токенов и генераций
+
+Задачи планировщика раньше обновляли подписки по одной строке
+(renew_subscription → save) и удаляли старые записи одним .delete() на
+всю выборку — с каскадом на GigaChatTokenUsage, резервы и версии
+генераций в одной огромной транзакции. Теперь выборка обходится пачками
+по первичному ключу (WHERE pk > последний ORDER BY pk LIMIT N); каждая
+пачка — один UPDATE или ограниченное удаление в своей транзакции, между
+пачками — пауза MAINTENANCE_BATCH_PAUSE, чтобы не устраивать «шторм»
+блокировок для рабочих запросов.
+
+После каждой пачки в кэш пишется контрольная точка (последний pk и время
+отсечки запуска): перезапуск после падения продолжает с неё. Условия
+выборок идемпотентны (продлённая подписка уже не попадает под
+next_renewal <= отсечки, удалённой строки нет), поэтому пачка, которую не
+успели отметить, при повторе просто ничего не изменит.
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, DateTimeField, F, When
+from django.utils import timezone
+
+from .tariffs import get_subscription_tariffs
+from .token_cache import invalidate_token_state
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_TTL = 24 * 60 * 60
+
+
+class BatchRunner:
+    """
+    Обход выборки пачками по pk с контрольными точками
+
+    Args:
+        name: Имя задачи (ключ контрольной точки maintenance:<name>)
+        batch_size: Строк в пачке (по умолчанию MAINTENANCE_BATCH_SIZE)
+        pause: Пауза между пачками в секундах (по умолчанию MAINTENANCE_BATCH_PAUSE)
+        resume: Продолжить с контрольной точки прерванного запуска
+    """
+
+    def __init__(self, name, batch_size=None, pause=None, resume=True):
+        self.name = name
+        self.batch_size = batch_size or getattr(settings, 'MAINTENANCE_BATCH_SIZE', 1000)
+        self.pause = getattr(settings, 'MAINTENANCE_BATCH_PAUSE', 0.05) if pause is None else pause
+        self.key = f"maintenance:{name}"
+        self.last_pk = None
+        self.cutoff = timezone.now()
+        self.resumed = False
+        checkpoint = self._load() if resume else None
+        if checkpoint:
+            # Та же отсечка, что у прерванного запуска: выборка не расширяется на ходу
+            self.last_pk = checkpoint['last_pk']
+            self.cutoff = datetime.fromisoformat(checkpoint['cutoff'])
+            self.resumed = True
+            logger.info(f"Обслуживание {name}: продолжение после pk={self.last_pk}")
+        elif not resume:
+            self._clear()
+
+    def _load(self):
+        try:
+            return cache.get(self.key)
+        except Exception as e:
+            logger.warning(f"Обслуживание {self.name}: контрольная точка недоступна ({e})")
+            return None
+
+    def _save(self):
+        try:
+            cache.set(self.key, {'last_pk': self.last_pk, 'cutoff': self.cutoff.isoformat()}, CHECKPOINT_TTL)
+        except Exception as e:
+            logger.warning(f"Обслуживание {self.name}: контрольная точка не сохранена ({e})")
+
+    def _clear(self):
+        try:
+            cache.delete(self.key)
+        except Exception:
+            pass
+
+    def run(self, queryset, process, fields=('pk',)):
+        """
+        Обрабатывает выборку пачками
+
+        Args:
+            queryset: Строки для обработки (условия выборки без сортировки)
+            process: Функция (rows) → число изменённых строк; rows — кортежи fields
+            fields: Поля пачки для values_list; первое — pk
+
+        Returns:
+            dict: job, rows, batches, seconds, rows_per_sec, resumed
+        """
+        started = time.perf_counter()
+        rows_done = 0
+        batches = 0
+        queryset = queryset.order_by('pk')
+        while True:
+            page = queryset if self.last_pk is None else queryset.filter(pk__gt=self.last_pk)
+            rows = list(page.values_list(*fields)[:self.batch_size])
+            if not rows:
+                break
+            rows_done += process(rows)
+            batches += 1
+            self.last_pk = rows[-1][0]
+            self._save()
+            if len(rows) < self.batch_size:
+                break
+            if self.pause:
+                time.sleep(self.pause)
+        self._clear()
+
+        seconds = time.perf_counter() - started
+        stats = {
+            'job': self.name,
+            'rows': rows_done,
+            'batches': batches,
+            'seconds': round(seconds, 3),
+            'rows_per_sec': round(rows_done / seconds, 1) if seconds and rows_done else 0.0,
+            'resumed': self.resumed,
+        }
+        if rows_done:
+            logger.info(
+                f"Обслуживание {self.name}: {rows_done} строк, {batches} пачек "
+                f"за {seconds:.2f} с ({stats['rows_per_sec']:.0f} строк/с)"
+            )
+        return stats
+
+
+def renew_subscriptions(**options):
+    """
+    Пополняет лимиты подписок, у которых наступил next_renewal
+
+    Пачка — один UPDATE: счётчики обнуляются, next_renewal сдвигается на
+    duration_days тарифа (CASE по token_type), как в
+    TemporaryAccessToken.renew_subscription.
+
+    Args:
+        **options: batch_size, pause, resume для BatchRunner
+
+    Returns:
+        dict: Статистика BatchRunner.run
+    """
+    from .models import TemporaryAccessToken
+
+    runner = BatchRunner('renew_subscriptions', **options)
+    tariffs = get_subscription_tariffs()
+    next_renewal = Case(
+        *[
+            When(token_type=token_type, then=F('next_renewal') + timedelta(days=tariff['duration_days']))
+            for token_type, tariff in tariffs.items()
+        ],
+        default=F('next_renewal'),
+        output_field=DateTimeField(),
+    )
+    due = TemporaryAccessToken.objects.filter(
+        is_active=True,
+        next_renewal__isnull=False,
+        next_renewal__lte=runner.cutoff,
+        token_type__in=list(tariffs),
+    )
+
+    def process(rows):
+        updated = due.filter(pk__in=[pk for pk, _ in rows]).update(
+            gigachat_tokens_used=0,
+            openai_tokens_used=0,
+            next_renewal=next_renewal,
+        )
+        invalidate_token_state(*[token for _, token in rows])
+        return updated
+
+    return runner.run(due, process, fields=('pk', 'token'))
+
+
+def deactivate_expired_tokens(**options):
+    """
+    Деактивирует истекшие активные токены (бессрочные не трогает)
+
+    Returns:
+        dict: Статистика BatchRunner.run
+    """
+    from .models import TemporaryAccessToken
+
+    runner = BatchRunner('deactivate_expired_tokens', **options)
+    expired = TemporaryAccessToken.objects.filter(
+        is_active=True,
+        expires_at__isnull=False,
+        expires_at__lt=runner.cutoff,
+    )
+
+    def process(rows):
+        updated = expired.filter(pk__in=[pk for pk, _ in rows]).update(is_active=False)
+        invalidate_token_state(*[token for _, token in rows])
+        return updated
+
+    return runner.run(expired, process, fields=('pk', 'token'))
+
+
+def _delete_batches(runner, queryset):
+    model = queryset.model
+
+    def process(rows):
+        # Каскад (резервы, версии генераций, SET_NULL в учёте токенов) — только для строк пачки
+        _, deleted = model.objects.filter(pk__in=[row[0] for row in rows]).delete()
+        return deleted.get(model._meta.label, 0)
+
+    return runner.run(queryset, process)
+
+
+def delete_old_tokens(days=90, **options):
+    """
+    Удаляет деактивированные токены, истекшие более days дней назад
+
+    После удаления перестраивает фильтр Блума по токенам.
+
+    Args:
+        days: Возраст истечения в днях
+        **options: batch_size, pause, resume для BatchRunner
+
+    Returns:
+        dict: Статистика BatchRunner.run
+    """
+    from .models import TemporaryAccessToken
+
+    runner = BatchRunner('delete_old_tokens', **options)
+    stats = _delete_batches(runner, TemporaryAccessToken.objects.filter(
+        is_active=False,
+        expires_at__isnull=False,
+        expires_at__lt=runner.cutoff - timedelta(days=days),
+    ))
+    if stats['rows']:
+        # Удалённые токены остаются в фильтре Блума до перестроения
+        from .token_filter import token_filter
+        token_filter.rebuild()
+    return stats
+
+
+def delete_old_generations(days=90, **options):
+    """
+    Удаляет генерации без пользователя (демо-токены) старше days дней
+
+    Returns:
+        dict: Статистика BatchRunner.run
+    """
+    from .models import Generation
+
+    runner = BatchRunner('delete_old_generations', **options)
+    return _delete_batches(runner, Generation.objects.filter(
+        user__isnull=True,
+        created_at__lt=runner.cutoff - timedelta(days=days),
+    ))
+
+
+JOBS = {
+    'renew_subscriptions': renew_subscriptions,
+    'deactivate_expired_tokens': deactivate_expired_tokens,
+    'delete_old_tokens': delete_old_tokens,
+    'delete_old_generations': delete_old_generations,
+}
@@ -0,0 +1,125 @@
+"""
+Команда для замера скорости поиска по генерациям
+
+Сравнивает полнотекстовый индекс (generator/generation_search.py) с
+поиском icontains по теме и тексту. Синтетические генерации создаются
+внутри транзакции, которая в конце откатывается, — данные в БД не
+остаются. Время считается по первой странице результатов.
+
+Использование:
+    python manage.py benchmark_generation_search
+    python manage.py benchmark_generation_search --rows 1000000 --queries 50
+"""
+
+import itertools
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from generator import generation_search
+from generator.models import Generation
+
+SYLLABLES = (
+    'ка', 'ро', 'ми', 'на', 'ле', 'то', 'ва', 'ст', 'ри', 'по', 'ко', 'да', 'ни', 'се', 'лу',
+    'ма', 'ре', 'бо', 'ти', 'за', 'ги', 'ду', 'фе', 'жа', 'цы', 'ше', 'хо', 'мо', 'ль', 'ин',
+)
+
+
+def make_vocabulary(rng, size):
+    """Словарь из случайных «слов» (частоты потом распределяются по Ципфу)."""
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(3, 5))))
+    return sorted(words)
+
+
+class Command(BaseCommand):
+    """
+    Микро-бенчмарк поиска: мс на запрос для индекса и icontains
+    """
+
+    help = 'Замеряет время поиска по генерациям: полнотекстовый индекс против icontains'
+
+    def add_arguments(self, parser):
+        """
+        Добавляет аргументы командной строки
+
+        Args:
+            parser: Парсер аргументов командной строки
+        """
+        parser.add_argument('--rows', type=int, default=100000, help='Количество синтетических генераций')
+        parser.add_argument('--queries', type=int, default=30, help='Количество поисковых запросов')
+        parser.add_argument('--vocabulary', type=int, default=50000, help='Размер словаря синтетических текстов')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Размер пачки bulk_create')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def _text(self, rng, vocabulary, weights, words):
+        return ' '.join(rng.choices(vocabulary, cum_weights=weights, k=words))
+
+    def _measure(self, search, queries):
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            search(None, query, 25)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+
+    def handle(self, *args, **options):
+        """
+        Основная логика команды
+
+        Args:
+            *args: Позиционные аргументы
+            **options: Именованные аргументы из add_arguments
+        """
+        rng = random.Random(options['seed'])
+        vocabulary = make_vocabulary(rng, options['vocabulary'])
+        # Частота слова обратно пропорциональна его рангу (закон Ципфа)
+        weights = list(itertools.accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+        # Запросы: слова средней частоты, одно или два (как у поиска «старого поста»)
+        middle = vocabulary[len(vocabulary) // 100:len(vocabulary) // 10]
+        queries = [' '.join(rng.sample(middle, rng.choice((1, 2)))) for _ in range(options['queries'])]
+        # Самые частые слова — худший случай для ранжирования
+        frequent = vocabulary[:10]
+
+        self.stdout.write('=' * 70)
+        self.stdout.write(self.style.SUCCESS('БЕНЧМАРК ПОИСКА ПО ГЕНЕРАЦИЯМ'))
+        self.stdout.write('=' * 70)
+        self.stdout.write(f"Способ поиска: {generation_search.backend()}")
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            created = 0
+            while created < options['rows']:
+                size = min(options['batch_size'], options['rows'] - created)
+                Generation.objects.bulk_create([
+                    Generation(
+                        topic=self._text(rng, vocabulary, weights, 4),
+                        result=self._text(rng, vocabulary, weights, 60),
+                    ) for _ in range(size)
+                ])
+                created += size
+            self.stdout.write(
+                f"Создано {created} генераций за {time.perf_counter() - started:.1f} с (будут удалены)"
+            )
+
+            searches = (
+                ('Полнотекстовый индекс', generation_search.search_ids),
+                ('icontains', generation_search.icontains_ids),
+            )
+            for title, probe in (('Слова средней частоты', queries), ('Самые частые слова', frequent)):
+                self.stdout.write(f"{title} ({len(probe)} запросов):")
+                measured = {}
+                for name, search in searches:
+                    median, p95 = self._measure(search, probe)
+                    measured[name] = median
+                    self.stdout.write(f"  {name:<24} медиана {median:>9.2f} мс, p95 {p95:>9.2f} мс")
+                if measured['Полнотекстовый индекс']:
+                    ratio = measured['icontains'] / measured['Полнотекстовый индекс']
+                    self.stdout.write(f"  icontains / индекс: {ratio:.1f}×")
+            transaction.set_rollback(True)
+        self.stdout.write('=' * 70)
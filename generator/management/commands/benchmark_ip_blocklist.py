@@ -0,0 +1,101 @@
+"""
+Команда для замера скорости проверки IP по блоклисту
+
+Сравнивает дерево префиксов в памяти процесса (generator/ip_blocklist.py)
+с прежней проверкой ключа blocked_ip:<ip> в кэше Django. Блоклист
+заполняется случайными сетями, БД не используется.
+
+Использование:
+    python manage.py benchmark_ip_blocklist
+    python manage.py benchmark_ip_blocklist --networks 100000 --lookups 500000
+"""
+
+import ipaddress
+import random
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from generator.ip_blocklist import BlockEntry, PrefixTree
+
+
+class Command(BaseCommand):
+    """
+    Микро-бенчмарк проверки IP: lookups/sec для дерева и кэша
+    """
+
+    help = 'Замеряет lookups/sec блоклиста в памяти процесса и проверки через кэш'
+
+    def add_arguments(self, parser):
+        """
+        Добавляет аргументы командной строки
+
+        Args:
+            parser: Парсер аргументов командной строки
+        """
+        parser.add_argument('--networks', type=int, default=20000, help='Количество сетей в блоклисте')
+        parser.add_argument('--lookups', type=int, default=200000, help='Количество проверок')
+        parser.add_argument(
+            '--cache-lookups',
+            type=int,
+            default=5000,
+            help='Количество проверок через кэш (медленнее, поэтому меньше)',
+        )
+        parser.add_argument(
+            '--clients',
+            type=int,
+            default=1000,
+            help='Количество различных IP в «горячем» замере (повторяющиеся клиенты)',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+
+    def _measure(self, tree, ips):
+        started = time.perf_counter()
+        blocked = sum(1 for ip in ips if tree.lookup(ip) is not None)
+        elapsed = time.perf_counter() - started
+        return blocked, (len(ips) / elapsed if elapsed else 0.0)
+
+    def handle(self, *args, **options):
+        """
+        Основная логика команды
+
+        Args:
+            *args: Позиционные аргументы
+            **options: Именованные аргументы из add_arguments
+        """
+        rng = random.Random(options['seed'])
+        tree = PrefixTree()
+        # Смесь одиночных адресов и подсетей, как в реальных списках
+        prefix_lengths = [32] * 6 + [24] * 3 + [16, 20, 22, 28]
+        started = time.perf_counter()
+        for _ in range(options['networks']):
+            length = rng.choice(prefix_lengths)
+            network = ipaddress.ip_network((rng.getrandbits(32), length), strict=False)
+            tree.add(str(network), BlockEntry(str(network), 'bench', 'bench', None))
+        build = time.perf_counter() - started
+
+        # Холодный замер: все адреса разные, память последних IP не помогает
+        ips = [str(ipaddress.IPv4Address(rng.getrandbits(32))) for _ in range(options['lookups'])]
+        blocked, tree_ops = self._measure(tree, ips)
+        # Горячий замер: те же клиенты приходят повторно
+        clients = ips[:options['clients']]
+        _, hot_ops = self._measure(tree, [rng.choice(clients) for _ in range(options['lookups'])])
+
+        cache_ips = ips[:options['cache_lookups']]
+        started = time.perf_counter()
+        for ip in cache_ips:
+            cache.get(f"blocked_ip:{ip}")
+        elapsed = time.perf_counter() - started
+        cache_ops = len(cache_ips) / elapsed if elapsed else 0.0
+
+        self.stdout.write('=' * 70)
+        self.stdout.write(self.style.SUCCESS('БЕНЧМАРК БЛОКЛИСТА IP'))
+        self.stdout.write('=' * 70)
+        self.stdout.write(f"Сетей: {len(tree)} (построение {build * 1000:.0f} мс), проверок: {len(ips)}")
+        self.stdout.write(f"Совпадений: {blocked} ({blocked / len(ips):.2%})")
+        for name, ops in (('Дерево (разные IP)', tree_ops), ('Дерево (повторные IP)', hot_ops)):
+            self.stdout.write(f"{name:<28} {ops:>12,.0f} lookups/sec ({1e6 / ops:.2f} мкс)")
+        ratio = f" (дерево быстрее в {tree_ops / cache_ops:.1f}×)" if cache_ops else ''
+        self.stdout.write(f"{'Кэш (blocked_ip:<ip>)':<28} {cache_ops:>12,.0f} lookups/sec{ratio}")
+        self.stdout.write('=' * 70)
@@ -0,0 +1,59 @@
+"""
+Команда для замера стоимости сборки системного промпта GigaChat
+
+Использование:
+    python manage.py benchmark_prompts
+    python manage.py benchmark_prompts --combinations 50000
+"""
+
+from django.core.management.base import BaseCommand
+from flask_generator.prompt_engine import run_benchmark
+from generator.gigachat_api import prompt_compiler
+
+
+class Command(BaseCommand):
+    """
+    Микро-бенчмарк компилятора промптов на N различных комбинациях критериев
+    """
+    
+    help = 'Замеряет время сборки промпта: без кэша, промах и попадание в LRU'
+    
+    def add_arguments(self, parser):
+        """
+        Добавляет аргументы командной строки
+        
+        Args:
+            parser: Парсер аргументов командной строки
+        """
+        parser.add_argument(
+            '--combinations',
+            type=int,
+            default=10000,
+            help='Количество различных комбинаций критериев',
+        )
+    
+    def handle(self, *args, **options):
+        """
+        Основная логика команды
+        
+        Args:
+            *args: Позиционные аргументы
+            **options: Именованные аргументы из add_arguments
+        """
+        stats = run_benchmark(prompt_compiler, combinations=options['combinations'])
+        
+        self.stdout.write('=' * 70)
+        self.stdout.write(self.style.SUCCESS('БЕНЧМАРК СБОРКИ ПРОМПТА'))
+        self.stdout.write('=' * 70)
+        self.stdout.write(f"Комбинаций критериев: {stats['combinations']}")
+        self.stdout.write(f"Без кэша:             {stats['uncached_us']} мкс/вызов")
+        self.stdout.write(f"Промах кэша:          {stats['miss_us']} мкс/вызов")
+        self.stdout.write(f"Попадание в кэш:      {stats['hit_us']} мкс/вызов (x{stats['speedup']})")
+        
+        live = prompt_compiler.cache_info()
+        self.stdout.write('-' * 70)
+        self.stdout.write(
+            f"Кэш процесса: {live['size']}/{live['maxsize']}, "
+            f"попаданий {live['hits']}, промахов {live['misses']} (hit rate {live['hit_rate']:.1%})"
+        )
+        self.stdout.write('=' * 70)
@@ -0,0 +1,91 @@
+"""
+Команда для сравнения производительности ограничителей частоты запросов
+
+Сравнивает прежнее фиксированное окно на счётчиках кэша Django
+(get + set/incr + ttl) с GCRA одним Lua-скриптом в Redis и GCRA в памяти
+процесса.
+
+Использование:
+    python manage.py benchmark_rate_limit
+    python manage.py benchmark_rate_limit --iterations 50000 --clients 100
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from generator.rate_limit import GCRALimiter, RatePolicy
+from generator.security import RateLimiter
+
+
+class Command(BaseCommand):
+    """
+    Микро-бенчмарк is_rate_limited: операций в секунду для каждой реализации
+    """
+
+    help = 'Сравнивает ops/sec фиксированного окна (кэш) и GCRA (Redis/память процесса)'
+
+    def add_arguments(self, parser):
+        """
+        Добавляет аргументы командной строки
+
+        Args:
+            parser: Парсер аргументов командной строки
+        """
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20000,
+            help='Количество проверок для каждой реализации',
+        )
+        parser.add_argument(
+            '--clients',
+            type=int,
+            default=50,
+            help='Количество различных клиентов (идентификаторов)',
+        )
+
+    def _measure(self, check, iterations, clients):
+        identifiers = [f"bench:{i}" for i in range(clients)]
+        started = time.perf_counter()
+        for i in range(iterations):
+            check(identifiers[i % clients])
+        elapsed = time.perf_counter() - started
+        return iterations / elapsed if elapsed else 0.0
+
+    def handle(self, *args, **options):
+        """
+        Основная логика команды
+
+        Args:
+            *args: Позиционные аргументы
+            **options: Именованные аргументы из add_arguments
+        """
+        iterations = options['iterations']
+        clients = options['clients']
+        # Лимит не достигается: замеряется стоимость проверки, а не отказа
+        policy = RatePolicy('bench', iterations, 60)
+        run_id = int(time.time())
+
+        gcra = GCRALimiter(prefix=f'rl-bench-{run_id}')
+        local = GCRALimiter(prefix=f'rl-bench-{run_id}')
+        local._redis_checked = True
+
+        results = [
+            ('Фиксированное окно (кэш)', self._measure(
+                lambda ident: RateLimiter.is_rate_limited_fixed_window(f"{ident}:{run_id}", iterations, 60),
+                iterations, clients,
+            )),
+            (f'GCRA ({gcra.backend})', self._measure(lambda ident: gcra.hit(ident, policy), iterations, clients)),
+            ('GCRA (память процесса)', self._measure(lambda ident: local.hit(ident, policy), iterations, clients)),
+        ]
+
+        self.stdout.write('=' * 70)
+        self.stdout.write(self.style.SUCCESS('БЕНЧМАРК ОГРАНИЧИТЕЛЯ ЧАСТОТЫ ЗАПРОСОВ'))
+        self.stdout.write('=' * 70)
+        self.stdout.write(f"Проверок: {iterations}, клиентов: {clients}")
+        baseline = results[0][1]
+        for name, ops in results:
+            ratio = f" (x{ops / baseline:.1f})" if baseline else ''
+            self.stdout.write(f"{name:<28} {ops:>12,.0f} ops/sec{ratio}")
+        self.stdout.write('=' * 70)
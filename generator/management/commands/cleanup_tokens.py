@@ -10,7 +10,8 @@
 
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from generator.models import TemporaryAccessToken, Generation
+from generator import maintenance
+from generator.models import TemporaryAccessToken, TokenReservation, Generation
 
 
 class Command(BaseCommand):
@@ -78,9 +79,9 @@ class Command(BaseCommand):
             self.stdout.write(f'\n📊 Найдено просроченных токенов: {expired_count}')
             
             if not dry_run:
-                expired_tokens.update(is_active=False)
+                stats = maintenance.deactivate_expired_tokens()
                 self.stdout.write(
-                    self.style.SUCCESS(f'✅ Деактивировано токенов: {expired_count}')
+                    self.style.SUCCESS(f'✅ Деактивировано токенов: {stats["rows"]} ({stats["rows_per_sec"]:.0f} строк/с)')
                 )
             else:
                 self.stdout.write(
@@ -91,6 +92,23 @@ class Command(BaseCommand):
                 self.style.WARNING('\n⚠️ Просроченных активных токенов не найдено')
             )
         
+        # Освобождение резервов токенов, которые не были закрыты (упавшие запросы)
+        stale_reservations = TokenReservation.objects.filter(
+            status=TokenReservation.STATUS_ACTIVE,
+            expires_at__lt=now
+        )
+        stale_count = stale_reservations.count()
+        if stale_count > 0:
+            if not dry_run:
+                released = TokenReservation.release_expired(now=now)
+                self.stdout.write(
+                    self.style.SUCCESS(f'✅ Освобождено просроченных резервов токенов: {released}')
+                )
+            else:
+                self.stdout.write(
+                    self.style.WARNING(f'🔍 [DRY RUN] Будет освобождено резервов токенов: {stale_count}')
+                )
+        
         # Удаление старых деактивированных токенов (опционально)
         if delete:
             from datetime import timedelta
@@ -109,9 +127,10 @@ class Command(BaseCommand):
                 )
                 
                 if not dry_run:
-                    old_inactive_tokens.delete()
+                    # Пачками по pk; фильтр Блума перестраивается после удаления
+                    stats = maintenance.delete_old_tokens(days=days_old)
                     self.stdout.write(
-                        self.style.SUCCESS(f'🗑️ Удалено токенов: {old_count}')
+                        self.style.SUCCESS(f'🗑️ Удалено токенов: {stats["rows"]} ({stats["rows_per_sec"]:.0f} строк/с)')
                     )
                 else:
                     self.stdout.write(
@@ -138,9 +157,9 @@ class Command(BaseCommand):
                 )
                 
                 if not dry_run:
-                    old_demo_generations.delete()
+                    stats = maintenance.delete_old_generations(days=days_old)
                     self.stdout.write(
-                        self.style.SUCCESS(f'🗑️ Удалено генераций демо-токенов: {demo_gen_count}')
+                        self.style.SUCCESS(f'🗑️ Удалено генераций демо-токенов: {stats["rows"]} ({stats["rows_per_sec"]:.0f} строк/с)')
                     )
                 else:
                     self.stdout.write(
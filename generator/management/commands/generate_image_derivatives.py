@@ -0,0 +1,112 @@
+"""
+Команда для создания уменьшенных копий изображений старых генераций
+
+Новые изображения получают копии при сохранении. Шаблоны копии не
+создают и до запуска команды показывают у старых генераций оригиналы.
+
+Использование:
+    python manage.py generate_image_derivatives
+    python manage.py generate_image_derivatives --force --batch-size 200
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from generator import image_derivatives
+from generator.models import Generation, GenerationImage
+
+
+class Command(BaseCommand):
+    """
+    Создаёт JPEG/WebP копии (DERIVATIVE_WIDTHS) для изображений в MEDIA_ROOT
+
+    Генерации читаются пачками по id, без загрузки текстов постов.
+    Внешние URL (OpenAI) пропускаются.
+    """
+
+    help = 'Создаёт уменьшенные копии (thumbnail/medium, WebP) изображений генераций'
+
+    def add_arguments(self, parser):
+        """
+        Добавляет аргументы командной строки
+
+        Args:
+            parser: Парсер аргументов командной строки
+        """
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Сколько генераций читать из БД за один запрос',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать уже существующие копии',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать изображения без создания копий',
+        )
+
+    def handle(self, *args, **options):
+        """
+        Основная логика команды
+
+        Args:
+            *args: Позиционные аргументы
+            **options: Именованные аргументы из add_arguments
+        """
+        if not image_derivatives.is_enabled():
+            self.stdout.write(self.style.WARNING('Копии отключены (IMAGE_DERIVATIVES_ENABLED) или не установлен Pillow'))
+            return
+
+        batch_size = options['batch_size']
+        force = options['force']
+        dry_run = options['dry_run']
+
+        images = 0
+        skipped = 0
+        created = 0
+        failed = 0
+        seen = set()
+        # image_url может быть NULL (поле null=True) — такие генерации без изображений
+        queryset = Generation.objects.exclude(
+            Q(image_url__isnull=True) | Q(image_url='')
+        ).values_list('id', 'image_url').order_by('id')
+
+        last_id = 0
+        while True:
+            batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            urls = [url for _, image_url in batch for url in image_url.split('|')]
+            # Перегенерированные изображения хранятся в GenerationImage
+            urls += GenerationImage.objects.filter(
+                generation_id__in=[gen_id for gen_id, _ in batch]
+            ).values_list('url', flat=True)
+            for url in urls:
+                rel_path = image_derivatives.media_path_from_url(url.strip())
+                if rel_path is None:
+                    skipped += 1
+                    continue
+                # Одинаковые изображения (image_store) хранятся одним файлом
+                if rel_path in seen:
+                    continue
+                seen.add(rel_path)
+                images += 1
+                if dry_run:
+                    continue
+                try:
+                    created += image_derivatives.ensure_derivatives(rel_path, force=force)
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'Ошибка для {rel_path}: {e}')
+            self.stdout.write(f'Обработано генераций до id={last_id}: изображений {images}, создано файлов {created}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: изображений {images}, создано файлов {created}, '
+            f'внешних URL пропущено {skipped}, ошибок {failed}'
+        ))
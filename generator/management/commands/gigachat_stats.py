@@ -0,0 +1,50 @@
+"""
+Команда для просмотра метрик обращений к GigaChat
+
+Использование:
+    python manage.py gigachat_stats
+"""
+
+from django.core.management.base import BaseCommand
+from generator.gigachat_api import get_client_pool_stats, get_rate_governor_stats
+from generator.usage_sink import usage_sink
+
+
+class Command(BaseCommand):
+    """
+    Показывает состояние общего регулятора частоты запросов, пула клиентов
+    и очереди записи расхода токенов
+    """
+    
+    help = 'Метрики регулятора частоты запросов к GigaChat и пула клиентов'
+    
+    def handle(self, *args, **options):
+        """
+        Основная логика команды
+        
+        Args:
+            *args: Позиционные аргументы
+            **options: Именованные аргументы
+        """
+        governor = get_rate_governor_stats()
+        
+        self.stdout.write('=' * 70)
+        self.stdout.write(self.style.SUCCESS('РЕГУЛЯТОР ЧАСТОТЫ ЗАПРОСОВ GIGACHAT'))
+        self.stdout.write('=' * 70)
+        self.stdout.write(f"Хранилище:              {governor['backend']}")
+        self.stdout.write(f"Текущая скорость:       {governor['rate']:.2f} запр/с")
+        self.stdout.write(f"Глубина очереди:        {governor['queue_depth']}")
+        self.stdout.write(f"Блокировка после 429:   {governor['blocked_for']:.1f} с")
+        self.stdout.write(f"Разрешено запросов:     {governor['acquired']}")
+        self.stdout.write(f"Ответов 429:            {governor['throttled']}")
+        self.stdout.write(f"Превышений ожидания:    {governor['timeouts']}")
+        self.stdout.write(f"Суммарное ожидание:     {governor['wait_seconds']} с")
+        
+        # Пул клиентов локален для процесса, здесь — только для этой команды
+        pool = get_client_pool_stats()
+        self.stdout.write('-' * 70)
+        self.stdout.write(f"Клиентов в пуле (этот процесс): {pool['active']}")
+        
+        sink = usage_sink.get_stats()
+        self.stdout.write(f"Очередь расхода токенов: {sink['mode']}, ожидают записи: {sink['pending']}")
+        self.stdout.write('=' * 70)
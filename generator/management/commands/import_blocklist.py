@@ -0,0 +1,139 @@
+"""
+Команда для массового импорта IP адресов и подсетей в блоклист
+
+Формат файла: одна запись на строку — адрес или сеть CIDR, через пробел,
+запятую или табуляцию необязательная причина; пустые строки и комментарии
+(#) пропускаются. Подходит для выгрузок подсетей по ASN и публичных списков.
+
+Использование:
+    python manage.py import_blocklist ranges.txt
+    python manage.py import_blocklist as12345.txt --source asn:AS12345 --replace
+    python manage.py import_blocklist scanners.txt --reason "Сканер" --expires-hours 72
+    cat ranges.txt | python manage.py import_blocklist -
+"""
+
+import re
+import sys
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from generator.ip_blocklist import bump_version, normalize_network
+from generator.models import BlockedNetwork
+
+_SPLIT_RE = re.compile(r'[\s,;]+')
+
+
+class Command(BaseCommand):
+    """
+    Импорт сетей пачками bulk_create (с обновлением существующих записей)
+    """
+
+    help = 'Импортирует IP адреса и подсети (CIDR) в блоклист'
+
+    def add_arguments(self, parser):
+        """
+        Добавляет аргументы командной строки
+
+        Args:
+            parser: Парсер аргументов командной строки
+        """
+        parser.add_argument('files', nargs='+', help='Файлы со списками сетей ("-" — stdin)')
+        parser.add_argument(
+            '--source',
+            default='import',
+            help='Имя списка, например asn:AS12345 (по умолчанию import)',
+        )
+        parser.add_argument('--reason', default='', help='Причина для записей без своей причины')
+        parser.add_argument(
+            '--expires-hours',
+            type=float,
+            default=None,
+            help='Срок блокировки в часах (по умолчанию бессрочно)',
+        )
+        parser.add_argument(
+            '--replace',
+            action='store_true',
+            help='Удалить записи этого источника, которых нет в файлах',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки bulk_create')
+
+    def _read_lines(self, path):
+        if path == '-':
+            yield from sys.stdin
+            return
+        try:
+            with open(path, encoding='utf-8') as handle:
+                yield from handle
+        except OSError as e:
+            raise CommandError(f'Не удалось прочитать {path}: {e}')
+
+    def _parse(self, paths, default_reason):
+        """Нормализованные сети → причина; число некорректных строк."""
+        networks = {}
+        invalid = 0
+        for path in paths:
+            for line in self._read_lines(path):
+                line = line.split('#', 1)[0].strip()
+                if not line:
+                    continue
+                parts = _SPLIT_RE.split(line, maxsplit=1)
+                try:
+                    network = normalize_network(parts[0])
+                except ValueError:
+                    invalid += 1
+                    continue
+                reason = parts[1].strip() if len(parts) > 1 else default_reason
+                networks[network] = reason[:255]
+        return networks, invalid
+
+    def handle(self, *args, **options):
+        """
+        Основная логика команды
+
+        Args:
+            *args: Позиционные аргументы
+            **options: Именованные аргументы из add_arguments
+        """
+        source = options['source']
+        batch_size = options['batch_size']
+        expires_at = None
+        if options['expires_hours']:
+            expires_at = timezone.now() + timedelta(hours=options['expires_hours'])
+
+        networks, invalid = self._parse(options['files'], options['reason'])
+        if not networks:
+            raise CommandError('В файлах нет корректных адресов или сетей')
+
+        items = list(networks.items())
+        for start in range(0, len(items), batch_size):
+            BlockedNetwork.objects.bulk_create(
+                [
+                    BlockedNetwork(network=network, reason=reason, source=source, expires_at=expires_at)
+                    for network, reason in items[start:start + batch_size]
+                ],
+                update_conflicts=True,
+                unique_fields=['network'],
+                update_fields=['reason', 'source', 'expires_at', 'updated_at'],
+            )
+
+        removed = 0
+        if options['replace']:
+            stale = [
+                pk for pk, network in BlockedNetwork.objects.filter(source=source).values_list('id', 'network')
+                if network not in networks
+            ]
+            for start in range(0, len(stale), batch_size):
+                removed += BlockedNetwork.objects.filter(id__in=stale[start:start + batch_size]).delete()[0]
+
+        # Массовые операции не вызывают save(): версию обновляем явно
+        bump_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано сетей: {len(networks)} (источник {source})'
+        ))
+        if removed:
+            self.stdout.write(f'Удалено устаревших записей: {removed}')
+        if invalid:
+            self.stdout.write(self.style.WARNING(f'Пропущено некорректных строк: {invalid}'))
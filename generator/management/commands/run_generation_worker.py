@@ -0,0 +1,76 @@
+"""
+Команда для запуска отдельного воркера очереди задач генерации
+
+Использование:
+    python manage.py run_generation_worker
+    python manage.py run_generation_worker --threads 4
+    python manage.py run_generation_worker --once
+
+Очередь включается GENERATION_JOBS_ENABLED=True. Пока
+GENERATION_JOBS_INPROCESS=False (по умолчанию), веб-процессы только
+ставят задачи в очередь, а выполняет их эта команда.
+"""
+
+from django.core.management.base import BaseCommand
+from generator.jobs import GenerationJobWorker, JOB_WORKER_THREADS, JOB_POLL_INTERVAL
+
+
+class Command(BaseCommand):
+    """
+    Команда для разбора очереди задач генерации в отдельном процессе
+    """
+    
+    help = 'Запускает воркер очереди задач генерации'
+    
+    def add_arguments(self, parser):
+        """
+        Добавляет аргументы командной строки
+        
+        Args:
+            parser: Парсер аргументов командной строки
+        """
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=JOB_WORKER_THREADS,
+            help='Количество потоков воркера',
+        )
+        
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=JOB_POLL_INTERVAL,
+            help='Интервал опроса очереди в секундах',
+        )
+        
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить одну задачу из очереди и завершиться',
+        )
+    
+    def handle(self, *args, **options):
+        """
+        Основная логика команды
+        
+        Args:
+            *args: Позиционные аргументы
+            **options: Именованные аргументы из add_arguments
+        """
+        worker = GenerationJobWorker(
+            threads=max(1, options['threads']),
+            poll_interval=options['poll_interval']
+        )
+        
+        if options['once']:
+            if worker.run_once():
+                self.stdout.write(self.style.SUCCESS('✓ Задача выполнена'))
+            else:
+                self.stdout.write('Очередь пуста')
+            return
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Воркер задач генерации запущен ({worker.threads} потоков). Ctrl+C для остановки.'
+        ))
+        worker.run_forever()
+        self.stdout.write('Воркер остановлен')
@@ -0,0 +1,64 @@
+"""
+Команда для ручного запуска пакетного обслуживания (generator/maintenance.py)
+
+Те же задачи, что выполняет планировщик, с выводом скорости. Прерванный
+запуск продолжается с контрольной точки; --restart начинает заново.
+
+Использование:
+    python manage.py run_maintenance renew_subscriptions
+    python manage.py run_maintenance delete_old_tokens --days 90 --batch-size 500 --pause 0.2
+    python manage.py run_maintenance delete_old_generations --restart
+"""
+
+from django.core.management.base import BaseCommand
+
+from generator import maintenance
+
+
+class Command(BaseCommand):
+    """
+    Запуск задачи обслуживания пачками с отчётом rows/sec
+    """
+
+    help = 'Запускает задачу обслуживания токенов/генераций пачками по pk и показывает скорость'
+
+    def add_arguments(self, parser):
+        """
+        Добавляет аргументы командной строки
+
+        Args:
+            parser: Парсер аргументов командной строки
+        """
+        parser.add_argument('job', choices=sorted(maintenance.JOBS), help='Задача обслуживания')
+        parser.add_argument('--batch-size', type=int, default=None, help='Строк в пачке (MAINTENANCE_BATCH_SIZE)')
+        parser.add_argument('--pause', type=float, default=None, help='Пауза между пачками, с (MAINTENANCE_BATCH_PAUSE)')
+        parser.add_argument('--days', type=int, default=90, help='Возраст записей для задач удаления, дней')
+        parser.add_argument('--restart', action='store_true', help='Не продолжать с контрольной точки')
+
+    def handle(self, *args, **options):
+        """
+        Основная логика команды
+
+        Args:
+            *args: Позиционные аргументы
+            **options: Именованные аргументы из add_arguments
+        """
+        job = options['job']
+        kwargs = {
+            'batch_size': options['batch_size'],
+            'pause': options['pause'],
+            'resume': not options['restart'],
+        }
+        if job.startswith('delete_'):
+            kwargs['days'] = options['days']
+
+        stats = maintenance.JOBS[job](**kwargs)
+
+        self.stdout.write('=' * 70)
+        self.stdout.write(self.style.SUCCESS(f'ОБСЛУЖИВАНИЕ: {job}'))
+        self.stdout.write('=' * 70)
+        if stats['resumed']:
+            self.stdout.write('Продолжение прерванного запуска с контрольной точки')
+        self.stdout.write(f"Строк: {stats['rows']}, пачек: {stats['batches']}")
+        self.stdout.write(f"Время: {stats['seconds']:.2f} с ({stats['rows_per_sec']:,.0f} строк/с)")
+        self.stdout.write('=' * 70)
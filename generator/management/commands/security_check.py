@@ -110,39 +110,34 @@ class Command(BaseCommand):
         self.stdout.write('')
 
         try:
-            # Получаем все ключи с заблокированными IP
-            blocked_keys = []
-            # Пробуем разные методы в зависимости от backend
-            try:
-                blocked_keys = list(cache.keys('blocked_ip:*'))
-            except AttributeError:
-                # LocMemCache не поддерживает keys(), используем iter_keys
-                try:
-                    blocked_keys = [k for k in cache._cache.keys() if k.startswith('blocked_ip:')]
-                except:
-                    pass
+            from django.db.models import Q
+            from django.utils import timezone
+            from generator.models import BlockedNetwork
 
-            if not blocked_keys:
+            blocked = BlockedNetwork.objects.filter(
+                Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now())
+            ).order_by('-created_at')
+            total = blocked.count()
+
+            if not total:
                 self.stdout.write(self.style.SUCCESS('  ✅ Нет заблокированных IP'))
                 return
 
             self.stdout.write(self.style.WARNING(
-                f'  ⚠️  Найдено заблокированных IP: {len(blocked_keys)}'
+                f'  ⚠️  Найдено заблокированных IP и сетей: {total}'
             ))
             self.stdout.write('')
 
-            for key in blocked_keys:
-                ip = key.replace('blocked_ip:', '')
-                block_data = cache.get(key)
-                
-                if block_data:
-                    self.stdout.write(f'  🔴 {ip}')
-                    if detailed and isinstance(block_data, dict):
-                        self.stdout.write(f'     Причина: {block_data.get("reason", "Unknown")}')
-                        self.stdout.write(f'     Заблокирован: {block_data.get("blocked_at", "Unknown")}')
-                        if 'expires_at' in block_data:
-                            self.stdout.write(f'     Истекает: {block_data.get("expires_at")}')
-                    self.stdout.write('')
+            for entry in blocked[:100]:
+                self.stdout.write(f'  🔴 {entry.network} ({entry.source})')
+                if detailed:
+                    self.stdout.write(f'     Причина: {entry.reason or "Unknown"}')
+                    self.stdout.write(f'     Заблокирован: {entry.created_at.isoformat()}')
+                    if entry.expires_at:
+                        self.stdout.write(f'     Истекает: {entry.expires_at.isoformat()}')
+                self.stdout.write('')
+            if total > 100:
+                self.stdout.write(f'  … и ещё {total - 100}')
 
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'  ❌ Ошибка при проверке: {e}'))
@@ -0,0 +1,94 @@
+"""
+Команда для перестроения и проверки фильтра Блума по токенам
+
+Показывает размер фильтра в памяти, заполнение, оценку доли
+ложноположительных ответов по заполнению и измеренную долю на случайных
+UUID, которых нет среди токенов.
+
+Использование:
+    python manage.py token_filter
+    python manage.py token_filter --rebuild
+    python manage.py token_filter --probes 500000
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from generator.token_filter import token_filter
+
+
+class Command(BaseCommand):
+    """
+    Перестроение фильтра и отчёт о его состоянии
+    """
+
+    help = 'Перестраивает фильтр Блума по токенам и показывает его размер и долю ошибок'
+
+    def add_arguments(self, parser):
+        """
+        Добавляет аргументы командной строки
+
+        Args:
+            parser: Парсер аргументов командной строки
+        """
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Перестроить фильтр по всем токенам в БД',
+        )
+        parser.add_argument(
+            '--probes',
+            type=int,
+            default=100000,
+            help='Количество случайных UUID для замера доли ложноположительных ответов',
+        )
+
+    def handle(self, *args, **options):
+        """
+        Основная логика команды
+
+        Args:
+            *args: Позиционные аргументы
+            **options: Именованные аргументы из add_arguments
+        """
+        self.stdout.write('=' * 70)
+        self.stdout.write(self.style.SUCCESS('ФИЛЬТР БЛУМА ПО ТОКЕНАМ'))
+        self.stdout.write('=' * 70)
+
+        if options['rebuild']:
+            started = time.perf_counter()
+            meta = token_filter.rebuild()
+            if meta is None:
+                self.stdout.write(self.style.WARNING('Фильтр выключен (TOKEN_FILTER_BACKEND=off)'))
+                return
+            self.stdout.write(
+                f"Перестроен за {time.perf_counter() - started:.2f} с: {meta['count']} токенов"
+            )
+
+        stats = token_filter.get_stats()
+        self.stdout.write(f"Хранилище: {stats['backend']}")
+        if 'm' not in stats:
+            self.stdout.write(self.style.WARNING('Фильтр не построен (используйте --rebuild)'))
+            return
+
+        self.stdout.write(f"Токенов: {stats['count']} (ёмкость {stats['capacity']})")
+        self.stdout.write(
+            f"Память: {stats['memory_bytes'] / 1024:.1f} КиБ "
+            f"({stats['m']} бит, k={stats['k']}, "
+            f"{stats['m'] / max(stats['count'], 1):.1f} бит на токен)"
+        )
+        if 'fill_ratio' in stats:
+            self.stdout.write(f"Заполнение: {stats['fill_ratio']:.2%}")
+            self.stdout.write(f"Оценка ложноположительных: {stats['estimated_fp_rate']:.2e}")
+
+        if options['probes'] > 0:
+            started = time.perf_counter()
+            measured = token_filter.measure_fp_rate(options['probes'])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"Измерено ложноположительных: {measured:.4%} "
+                f"на {options['probes']} случайных UUID "
+                f"({options['probes'] / elapsed:,.0f} проверок/с)"
+            )
+        self.stdout.write('=' * 70)
@@ -3,6 +3,7 @@ Management команда для разблокировки IP и токенов
 
 Использование:
     python manage.py unblock --ip 192.168.1.1
+    python manage.py unblock --ip 203.0.113.0/24
     python manage.py unblock --token uuid-токена
     python manage.py unblock --all
 """
@@ -18,7 +19,7 @@ class Command(BaseCommand):
         parser.add_argument(
             '--ip',
             type=str,
-            help='IP адрес для разблокировки',
+            help='IP адрес или сеть (CIDR) для разблокировки',
         )
         parser.add_argument(
             '--token',
@@ -56,11 +57,19 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS('=' * 70))
 
     def _unblock_ip(self, ip):
-        """Разблокировать конкретный IP"""
-        cache_key = f'blocked_ip:{ip}'
-        
+        """Разблокировать конкретный IP или подсеть"""
+        from generator.ip_blocklist import normalize_network
+        from generator.models import BlockedNetwork
+        from generator.security import BlockList
+
+        try:
+            network = normalize_network(ip)
+        except ValueError:
+            self.stdout.write(self.style.ERROR(f'❌ Некорректный IP или сеть: {ip}'))
+            return
+
         # Проверяем, заблокирован ли
-        block_data = cache.get(cache_key)
+        block_data = BlockedNetwork.objects.filter(network=network).first()
         if not block_data:
             self.stdout.write(self.style.WARNING(
                 f'⚠️  IP {ip} не был заблокирован'
@@ -68,15 +77,14 @@ class Command(BaseCommand):
             return
 
         # Показываем информацию о блокировке
-        if isinstance(block_data, dict):
-            self.stdout.write(f'📋 Информация о блокировке:')
-            self.stdout.write(f'   IP: {ip}')
-            self.stdout.write(f'   Причина: {block_data.get("reason", "Unknown")}')
-            self.stdout.write(f'   Заблокирован: {block_data.get("blocked_at", "Unknown")}')
-            self.stdout.write('')
+        self.stdout.write(f'📋 Информация о блокировке:')
+        self.stdout.write(f'   IP: {network}')
+        self.stdout.write(f'   Причина: {block_data.reason or "Unknown"}')
+        self.stdout.write(f'   Заблокирован: {block_data.created_at.isoformat()}')
+        self.stdout.write('')
 
         # Удаляем блокировку
-        cache.delete(cache_key)
+        BlockList.unblock_network(network)
         
         # Очищаем также счетчик неудачных попыток
         cache.delete(f'failed_attempts:ip:{ip}')
@@ -143,12 +151,20 @@ class Command(BaseCommand):
                     all_keys = []
 
             for key in all_keys:
-                if key.startswith('blocked_ip:'):
-                    ip_count += 1
-                elif key.startswith('blocked_token:'):
+                if key.startswith('blocked_token:'):
                     token_count += 1
                 cache.delete(key)
 
+            # IP и сети, заблокированные вручную и автоматически
+            # (импортированные списки снимаются через import_blocklist --replace)
+            from generator.ip_blocklist import bump_version, ip_blocklist
+            from generator.models import BlockedNetwork
+            ip_count, _ = BlockedNetwork.objects.filter(
+                source__in=[BlockedNetwork.SOURCE_AUTO, BlockedNetwork.SOURCE_MANUAL]
+            ).delete()
+            bump_version()
+            ip_blocklist.reload()
+
             # Очищаем также счетчики неудачных попыток
             try:
                 failed_keys = list(cache.keys('failed_attempts:*'))
@@ -9,6 +9,8 @@ from django.shortcuts import redirect
 from django.urls import reverse
 from django.utils import timezone
 from .models import TemporaryAccessToken
+from .session_sync import sync_session, token_session_values
+from .token_cache import get_request_token
 
 
 class TokenAccessMiddleware:
@@ -58,12 +60,9 @@ class TokenAccessMiddleware:
             # Нет токена - перенаправляем на страницу требования токена
             return redirect('token_required_page')
         
-        # Проверяем валидность токена в базе данных
+        # Проверяем валидность токена (кэш состояния токенов, затем БД)
         try:
-            token = TemporaryAccessToken.objects.get(
-                token=token_str,
-                is_active=True
-            )
+            token = get_request_token(request)
             
             # Проверяем срок действия
             if token.is_expired():
@@ -75,19 +74,9 @@ class TokenAccessMiddleware:
                 self._clear_session(request)
                 return redirect('invalid_token_page')
             
-            # Сохраняем токен в request для использования в views
-            request.token = token
-            
             # Обновляем сессию с информацией о лимитах токенов
-            request.session['token_type'] = token.token_type
-            request.session['gigachat_tokens_limit'] = token.gigachat_tokens_limit
-            request.session['gigachat_tokens_used'] = token.gigachat_tokens_used
-            request.session['openai_tokens_limit'] = token.openai_tokens_limit
-            request.session['openai_tokens_used'] = token.openai_tokens_used
-            
-            # Для обратной совместимости
-            request.session['is_demo'] = (token.token_type == 'DEMO_FREE' or token.token_type.startswith('HIDDEN'))
-            request.session['daily_generations_left'] = -1  # Устаревшее поле
+            # (только изменившиеся ключи — иначе сессия сохранялась бы на каждый запрос)
+            sync_session(request.session, token_session_values(token))
         
         except TemporaryAccessToken.DoesNotExist:
             # Токен не найден в базе - очищаем сессию
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:16
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0018_support_reviews'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('generator_type', models.CharField(default='gigachat', max_length=20, verbose_name='Генератор')),
+                ('payload', models.JSONField(default=dict, help_text='Параметры формы и флаги генерации')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=20)),
+                ('result', models.JSONField(blank=True, help_text='JSON-ответ в формате generator_view', null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('worker', models.CharField(blank=True, default='', help_text='Кто выполняет задачу', max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Задача генерации',
+                'verbose_name_plural': 'Задачи генерации',
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='generationjob',
+            name='token',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='generation_jobs', to='generator.temporaryaccesstoken'),
+        ),
+        migrations.AddField(
+            model_name='generationjob',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='generationjob',
+            index=models.Index(fields=['status', 'created_at'], name='generator_g_status_1abe85_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0019_generation_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gigachattokenusage',
+            name='from_cache',
+            field=models.BooleanField(default=False, help_text='Ответ взят из кэша ответов: токены не расходовались', verbose_name='Из кэша'),
+        ),
+    ]
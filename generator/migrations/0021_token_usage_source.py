@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0020_token_usage_from_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gigachattokenusage',
+            name='source',
+            field=models.CharField(choices=[('provider', 'Данные провайдера'), ('estimated', 'Оценка')], default='estimated', help_text='provider — usage из ответа API, estimated — локальная оценка', max_length=10, verbose_name='Источник расхода'),
+        ),
+    ]
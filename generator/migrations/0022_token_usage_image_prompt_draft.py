@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0021_token_usage_source'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='gigachattokenusage',
+            name='operation_type',
+            field=models.CharField(choices=[('TEXT_GENERATION', 'Генерация текста'), ('IMAGE_PROMPT', 'Промпт для изображения'), ('IMAGE_PROMPT_DRAFT', 'Черновик промпта изображения'), ('IMAGE_GENERATION', 'Генерация изображения')], max_length=20, verbose_name='Тип операции'),
+        ),
+    ]
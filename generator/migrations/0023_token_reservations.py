@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0022_token_usage_image_prompt_draft'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(choices=[('gigachat', 'GigaChat'), ('openai', 'OpenAI')], max_length=20, verbose_name='Провайдер')),
+                ('amount', models.IntegerField(verbose_name='Зарезервировано токенов')),
+                ('settled_tokens', models.IntegerField(default=0, verbose_name='Списано токенов')),
+                ('status', models.CharField(choices=[('active', 'Активен'), ('settled', 'Списан'), ('released', 'Освобождён'), ('expired', 'Просрочен')], default='active', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(blank=True, null=True, verbose_name='Истекает')),
+                ('closed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Резерв токенов',
+                'verbose_name_plural': 'Резервы токенов',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='temporaryaccesstoken',
+            name='gigachat_tokens_reserved',
+            field=models.IntegerField(default=0, help_text='Оценка расхода запросов GigaChat, которые ещё выполняются', verbose_name='Зарезервировано токенов GigaChat'),
+        ),
+        migrations.AddField(
+            model_name='temporaryaccesstoken',
+            name='openai_tokens_reserved',
+            field=models.IntegerField(default=0, help_text='Оценка расхода запросов OpenAI, которые ещё выполняются', verbose_name='Зарезервировано токенов OpenAI'),
+        ),
+        migrations.AddField(
+            model_name='tokenreservation',
+            name='token',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='generator.temporaryaccesstoken'),
+        ),
+        migrations.AddIndex(
+            model_name='tokenreservation',
+            index=models.Index(fields=['status', 'expires_at'], name='generator_t_status_ca2a13_idx'),
+        ),
+    ]
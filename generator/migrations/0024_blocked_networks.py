@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0023_token_reservations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlockedNetwork',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('network', models.CharField(max_length=49, unique=True, verbose_name='Сеть (CIDR)')),
+                ('reason', models.CharField(blank=True, default='', max_length=255, verbose_name='Причина')),
+                ('source', models.CharField(db_index=True, default='manual', help_text='manual, auto (SecurityMonitor) или имя списка при импорте, например asn:AS12345', max_length=64, verbose_name='Источник')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('expires_at', models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Истекает')),
+            ],
+            options={
+                'verbose_name': 'Заблокированная сеть',
+                'verbose_name_plural': 'Заблокированные сети',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0024_blocked_networks'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='generation',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='generation_wall_idx'),
+        ),
+    ]
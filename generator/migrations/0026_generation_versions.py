@@ -0,0 +1,137 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:13
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+VERSION_SEPARATOR = re.compile(r'\s*--- Перегенерация \d+ ---\s*')
+BATCH_SIZE = 1000
+
+
+def split_legacy_blobs(apps, schema_editor):
+    """
+    Переносит версии текста и изображения из склеенных строк в дочерние таблицы
+
+    result: "текст\n\n--- Перегенерация N ---\n\nтекст..." → первая версия
+    остаётся в result, остальные становятся GenerationVersion (номера с 2).
+    image_url: "url1|url2|..." → url1 остаётся, остальные — GenerationImage.
+    """
+    Generation = apps.get_model('generator', 'Generation')
+    GenerationVersion = apps.get_model('generator', 'GenerationVersion')
+    GenerationImage = apps.get_model('generator', 'GenerationImage')
+
+    legacy = Generation.objects.filter(
+        models.Q(result__contains='--- Перегенерация') | models.Q(image_url__contains='|')
+    ).only('id', 'result', 'image_url').order_by('id')
+    last_id = 0
+    while True:
+        batch = list(legacy.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1].id
+        versions, images = [], []
+        for gen in batch:
+            texts = VERSION_SEPARATOR.split(gen.result or '')
+            gen.result = texts[0].strip() if len(texts) > 1 else gen.result
+            versions.extend(
+                GenerationVersion(generation_id=gen.id, number=number, text=text.strip())
+                for number, text in enumerate(texts[1:], start=2)
+            )
+            urls = [url.strip() for url in (gen.image_url or '').split('|') if url.strip()]
+            if urls:
+                gen.image_url = urls[0]
+                images.extend(
+                    GenerationImage(generation_id=gen.id, position=position, url=url)
+                    for position, url in enumerate(urls[1:], start=2)
+                )
+        Generation.objects.bulk_update(batch, ['result', 'image_url'])
+        GenerationVersion.objects.bulk_create(versions)
+        GenerationImage.objects.bulk_create(images)
+
+
+def join_legacy_blobs(apps, schema_editor):
+    """
+    Обратная миграция: склеивает версии и изображения обратно в result и image_url
+    """
+    Generation = apps.get_model('generator', 'Generation')
+    GenerationVersion = apps.get_model('generator', 'GenerationVersion')
+    GenerationImage = apps.get_model('generator', 'GenerationImage')
+
+    ids = set(GenerationVersion.objects.values_list('generation_id', flat=True))
+    ids |= set(GenerationImage.objects.values_list('generation_id', flat=True))
+    ids = sorted(ids)
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch = list(Generation.objects.filter(id__in=ids[start:start + BATCH_SIZE]).only('id', 'result', 'image_url'))
+        versions, images = {}, {}
+        for version in GenerationVersion.objects.filter(generation_id__in=[gen.id for gen in batch]).order_by('number'):
+            versions.setdefault(version.generation_id, []).append(version)
+        for image in GenerationImage.objects.filter(generation_id__in=[gen.id for gen in batch]).order_by('position'):
+            images.setdefault(image.generation_id, []).append(image.url)
+        for gen in batch:
+            for version in versions.get(gen.id, []):
+                gen.result += f"\n\n--- Перегенерация {version.number - 1} ---\n\n{version.text}"
+            gen.image_url = '|'.join(([gen.image_url] if gen.image_url else []) + images.get(gen.id, []))
+        Generation.objects.bulk_update(batch, ['result', 'image_url'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0025_generation_wall_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(verbose_name='Позиция')),
+                ('url', models.CharField(max_length=512, verbose_name='URL изображения')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Изображение генерации',
+                'verbose_name_plural': 'Изображения генераций',
+                'ordering': ['position'],
+            },
+        ),
+        migrations.CreateModel(
+            name='GenerationVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField(verbose_name='Номер версии')),
+                ('text', models.TextField(verbose_name='Текст')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Версия текста',
+                'verbose_name_plural': 'Версии текста',
+                'ordering': ['number'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='generation',
+            name='image_url',
+            field=models.CharField(blank=True, help_text='Первое изображение; остальные — в GenerationImage', max_length=512, null=True, verbose_name='URL изображения'),
+        ),
+        migrations.AddField(
+            model_name='generationimage',
+            name='generation',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='images', to='generator.generation', verbose_name='Генерация'),
+        ),
+        migrations.AddField(
+            model_name='generationversion',
+            name='generation',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='versions', to='generator.generation', verbose_name='Генерация'),
+        ),
+        migrations.AddConstraint(
+            model_name='generationimage',
+            constraint=models.UniqueConstraint(fields=('generation', 'position'), name='generation_image_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='generationversion',
+            constraint=models.UniqueConstraint(fields=('generation', 'number'), name='generation_version_unique'),
+        ),
+        migrations.RunPython(split_legacy_blobs, join_legacy_blobs),
+    ]
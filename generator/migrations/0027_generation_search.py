@@ -0,0 +1,88 @@
+# Полнотекстовый индекс генераций (generator/generation_search.py)
+
+from django.db import migrations
+
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE generator_generation ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian'::regconfig, coalesce(topic, '')), 'A') ||
+        setweight(to_tsvector('russian'::regconfig, coalesce(result, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX generation_search_idx ON generator_generation USING GIN (search_vector)",
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS generation_search_idx",
+    "ALTER TABLE generator_generation DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE generator_generation_fts USING fts5(
+        topic, result,
+        content='generator_generation', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='3 4 5 6 7 8'
+    )
+    """,
+    """
+    CREATE TRIGGER generator_generation_fts_ai AFTER INSERT ON generator_generation BEGIN
+        INSERT INTO generator_generation_fts(rowid, topic, result) VALUES (new.id, new.topic, new.result);
+    END
+    """,
+    """
+    CREATE TRIGGER generator_generation_fts_ad AFTER DELETE ON generator_generation BEGIN
+        INSERT INTO generator_generation_fts(generator_generation_fts, rowid, topic, result)
+        VALUES ('delete', old.id, old.topic, old.result);
+    END
+    """,
+    """
+    CREATE TRIGGER generator_generation_fts_au AFTER UPDATE OF topic, result ON generator_generation BEGIN
+        INSERT INTO generator_generation_fts(generator_generation_fts, rowid, topic, result)
+        VALUES ('delete', old.id, old.topic, old.result);
+        INSERT INTO generator_generation_fts(rowid, topic, result) VALUES (new.id, new.topic, new.result);
+    END
+    """,
+    "INSERT INTO generator_generation_fts(generator_generation_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS generator_generation_fts_ai",
+    "DROP TRIGGER IF EXISTS generator_generation_fts_ad",
+    "DROP TRIGGER IF EXISTS generator_generation_fts_au",
+    "DROP TABLE IF EXISTS generator_generation_fts",
+]
+
+
+def _run(schema_editor, statements):
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Создаёт индекс: GIN по tsvector (PostgreSQL) или FTS5 с триггерами (SQLite)
+
+    Для других БД поиск работает через icontains, индекс не создаётся.
+    """
+    _run(schema_editor, {'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD})
+
+
+def drop_search_index(apps, schema_editor):
+    """
+    Обратная миграция: удаляет индекс
+    """
+    _run(schema_editor, {'postgresql': POSTGRES_REVERSE, 'sqlite': SQLITE_REVERSE})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0026_generation_versions'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
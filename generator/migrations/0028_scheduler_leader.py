@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:25
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0027_generation_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchedulerLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True, verbose_name='Имя аренды')),
+                ('holder', models.CharField(blank=True, default='', max_length=128, verbose_name='Владелец')),
+                ('acquired_at', models.DateTimeField(blank=True, null=True, verbose_name='Получена')),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True, verbose_name='Последнее продление')),
+                ('expires_at', models.DateTimeField(verbose_name='Истекает')),
+            ],
+            options={
+                'verbose_name': 'Аренда лидерства',
+                'verbose_name_plural': 'Аренды лидерства',
+            },
+        ),
+        migrations.CreateModel(
+            name='SchedulerRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.CharField(max_length=64, verbose_name='Задача')),
+                ('holder', models.CharField(max_length=128, verbose_name='Процесс')),
+                ('status', models.CharField(choices=[('running', 'Выполняется'), ('success', 'Успешно'), ('failed', 'Ошибка')], default='running', max_length=16, verbose_name='Статус')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Начало')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Окончание')),
+                ('result', models.IntegerField(blank=True, null=True, verbose_name='Результат')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Ошибка')),
+            ],
+            options={
+                'verbose_name': 'Запуск задачи планировщика',
+                'verbose_name_plural': 'Запуски задач планировщика',
+                'ordering': ['-started_at', '-id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='schedulerrun',
+            index=models.Index(fields=['job_id', '-started_at'], name='scheduler_run_job_idx'),
+        ),
+    ]
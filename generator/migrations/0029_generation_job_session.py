@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0028_scheduler_leader'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='session_key',
+            field=models.CharField(blank=True, default='', help_text='Сессия, создавшая задачу (владелец задачи без токена и пользователя)', max_length=40),
+        ),
+    ]
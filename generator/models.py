@@ -4,18 +4,32 @@ Django модели для системы генерации контента
 Модели:
 - UserProfile: Расширенный профиль пользователя
 - Generation: Сгенерированный контент (текст + изображения)
+- GenerationVersion: Перегенерированные версии текста генерации
+- GenerationImage: Дополнительные изображения генерации
 - GenerationTemplate: Сохраненные шаблоны настроек генерации
 - TemporaryAccessToken: Временные токены доступа для анонимных пользователей
+- TokenReservation: Резервы токенов на время запроса к провайдеру
 - GigaChatTokenUsage: Отслеживание расхода токенов GigaChat
 - SubscriptionButtonClick: Отслеживание кликов по кнопке подписки
 - Payment: Платежи пользователей (ЮКасса, Тинькофф)
+- GenerationJob: Фоновые задачи генерации (очередь)
+- BlockedNetwork: Заблокированные IP адреса и подсети (CIDR)
+- SchedulerLease: Аренда лидерства планировщика (выборы лидера через БД)
+- SchedulerRun: История запусков задач планировщика
 """
 
 import uuid
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Greatest
 from django.utils import timezone
 
+from .token_cache import invalidate_token_state
+from .token_filter import token_filter
+
 
 class UserProfile(models.Model):
     """
@@ -41,9 +55,10 @@ class Generation(models.Model):
     Сгенерированный контент пользователя
     
     Хранит результаты генерации текста и изображений.
-    Поддерживает множественные версии через разделители:
-    - Текст: разделен "--- Перегенерация N ---"
-    - Изображения: разделены символом "|"
+    result и image_url — первая версия текста и первое изображение;
+    перегенерации хранятся отдельными строками:
+    - Текст: GenerationVersion (номера с 2)
+    - Изображения: GenerationImage (позиции с 2)
     """
     user = models.ForeignKey(
         User, 
@@ -59,8 +74,8 @@ class Generation(models.Model):
         max_length=512, 
         blank=True, 
         null=True,
-        verbose_name="URL изображения(й)",
-        help_text="Множественные URL разделены символом |"
+        verbose_name="URL изображения",
+        help_text="Первое изображение; остальные — в GenerationImage"
     )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
 
@@ -68,10 +83,135 @@ class Generation(models.Model):
         verbose_name = "Генерация"
         verbose_name_plural = "Генерации"
         ordering = ['-created_at']
+        indexes = [
+            # Курсорная пагинация стены: WHERE user ... ORDER BY created_at DESC, id DESC
+            models.Index(fields=['user', '-created_at', '-id'], name='generation_wall_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username if self.user else 'Аноним'}: {self.topic[:30]}..."
 
+    def _next_number(self, related, field):
+        last = related.order_by(f'-{field}').values_list(field, flat=True).first()
+        return (last or 1) + 1
+
+    def add_version(self, text):
+        """
+        Добавляет перегенерированную версию текста
+
+        Одна вставка строки вместо перезаписи растущего текста result.
+        Номер версии уникален в пределах генерации; при одновременной
+        перегенерации вставка повторяется со следующим номером.
+
+        Args:
+            text: Новый текст
+
+        Returns:
+            GenerationVersion
+        """
+        for _ in range(3):
+            try:
+                with transaction.atomic():
+                    return GenerationVersion.objects.create(
+                        generation=self, number=self._next_number(self.versions, 'number'), text=text
+                    )
+            except IntegrityError:
+                continue
+        raise IntegrityError(f"Не удалось добавить версию текста генерации {self.pk}")
+
+    def add_image(self, url):
+        """
+        Добавляет изображение: первое сохраняется в image_url, остальные — в GenerationImage
+
+        Args:
+            url: URL изображения
+
+        Returns:
+            GenerationImage или None (первое изображение)
+        """
+        if not self.image_url:
+            self.image_url = url
+            self.save(update_fields=['image_url'])
+            return None
+        for _ in range(3):
+            try:
+                with transaction.atomic():
+                    return GenerationImage.objects.create(
+                        generation=self, position=self._next_number(self.images, 'position'), url=url
+                    )
+            except IntegrityError:
+                continue
+        raise IntegrityError(f"Не удалось добавить изображение генерации {self.pk}")
+
+    def text_versions(self):
+        """
+        Все версии текста: [(номер, текст), ...], первая — result
+
+        Использует prefetch_related('versions'), если он был сделан.
+        """
+        return [(1, self.result)] + [(version.number, version.text) for version in self.versions.all()]
+
+    def image_urls(self):
+        """Все URL изображений по порядку (использует prefetch_related('images'))."""
+        urls = [self.image_url] if self.image_url else []
+        return urls + [image.url for image in self.images.all()]
+
+
+class GenerationVersion(models.Model):
+    """
+    Перегенерированная версия текста генерации
+
+    Версия 1 — Generation.result, здесь хранятся версии начиная со 2.
+    """
+    generation = models.ForeignKey(
+        Generation,
+        on_delete=models.CASCADE,
+        related_name='versions',
+        verbose_name="Генерация"
+    )
+    number = models.PositiveIntegerField(verbose_name="Номер версии")
+    text = models.TextField(verbose_name="Текст")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+
+    class Meta:
+        verbose_name = "Версия текста"
+        verbose_name_plural = "Версии текста"
+        ordering = ['number']
+        constraints = [
+            models.UniqueConstraint(fields=['generation', 'number'], name='generation_version_unique'),
+        ]
+
+    def __str__(self):
+        return f"Генерация {self.generation_id}, версия {self.number}"
+
+
+class GenerationImage(models.Model):
+    """
+    Дополнительное изображение генерации
+
+    Первое изображение — Generation.image_url, здесь хранятся позиции начиная со 2.
+    """
+    generation = models.ForeignKey(
+        Generation,
+        on_delete=models.CASCADE,
+        related_name='images',
+        verbose_name="Генерация"
+    )
+    position = models.PositiveIntegerField(verbose_name="Позиция")
+    url = models.CharField(max_length=512, verbose_name="URL изображения")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+
+    class Meta:
+        verbose_name = "Изображение генерации"
+        verbose_name_plural = "Изображения генераций"
+        ordering = ['position']
+        constraints = [
+            models.UniqueConstraint(fields=['generation', 'position'], name='generation_image_unique'),
+        ]
+
+    def __str__(self):
+        return f"Генерация {self.generation_id}, изображение {self.position}"
+
 
 class GenerationTemplate(models.Model):
     """
@@ -178,6 +318,18 @@ class TemporaryAccessToken(models.Model):
         help_text="Текущее использование токенов OpenAI"
     )
     
+    # Резервы под выполняющиеся запросы (TokenReservation)
+    gigachat_tokens_reserved = models.IntegerField(
+        default=0,
+        verbose_name="Зарезервировано токенов GigaChat",
+        help_text="Оценка расхода запросов GigaChat, которые ещё выполняются"
+    )
+    openai_tokens_reserved = models.IntegerField(
+        default=0,
+        verbose_name="Зарезервировано токенов OpenAI",
+        help_text="Оценка расхода запросов OpenAI, которые ещё выполняются"
+    )
+    
     # Подписки (для платных тарифов)
     subscription_start = models.DateTimeField(
         null=True,
@@ -240,6 +392,19 @@ class TemporaryAccessToken(models.Model):
     def __str__(self):
         return f"{self.get_token_type_display()} - {self.token} (истекает {self.expires_at.strftime('%d.%m.%Y')})"
     
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        invalidate_token_state(self.token)
+        if adding:
+            token_filter.add(self.token, pk=self.pk)
+    
+    def delete(self, *args, **kwargs):
+        token = self.token
+        result = super().delete(*args, **kwargs)
+        invalidate_token_state(token)
+        return result
+    
     def is_expired(self):
         """Проверяет, истек ли срок действия токена"""
         # DEVELOPER и бессрочные токены никогда не истекают
@@ -261,8 +426,8 @@ class TemporaryAccessToken(models.Model):
         if self.gigachat_tokens_limit == -1:
             return True, None
         
-        # Проверяем лимит
-        if self.gigachat_tokens_used >= self.gigachat_tokens_limit:
+        # Проверяем лимит с учётом резервов выполняющихся запросов
+        if self.gigachat_tokens_used + self.gigachat_tokens_reserved >= self.gigachat_tokens_limit:
             return False, "Лимит токенов GigaChat исчерпан"
         
         return True, None
@@ -285,12 +450,48 @@ class TemporaryAccessToken(models.Model):
         if self.openai_tokens_limit == -1:
             return True, None
         
-        # Проверяем лимит
-        if self.openai_tokens_used >= self.openai_tokens_limit:
+        # Проверяем лимит с учётом резервов выполняющихся запросов
+        if self.openai_tokens_used + self.openai_tokens_reserved >= self.openai_tokens_limit:
             return False, "Лимит токенов OpenAI исчерпан"
         
         return True, None
     
+    # Тарифы, для которых расход не считается
+    UNMETERED_GIGACHAT_TYPES = ('HIDDEN_14D', 'HIDDEN_30D', 'DEVELOPER', 'UNLIMITED')
+    UNMETERED_OPENAI_TYPES = ('HIDDEN_14D', 'HIDDEN_30D', 'DEVELOPER')
+    
+    def meter_tokens(self, provider, tokens_count):
+        """
+        Атомарно списывает токены одним условным UPDATE
+        
+        UPDATE ... SET used = used + n WHERE limit = -1 OR used + n <= limit
+        затрагивает только счётчик, поэтому параллельные генерации одного
+        токена не теряют списания и не превышают лимит.
+        
+        Args:
+            provider (str): 'gigachat' или 'openai'
+            tokens_count (int): Количество использованных токенов
+        
+        Returns:
+            int: Новый остаток токенов (-1 для безлимита) или None, если лимит превышен
+        """
+        used_field = f'{provider}_tokens_used'
+        limit_field = f'{provider}_tokens_limit'
+        tokens_count = max(int(tokens_count or 0), 0)
+        
+        updated = TemporaryAccessToken.objects.filter(pk=self.pk).filter(
+            models.Q(**{limit_field: -1}) |
+            models.Q(**{f'{limit_field}__gte': models.F(used_field) + tokens_count})
+        ).update(**{used_field: models.F(used_field) + tokens_count})
+        if not updated:
+            return None
+        invalidate_token_state(self.token)
+        
+        # Значения после UPDATE (в том числе списания параллельных запросов)
+        self.refresh_from_db(fields=[used_field, limit_field])
+        limit = getattr(self, limit_field)
+        return -1 if limit == -1 else limit - getattr(self, used_field)
+    
     def consume_gigachat_tokens(self, tokens_count):
         """
         Увеличивает счётчик использованных токенов GigaChat.
@@ -302,20 +503,9 @@ class TemporaryAccessToken(models.Model):
         Returns:
             bool: True если успешно, False если превышен лимит
         """
-        if self.token_type in ('HIDDEN_14D', 'HIDDEN_30D', 'DEVELOPER', 'UNLIMITED'):
+        if self.token_type in self.UNMETERED_GIGACHAT_TYPES:
             return True  # не считаем для скрытых, разработчика и безлимита
-        if self.gigachat_tokens_limit == -1:
-            # Безлимит - просто увеличиваем счётчик
-            self.gigachat_tokens_used += tokens_count
-            self.save()
-            return True
-        
-        if self.gigachat_tokens_used + tokens_count > self.gigachat_tokens_limit:
-            return False
-        
-        self.gigachat_tokens_used += tokens_count
-        self.save()
-        return True
+        return self.meter_tokens('gigachat', tokens_count) is not None
     
     def consume_openai_tokens(self, tokens_count):
         """
@@ -328,23 +518,93 @@ class TemporaryAccessToken(models.Model):
         Returns:
             bool: True если успешно, False если превышен лимит
         """
-        if self.token_type in ('HIDDEN_14D', 'HIDDEN_30D', 'DEVELOPER'):
+        if self.token_type in self.UNMETERED_OPENAI_TYPES:
             return True  # не считаем для скрытых и разработчика
-        if self.openai_tokens_limit == -1:
-            # Безлимит - просто увеличиваем счётчик
-            self.openai_tokens_used += tokens_count
-            self.save()
-            return True
-        
         if self.openai_tokens_limit == 0:
             return False
+        return self.meter_tokens('openai', tokens_count) is not None
+    
+    def reserve_tokens(self, provider, estimate, ttl=None):
+        """
+        Резервирует верхнюю оценку расхода до вызова провайдера
         
-        if self.openai_tokens_used + tokens_count > self.openai_tokens_limit:
-            return False
+        UPDATE ... SET reserved = reserved + n WHERE used + reserved + n <= limit
+        отклоняет запрос, который мог бы превысить лимит, ещё до оплаченного
+        обращения к GigaChat/OpenAI. Перед резервом освобождаются просроченные
+        резервы этого токена. После ответа провайдера резерв закрывается
+        settle_reservation (или release_reservation при ошибке); незакрытый
+        резерв освобождается через ttl секунд.
         
-        self.openai_tokens_used += tokens_count
-        self.save()
-        return True
+        Args:
+            provider (str): 'gigachat' или 'openai'
+            estimate (int): Верхняя оценка расхода в токенах
+            ttl (int): Время жизни резерва, секунды (по умолчанию TOKEN_RESERVATION_TTL)
+        
+        Returns:
+            TokenReservation: Резерв (для безлимита и неучитываемых тарифов —
+            без записи в БД) или None, если остатка не хватает
+        """
+        reserved_field = f'{provider}_tokens_reserved'
+        used_field = f'{provider}_tokens_used'
+        limit_field = f'{provider}_tokens_limit'
+        estimate = max(int(estimate or 0), 0)
+        unmetered = self.UNMETERED_GIGACHAT_TYPES if provider == 'gigachat' else self.UNMETERED_OPENAI_TYPES
+        limit = getattr(self, limit_field)
+        
+        if provider == 'openai' and limit == 0 and self.token_type not in unmetered:
+            return None
+        if self.token_type in unmetered or limit == -1:
+            # Лимита нет — резервировать нечего, расход спишет settle_reservation
+            return TokenReservation(token=self, provider=provider, amount=0)
+        
+        TokenReservation.release_expired(token=self)
+        now = timezone.now()
+        ttl = ttl or getattr(settings, 'TOKEN_RESERVATION_TTL', 300)
+        with transaction.atomic():
+            updated = TemporaryAccessToken.objects.filter(pk=self.pk).filter(
+                models.Q(**{limit_field: -1}) |
+                models.Q(**{f'{limit_field}__gte': models.F(used_field) + models.F(reserved_field) + estimate})
+            ).update(**{reserved_field: models.F(reserved_field) + estimate})
+            if not updated:
+                return None
+            invalidate_token_state(self.token)
+            return TokenReservation.objects.create(
+                token=self,
+                provider=provider,
+                amount=estimate,
+                expires_at=now + timedelta(seconds=ttl),
+            )
+    
+    def settle_reservation(self, reservation, tokens_count):
+        """
+        Закрывает резерв фактическим расходом
+        
+        Одним UPDATE снимает резерв и списывает фактический расход. Расход
+        списывается, даже если он больше оценки или резерв уже просрочен:
+        ответ провайдера уже оплачен.
+        
+        Args:
+            reservation (TokenReservation): Резерв из reserve_tokens
+            tokens_count (int): Фактически использованные токены
+        
+        Returns:
+            bool: True если расход списан, False если резерв уже закрыт
+            (или, без резерва в БД, превышен лимит)
+        """
+        if reservation.pk is None:
+            consume = self.consume_gigachat_tokens if reservation.provider == 'gigachat' else self.consume_openai_tokens
+            return consume(tokens_count)
+        return reservation.close(TokenReservation.STATUS_SETTLED, tokens_count)
+    
+    def release_reservation(self, reservation):
+        """
+        Освобождает резерв без списания (запрос к провайдеру не удался)
+        
+        Args:
+            reservation (TokenReservation): Резерв из reserve_tokens
+        """
+        if reservation.pk is not None:
+            reservation.close(TokenReservation.STATUS_RELEASED, 0)
     
     def can_generate(self):
         """
@@ -376,7 +636,14 @@ class TemporaryAccessToken(models.Model):
         self.last_used = timezone.now()
         if ip_address:
             self.current_ip = ip_address
-        self.save()
+        # Без полного save(): иначе устаревшие счётчики токенов из памяти
+        # затрут списания параллельных генераций
+        TemporaryAccessToken.objects.filter(pk=self.pk).update(
+            total_used=models.F('total_used') + 1,
+            last_used=self.last_used,
+            current_ip=self.current_ip,
+        )
+        invalidate_token_state(self.token)
     
     def renew_subscription(self):
         """
@@ -402,8 +669,123 @@ class TemporaryAccessToken(models.Model):
             from datetime import timedelta
             self.next_renewal = timezone.now() + timedelta(days=tariff['duration_days'])
         
-        self.save()
+        # Без полного save(): резервы выполняющихся запросов не затираются
+        self.save(update_fields=['gigachat_tokens_used', 'openai_tokens_used', 'next_renewal'])
+        return True
+
+
+class TokenReservation(models.Model):
+    """
+    Резерв токенов на время запроса к GigaChat/OpenAI
+    
+    Создаётся TemporaryAccessToken.reserve_tokens до вызова провайдера и
+    закрывается фактическим расходом (settle_reservation) или без списания
+    (release_reservation). Резервы, которые никто не закрыл (процесс упал,
+    клиент отключился), освобождаются release_expired.
+    """
+    STATUS_ACTIVE = 'active'
+    STATUS_SETTLED = 'settled'
+    STATUS_RELEASED = 'released'
+    STATUS_EXPIRED = 'expired'
+    STATUS_CHOICES = (
+        (STATUS_ACTIVE, 'Активен'),
+        (STATUS_SETTLED, 'Списан'),
+        (STATUS_RELEASED, 'Освобождён'),
+        (STATUS_EXPIRED, 'Просрочен'),
+    )
+    PROVIDER_CHOICES = (
+        ('gigachat', 'GigaChat'),
+        ('openai', 'OpenAI'),
+    )
+    
+    token = models.ForeignKey(
+        TemporaryAccessToken,
+        on_delete=models.CASCADE,
+        related_name='reservations'
+    )
+    provider = models.CharField(max_length=20, choices=PROVIDER_CHOICES, verbose_name="Провайдер")
+    amount = models.IntegerField(verbose_name="Зарезервировано токенов")
+    settled_tokens = models.IntegerField(default=0, verbose_name="Списано токенов")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_ACTIVE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(null=True, blank=True, verbose_name="Истекает")
+    closed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "Резерв токенов"
+        verbose_name_plural = "Резервы токенов"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.provider}: {self.amount} ({self.get_status_display()})"
+    
+    def close(self, status, tokens_count=0):
+        """
+        Закрывает резерв: снимает его с токена и списывает tokens_count
+        
+        Статус меняется условным UPDATE, поэтому резерв закрывается ровно
+        один раз, даже если settle и release_expired выполняются параллельно.
+        Просроченный резерв (его сумма уже снята) при settle только списывает
+        фактический расход.
+        
+        Args:
+            status (str): STATUS_SETTLED, STATUS_RELEASED или STATUS_EXPIRED
+            tokens_count (int): Фактически использованные токены
+        
+        Returns:
+            bool: True, если резерв был закрыт этим вызовом
+        """
+        tokens_count = max(int(tokens_count or 0), 0)
+        reserved_field = f'{self.provider}_tokens_reserved'
+        used_field = f'{self.provider}_tokens_used'
+        now = timezone.now()
+        reservations = TokenReservation.objects.filter(pk=self.pk)
+        token_changes = {
+            reserved_field: Greatest(models.F(reserved_field) - self.amount, 0),
+            used_field: models.F(used_field) + tokens_count,
+        }
+        with transaction.atomic():
+            closed = reservations.filter(status=self.STATUS_ACTIVE).update(
+                status=status, settled_tokens=tokens_count, closed_at=now
+            )
+            if not closed and status == self.STATUS_SETTLED and tokens_count:
+                # Запрос дольше TTL: резерв уже снят, списываем только расход
+                closed = reservations.filter(status=self.STATUS_EXPIRED).update(
+                    status=status, settled_tokens=tokens_count, closed_at=now
+                )
+                token_changes.pop(reserved_field)
+            if not closed:
+                return False
+            TemporaryAccessToken.objects.filter(pk=self.token_id).update(**token_changes)
+        invalidate_token_state(self.token.token)
+        self.status = status
+        self.settled_tokens = tokens_count
+        self.closed_at = now
         return True
+    
+    @classmethod
+    def release_expired(cls, token=None, now=None):
+        """
+        Освобождает резервы, которые не были закрыты до expires_at
+        
+        Args:
+            token: Только резервы этого токена (по умолчанию — все)
+            now: Текущее время (для тестов)
+        
+        Returns:
+            int: Число освобождённых резервов
+        """
+        queryset = cls.objects.filter(status=cls.STATUS_ACTIVE, expires_at__lt=now or timezone.now())
+        if token is not None:
+            queryset = queryset.filter(token=token)
+        released = 0
+        queryset = queryset.select_related('token').only('id', 'provider', 'amount', 'token__token')
+        for reservation in queryset:
+            released += reservation.close(cls.STATUS_EXPIRED)
+        return released
 
 
 class GigaChatTokenUsage(models.Model):
@@ -412,15 +794,21 @@ class GigaChatTokenUsage(models.Model):
     
     Хранит информацию о каждом запросе к GigaChat API:
     - Тип операции (текст, промпт изображения, генерация изображения)
-    - Количество использованных токенов (оценка)
+    - Количество использованных токенов (из ответа API или оценка)
     - Связь с генерацией и пользователем
     """
     OPERATION_TYPES = (
         ('TEXT_GENERATION', 'Генерация текста'),
         ('IMAGE_PROMPT', 'Промпт для изображения'),
+        ('IMAGE_PROMPT_DRAFT', 'Черновик промпта изображения'),
         ('IMAGE_GENERATION', 'Генерация изображения'),
     )
     
+    SOURCE_CHOICES = (
+        ('provider', 'Данные провайдера'),
+        ('estimated', 'Оценка'),
+    )
+    
     # Связь с генерацией (опционально)
     generation = models.ForeignKey(
         Generation,
@@ -501,6 +889,18 @@ class GigaChatTokenUsage(models.Model):
         null=True,
         verbose_name="Платформа"
     )
+    from_cache = models.BooleanField(
+        default=False,
+        verbose_name="Из кэша",
+        help_text="Ответ взят из кэша ответов: токены не расходовались"
+    )
+    source = models.CharField(
+        max_length=10,
+        choices=SOURCE_CHOICES,
+        default='estimated',
+        verbose_name="Источник расхода",
+        help_text="provider — usage из ответа API, estimated — локальная оценка"
+    )
     
     class Meta:
         verbose_name = "Использование токенов GigaChat"
@@ -528,9 +928,9 @@ class GigaChatTokenUsage(models.Model):
             operation_type: Тип операции (опционально)
         
         Returns:
-            int: Общее количество токенов
+            int: Общее количество токенов (без попаданий в кэш ответов)
         """
-        queryset = cls.objects.all()
+        queryset = cls.objects.filter(from_cache=False)
         
         if start_date:
             queryset = queryset.filter(created_at__gte=start_date)
@@ -557,7 +957,10 @@ class GigaChatTokenUsage(models.Model):
         from datetime import timedelta
         cutoff_date = timezone.now() - timedelta(days=days)
         
-        queryset = cls.objects.filter(created_at__gte=cutoff_date)
+        period = cls.objects.filter(created_at__gte=cutoff_date)
+        # Попадания в кэш ответов не расходуют токены и считаются отдельно
+        cached = period.filter(from_cache=True)
+        queryset = period.filter(from_cache=False)
         
         total_tokens = queryset.aggregate(
             total=models.Sum('estimated_total_tokens')
@@ -579,6 +982,10 @@ class GigaChatTokenUsage(models.Model):
             'total_tokens': total_tokens,
             'total_requests': queryset.count(),
             'by_operation': by_operation,
+            'cache_hits': cached.count(),
+            'tokens_saved': cached.aggregate(
+                total=models.Sum('estimated_total_tokens')
+            )['total'] or 0,
             'period_days': days
         }
 
@@ -1039,3 +1446,172 @@ class SupportChat(models.Model):
     def __str__(self):
         return f"Чат #{self.id} — user {self.telegram_user_id} ({self.get_status_display()})"
 
+
+
+class GenerationJob(models.Model):
+    """
+    Фоновая задача генерации контента.
+
+    POST на генератор ставит задачу в очередь и сразу возвращает её ID,
+    а воркеры (generator/jobs.py) выполняют пайплайн GigaChat/Flask.
+    Итоговый JSON совпадает с прежним ответом generator_view.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'В очереди'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_DONE, 'Готово'),
+        (STATUS_FAILED, 'Ошибка'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    token = models.ForeignKey(
+        TemporaryAccessToken,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='generation_jobs'
+    )
+    session_key = models.CharField(
+        max_length=40,
+        blank=True,
+        default='',
+        help_text="Сессия, создавшая задачу (владелец задачи без токена и пользователя)"
+    )
+    generator_type = models.CharField(max_length=20, default='gigachat', verbose_name="Генератор")
+    payload = models.JSONField(default=dict, help_text="Параметры формы и флаги генерации")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    result = models.JSONField(null=True, blank=True, help_text="JSON-ответ в формате generator_view")
+    error = models.TextField(blank=True, default='')
+    worker = models.CharField(max_length=100, blank=True, default='', help_text="Кто выполняет задачу")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Задача генерации"
+        verbose_name_plural = "Задачи генерации"
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Задача {self.id} ({self.get_status_display()})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+
+class BlockedNetwork(models.Model):
+    """
+    Заблокированный IP адрес или подсеть (CIDR)
+
+    Источник правды для in-process блоклиста (generator/ip_blocklist.py):
+    каждый воркер держит все записи в памяти и перечитывает их при смене
+    версии. Одиночный IP хранится как /32 (/128 для IPv6).
+    """
+    SOURCE_MANUAL = 'manual'
+    SOURCE_AUTO = 'auto'
+
+    network = models.CharField(max_length=49, unique=True, verbose_name="Сеть (CIDR)")
+    reason = models.CharField(max_length=255, blank=True, default='', verbose_name="Причина")
+    source = models.CharField(
+        max_length=64,
+        default=SOURCE_MANUAL,
+        db_index=True,
+        verbose_name="Источник",
+        help_text="manual, auto (SecurityMonitor) или имя списка при импорте, например asn:AS12345"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True, verbose_name="Истекает")
+
+    class Meta:
+        verbose_name = "Заблокированная сеть"
+        verbose_name_plural = "Заблокированные сети"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.network} ({self.source})"
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        from .ip_blocklist import bump_version
+        bump_version()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        from .ip_blocklist import bump_version
+        bump_version()
+        return result
+
+
+class SchedulerLease(models.Model):
+    """
+    Аренда лидерства (generator/leader_election.py, хранилище db)
+
+    Лидер продлевает expires_at каждые SCHEDULER_LEADER_HEARTBEAT секунд;
+    если он пропал, после истечения аренды её забирает другой процесс.
+    Время берётся из часов БД, поэтому расхождение часов серверов не важно.
+    """
+    name = models.CharField(max_length=64, unique=True, verbose_name="Имя аренды")
+    holder = models.CharField(max_length=128, blank=True, default='', verbose_name="Владелец")
+    acquired_at = models.DateTimeField(null=True, blank=True, verbose_name="Получена")
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name="Последнее продление")
+    expires_at = models.DateTimeField(verbose_name="Истекает")
+
+    class Meta:
+        verbose_name = "Аренда лидерства"
+        verbose_name_plural = "Аренды лидерства"
+
+    def __str__(self):
+        return f"{self.name}: {self.holder or '—'}"
+
+
+class SchedulerRun(models.Model):
+    """
+    Запуск задачи планировщика
+
+    Пишется только лидером, поэтому видна история всего кластера.
+    """
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCESS = 'success'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_SUCCESS, 'Успешно'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    job_id = models.CharField(max_length=64, verbose_name="Задача")
+    holder = models.CharField(max_length=128, verbose_name="Процесс")
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_RUNNING, verbose_name="Статус")
+    started_at = models.DateTimeField(default=timezone.now, verbose_name="Начало")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Окончание")
+    result = models.IntegerField(null=True, blank=True, verbose_name="Результат")
+    error = models.TextField(blank=True, default='', verbose_name="Ошибка")
+
+    class Meta:
+        verbose_name = "Запуск задачи планировщика"
+        verbose_name_plural = "Запуски задач планировщика"
+        ordering = ['-started_at', '-id']
+        indexes = [
+            models.Index(fields=['job_id', '-started_at'], name='scheduler_run_job_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.job_id} {self.started_at:%Y-%m-%d %H:%M} ({self.status})"
+
+    @property
+    def duration(self):
+        """Длительность в секундах или None (ещё выполняется)."""
+        if self.finished_at is None:
+            return None
+        return (self.finished_at - self.started_at).total_seconds()
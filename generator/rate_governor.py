@@ -0,0 +1,435 @@
+"""
+Общий регулятор частоты исходящих запросов к GigaChat
+
+Раньше перед запросами стояли фиксированные паузы (time.sleep(5) перед
+изображением, time.sleep(1) и 15/30 с после 429). Они блокировали воркер
+и не учитывали, что делают соседние воркеры. Регулятор — это token bucket,
+общий для всех процессов через Redis:
+
+- перед каждым запросом вызывающий встаёт в очередь (sorted set по времени
+  прихода) и получает разрешение, когда он первый в очереди и в корзине
+  есть токен — так запросы обслуживаются по порядку прихода во всех воркерах;
+- ожидающий отмечается в очереди при каждой попытке (не реже раза в
+  секунду); место того, кто не отмечался GIGACHAT_QUEUE_HEARTBEAT секунд
+  (процесс упал), освобождается, и очередь за ним не стоит;
+- скорость подстраивается по AIMD: успешный ответ немного увеличивает её,
+  429 уменьшает вдвое и блокирует корзину на Retry-After секунд;
+- метрики (текущая скорость, глубина очереди, суммарное время ожидания)
+  доступны через get_stats() и `python manage.py gigachat_stats`.
+
+Время в Redis-скриптах берётся командой TIME сервера Redis, а не из
+часов воркера: расхождение часов между машинами не должно наполнять
+корзину или снимать блокировку после 429.
+
+Если Redis недоступен, используется такое же состояние в памяти процесса;
+после ошибки Redis регулятор переподключается с нарастающей паузой
+(generator/redis_backend.RedisLink).
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+
+from . import redis_backend
+
+logger = logging.getLogger(__name__)
+
+# Начальная, минимальная и максимальная скорость (запросов в секунду)
+GIGACHAT_RATE = float(os.getenv('GIGACHAT_RATE', '1.0'))
+GIGACHAT_RATE_MIN = float(os.getenv('GIGACHAT_RATE_MIN', '0.1'))
+GIGACHAT_RATE_MAX = float(os.getenv('GIGACHAT_RATE_MAX', '5.0'))
+
+# Сколько запросов можно отправить подряд без ожидания
+GIGACHAT_BURST = float(os.getenv('GIGACHAT_BURST', '2'))
+
+# AIMD: прибавка к скорости за успешный ответ и множитель при 429
+GIGACHAT_RATE_INCREASE = float(os.getenv('GIGACHAT_RATE_INCREASE', '0.05'))
+GIGACHAT_RATE_DECREASE = float(os.getenv('GIGACHAT_RATE_DECREASE', '0.5'))
+
+# Максимальное ожидание в очереди (секунды), после него запрос уходит без разрешения
+GIGACHAT_MAX_WAIT = float(os.getenv('GIGACHAT_MAX_WAIT', '120'))
+
+# Через сколько секунд без попыток место в очереди освобождается (ожидающий опрашивает раз в секунду)
+GIGACHAT_QUEUE_HEARTBEAT = float(os.getenv('GIGACHAT_QUEUE_HEARTBEAT', '5'))
+
+# Пауза между попытками захвата не больше этой (она же — период отметки в очереди)
+POLL_INTERVAL = 1.0
+
+# Lua-скрипт захвата: возвращает {разрешено, секунд до следующей попытки, позиция в очереди}.
+# KEYS: корзина, очередь (время прихода), отметки ожидающих (время последней попытки).
+# ARGV: caller, default_rate, burst, max_wait, heartbeat. Время — TIME сервера Redis.
+# Числа с плавающей точкой возвращаются строками: Redis округляет Lua-числа до целых.
+_ACQUIRE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local caller = ARGV[1]
+local default_rate = tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+local stale_before = now - tonumber(ARGV[4])
+local dead_before = now - tonumber(ARGV[5])
+
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', stale_before)
+local dead = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', dead_before)
+if #dead > 0 then
+    redis.call('ZREM', KEYS[2], unpack(dead))
+    redis.call('ZREM', KEYS[3], unpack(dead))
+end
+if not redis.call('ZSCORE', KEYS[2], caller) then
+    redis.call('ZADD', KEYS[2], now, caller)
+end
+redis.call('ZADD', KEYS[3], now, caller)
+local rank = redis.call('ZRANK', KEYS[2], caller)
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'rate', 'blocked_until')
+local rate = tonumber(state[3]) or default_rate
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+local blocked_until = tonumber(state[4]) or 0
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+
+local granted = 0
+local wait = 0
+if blocked_until > now then
+    wait = blocked_until - now
+elseif rank == 0 and tokens >= 1 then
+    tokens = tokens - 1
+    granted = 1
+    redis.call('ZREM', KEYS[2], caller)
+    redis.call('ZREM', KEYS[3], caller)
+else
+    wait = math.max(rank + 1 - tokens, 0.01) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now), 'rate', tostring(rate))
+redis.call('EXPIRE', KEYS[1], 3600)
+redis.call('EXPIRE', KEYS[2], 3600)
+redis.call('EXPIRE', KEYS[3], 3600)
+return {granted, tostring(wait), rank}
+"""
+
+# Lua-скрипт AIMD: ARGV = throttled (0/1), retry_after, default_rate, min, max, step, factor
+_REPORT_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local throttled = tonumber(ARGV[1])
+local retry_after = tonumber(ARGV[2])
+local rate = tonumber(redis.call('HGET', KEYS[1], 'rate')) or tonumber(ARGV[3])
+if throttled == 1 then
+    rate = math.max(tonumber(ARGV[4]), rate * tonumber(ARGV[7]))
+    local blocked_until = now + math.max(retry_after, 1 / rate)
+    local current = tonumber(redis.call('HGET', KEYS[1], 'blocked_until')) or 0
+    if blocked_until > current then
+        redis.call('HSET', KEYS[1], 'blocked_until', tostring(blocked_until))
+    end
+    redis.call('HSET', KEYS[1], 'tokens', '0', 'ts', tostring(now))
+else
+    rate = math.min(tonumber(ARGV[5]), rate + tonumber(ARGV[6]))
+end
+redis.call('HSET', KEYS[1], 'rate', tostring(rate))
+return tostring(rate)
+"""
+
+
+def retry_after_from_error(error):
+    """
+    Извлекает Retry-After (секунды) из исключения GigaChat/httpx
+
+    Returns:
+        float или None
+    """
+    headers = None
+    response = getattr(error, 'response', None)
+    if response is not None:
+        headers = getattr(response, 'headers', None)
+    if headers is None:
+        # gigachat.exceptions.ResponseError(url, status_code, content, headers)
+        args = getattr(error, 'args', ())
+        if len(args) >= 4:
+            headers = args[3]
+    if not headers:
+        return None
+    try:
+        value = headers.get('retry-after') or headers.get('Retry-After')
+        return float(value) if value is not None else None
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def is_rate_limit_error(error):
+    """Проверяет, что исключение — ответ 429 Too Many Requests."""
+    args = getattr(error, 'args', ())
+    if len(args) >= 2 and args[1] == 429:
+        return True
+    message = str(error)
+    return "429" in message or "Too Many Requests" in message
+
+
+class _LocalState:
+    """Состояние регулятора в памяти процесса (без Redis)."""
+
+    def __init__(self, rate, burst):
+        self.lock = threading.Lock()
+        self.rate = rate
+        self.tokens = burst
+        self.ts = time.time()
+        self.blocked_until = 0.0
+        self.queue = []
+        self.seen = {}
+
+
+class RateGovernor:
+    """
+    Token bucket с AIMD-подстройкой скорости, общий для всех воркеров
+
+    Args:
+        name: Имя регулятора (часть ключей Redis)
+        rate: Начальная скорость (запросов в секунду)
+        burst: Ёмкость корзины
+        min_rate: Минимальная скорость
+        max_rate: Максимальная скорость
+        increase: Прибавка к скорости за успешный ответ
+        decrease: Множитель скорости при 429
+        max_wait: Максимальное ожидание в очереди (секунды)
+        heartbeat: Через сколько секунд без попыток место в очереди освобождается
+        redis_client: Клиент Redis (по умолчанию — из django_redis; False — без Redis)
+    """
+
+    def __init__(self, name, rate=GIGACHAT_RATE, burst=GIGACHAT_BURST,
+                 min_rate=GIGACHAT_RATE_MIN, max_rate=GIGACHAT_RATE_MAX,
+                 increase=GIGACHAT_RATE_INCREASE, decrease=GIGACHAT_RATE_DECREASE,
+                 max_wait=GIGACHAT_MAX_WAIT, heartbeat=GIGACHAT_QUEUE_HEARTBEAT, redis_client=None):
+        self.name = name
+        self.default_rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.max_wait = max_wait
+        self.heartbeat = heartbeat
+        self._bucket_key = f'rate_governor:{name}:bucket'
+        self._queue_key = f'rate_governor:{name}:queue'
+        self._seen_key = f'rate_governor:{name}:seen'
+        self._stats_key = f'rate_governor:{name}:stats'
+        self._scripts = None
+        self._link = redis_backend.RedisLink(
+            f"Регулятор {name}", 'состояние в памяти процесса',
+            client=redis_client, on_connect=self._register_scripts,
+        )
+        self._local = _LocalState(rate, burst)
+        self._stats_lock = threading.Lock()
+        self._local_stats = {'acquired': 0, 'throttled': 0, 'timeouts': 0, 'wait_seconds': 0.0}
+
+    # ------------------------------------------------------------------
+    # Хранилище
+    # ------------------------------------------------------------------
+
+    def _register_scripts(self, client):
+        self._scripts = (
+            client.register_script(_ACQUIRE_SCRIPT),
+            client.register_script(_REPORT_SCRIPT),
+        )
+
+    def _get_redis(self):
+        return self._link.get()
+
+    def _try_acquire(self, caller):
+        """Одна попытка захвата: (разрешено, пауза до следующей попытки)."""
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                granted, wait, _ = self._scripts[0](
+                    keys=[self._bucket_key, self._queue_key, self._seen_key],
+                    args=[caller, self.default_rate, self.burst, self.max_wait, self.heartbeat],
+                )
+                return bool(int(granted)), float(wait)
+            except Exception as e:
+                self._link.failed(e)
+        return self._try_acquire_local(caller, time.time())
+
+    def _try_acquire_local(self, caller, now):
+        state = self._local
+        with state.lock:
+            dead_before = now - self.heartbeat
+            for other in [c for c, seen in state.seen.items() if seen < dead_before]:
+                del state.seen[other]
+                if other in state.queue:
+                    state.queue.remove(other)
+            if caller not in state.queue:
+                state.queue.append(caller)
+            state.seen[caller] = now
+            rank = state.queue.index(caller)
+            state.tokens = min(self.burst, state.tokens + max(0.0, now - state.ts) * state.rate)
+            state.ts = now
+            if state.blocked_until > now:
+                return False, state.blocked_until - now
+            if rank == 0 and state.tokens >= 1:
+                state.tokens -= 1
+                state.queue.pop(0)
+                state.seen.pop(caller, None)
+                return True, 0.0
+            return False, max(rank + 1 - state.tokens, 0.01) / state.rate
+
+    def _leave_queue(self, caller):
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                redis.zrem(self._queue_key, caller)
+                redis.zrem(self._seen_key, caller)
+                return
+            except Exception as e:
+                self._link.failed(e)
+        with self._local.lock:
+            self._local.seen.pop(caller, None)
+            if caller in self._local.queue:
+                self._local.queue.remove(caller)
+
+    def _bump(self, key, value=1):
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                if isinstance(value, float):
+                    redis.hincrbyfloat(self._stats_key, key, value)
+                else:
+                    redis.hincrby(self._stats_key, key, value)
+                return
+            except Exception:
+                pass
+        with self._stats_lock:
+            self._local_stats[key] += value
+
+    # ------------------------------------------------------------------
+    # Публичный интерфейс
+    # ------------------------------------------------------------------
+
+    def acquire(self):
+        """
+        Ждёт своей очереди и свободного токена
+
+        Returns:
+            float: Время ожидания (секунды)
+        """
+        caller = uuid.uuid4().hex
+        started = time.time()
+        deadline = started + self.max_wait
+        try:
+            while True:
+                granted, wait = self._try_acquire(caller)
+                if granted:
+                    break
+                now = time.time()
+                if now >= deadline:
+                    logger.warning(f"Регулятор {self.name}: превышено ожидание {self.max_wait} с, запрос без разрешения")
+                    self._bump('timeouts')
+                    self._leave_queue(caller)
+                    break
+                time.sleep(min(max(wait, 0.01), deadline - now, POLL_INTERVAL))
+        except BaseException:
+            self._leave_queue(caller)
+            raise
+        waited = time.time() - started
+        self._bump('acquired')
+        if waited > 0.001:
+            self._bump('wait_seconds', float(waited))
+        return waited
+
+    def report(self, throttled=False, retry_after=None):
+        """
+        Сообщает результат запроса для AIMD-подстройки скорости
+
+        Args:
+            throttled: Получен ли ответ 429
+            retry_after: Значение Retry-After (секунды), если есть
+
+        Returns:
+            float: Новая скорость
+        """
+        if throttled:
+            self._bump('throttled')
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                return float(self._scripts[1](
+                    keys=[self._bucket_key],
+                    args=[1 if throttled else 0, retry_after or 0, self.default_rate,
+                          self.min_rate, self.max_rate, self.increase, self.decrease],
+                ))
+            except Exception as e:
+                self._link.failed(e)
+        now = time.time()
+        state = self._local
+        with state.lock:
+            if throttled:
+                state.rate = max(self.min_rate, state.rate * self.decrease)
+                state.blocked_until = max(state.blocked_until, now + max(retry_after or 0, 1 / state.rate))
+                state.tokens = 0
+                state.ts = now
+            else:
+                state.rate = min(self.max_rate, state.rate + self.increase)
+            return state.rate
+
+    def call(self, func):
+        """
+        Выполняет func() с разрешения регулятора и сообщает о 429
+
+        Исключение 429 пробрасывается дальше: повтор решает вызывающий код
+        (следующий acquire() подождёт Retry-After).
+        """
+        self.acquire()
+        try:
+            result = func()
+        except Exception as e:
+            if is_rate_limit_error(e):
+                retry_after = retry_after_from_error(e)
+                logger.warning(f"Регулятор {self.name}: 429, Retry-After={retry_after}")
+                self.report(throttled=True, retry_after=retry_after)
+            raise
+        self.report(throttled=False)
+        return result
+
+    def get_stats(self):
+        """
+        Метрики регулятора
+
+        Returns:
+            dict: rate, queue_depth, blocked_for, acquired, throttled, timeouts,
+                  wait_seconds, backend
+        """
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                seconds, microseconds = redis.time()
+                now = seconds + microseconds / 1000000
+                rate, blocked_until = redis.hmget(self._bucket_key, 'rate', 'blocked_until')
+                counters = redis.hgetall(self._stats_key)
+                counters = {
+                    (k.decode() if isinstance(k, bytes) else k): float(v)
+                    for k, v in counters.items()
+                }
+                return {
+                    'rate': float(rate) if rate else self.default_rate,
+                    'queue_depth': redis.zcard(self._queue_key),
+                    'blocked_for': max(0.0, float(blocked_until or 0) - now),
+                    'acquired': int(counters.get('acquired', 0)),
+                    'throttled': int(counters.get('throttled', 0)),
+                    'timeouts': int(counters.get('timeouts', 0)),
+                    'wait_seconds': round(counters.get('wait_seconds', 0.0), 3),
+                    'backend': 'redis',
+                }
+            except Exception as e:
+                logger.warning(f"Регулятор {self.name}: ошибка чтения метрик ({e})")
+        now = time.time()
+        state = self._local
+        with state.lock, self._stats_lock:
+            return {
+                'rate': state.rate,
+                'queue_depth': len(state.queue),
+                'blocked_for': max(0.0, state.blocked_until - now),
+                'acquired': self._local_stats['acquired'],
+                'throttled': self._local_stats['throttled'],
+                'timeouts': self._local_stats['timeouts'],
+                'wait_seconds': round(self._local_stats['wait_seconds'], 3),
+                'backend': 'local',
+            }
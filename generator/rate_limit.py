@@ -0,0 +1,208 @@
+"""
+Ограничение частоты входящих запросов по алгоритму GCRA
+
+RateLimiter.is_rate_limited раньше делал cache.get, затем cache.set или
+cache.incr и cache.ttl — два-три обращения к Redis на запрос, без
+атомарности (параллельные запросы на границе окна проходили сверх лимита),
+с фиксированным окном (до 2×limit запросов на стыке двух окон).
+
+GCRA (generic cell rate algorithm) — скользящее окно с одним числом на
+клиента: теоретическое время прихода следующего запроса (TAT). Запрос
+разрешён, если после него TAT уходит вперёд не больше чем на период
+политики. Проверка и обновление выполняются одним Lua-скриптом (один
+round trip, атомарно для всех воркеров); текущее время скрипт берёт
+командой TIME сервера Redis, чтобы расхождение часов воркеров не сдвигало
+TAT. Если Redis недоступен, то же
+состояние хранится в памяти процесса, пока не удастся переподключиться
+(generator/redis_backend.RedisLink).
+
+Политики (RatePolicy) выбираются по префиксу пути и тарифу токена:
+resolve_policy('/generator/...', 'PRO').
+"""
+
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+from . import redis_backend
+
+logger = logging.getLogger(__name__)
+
+RatePolicy = namedtuple('RatePolicy', ['name', 'limit', 'period'])
+
+# allowed, remaining — число запросов; retry_after, reset_after — секунды
+RateLimitResult = namedtuple('RateLimitResult', ['allowed', 'remaining', 'retry_after', 'reset_after'])
+
+# Префикс пути → (лимит, период в секундах); '' — политика по умолчанию
+DEFAULT_PATH_POLICIES = {
+    '/api/': (30, 60),
+    '/generator/': (20, 60),
+    '': (60, 60),
+}
+
+# Множитель лимита по тарифу; None — без ограничения
+DEFAULT_TARIFF_MULTIPLIERS = {
+    'DEMO_FREE': 1,
+    'BASIC': 1,
+    'PRO': 2,
+    'UNLIMITED': 3,
+    'HIDDEN_14D': 2,
+    'HIDDEN_30D': 2,
+    'DEVELOPER': None,
+}
+
+# KEYS[1] — TAT клиента; ARGV: interval_ms, period_ms. Время — TIME сервера Redis.
+# Возвращает {разрешено, осталось, retry_after_ms, reset_after_ms}
+_GCRA_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + tonumber(clock[2]) / 1000
+local interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+local new_tat = tat + interval
+local ahead = new_tat - now
+if ahead > period then
+    return {0, 0, math.ceil(ahead - period), math.ceil(tat - now)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil(ahead))
+return {1, math.floor((period - ahead) / interval), 0, math.ceil(ahead)}
+"""
+
+
+def _gcra(tat, now, interval, period):
+    """Шаг GCRA: (новый TAT или None при отказе, результат). Время в миллисекундах."""
+    tat = max(tat, now)
+    new_tat = tat + interval
+    ahead = new_tat - now
+    if ahead > period:
+        return None, RateLimitResult(False, 0, (ahead - period) / 1000, (tat - now) / 1000)
+    return new_tat, RateLimitResult(True, int((period - ahead) // interval), 0.0, ahead / 1000)
+
+
+class _LocalStore:
+    """TAT клиентов в памяти процесса (без Redis)."""
+
+    def __init__(self, max_keys=100000):
+        self.lock = threading.Lock()
+        self.tats = {}
+        self.max_keys = max_keys
+
+    def hit(self, key, now, interval, period):
+        with self.lock:
+            new_tat, result = _gcra(self.tats.get(key, now), now, interval, period)
+            if new_tat is not None:
+                if len(self.tats) >= self.max_keys:
+                    self._prune(now)
+                self.tats[key] = new_tat
+            return result
+
+    def _prune(self, now):
+        # TAT в прошлом эквивалентен отсутствию записи
+        for key in [key for key, tat in self.tats.items() if tat <= now]:
+            del self.tats[key]
+        if len(self.tats) >= self.max_keys:
+            self.tats.clear()
+
+
+class GCRALimiter:
+    """
+    Ограничитель частоты GCRA: Redis (Lua) с запасным вариантом в памяти процесса
+
+    Args:
+        prefix: Префикс ключей Redis
+        redis_client: Клиент Redis (по умолчанию — из django_redis; False — без Redis)
+    """
+
+    def __init__(self, prefix='rl', redis_client=None):
+        self.prefix = prefix
+        self._script = None
+        self._link = redis_backend.RedisLink(
+            'Ограничитель частоты', 'состояние в памяти процесса',
+            client=redis_client, on_connect=self._register_script,
+        )
+        self._local = _LocalStore()
+
+    def _register_script(self, client):
+        self._script = client.register_script(_GCRA_SCRIPT)
+
+    def _get_redis(self):
+        return self._link.get()
+
+    @property
+    def backend(self):
+        """'redis' или 'local'."""
+        return 'redis' if self._get_redis() is not None else 'local'
+
+    def hit(self, identifier, policy):
+        """
+        Учитывает запрос клиента и проверяет лимит
+
+        Args:
+            identifier: Идентификатор клиента (token:…, ip:…)
+            policy: RatePolicy
+
+        Returns:
+            RateLimitResult
+        """
+        period = policy.period * 1000
+        interval = period / policy.limit
+        key = f"{self.prefix}:{policy.name}:{identifier}"
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                allowed, remaining, retry_after, reset_after = self._script(
+                    keys=[key], args=[repr(interval), period]
+                )
+                return RateLimitResult(bool(allowed), int(remaining), int(retry_after) / 1000, int(reset_after) / 1000)
+            except Exception as e:
+                self._link.failed(e)
+        return self._local.hit(key, time.time() * 1000, interval, period)
+
+
+def _path_policies():
+    policies = getattr(settings, 'RATE_LIMIT_PATH_POLICIES', None) or DEFAULT_PATH_POLICIES
+    # Самый длинный префикс проверяется первым
+    return sorted(policies.items(), key=lambda item: len(item[0]), reverse=True)
+
+
+_policy_table = None
+
+
+def resolve_policy(path, token_type=None):
+    """
+    Политика ограничения для пути и тарифа
+
+    Args:
+        path: Путь запроса
+        token_type: Тип токена из сессии (опционально)
+
+    Returns:
+        RatePolicy или None, если тариф не ограничивается
+    """
+    global _policy_table
+    if _policy_table is None:
+        _policy_table = _path_policies()
+    multipliers = getattr(settings, 'RATE_LIMIT_TARIFF_MULTIPLIERS', None) or DEFAULT_TARIFF_MULTIPLIERS
+    multiplier = multipliers.get(token_type, 1) if token_type else 1
+    if multiplier is None:
+        return None
+    for prefix, (limit, period) in _policy_table:
+        if path.startswith(prefix):
+            name = prefix.strip('/').replace('/', '.') or 'default'
+            return RatePolicy(f"{name}:{token_type or 'anon'}", int(limit * multiplier), period)
+    return None
+
+
+def reset_policies():
+    """Сбрасывает таблицу политик (после изменения настроек)."""
+    global _policy_table
+    _policy_table = None
+
+
+gcra_limiter = GCRALimiter()
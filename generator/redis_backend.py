@@ -0,0 +1,129 @@
+"""
+Подключение к Redis для инфраструктурных модулей
+
+Кэш ответов, очередь расхода токенов, регулятор GigaChat, ограничитель
+частоты, фильтр токенов и выбор лидера используют одно подключение
+django_redis (алиас кэша из settings.CACHES). Доступность проверяется
+ping при подключении; что делать без Redis, решает вызывающий модуль.
+
+RedisLink — подключение для модулей с запасным состоянием в памяти
+процесса: после ошибки Redis клиент сбрасывается и переподключается с
+нарастающей паузой, а не остаётся на локальном состоянии до перезапуска.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед повторным подключением: от RETRY_MIN, удваивается до RETRY_MAX (секунды)
+RETRY_MIN = 1.0
+RETRY_MAX = 60.0
+
+
+def is_configured(alias='default'):
+    """
+    Настроен ли кэш alias на django_redis
+
+    Ответ зависит только от настроек, поэтому одинаков во всех процессах
+    кластера (в отличие от доступности Redis в момент проверки).
+    """
+    from django.conf import settings
+
+    backend = getattr(settings, 'CACHES', {}).get(alias, {}).get('BACKEND', '')
+    return backend.startswith('django_redis.')
+
+
+def connect(alias='default', owner='Redis', fallback=None):
+    """
+    Клиент Redis из django_redis, проверенный ping
+
+    Args:
+        alias: Алиас кэша в settings.CACHES
+        owner: Кто подключается (для лога)
+        fallback: Что используется без Redis (для лога)
+
+    Returns:
+        Клиент redis или None, если Redis недоступен (или кэш не django_redis)
+    """
+    try:
+        from django_redis import get_redis_connection
+        connection = get_redis_connection(alias)
+        connection.ping()
+        return connection
+    except Exception as e:
+        suffix = f", {fallback}" if fallback else ""
+        logger.info(f"{owner}: Redis недоступен ({e}){suffix}")
+        return None
+
+
+class RedisLink:
+    """
+    Подключение к Redis с повторным подключением после ошибок
+
+    Пока Redis недоступен, get() возвращает None и вызывающий модуль
+    работает со своим состоянием в памяти процесса; следующая попытка
+    подключения — не раньше чем через паузу (RETRY_MIN, удваивается до
+    RETRY_MAX, сбрасывается после успешного подключения).
+
+    Args:
+        owner: Кто подключается (для лога)
+        fallback: Что используется без Redis (для лога)
+        alias: Алиас кэша в settings.CACHES
+        client: Готовый клиент; False — не подключаться к Redis (тесты)
+        on_connect: Вызывается с новым клиентом (регистрация Lua-скриптов)
+    """
+
+    def __init__(self, owner, fallback=None, alias='default', client=None, on_connect=None):
+        self.owner = owner
+        self.fallback = fallback
+        self.alias = alias
+        self.on_connect = on_connect
+        self._enabled = client is not False
+        self._client = None
+        self._lock = threading.Lock()
+        self._retry_at = 0.0
+        self._delay = RETRY_MIN
+        if client:
+            self._attach(client)
+
+    def _attach(self, client):
+        if self.on_connect is not None:
+            self.on_connect(client)
+        self._client = client
+        self._delay = RETRY_MIN
+
+    def _schedule_retry(self):
+        self._retry_at = time.monotonic() + self._delay
+        self._delay = min(self._delay * 2, RETRY_MAX)
+
+    def get(self):
+        """Клиент Redis или None (Redis недоступен, повтор ещё не наступил)."""
+        client = self._client
+        if client is not None or not self._enabled or time.monotonic() < self._retry_at:
+            return client
+        with self._lock:
+            if self._client is None and time.monotonic() >= self._retry_at:
+                client = connect(self.alias, self.owner, self.fallback)
+                if client is None:
+                    self._schedule_retry()
+                else:
+                    self._attach(client)
+            return self._client
+
+    def failed(self, error):
+        """
+        Сбрасывает клиент после ошибки команды Redis
+
+        Args:
+            error: Исключение (для лога)
+        """
+        with self._lock:
+            if self._client is None:
+                return
+            logger.warning(
+                f"{self.owner}: ошибка Redis ({error}), повторное подключение через {self._delay:.0f} с"
+            )
+            self._client = None
+            self._schedule_retry()
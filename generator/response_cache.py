@@ -0,0 +1,284 @@
+"""
+Кэш ответов генерации по содержимому запроса
+
+Одинаковые запросы (та же тема и те же критерии формы, тот же провайдер
+и модель) часто приходят от DEMO-пользователей с настройками по умолчанию.
+Кэш возвращает ранее сгенерированный текст без обращения к API и без
+списания токенов.
+
+Ключ — SHA-256 от канонизированных критериев (PromptCompiler.canonical_key),
+нормализованной темы, провайдера и модели. Хранилище — Redis (через
+django_redis) с TTL и ограничением числа записей (вытесняются самые старые),
+при недоступности Redis — LRU в памяти процесса до повторного подключения
+(generator/redis_backend.RedisLink).
+
+Кэш включается настройкой RESPONSE_CACHE_ENABLED и флагом
+'response_cache' тарифа (generator/tariffs.py).
+"""
+
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from flask_generator.prompt_engine import PromptCompiler
+
+from . import redis_backend
+
+logger = logging.getLogger(__name__)
+
+# Поля формы вне критериев промпта, которые влияют на текст
+_EXTRA_FIELDS = ('template_type', 'platform')
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def is_enabled_for(token=None):
+    """
+    Включён ли кэш ответов для токена
+
+    Args:
+        token: TemporaryAccessToken или None
+
+    Returns:
+        bool: True, если кэш включён глобально и для тарифа токена
+    """
+    if not _setting('RESPONSE_CACHE_ENABLED', False):
+        return False
+    from .tariffs import get_tariff_config
+
+    token_type = getattr(token, 'token_type', None) or 'DEMO_FREE'
+    config = get_tariff_config(token_type) or {}
+    return bool(config.get('response_cache', False))
+
+
+def make_cache_key(form_data, provider, model):
+    """
+    Ключ кэша по содержимому запроса
+
+    Args:
+        form_data: Параметры генерации
+        provider: 'gigachat' или 'openai'
+        model: Название модели
+
+    Returns:
+        str: Хеш запроса
+    """
+    topic = _WHITESPACE_RE.sub(' ', str(form_data.get('topic') or '')).strip().lower()
+    extra = [str(form_data.get(field) or '') for field in _EXTRA_FIELDS]
+    payload = json.dumps(
+        [provider, model or '', topic, extra, PromptCompiler.canonical_key(form_data)],
+        ensure_ascii=False,
+        separators=(',', ':'),
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _LocalBackend:
+    """LRU с TTL в памяти процесса (fallback без Redis)."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def size(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class _RedisBackend:
+    """
+    Redis: значения с TTL и индекс в sorted set (score — время записи).
+
+    При превышении max_entries самые старые записи удаляются.
+    """
+
+    PREFIX = 'response_cache:'
+    INDEX = 'response_cache:index'
+
+    def __init__(self, connection, max_entries):
+        self.redis = connection
+        self.max_entries = max_entries
+
+    def get(self, key):
+        raw = self.redis.get(self.PREFIX + key)
+        if raw is None:
+            return None
+        return json.loads(raw)
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        pipe = self.redis.pipeline()
+        pipe.set(self.PREFIX + key, json.dumps(value, ensure_ascii=False), ex=ttl)
+        pipe.zadd(self.INDEX, {key: now})
+        # Записи старше TTL уже истекли в Redis — убираем их из индекса
+        pipe.zremrangebyscore(self.INDEX, '-inf', now - ttl)
+        pipe.zcard(self.INDEX)
+        size = pipe.execute()[-1]
+        overflow = size - self.max_entries
+        if overflow > 0:
+            oldest = self.redis.zpopmin(self.INDEX, overflow)
+            if oldest:
+                self.redis.delete(*[self.PREFIX + (k.decode() if isinstance(k, bytes) else k) for k, _ in oldest])
+
+    def delete(self, key):
+        pipe = self.redis.pipeline()
+        pipe.delete(self.PREFIX + key)
+        pipe.zrem(self.INDEX, key)
+        pipe.execute()
+
+    def size(self):
+        return self.redis.zcard(self.INDEX)
+
+    def clear(self):
+        keys = [self.PREFIX + (k.decode() if isinstance(k, bytes) else k) for k in self.redis.zrange(self.INDEX, 0, -1)]
+        if keys:
+            self.redis.delete(*keys)
+        self.redis.delete(self.INDEX)
+
+
+class ResponseCache:
+    """
+    Кэш ответов генерации со статистикой попаданий
+
+    Args:
+        ttl: Время жизни записи (секунды)
+        max_entries: Максимальное число записей
+        redis_client: Клиент Redis (по умолчанию — из django_redis; False — без Redis)
+    """
+
+    def __init__(self, ttl=None, max_entries=None, redis_client=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._redis_client = redis_client
+        self._link = None
+        self._local = None
+        self._redis = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _configure(self):
+        # Настройки читаются при первом обращении, а не при импорте модуля
+        self.ttl = self.ttl or _setting('RESPONSE_CACHE_TTL', 86400)
+        self.max_entries = self.max_entries or _setting('RESPONSE_CACHE_MAX_ENTRIES', 5000)
+        self._local = _LocalBackend(self.max_entries)
+        self._link = redis_backend.RedisLink(
+            'Кэш ответов', 'используем память процесса',
+            alias=_setting('RESPONSE_CACHE_ALIAS', 'default'), client=self._redis_client,
+        )
+
+    def _get_backend(self):
+        if self._link is None:
+            with self._lock:
+                if self._link is None:
+                    self._configure()
+        client = self._link.get()
+        if client is None:
+            return self._local
+        backend = self._redis
+        if backend is None or backend.redis is not client:
+            backend = self._redis = _RedisBackend(client, self.max_entries)
+        return backend
+
+    def _failed(self, backend, error):
+        """После ошибки Redis — память процесса до повторного подключения."""
+        if isinstance(backend, _RedisBackend):
+            self._link.failed(error)
+
+    def get(self, key):
+        """Возвращает закэшированный ответ или None."""
+        backend = self._get_backend()
+        try:
+            value = backend.get(key)
+        except Exception as e:
+            logger.warning(f"Ошибка чтения кэша ответов: {e}")
+            self._failed(backend, e)
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Сохраняет ответ (словарь, сериализуемый в JSON)."""
+        backend = self._get_backend()
+        try:
+            backend.set(key, value, self.ttl)
+        except Exception as e:
+            logger.warning(f"Ошибка записи в кэш ответов: {e}")
+            self._failed(backend, e)
+
+    def delete(self, key):
+        backend = self._get_backend()
+        try:
+            backend.delete(key)
+        except Exception as e:
+            logger.warning(f"Ошибка удаления из кэша ответов: {e}")
+            self._failed(backend, e)
+
+    def clear(self):
+        self._get_backend().clear()
+        self.hits = 0
+        self.misses = 0
+
+    def get_stats(self):
+        """
+        Статистика кэша в текущем процессе
+
+        Returns:
+            dict: hits, misses, hit_rate, size, backend
+        """
+        backend = self._get_backend()
+        total = self.hits + self.misses
+        try:
+            size = backend.size()
+        except Exception:
+            size = None
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            'size': size,
+            'backend': 'redis' if isinstance(backend, _RedisBackend) else 'local',
+        }
+
+
+response_cache = ResponseCache()
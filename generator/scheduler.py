@@ -7,15 +7,27 @@
 - Очистку базы данных
 
 Использует APScheduler для встроенной автоматизации без необходимости настройки cron.
+
+Планировщик стартует в каждом воркере каждого контейнера, но задачи
+выполняет только лидер (generator/leader_election.py): остальные процессы
+пропускают запуск. Каждый запуск лидера записывается в SchedulerRun —
+история всего кластера видна в get_scheduler_status(). Новый лидер по
+этой истории находит задачи, время которых наступало, пока лидера не
+было, и выполняет каждую из них один раз.
 """
 
+import atexit
 import logging
 from datetime import timedelta
+from functools import partial
+from django.db import close_old_connections
 from django.utils import timezone
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 from django.conf import settings
 
+from .leader_election import LeaderElector
+
 logger = logging.getLogger(__name__)
 
 
@@ -25,25 +37,14 @@ def cleanup_expired_tokens():
     
     Эта задача запускается автоматически по расписанию и деактивирует
     все токены, у которых истек срок действия, но они все еще активны.
+    Токены обрабатываются пачками (generator/maintenance.py).
     """
     try:
-        from generator.models import TemporaryAccessToken
-        
-        now = timezone.now()
-        
-        # Находим все истекшие активные токены (исключаем бессрочные)
-        from django.db.models import Q
-        expired_tokens = TemporaryAccessToken.objects.filter(
-            expires_at__lt=now,
-            expires_at__isnull=False,  # Исключаем бессрочные
-            is_active=True
-        )
+        from generator.maintenance import deactivate_expired_tokens
         
-        count = expired_tokens.count()
+        count = deactivate_expired_tokens()['rows']
         
         if count > 0:
-            # Деактивируем их
-            expired_tokens.update(is_active=False)
             logger.info(f"✅ Автоматическая очистка: деактивировано {count} истекших токенов")
         else:
             logger.debug("✅ Автоматическая очистка: истекших токенов не найдено")
@@ -66,41 +67,25 @@ def delete_old_tokens():
     Также удаляет генерации без пользователя (user=None) старше 90 дней,
     которые были созданы демо-токенами из manual_token_generator.
     
+    Удаление идёт пачками по pk, каждая в своей транзакции вместе со
+    своим каскадом (generator/maintenance.py).
+    
     Это помогает поддерживать базу данных в чистоте.
     """
     try:
-        from generator.models import TemporaryAccessToken, Generation
+        from generator.maintenance import delete_old_generations, delete_old_tokens as delete_tokens
         
-        # Вычисляем дату отсечки (90 дней назад)
-        cutoff_date = timezone.now() - timedelta(days=90)
-        
-        # Находим старые деактивированные токены (исключаем бессрочные)
-        from django.db.models import Q
-        old_tokens = TemporaryAccessToken.objects.filter(
-            is_active=False,
-            expires_at__lt=cutoff_date,
-            expires_at__isnull=False  # Исключаем бессрочные
-        )
-        
-        token_count = old_tokens.count()
+        token_count = delete_tokens(days=90)['rows']
         
         if token_count > 0:
-            # Удаляем их
-            old_tokens.delete()
             logger.info(f"🗑️ Автоматическая очистка: удалено {token_count} старых токенов (>90 дней)")
         else:
             logger.debug("🗑️ Автоматическая очистка: старых токенов не найдено")
         
         # Удаляем генерации без пользователя (демо-токены) старше 90 дней
-        old_generations = Generation.objects.filter(
-            user__isnull=True,  # Только генерации без пользователя (демо-токены)
-            created_at__lt=cutoff_date
-        )
-        
-        generation_count = old_generations.count()
+        generation_count = delete_old_generations(days=90)['rows']
         
         if generation_count > 0:
-            old_generations.delete()
             logger.info(f"🗑️ Автоматическая очистка: удалено {generation_count} старых генераций демо-токенов (>90 дней)")
         else:
             logger.debug("🗑️ Автоматическая очистка: старых генераций демо-токенов не найдено")
@@ -117,24 +102,13 @@ def renew_subscriptions():
     Автоматически пополняет лимиты токенов для подписок
     
     Эта задача проверяет все активные подписки и пополняет лимиты токенов
-    когда наступает дата next_renewal.
+    когда наступает дата next_renewal. Подписки обновляются пачками —
+    один UPDATE на пачку (generator/maintenance.py).
     """
     try:
-        from generator.models import TemporaryAccessToken
+        from generator.maintenance import renew_subscriptions as renew_due_subscriptions
         
-        now = timezone.now()
-        
-        # Находим все подписки, которые нужно пополнить
-        subscriptions_to_renew = TemporaryAccessToken.objects.filter(
-            is_active=True,
-            next_renewal__lte=now,
-            next_renewal__isnull=False
-        )
-        
-        count = 0
-        for token in subscriptions_to_renew:
-            if token.renew_subscription():
-                count += 1
+        count = renew_due_subscriptions()['rows']
         
         if count > 0:
             logger.info(f"🔄 Автопополнение: обновлено {count} подписок")
@@ -151,6 +125,112 @@ def renew_subscriptions():
 # Глобальный экземпляр планировщика
 scheduler = None
 
+# Участник выборов лидера этого процесса
+elector = None
+
+
+def run_job(job_id, func):
+    """
+    Выполняет задачу, если этот процесс — лидер, и записывает запуск в историю
+
+    Args:
+        job_id: ID задачи (SchedulerRun.job_id)
+        func: Функция задачи
+
+    Returns:
+        Результат функции или None (процесс не лидер)
+    """
+    if elector is None or not elector.is_leader():
+        logger.debug(f"Задача {job_id} пропущена: процесс не лидер")
+        return None
+
+    from generator.models import SchedulerRun
+
+    try:
+        run = SchedulerRun.objects.create(job_id=job_id, holder=elector.holder)
+        try:
+            result = func()
+        except Exception as e:
+            run.status = SchedulerRun.STATUS_FAILED
+            run.error = str(e)
+            logger.error(f"❌ Задача {job_id} завершилась ошибкой: {e}")
+            result = None
+        else:
+            run.status = SchedulerRun.STATUS_SUCCESS
+            run.result = result if isinstance(result, int) else None
+        run.finished_at = timezone.now()
+        run.save(update_fields=['status', 'result', 'error', 'finished_at'])
+
+        keep_days = getattr(settings, 'SCHEDULER_RUN_HISTORY_DAYS', 30)
+        SchedulerRun.objects.filter(
+            job_id=job_id, started_at__lt=timezone.now() - timedelta(days=keep_days)
+        ).delete()
+        return result
+    finally:
+        # Потоки APScheduler переиспользуются — не держим соединения с БД между запусками
+        close_old_connections()
+
+
+def _missed_jobs(now=None):
+    """
+    Задачи по расписанию, время которых наступило после их последнего запуска
+
+    Последний запуск берётся из SchedulerRun (пишется только лидером);
+    задача без истории считается пропущенной.
+
+    Returns:
+        list: Задачи APScheduler
+    """
+    from django.db.models import Max
+    from generator.models import SchedulerRun
+
+    now = now or timezone.now()
+    # Триггеры APScheduler сравнивают только aware datetime (при USE_TZ=False они naive)
+    if timezone.is_naive(now):
+        now = timezone.make_aware(now)
+    last_runs = dict(
+        SchedulerRun.objects.values('job_id').annotate(last=Max('started_at')).values_list('job_id', 'last')
+    )
+    missed = []
+    for job in scheduler.get_jobs():
+        if not isinstance(job.trigger, CronTrigger):
+            continue
+        last = last_runs.get(job.id)
+        if last is None:
+            missed.append(job)
+            continue
+        if timezone.is_naive(last):
+            last = timezone.make_aware(last)
+        next_fire = job.trigger.get_next_fire_time(last, last)
+        if next_fire is not None and next_fire <= now:
+            missed.append(job)
+    return missed
+
+
+def _on_elected():
+    """
+    Новый лидер выполняет задачи, пропущенные без лидера
+
+    Несколько пропущенных запусков одной задачи объединяются в один.
+    """
+    if scheduler is None:
+        return
+    try:
+        missed = _missed_jobs()
+    except Exception as e:
+        logger.error(f"❌ Не удалось проверить пропущенные запуски: {e}")
+        return
+    finally:
+        close_old_connections()
+    for job in missed:
+        logger.info(f"⏱️ Пропущенный запуск задачи {job.id} — выполняем")
+        scheduler.add_job(
+            job.func,
+            id=f'catch_up_{job.id}',
+            name=f'Пропущенный запуск: {job.name}',
+            replace_existing=True,
+        )
+
 
 def start_scheduler():
     """
@@ -160,8 +240,10 @@ def start_scheduler():
     - Деактивация истекших токенов: каждый час
     - Автопополнение подписок: каждый день в 00:01
     - Удаление старых токенов: каждое воскресенье в 03:00
+    
+    и участвует в выборах лидера: задачи выполняются только в процессе-лидере.
     """
-    global scheduler
+    global scheduler, elector
     
     # Проверяем что планировщик еще не запущен
     if scheduler is not None:
@@ -177,7 +259,7 @@ def start_scheduler():
         # Задача 1: Деактивация истекших токенов
         # Запускается каждый час в :00
         scheduler.add_job(
-            cleanup_expired_tokens,
+            partial(run_job, 'cleanup_expired_tokens', cleanup_expired_tokens),
             trigger=CronTrigger(minute=0),  # Каждый час
             id='cleanup_expired_tokens',
             name='Деактивация истекших токенов',
@@ -189,7 +271,7 @@ def start_scheduler():
         # Задача 2: Автопополнение подписок
         # Запускается каждый день в 00:01
         scheduler.add_job(
-            renew_subscriptions,
+            partial(run_job, 'renew_subscriptions', renew_subscriptions),
             trigger=CronTrigger(hour=0, minute=1),  # Каждый день в 00:01
             id='renew_subscriptions',
             name='Автопополнение подписок',
@@ -201,7 +283,7 @@ def start_scheduler():
         # Задача 3: Удаление старых токенов
         # Запускается каждое воскресенье в 03:00
         scheduler.add_job(
-            delete_old_tokens,
+            partial(run_job, 'delete_old_tokens', delete_old_tokens),
             trigger=CronTrigger(day_of_week='sun', hour=3, minute=0),  # Воскресенье 03:00
             id='delete_old_tokens',
             name='Удаление старых токенов',
@@ -222,9 +304,14 @@ def start_scheduler():
         logger.info("  3️⃣ Удаление старых токенов - воскресенье в 03:00")
         logger.info("=" * 70)
         
-        # Запускаем первую очистку сразу при старте
-        logger.info("🚀 Запуск начальной очистки...")
-        cleanup_expired_tokens()
+        # Выборы лидера; пропущенные запуски выполнит только лидер (_on_elected)
+        elector = LeaderElector('scheduler', on_elected=_on_elected)
+        elector.start()
+        atexit.register(stop_scheduler)
+        logger.info(
+            f"🗳️ Выбор лидера ({elector.backend}): "
+            f"{'лидер' if elector.is_leader() else 'ожидание'} — {elector.holder}"
+        )
         
     except Exception as e:
         logger.error(f"❌ Ошибка при запуске планировщика: {e}")
@@ -235,9 +322,14 @@ def stop_scheduler():
     """
     Останавливает планировщик фоновых задач
     
-    Вызывается при завершении работы приложения.
+    Вызывается при завершении работы приложения. Аренда лидерства
+    снимается сразу, чтобы другой процесс не ждал её истечения.
     """
-    global scheduler
+    global scheduler, elector
+    
+    if elector is not None:
+        elector.stop(release=True)
+        elector = None
     
     if scheduler is not None:
         try:
@@ -248,19 +340,28 @@ def stop_scheduler():
             logger.error(f"❌ Ошибка при остановке планировщика: {e}")
 
 
-def get_scheduler_status():
+def get_scheduler_status(history_limit=20):
     """
     Возвращает статус планировщика и информацию о задачах
     
+    Args:
+        history_limit: Сколько последних запусков вернуть в history
+    
     Returns:
-        dict: Словарь с информацией о статусе и задачах
+        dict: running, jobs (с last_run), leader (состояние выборов),
+        history (последние запуски задач в кластере)
     """
-    global scheduler
+    history = _get_run_history(history_limit)
+    last_runs = {}
+    for run in history:
+        last_runs.setdefault(run['job_id'], run)
     
     if scheduler is None:
         return {
             'running': False,
-            'jobs': []
+            'jobs': [],
+            'leader': None,
+            'history': history,
         }
     
     jobs = []
@@ -269,10 +370,36 @@ def get_scheduler_status():
             'id': job.id,
             'name': job.name,
             'next_run': job.next_run_time.isoformat() if job.next_run_time else None,
-            'trigger': str(job.trigger)
+            'trigger': str(job.trigger),
+            'last_run': last_runs.get(job.id),
         })
     
     return {
         'running': scheduler.running,
-        'jobs': jobs
+        'jobs': jobs,
+        'leader': elector.get_status() if elector is not None else None,
+        'history': history,
     }
+
+
+def _get_run_history(limit):
+    """Последние запуски задач из SchedulerRun (пустой список, если БД недоступна)."""
+    try:
+        from generator.models import SchedulerRun
+        runs = SchedulerRun.objects.all()[:limit]
+        return [
+            {
+                'job_id': run.job_id,
+                'holder': run.holder,
+                'status': run.status,
+                'started_at': run.started_at.isoformat(),
+                'finished_at': run.finished_at.isoformat() if run.finished_at else None,
+                'duration': run.duration,
+                'result': run.result,
+                'error': run.error,
+            }
+            for run in runs
+        ]
+    except Exception as e:
+        logger.warning(f"Не удалось прочитать историю запусков планировщика: {e}")
+        return []
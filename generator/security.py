@@ -13,11 +13,14 @@ import time
 import logging
 from datetime import datetime, timedelta
 from collections import defaultdict
+from django.conf import settings
 from django.core.cache import cache
 from django.http import JsonResponse, HttpResponseForbidden
 from django.utils import timezone
 from ipware import get_client_ip
 
+from .rate_limit import RatePolicy, gcra_limiter
+
 logger = logging.getLogger('security')
 
 
@@ -64,22 +67,48 @@ class RateLimiter:
         return f"ip:{client_ip or 'unknown'}"
     
     @staticmethod
-    def is_rate_limited(identifier, max_requests, window_seconds):
+    def is_rate_limited(identifier, max_requests, window_seconds, policy_name=None):
         """
         Проверить, не превышен ли лимит запросов
         
+        По умолчанию — скользящее окно GCRA одним атомарным обращением
+        к Redis (generator/rate_limit.py); RATE_LIMIT_BACKEND='fixed' —
+        прежнее фиксированное окно на счётчиках кэша.
+        
         Args:
             identifier: Уникальный идентификатор клиента
             max_requests: Максимальное количество запросов
             window_seconds: Временное окно в секундах
+            policy_name: Имя политики (часть ключа; по умолчанию — по окну)
         
         Returns:
             (is_limited, remaining, reset_time)
         """
-        cache_key = f"ratelimit:{identifier}:{window_seconds}"
+        if getattr(settings, 'RATE_LIMIT_BACKEND', 'gcra') == 'fixed':
+            return RateLimiter.is_rate_limited_fixed_window(identifier, max_requests, window_seconds)
+        
+        policy = RatePolicy(policy_name or f"{window_seconds}s", max_requests, window_seconds)
+        result = gcra_limiter.hit(identifier, policy)
+        wait = result.reset_after if result.allowed else result.retry_after
+        return not result.allowed, result.remaining, datetime.now() + timedelta(seconds=wait)
+    
+    @staticmethod
+    def is_rate_limited_fixed_window(identifier, max_requests, window_seconds, current=None):
+        """
+        Фиксированное окно на счётчиках кэша (прежняя реализация)
+        
+        Args:
+            current: Уже прочитанный счётчик (конвейер безопасности читает его
+                вместе с блокировками одним cache.get_many)
+        
+        Returns:
+            (is_limited, remaining, reset_time)
+        """
+        cache_key = RateLimiter.fixed_window_key(identifier, window_seconds)
         
         # Получаем текущий счетчик
-        current = cache.get(cache_key, 0)
+        if current is None:
+            current = cache.get(cache_key, 0)
         
         if current >= max_requests:
             # Лимит превышен
@@ -99,18 +128,28 @@ class RateLimiter:
         return False, remaining, reset_time
     
     @staticmethod
-    def check_rate_limit(request, max_per_minute=MAX_REQUESTS_PER_MINUTE):
+    def fixed_window_key(identifier, window_seconds):
+        """Ключ счётчика фиксированного окна"""
+        return f"ratelimit:{identifier}:{window_seconds}"
+    
+    @staticmethod
+    def check_rate_limit(request, max_per_minute=MAX_REQUESTS_PER_MINUTE, policy=None):
         """
         Проверить rate limit для запроса
         
+        Args:
+            request: HTTP запрос
+            max_per_minute: Лимит в минуту, если политика не передана
+            policy: RatePolicy (generator.rate_limit.resolve_policy)
+        
         Returns:
             None если OK, JsonResponse если превышен лимит
         """
         identifier = RateLimiter.get_client_identifier(request)
+        policy = policy or RatePolicy('60s', max_per_minute, 60)
         
-        # Проверяем минутный лимит
         is_limited, remaining, reset_time = RateLimiter.is_rate_limited(
-            identifier, max_per_minute, 60
+            identifier, policy.limit, policy.period, policy.name
         )
         
         if is_limited:
@@ -118,13 +157,18 @@ class RateLimiter:
                 f"Rate limit exceeded for {identifier}. "
                 f"Reset at {reset_time}"
             )
-            return JsonResponse({
-                'error': 'Too many requests',
-                'message': 'Вы превысили лимит запросов. Попробуйте позже.',
-                'retry_after': int((reset_time - datetime.now()).total_seconds())
-            }, status=429)
+            return RateLimiter.too_many_requests(reset_time)
         
         return None
+    
+    @staticmethod
+    def too_many_requests(reset_time):
+        """Ответ 429 с временем до сброса лимита"""
+        return JsonResponse({
+            'error': 'Too many requests',
+            'message': 'Вы превысили лимит запросов. Попробуйте позже.',
+            'retry_after': int((reset_time - datetime.now()).total_seconds())
+        }, status=429)
 
 
 # =============================================================================
@@ -137,21 +181,65 @@ class BlockList:
     @staticmethod
     def block_ip(ip, reason, duration_minutes=BLOCK_DURATION_MINUTES):
         """Заблокировать IP адрес"""
-        cache_key = f"blocked_ip:{ip}"
-        cache.set(cache_key, {
-            'reason': reason,
-            'blocked_at': timezone.now().isoformat(),
-            'expires_at': (timezone.now() + timedelta(minutes=duration_minutes)).isoformat()
-        }, duration_minutes * 60)
+        try:
+            BlockList.block_network(ip, reason, source='auto', duration_minutes=duration_minutes)
+        except (TypeError, ValueError):
+            logger.warning(f"Cannot block invalid IP {ip!r}. Reason: {reason}")
+            return
         
         logger.warning(f"IP {ip} blocked for {duration_minutes} minutes. Reason: {reason}")
     
+    @staticmethod
+    def block_network(network, reason, source='manual', duration_minutes=None):
+        """
+        Заблокировать IP адрес или подсеть (CIDR)
+        
+        Запись сохраняется в BlockedNetwork; этот процесс видит её сразу,
+        остальные воркеры — после обновления блоклиста по версии.
+        
+        Args:
+            network: IP адрес или сеть, например 203.0.113.0/24
+            reason: Причина блокировки
+            source: Источник записи (manual, auto, asn:AS12345)
+            duration_minutes: Срок блокировки (None — бессрочно)
+        
+        Raises:
+            ValueError: Некорректный адрес или сеть
+        """
+        from .ip_blocklist import ip_blocklist, normalize_network
+        from .models import BlockedNetwork
+        
+        network = normalize_network(network)
+        expires_at = None
+        if duration_minutes:
+            expires_at = timezone.now() + timedelta(minutes=duration_minutes)
+        try:
+            BlockedNetwork.objects.update_or_create(
+                network=network,
+                defaults={'reason': reason[:255], 'source': source, 'expires_at': expires_at}
+            )
+        except Exception as e:
+            logger.error(f"Не удалось сохранить блокировку {network}: {e}")
+        ip_blocklist.add_local(
+            network, reason, source, expires_at.timestamp() if expires_at else None
+        )
+    
+    @staticmethod
+    def unblock_network(network):
+        """Снять блокировку IP адреса или подсети"""
+        from .ip_blocklist import ip_blocklist, normalize_network
+        from .models import BlockedNetwork
+        
+        network = normalize_network(network)
+        for blocked in BlockedNetwork.objects.filter(network=network):
+            blocked.delete()
+        ip_blocklist.remove_local(network)
+    
     @staticmethod
     def is_ip_blocked(ip):
-        """Проверить, заблокирован ли IP"""
-        cache_key = f"blocked_ip:{ip}"
-        blocked_data = cache.get(cache_key)
-        return blocked_data is not None
+        """Проверить, заблокирован ли IP (адресом или подсетью, без обращения к кэшу)"""
+        from .ip_blocklist import ip_blocklist
+        return ip_blocklist.is_blocked(ip)
     
     @staticmethod
     def block_token(token, reason):
@@ -173,11 +261,12 @@ class BlockList:
     @staticmethod
     def get_blocked_info(identifier):
         """Получить информацию о блокировке"""
+        from .ip_blocklist import ip_blocklist
+        
         # Проверяем IP
-        ip_key = f"blocked_ip:{identifier}"
-        ip_data = cache.get(ip_key)
-        if ip_data:
-            return ip_data
+        entry = ip_blocklist.lookup(identifier)
+        if entry is not None:
+            return entry.info()
         
         # Проверяем токен
         token_key = f"blocked_token:{identifier}"
@@ -1,23 +1,117 @@
 """
 Middleware для безопасности
 
-Применяет глобальные проверки безопасности ко всем запросам
+Применяет глобальные проверки безопасности ко всем запросам.
+
+SecurityPipelineMiddleware заменяет связку SecurityMiddleware +
+TokenSecurityMiddleware + AuditLogMiddleware: IP и идентификатор клиента
+вычисляются один раз за запрос, блокировки IP и подсетей проверяются в
+памяти процесса (generator/ip_blocklist.py), состояние токена читается одним
+cache.get_many, а проверки User-Agent и путей — заранее собранными
+регулярными выражениями и кортежами префиксов. Время каждого этапа
+доступно в request.security_timings и, при SECURITY_TIMINGS=True,
+в заголовке Server-Timing.
 """
 
 import logging
+import re
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
 from django.http import JsonResponse, HttpResponseForbidden
 from django.utils.deprecation import MiddlewareMixin
 from ipware import get_client_ip
 
+from .ip_blocklist import ip_blocklist
+from .rate_limit import gcra_limiter, resolve_policy
 from .security import (
     RateLimiter, 
     BlockList, 
     SecurityMonitor,
     log_security_event
 )
+from .token_cache import prime_request_token, state_key
 
 logger = logging.getLogger('security')
 
+# Пути без проверок (статика, медиа)
+EXEMPT_PATHS = (
+    '/static/',
+    '/media/',
+    '/favicon.ico',
+    '/robots.txt',
+)
+
+# Пути, которые требуют аудита
+AUDIT_PATHS = (
+    '/api/create-token/',
+    '/api/generate/',
+    '/auth/token/',
+    '/telegram/webhook/',
+)
+
+# Известные боты/сканеры
+SUSPICIOUS_AGENTS = (
+    'sqlmap',
+    'nikto',
+    'nmap',
+    'masscan',
+    'nessus',
+    'openvas',
+    'metasploit',
+    'burp',
+    'zaproxy',
+    'acunetix',
+    'w3af',
+)
+_SUSPICIOUS_AGENT_RE = re.compile('|'.join(map(re.escape, SUSPICIOUS_AGENTS)), re.IGNORECASE)
+
+ALLOWED_METHODS = frozenset(('GET', 'POST', 'HEAD', 'OPTIONS'))
+
+RequestIdentity = namedtuple('RequestIdentity', ['ip', 'token', 'identifier'])
+
+SECURITY_HEADERS = {
+    'X-Content-Type-Options': 'nosniff',
+    'X-Frame-Options': 'DENY',
+    'X-XSS-Protection': '1; mode=block',
+    'Referrer-Policy': 'strict-origin-when-cross-origin',
+}
+
+CONTENT_SECURITY_POLICY = (
+    "default-src 'self'; "
+    "script-src 'self' 'unsafe-inline' 'unsafe-eval'; "
+    "style-src 'self' 'unsafe-inline' https://fonts.googleapis.com; "
+    "img-src 'self' data: https:; "
+    "font-src 'self' data: https://fonts.gstatic.com; "
+    "connect-src 'self';"
+)
+
+
+def is_suspicious_user_agent(user_agent):
+    """Проверить, подозрительный ли User-Agent (пустой или известный сканер)."""
+    return not user_agent or _SUSPICIOUS_AGENT_RE.search(user_agent) is not None
+
+
+def get_request_identity(request):
+    """
+    IP, токен и идентификатор клиента (вычисляются один раз за запрос)
+
+    Returns:
+        RequestIdentity: identifier — token:… при токене в сессии, иначе ip:…
+    """
+    identity = getattr(request, '_security_identity', None)
+    if identity is None:
+        client_ip, _ = get_client_ip(request)
+        token = request.session.get('access_token') if hasattr(request, 'session') else None
+        identifier = f"token:{token}" if token else f"ip:{client_ip or 'unknown'}"
+        identity = RequestIdentity(client_ip, token, identifier)
+        request._security_identity = identity
+    return identity
+
 
 class SecurityMiddleware(MiddlewareMixin):
     """
@@ -30,22 +124,18 @@ class SecurityMiddleware(MiddlewareMixin):
     """
     
     # Пути, которые не требуют проверки (статика, медиа)
-    EXEMPT_PATHS = [
-        '/static/',
-        '/media/',
-        '/favicon.ico',
-        '/robots.txt',
-    ]
+    EXEMPT_PATHS = EXEMPT_PATHS
     
     def process_request(self, request):
         """Обработка входящего запроса"""
         
         # Пропускаем проверку для exempt путей
-        if any(request.path.startswith(path) for path in self.EXEMPT_PATHS):
+        if request.path.startswith(self.EXEMPT_PATHS):
             return None
         
         # Получаем IP клиента
-        client_ip, is_routable = get_client_ip(request)
+        identity = get_request_identity(request)
+        client_ip = identity.ip
         
         # Проверка 1: IP в черном списке
         if BlockList.is_ip_blocked(client_ip):
@@ -70,24 +160,18 @@ class SecurityMiddleware(MiddlewareMixin):
             }, status=403)
         
         # Проверка 2: Глобальный rate limit
-        # Для API эндпоинтов используем более строгий лимит
-        if request.path.startswith('/api/'):
-            max_per_minute = 30
-        elif request.path.startswith('/generator/'):
-            max_per_minute = 20
-        else:
-            max_per_minute = 60
-        
-        limit_response = RateLimiter.check_rate_limit(request, max_per_minute)
+        # Политика по пути (для API и генератора строже) и тарифу токена
+        policy = resolve_policy(request.path, request.session.get('token_type'))
+        request.rate_limit_policy = policy
+        limit_response = RateLimiter.check_rate_limit(request, policy=policy) if policy else None
         if limit_response:
-            identifier = RateLimiter.get_client_identifier(request)
             log_security_event(
                 'rate_limit_exceeded',
-                identifier,
+                identity.identifier,
                 {
                     'path': request.path,
                     'method': request.method,
-                    'limit': max_per_minute
+                    'limit': policy.limit
                 },
                 'WARNING'
             )
@@ -96,18 +180,16 @@ class SecurityMiddleware(MiddlewareMixin):
         # Проверка 3: Подозрительные User-Agent
         user_agent = request.META.get('HTTP_USER_AGENT', '')
         if self._is_suspicious_user_agent(user_agent):
-            identifier = RateLimiter.get_client_identifier(request)
             SecurityMonitor.log_suspicious_activity(
-                identifier,
+                identity.identifier,
                 'suspicious_user_agent',
                 f"User-Agent: {user_agent}"
             )
         
         # Проверка 4: Необычные HTTP методы
-        if request.method not in ['GET', 'POST', 'HEAD', 'OPTIONS']:
-            identifier = RateLimiter.get_client_identifier(request)
+        if request.method not in ALLOWED_METHODS:
             SecurityMonitor.log_suspicious_activity(
-                identifier,
+                identity.identifier,
                 'unusual_http_method',
                 f"Method: {request.method}, Path: {request.path}"
             )
@@ -118,52 +200,25 @@ class SecurityMiddleware(MiddlewareMixin):
         """Добавление заголовков безопасности в ответ"""
         
         # Добавляем security headers
-        response['X-Content-Type-Options'] = 'nosniff'
-        response['X-Frame-Options'] = 'DENY'
-        response['X-XSS-Protection'] = '1; mode=block'
-        response['Referrer-Policy'] = 'strict-origin-when-cross-origin'
+        for header, value in SECURITY_HEADERS.items():
+            response[header] = value
         
         # Content Security Policy
         if not request.path.startswith('/admin/'):
-            response['Content-Security-Policy'] = (
-                "default-src 'self'; "
-                "script-src 'self' 'unsafe-inline' 'unsafe-eval'; "
-                "style-src 'self' 'unsafe-inline' https://fonts.googleapis.com; "
-                "img-src 'self' data: https:; "
-                "font-src 'self' data: https://fonts.gstatic.com; "
-                "connect-src 'self';"
-            )
+            response['Content-Security-Policy'] = CONTENT_SECURITY_POLICY
         
         # Rate limit информация в заголовках (для API)
         if request.path.startswith('/api/'):
-            identifier = RateLimiter.get_client_identifier(request)
             # Не вызываем проверку снова, просто добавляем информационные заголовки
-            response['X-RateLimit-Limit'] = '30'
+            policy = getattr(request, 'rate_limit_policy', None)
+            if policy:
+                response['X-RateLimit-Limit'] = str(policy.limit)
         
         return response
     
     def _is_suspicious_user_agent(self, user_agent):
         """Проверить, подозрительный ли User-Agent"""
-        if not user_agent:
-            return True
-        
-        # Известные боты/сканеры
-        suspicious_agents = [
-            'sqlmap',
-            'nikto',
-            'nmap',
-            'masscan',
-            'nessus',
-            'openvas',
-            'metasploit',
-            'burp',
-            'zaproxy',
-            'acunetix',
-            'w3af'
-        ]
-        
-        user_agent_lower = user_agent.lower()
-        return any(agent in user_agent_lower for agent in suspicious_agents)
+        return is_suspicious_user_agent(user_agent)
 
 
 class TokenSecurityMiddleware(MiddlewareMixin):
@@ -215,30 +270,21 @@ class AuditLogMiddleware(MiddlewareMixin):
     """
     
     # Пути, которые требуют аудита
-    AUDIT_PATHS = [
-        '/api/create-token/',
-        '/api/generate/',
-        '/auth/token/',
-        '/telegram/webhook/',
-    ]
+    AUDIT_PATHS = AUDIT_PATHS
     
     def process_request(self, request):
         """Логирование запроса"""
         
         # Проверяем, нужно ли логировать этот путь
-        should_audit = any(
-            request.path.startswith(path) 
-            for path in self.AUDIT_PATHS
-        )
+        should_audit = request.path.startswith(self.AUDIT_PATHS)
         
         if should_audit:
-            client_ip, _ = get_client_ip(request)
-            identifier = RateLimiter.get_client_identifier(request)
+            identity = get_request_identity(request)
             
             log_data = {
                 'path': request.path,
                 'method': request.method,
-                'ip': client_ip,
+                'ip': identity.ip,
                 'user_agent': request.META.get('HTTP_USER_AGENT', ''),
                 'referer': request.META.get('HTTP_REFERER', ''),
             }
@@ -249,7 +295,7 @@ class AuditLogMiddleware(MiddlewareMixin):
             
             log_security_event(
                 'audit',
-                identifier,
+                identity.identifier,
                 log_data,
                 'INFO'
             )
@@ -261,19 +307,237 @@ class AuditLogMiddleware(MiddlewareMixin):
         
         # Логируем ошибки
         if response.status_code >= 400:
-            client_ip, _ = get_client_ip(request)
-            identifier = RateLimiter.get_client_identifier(request)
+            identity = get_request_identity(request)
             
             log_security_event(
                 'error_response',
-                identifier,
+                identity.identifier,
                 {
                     'path': request.path,
                     'status_code': response.status_code,
                     'method': request.method,
-                    'ip': client_ip
+                    'ip': identity.ip
                 },
                 'WARNING' if response.status_code < 500 else 'ERROR'
             )
         
         return response
+
+
+_timings_lock = threading.Lock()
+_timings = {}
+
+
+def get_timing_stats():
+    """
+    Суммарное время этапов конвейера безопасности в этом процессе
+
+    Returns:
+        dict: этап → {'calls': int, 'total_ms': float, 'avg_ms': float}
+    """
+    with _timings_lock:
+        return {
+            stage: {'calls': calls, 'total_ms': total, 'avg_ms': total / calls if calls else 0.0}
+            for stage, (calls, total) in _timings.items()
+        }
+
+
+def reset_timing_stats():
+    """Сбрасывает накопленную статистику этапов."""
+    with _timings_lock:
+        _timings.clear()
+
+
+class SecurityPipelineMiddleware(MiddlewareMixin):
+    """
+    Все проверки безопасности за один проход
+
+    Заменяет SecurityMiddleware, TokenSecurityMiddleware и AuditLogMiddleware
+    (их не нужно подключать вместе с ним). Этапы:
+    - identity: IP и идентификатор клиента (один раз за запрос)
+    - state: блокировка IP или подсети — из ip_blocklist в памяти процесса;
+      блокировка токена, состояние токена и счётчик фиксированного окна —
+      одним cache.get_many
+    - block: отказ для заблокированного IP или токена
+    - rate: лимит по политике пути и тарифа (GCRA — один вызов Lua-скрипта)
+    - inspect: User-Agent и HTTP метод
+    - audit: журнал для AUDIT_PATHS
+
+    Время этапов в миллисекундах — в request.security_timings, в get_timing_stats()
+    и, при SECURITY_TIMINGS=True, в заголовке Server-Timing.
+    """
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        self.report_timings = getattr(settings, 'SECURITY_TIMINGS', False)
+
+    def process_request(self, request):
+        """Проверки входящего запроса"""
+        if request.path.startswith(EXEMPT_PATHS):
+            return None
+
+        timings = request.security_timings = {}
+        clock = time.perf_counter
+        started = clock()
+
+        identity = get_request_identity(request)
+        policy = resolve_policy(request.path, request.session.get('token_type'))
+        request.rate_limit_policy = policy
+        fixed_window = policy is not None and getattr(settings, 'RATE_LIMIT_BACKEND', 'gcra') == 'fixed'
+        mark = clock()
+        timings['identity'] = (mark - started) * 1000
+
+        # Блокировки IP и подсетей — в памяти процесса (ip_blocklist)
+        ip_block = ip_blocklist.lookup(identity.ip)
+        keys = {}
+        if identity.token:
+            keys['token'] = f"blocked_token:{identity.token}"
+            keys['token_state'] = state_key(identity.token)
+        if fixed_window:
+            keys['rate'] = RateLimiter.fixed_window_key(identity.identifier, policy.period)
+        found = {}
+        if keys:
+            try:
+                found = cache.get_many(list(keys.values()))
+            except Exception as e:
+                logger.warning(f"Ошибка чтения состояния безопасности из кэша: {e}")
+        state = {name: found.get(key) for name, key in keys.items()}
+        state['ip'] = ip_block.info() if ip_block is not None else None
+        started, mark = mark, clock()
+        timings['state'] = (mark - started) * 1000
+
+        response = self._check_blocks(request, identity, state)
+        started, mark = mark, clock()
+        timings['block'] = (mark - started) * 1000
+        if response is not None:
+            return response
+        prime_request_token(request, state.get('token_state'))
+
+        if policy is not None:
+            response = self._check_rate(identity, policy, fixed_window, state.get('rate'), request)
+            started, mark = mark, clock()
+            timings['rate'] = (mark - started) * 1000
+            if response is not None:
+                return response
+
+        user_agent = request.META.get('HTTP_USER_AGENT', '')
+        if is_suspicious_user_agent(user_agent):
+            SecurityMonitor.log_suspicious_activity(
+                identity.identifier,
+                'suspicious_user_agent',
+                f"User-Agent: {user_agent}"
+            )
+        if request.method not in ALLOWED_METHODS:
+            SecurityMonitor.log_suspicious_activity(
+                identity.identifier,
+                'unusual_http_method',
+                f"Method: {request.method}, Path: {request.path}"
+            )
+        started, mark = mark, clock()
+        timings['inspect'] = (mark - started) * 1000
+
+        if request.path.startswith(AUDIT_PATHS):
+            log_data = {
+                'path': request.path,
+                'method': request.method,
+                'ip': identity.ip,
+                'user_agent': user_agent,
+                'referer': request.META.get('HTTP_REFERER', ''),
+            }
+            # Для POST запросов логируем ключи (но не значения!)
+            if request.method == 'POST':
+                log_data['post_keys'] = list(request.POST.keys())
+            log_security_event('audit', identity.identifier, log_data, 'INFO')
+            timings['audit'] = (clock() - mark) * 1000
+
+        return None
+
+    def _check_blocks(self, request, identity, state):
+        """Ответ 403 для заблокированного IP или токена"""
+        ip_block = state.get('ip')
+        if ip_block is not None:
+            log_security_event(
+                'blocked_access',
+                f"ip:{identity.ip}",
+                {'path': request.path, 'method': request.method, 'block_info': ip_block},
+                'WARNING'
+            )
+            return JsonResponse({
+                'error': 'Access Denied',
+                'message': 'Ваш IP адрес временно заблокирован из-за подозрительной активности.',
+                'reason': ip_block.get('reason', 'Unknown'),
+                'expires_at': ip_block.get('expires_at', 'Unknown')
+            }, status=403)
+
+        token_block = state.get('token')
+        if token_block is not None:
+            log_security_event(
+                'blocked_token_access',
+                f"token:{identity.token}",
+                {'path': request.path, 'block_info': token_block},
+                'WARNING'
+            )
+            # Очищаем сессию
+            request.session.flush()
+            return JsonResponse({
+                'error': 'Token Blocked',
+                'message': 'Ваш токен заблокирован.',
+                'reason': token_block.get('reason', 'Security violation')
+            }, status=403)
+        return None
+
+    def _check_rate(self, identity, policy, fixed_window, current, request):
+        """Ответ 429 при превышении лимита политики"""
+        if fixed_window:
+            is_limited, _, reset_time = RateLimiter.is_rate_limited_fixed_window(
+                identity.identifier, policy.limit, policy.period, current=current or 0
+            )
+        else:
+            result = gcra_limiter.hit(identity.identifier, policy)
+            is_limited = not result.allowed
+            reset_time = datetime.now() + timedelta(seconds=result.retry_after)
+        if not is_limited:
+            return None
+        log_security_event(
+            'rate_limit_exceeded',
+            identity.identifier,
+            {'path': request.path, 'method': request.method, 'limit': policy.limit},
+            'WARNING'
+        )
+        return RateLimiter.too_many_requests(reset_time)
+
+    def process_response(self, request, response):
+        """Заголовки безопасности, журнал ошибок и время этапов"""
+        for header, value in SECURITY_HEADERS.items():
+            response[header] = value
+        if not request.path.startswith('/admin/'):
+            response['Content-Security-Policy'] = CONTENT_SECURITY_POLICY
+        policy = getattr(request, 'rate_limit_policy', None)
+        if policy and request.path.startswith('/api/'):
+            response['X-RateLimit-Limit'] = str(policy.limit)
+
+        if response.status_code >= 400 and not request.path.startswith(EXEMPT_PATHS):
+            identity = get_request_identity(request)
+            log_security_event(
+                'error_response',
+                identity.identifier,
+                {
+                    'path': request.path,
+                    'status_code': response.status_code,
+                    'method': request.method,
+                    'ip': identity.ip
+                },
+                'WARNING' if response.status_code < 500 else 'ERROR'
+            )
+
+        timings = getattr(request, 'security_timings', None)
+        if timings:
+            with _timings_lock:
+                for stage, elapsed in timings.items():
+                    calls, total = _timings.get(stage, (0, 0.0))
+                    _timings[stage] = (calls + 1, total + elapsed)
+            if self.report_timings:
+                response['Server-Timing'] = ', '.join(
+                    f"sec-{stage};dur={elapsed:.3f}" for stage, elapsed in timings.items()
+                )
+        return response
@@ -0,0 +1,164 @@
+"""
+Синхронизация данных токена в сессии без лишних записей
+
+TokenAccessMiddleware и декораторы на каждом запросе заново присваивали
+шесть ключей сессии (token_type, gigachat_tokens_used, is_demo, ...), из-за
+чего сессия помечалась изменённой и сохранялась (с cached_db — запись в БД
+и в Redis) на каждый просмотр страницы. Теперь ключ присваивается только
+если значение действительно изменилось (sync_session), а форма последней
+генерации хранится не в сессии, а в кэше по ID генерации
+(remember_form_data / recall_form_data).
+
+SessionSyncMiddleware продлевает сессию не чаще раза в
+SESSION_REFRESH_INTERVAL секунд (вместо SESSION_SAVE_EVERY_REQUEST) и
+считает записи сессии и их размер: get_stats() по процессу, а при
+SESSION_SYNC_REPORT=True — заголовок X-Session-Write в каждом ответе.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+REFRESHED_AT_KEY = '_refreshed_at'
+FORM_DATA_PREFIX = 'form_data:'
+
+
+def sync_session(session, values):
+    """
+    Записывает в сессию только изменившиеся значения
+
+    Args:
+        session: request.session
+        values: Словарь ключ → новое значение
+
+    Returns:
+        int: Число изменённых ключей
+    """
+    changed = 0
+    for key, value in values.items():
+        if session.get(key, _MISSING) != value:
+            session[key] = value
+            changed += 1
+    return changed
+
+
+def token_session_values(token):
+    """Данные токена, которые шаблоны и JS читают из сессии."""
+    return {
+        'token_type': token.token_type,
+        'gigachat_tokens_limit': token.gigachat_tokens_limit,
+        'gigachat_tokens_used': token.gigachat_tokens_used,
+        'openai_tokens_limit': token.openai_tokens_limit,
+        'openai_tokens_used': token.openai_tokens_used,
+        # Для обратной совместимости
+        'is_demo': token.token_type == 'DEMO_FREE' or token.token_type.startswith('HIDDEN'),
+        'daily_generations_left': -1,  # Устаревшее поле
+    }
+
+
+def sync_token_usage(session, token):
+    """Обновляет в сессии счётчики токенов после генерации."""
+    return sync_session(session, {
+        'gigachat_tokens_used': token.gigachat_tokens_used,
+        'openai_tokens_used': token.openai_tokens_used,
+    })
+
+
+def remember_form_data(session, generation_id, form_data):
+    """
+    Сохраняет форму генерации в кэше (для генерации изображения по тексту)
+
+    Args:
+        session: request.session (удаляется устаревший ключ last_form_data)
+        generation_id: ID генерации
+        form_data: Параметры формы
+    """
+    session.pop('last_form_data', None)
+    if not generation_id:
+        return
+    try:
+        cache.set(f"{FORM_DATA_PREFIX}{generation_id}", form_data, getattr(settings, 'FORM_DATA_CACHE_TTL', 86400))
+    except Exception as e:
+        logger.warning(f"Не удалось сохранить форму генерации {generation_id}: {e}")
+
+
+def recall_form_data(session, generation_id):
+    """
+    Форма генерации по ID (или из старой сессии с last_form_data)
+
+    Returns:
+        dict: Параметры формы или пустой словарь
+    """
+    form_data = None
+    if generation_id:
+        try:
+            form_data = cache.get(f"{FORM_DATA_PREFIX}{generation_id}")
+        except Exception as e:
+            logger.warning(f"Ошибка чтения формы генерации {generation_id}: {e}")
+    return form_data or session.get('last_form_data', {})
+
+
+_stats_lock = threading.Lock()
+_stats = {'requests': 0, 'writes': 0, 'bytes': 0}
+
+
+def get_stats():
+    """
+    Статистика записей сессий в этом процессе
+
+    Returns:
+        dict: requests, writes, bytes (суммарный размер записанных сессий)
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+class SessionSyncMiddleware:
+    """
+    Продление сессии по интервалу и учёт записей сессии
+
+    Должен стоять сразу после SessionMiddleware, чтобы видеть сессию
+    в том состоянии, в котором она будет сохранена.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.refresh_interval = getattr(settings, 'SESSION_REFRESH_INTERVAL', 3600)
+        self.report = getattr(settings, 'SESSION_SYNC_REPORT', False)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        session = getattr(request, 'session', None)
+        if session is None:
+            return response
+
+        if session.accessed and not session.is_empty():
+            # Скользящий срок жизни сессии: одна запись за интервал, а не за запрос
+            now = int(time.time())
+            if now - session.get(REFRESHED_AT_KEY, 0) >= self.refresh_interval:
+                session[REFRESHED_AT_KEY] = now
+
+        # Условие сохранения — как в SessionMiddleware.process_response
+        will_save = (
+            (session.modified or settings.SESSION_SAVE_EVERY_REQUEST)
+            and not session.is_empty()
+            and response.status_code != 500
+        )
+        size = len(session.encode(session._get_session())) if will_save else 0
+        with _stats_lock:
+            _stats['requests'] += 1
+            if will_save:
+                _stats['writes'] += 1
+                _stats['bytes'] += size
+        if will_save:
+            logger.debug(f"Запись сессии: {size} байт ({request.path})")
+        if self.report:
+            response['X-Session-Write'] = str(size)
+        return response
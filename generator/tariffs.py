@@ -13,6 +13,7 @@ TARIFFS = {
         'duration_days': None,  # бессрочный
         'is_subscription': False,
         'visible_in_bot': True,
+        'response_cache': True,  # одинаковые запросы отдаются из кэша ответов
         'description': '30 000 токенов GigaChat + 30 000 токенов OpenAI. Бессрочно, одноразово.',
     },
     'BASIC': {
@@ -23,6 +24,7 @@ TARIFFS = {
         'duration_days': 30,
         'is_subscription': True,
         'visible_in_bot': True,
+        'response_cache': True,
         'description': '200 000 токенов GigaChat + 100 000 токенов OpenAI. Подписка на 30 дней.',
     },
     'PRO': {
@@ -33,6 +35,7 @@ TARIFFS = {
         'duration_days': 30,
         'is_subscription': True,
         'visible_in_bot': True,
+        'response_cache': False,
         'description': '500 000 токенов GigaChat + 200 000 токенов OpenAI. Подписка на 30 дней.',
     },
     'UNLIMITED': {
@@ -43,6 +46,7 @@ TARIFFS = {
         'duration_days': 30,
         'is_subscription': True,
         'visible_in_bot': True,
+        'response_cache': False,
         'description': 'Безлимит GigaChat + 500 000 токенов OpenAI. Подписка на 30 дней.',
     },
     'HIDDEN_14D': {
@@ -53,6 +57,7 @@ TARIFFS = {
         'duration_days': 14,
         'is_subscription': False,
         'visible_in_bot': False,
+        'response_cache': False,
         'description': 'Безлимит GigaChat, без OpenAI. 14 дней. Только через manual_token_generator.',
     },
     'HIDDEN_30D': {
@@ -63,6 +68,7 @@ TARIFFS = {
         'duration_days': 30,
         'is_subscription': False,
         'visible_in_bot': False,
+        'response_cache': False,
         'description': 'Безлимит GigaChat, без OpenAI. 30 дней. Только через manual_token_generator.',
     },
     'DEVELOPER': {
@@ -73,6 +79,7 @@ TARIFFS = {
         'duration_days': None,  # бессрочный
         'is_subscription': False,
         'visible_in_bot': False,
+        'response_cache': False,
         'description': 'Безлимит всего, бессрочно. Только для разработчиков.',
     },
 }
@@ -1,5 +1,7 @@
 from django import template
 
+from generator import image_derivatives
+
 register = template.Library()
 
 
@@ -20,6 +22,26 @@ def media_urls_absolute(value, request):
     return '|'.join(result)
 
 
+@register.filter
+def image_srcset(value, extension='jpg'):
+    """srcset уменьшенных копий изображения ('' для внешних URL и без копий): {{ url|image_srcset:"webp" }}"""
+    return image_derivatives.srcset(value, extension)
+
+
+@register.filter
+def image_thumb(value, width=320):
+    """URL JPEG-копии нужной ширины или исходный URL, если копии нет"""
+    if not image_derivatives.has_derivatives(value):
+        return value
+    try:
+        width = int(width)
+    except (TypeError, ValueError):
+        return value
+    if width not in image_derivatives.DERIVATIVE_WIDTHS:
+        return value
+    return image_derivatives.derivative_url(value, width, 'jpg')
+
+
 @register.filter
 def split(value, delimiter):
     """Разделяет строку по разделителю"""
@@ -29,7 +51,7 @@ def split(value, delimiter):
 
 @register.filter
 def get_first_text(value):
-    """Получает первую версию текста (до первого разделителя)"""
+    """Получает первую версию текста (до первого разделителя, legacy формат result)"""
     if not value:
         return ""
     parts = value.split("--- Перегенерация")
@@ -37,7 +59,7 @@ def get_first_text(value):
 
 @register.filter 
 def count_versions(value):
-    """Подсчитывает количество версий текста"""
+    """Подсчитывает количество версий текста (legacy формат; новые версии — GenerationVersion)"""
     if not value:
         return 1
     return value.count("--- Перегенерация") + 1
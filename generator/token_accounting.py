@@ -0,0 +1,189 @@
+"""
+Учёт токенов по данным провайдера
+
+GigaChat и OpenAI возвращают в ответе фактический расход токенов
+(usage / usage_metadata). Эти значения используются для списания лимитов
+TemporaryAccessToken и записи GigaChatTokenUsage. Если провайдер расход не
+вернул (обрыв потока, ответ из кэша, старая версия Flask API), расход
+оценивается быстрым локальным токенизатором, а запись помечается
+source='estimated', чтобы биллинг можно было сверить.
+"""
+
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+SOURCE_PROVIDER = 'provider'
+SOURCE_ESTIMATED = 'estimated'
+
+# Оценка расхода на генерацию изображения GigaChat, если провайдер не вернул usage
+IMAGE_TOKENS_ESTIMATE = int(os.getenv('GIGACHAT_IMAGE_TOKENS_ESTIMATE', '1000'))
+
+# Верхние оценки длины ответа для резерва токенов до вызова провайдера
+# (TemporaryAccessToken.reserve_tokens): текст поста и промпт изображения
+TEXT_TOKENS_ESTIMATE = int(os.getenv('TEXT_TOKENS_ESTIMATE', '2048'))
+IMAGE_PROMPT_TOKENS_ESTIMATE = int(os.getenv('IMAGE_PROMPT_TOKENS_ESTIMATE', '512'))
+
+TokenUsage = namedtuple('TokenUsage', ['prompt_tokens', 'completion_tokens', 'total_tokens', 'source'])
+
+# Символов на токен для слов разных алфавитов. Токенизатор GigaChat
+# обучен на русском тексте и кодирует кириллицу плотнее, чем OpenAI.
+_CHARS_PER_TOKEN = {
+    'gigachat': {'cyrillic': 4, 'latin': 4, 'digits': 3},
+    'openai': {'cyrillic': 3, 'latin': 4, 'digits': 3},
+}
+
+# Слова, числа и отдельные знаки пунктуации; пробелы входят в соседний токен
+_TOKEN_RE = re.compile(r'(?P<cyrillic>[а-яё]+)|(?P<latin>[a-z]+)|(?P<digits>\d+)|(?P<other>[^\w\s])', re.I)
+
+# Тексты длиннее этого порога не кэшируются и считаются по частям
+_CACHED_TEXT_LIMIT = 4096
+LONG_TEXT_CHUNK = 64 * 1024
+
+
+def _count(text, provider):
+    ratios = _CHARS_PER_TOKEN.get(provider, _CHARS_PER_TOKEN['gigachat'])
+    tokens = 0
+    for match in _TOKEN_RE.finditer(text):
+        kind = match.lastgroup
+        if kind == 'other':
+            tokens += 1
+        else:
+            per_token = ratios[kind]
+            tokens += -(-(match.end() - match.start()) // per_token)
+    return tokens
+
+
+@lru_cache(maxsize=2048)
+def _count_cached(text, provider):
+    # Системные промпты повторяются от запроса к запросу
+    return _count(text, provider)
+
+
+def _chunks(text, size=LONG_TEXT_CHUNK):
+    """Делит длинный текст на части по пробелам, не разрывая слова."""
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(start + size, length)
+        if end < length:
+            space = text.rfind(' ', start, end)
+            if space > start:
+                end = space
+        yield text[start:end]
+        start = end
+
+
+def count_tokens(text, provider='gigachat'):
+    """
+    Быстрая локальная оценка числа токенов
+
+    Args:
+        text: Текст
+        provider: 'gigachat' или 'openai' (разная плотность кириллицы)
+
+    Returns:
+        int: Оценочное количество токенов
+    """
+    if not text:
+        return 0
+    text = str(text)
+    if len(text) <= _CACHED_TEXT_LIMIT:
+        return _count_cached(text, provider)
+    return sum(_count(chunk, provider) for chunk in _chunks(text))
+
+
+def count_tokens_batch(texts, provider='gigachat'):
+    """
+    Оценка числа токенов для списка текстов
+
+    Returns:
+        list: Количество токенов для каждого текста
+    """
+    return [count_tokens(text, provider) for text in texts]
+
+
+def reservation_estimate(prompt_text, completion_tokens, provider='gigachat'):
+    """
+    Верхняя оценка расхода запроса для резерва: промпт плюс максимум ответа
+
+    Args:
+        prompt_text: Текст промпта
+        completion_tokens: Максимальная ожидаемая длина ответа в токенах
+        provider: 'gigachat' или 'openai'
+
+    Returns:
+        int: Количество токенов для резерва
+    """
+    return count_tokens(prompt_text, provider) + completion_tokens
+
+
+def _field(obj, name):
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def usage_from_response(response):
+    """
+    Извлекает фактический расход токенов из ответа провайдера
+
+    Поддерживает AIMessage/AIMessageChunk langchain (usage_metadata),
+    ChatCompletion SDK gigachat и OpenAI (usage), а также словари.
+
+    Returns:
+        TokenUsage или None, если ответ не содержит расхода
+    """
+    if response is None:
+        return None
+    meta = _field(response, 'usage_metadata')
+    if meta:
+        prompt = _field(meta, 'input_tokens') or 0
+        completion = _field(meta, 'output_tokens') or 0
+        total = _field(meta, 'total_tokens') or prompt + completion
+        return TokenUsage(prompt, completion, total, SOURCE_PROVIDER)
+    usage = _field(response, 'usage')
+    if usage:
+        prompt = _field(usage, 'prompt_tokens') or 0
+        completion = _field(usage, 'completion_tokens') or 0
+        total = _field(usage, 'total_tokens') or prompt + completion
+        if total:
+            return TokenUsage(prompt, completion, total, SOURCE_PROVIDER)
+    return None
+
+
+def estimate_usage(prompt_text, response_text, provider='gigachat', extra_completion_tokens=0):
+    """
+    Оценка расхода по текстам промпта и ответа
+
+    Args:
+        extra_completion_tokens: Добавка к ответу (например, за изображение)
+
+    Returns:
+        TokenUsage: Оценка с source='estimated'
+    """
+    prompt, completion = count_tokens_batch([prompt_text, response_text], provider)
+    completion += extra_completion_tokens
+    return TokenUsage(prompt, completion, prompt + completion, SOURCE_ESTIMATED)
+
+
+def measure_usage(prompt_text, response_text, response=None, provider='gigachat',
+                  extra_completion_tokens=0):
+    """
+    Расход токенов: данные провайдера, а при их отсутствии — оценка
+
+    Args:
+        prompt_text: Текст промпта
+        response_text: Текст ответа
+        response: Исходный ответ провайдера (опционально)
+        provider: 'gigachat' или 'openai'
+        extra_completion_tokens: Добавка к оценке, если провайдер не вернул usage
+
+    Returns:
+        TokenUsage
+    """
+    usage = usage_from_response(response)
+    if usage is not None:
+        return usage
+    return estimate_usage(prompt_text, response_text, provider, extra_completion_tokens)
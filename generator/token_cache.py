@@ -0,0 +1,123 @@
+"""
+Кэш состояния токенов доступа (TemporaryAccessToken)
+
+Один запрос к генератору загружал строку токена до трёх раз:
+TokenAccessMiddleware, декораторы consume_generation/token_required и
+utils.get_token_from_request. Теперь токен загружается один раз за запрос
+и запоминается в request.token, а между запросами хранится в общем кэше
+Django (Redis в production) не дольше TOKEN_STATE_CACHE_TTL секунд.
+
+Запись кэша удаляется при каждом изменении токена: save()/delete(),
+списание и резервирование токенов, consume_generation, массовая
+деактивация. Срок действия проверяется по expires_at при каждом запросе,
+поэтому истёкший токен не пропускается даже из кэша.
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .token_filter import token_filter
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'token_state:'
+
+
+def state_key(token_str):
+    """Ключ кэша состояния токена (для пакетного чтения через cache.get_many)."""
+    return f"{KEY_PREFIX}{str(token_str).lower()}"
+
+
+def _ttl():
+    return getattr(settings, 'TOKEN_STATE_CACHE_TTL', 30)
+
+
+def load_token(token_str):
+    """
+    Активный токен по строке UUID: из кэша, при промахе — из БД
+
+    Args:
+        token_str: UUID токена (из сессии)
+
+    Returns:
+        TemporaryAccessToken
+
+    Raises:
+        TemporaryAccessToken.DoesNotExist: Токена нет или он неактивен
+    """
+    from .models import TemporaryAccessToken
+
+    ttl = _ttl()
+    if ttl:
+        try:
+            token = cache.get(state_key(token_str))
+        except Exception as e:
+            logger.warning(f"Ошибка чтения кэша токенов: {e}")
+            token = None
+        if token is not None:
+            return token
+
+    # Фильтр Блума отсекает несуществующие UUID (перебор) без запроса к БД
+    if not token_filter.might_contain(token_str):
+        raise TemporaryAccessToken.DoesNotExist('Токен не найден')
+
+    token = TemporaryAccessToken.objects.get(token=token_str, is_active=True)
+    if ttl:
+        try:
+            cache.set(state_key(token.token), token, ttl)
+        except Exception as e:
+            logger.warning(f"Ошибка записи в кэш токенов: {e}")
+    return token
+
+
+def get_request_token(request):
+    """
+    Токен текущего запроса (запоминается в request.token)
+
+    Повторные вызовы в рамках одного запроса не обращаются ни к кэшу, ни к БД.
+
+    Args:
+        request: HTTP запрос с access_token в сессии
+
+    Returns:
+        TemporaryAccessToken
+
+    Raises:
+        TemporaryAccessToken.DoesNotExist: Токена нет или он неактивен
+    """
+    token_str = request.session.get('access_token')
+    token = getattr(request, 'token', None)
+    if token is not None and str(token.token) == str(token_str).lower():
+        return token
+    token = load_token(token_str)
+    request.token = token
+    return token
+
+
+def prime_request_token(request, token):
+    """
+    Запоминает в request.token токен, уже прочитанный из кэша
+
+    Используется конвейером безопасности, который читает состояние токена
+    вместе с блокировками одним cache.get_many.
+    """
+    if token is not None and str(token.token) == str(request.session.get('access_token')).lower():
+        request.token = token
+
+
+def invalidate_token_state(*tokens):
+    """
+    Удаляет токены из кэша после изменения
+
+    Args:
+        *tokens: UUID токенов (или их строки)
+    """
+    keys = [state_key(token) for token in tokens if token]
+    if not keys:
+        return
+    try:
+        cache.delete_many(keys)
+    except Exception as e:
+        logger.warning(f"Ошибка очистки кэша токенов: {e}")
@@ -0,0 +1,716 @@
+"""
+Фильтр Блума по UUID токенов доступа
+
+token_auth_view, api_token_info и TokenAccessMiddleware обращались к БД
+за каждым предъявленным UUID, в том числе за мусором и перебором. Фильтр
+хранит все существующие токены (k бит на токен в битовом массиве из m бит)
+и отвечает «точно нет» без запроса к БД; ответ «возможно» проверяется в БД
+как раньше. Новые токены добавляются в фильтр при создании
+(TemporaryAccessToken.save), а после перестроения заново добавляются
+токены, созданные во время перестроения.
+
+«Точно нет» отвечает только фильтр, про который известно, что он полный;
+иначе ответ «возможно» и запрос к БД:
+- фильтр хранит число добавленных токенов и сумму их id; раз в
+  TOKEN_FILTER_VERIFY_INTERVAL секунд процесс сверяет их с БД. Расхождение
+  (loaddata, миграции, восстановление из копии, bulk_create, удаление
+  токенов — всё, что минует save) запускает перестроение;
+- если добавить токен не удалось, фильтр удаляется из хранилища (все
+  процессы перестраивают его), а процесс считает его устаревшим, пока не
+  увидит фильтр, построенный после ошибки.
+
+Фильтр общий для всех воркеров:
+- redis — битовая карта в Redis, проверка одним Lua-скриптом (один round trip);
+- mmap — файл TOKEN_FILTER_PATH, отображённый в память каждым воркером
+  (только для одного хоста: добавления видны процессам этого хоста);
+- memory — в памяти процесса (для тестов и одного процесса);
+- auto — redis, если доступен, иначе off (не файл на хосте: воркеры
+  других хостов не видели бы добавленных токенов); off — фильтр выключен.
+
+Удалить токен из фильтра Блума нельзя: удалённые токены остаются
+«возможными» до перестроения (rebuild, после очистки старых токенов).
+Размер, заполнение, оценка и измеренная доля ложноположительных ответов —
+get_stats() и команда token_filter.
+"""
+
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+
+from . import redis_backend
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировки файла недоступны
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+BACKEND_OFF = 'off'
+BACKEND_AUTO = 'auto'
+BACKEND_MEMORY = 'memory'
+BACKEND_MMAP = 'mmap'
+BACKEND_REDIS = 'redis'
+
+# Токены, созданные за это время до начала перестроения, добавляются повторно
+REBUILD_OVERLAP = timedelta(minutes=1)
+
+
+def _hashes(token):
+    """
+    Два 32-битных хеша UUID для двойного хеширования (h1 + i*h2) mod m
+
+    Raises:
+        ValueError: Строка не является UUID
+    """
+    raw = token.bytes if isinstance(token, uuid.UUID) else uuid.UUID(str(token)).bytes
+    digest = hashlib.blake2b(raw, digest_size=8).digest()
+    return int.from_bytes(digest[:4], 'little'), int.from_bytes(digest[4:], 'little') | 1
+
+
+def optimal_params(capacity, error_rate):
+    """
+    Размер битового массива и число хеш-функций для ёмкости и доли ошибок
+
+    Returns:
+        (m, k): m кратно 8
+    """
+    capacity = max(int(capacity), 1)
+    m = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+    m = max(64, (m + 7) // 8 * 8)
+    k = max(1, round(m / capacity * math.log(2)))
+    return m, k
+
+
+# Порядок бит как у Redis GETBIT/SETBIT: бит 0 — старший бит байта 0
+def _test_bits(bits, m, k, h1, h2):
+    for i in range(k):
+        position = (h1 + i * h2) % m
+        if not bits[position >> 3] & (0x80 >> (position & 7)):
+            return False
+    return True
+
+
+def _set_bits(bits, m, k, h1, h2):
+    for i in range(k):
+        position = (h1 + i * h2) % m
+        bits[position >> 3] |= 0x80 >> (position & 7)
+
+
+class _MemoryStore:
+    """Битовый массив в памяти процесса."""
+
+    name = BACKEND_MEMORY
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bits = None
+        self.meta = None
+
+    def info(self):
+        return dict(self.meta) if self.meta else None
+
+    def contains(self, h1, h2):
+        if self.bits is None:
+            return None
+        return _test_bits(self.bits, self.meta['m'], self.meta['k'], h1, h2)
+
+    def add(self, h1, h2, pk=None):
+        with self.lock:
+            if self.bits is None:
+                return False
+            _set_bits(self.bits, self.meta['m'], self.meta['k'], h1, h2)
+            if pk is not None:
+                self.meta['count'] += 1
+                self.meta['ids'] += pk
+            return True
+
+    def replace(self, meta, bits, after_replace=None):
+        with self.lock:
+            self.bits = bytearray(bits)
+            self.meta = dict(meta)
+        if after_replace:
+            after_replace()
+
+    def discard(self):
+        with self.lock:
+            self.bits = None
+            self.meta = None
+
+    def snapshot(self):
+        return bytes(self.bits) if self.bits is not None else None
+
+    def try_lock_build(self):
+        return True
+
+    def unlock_build(self):
+        pass
+
+
+class _MmapStore:
+    """
+    Битовый массив в файле, отображённом в память (общий для процессов хоста)
+
+    Заголовок: магическое число, версия формата, m, k, ёмкость, число
+    токенов, сумма их id, время построения. Добавления и замена файла
+    выполняются под блокировкой файла <path>.lock.
+    """
+
+    name = BACKEND_MMAP
+    MAGIC = b'GWBF'
+    VERSION = 2
+    HEADER = struct.Struct('<4sIQIQQQd')
+    HEADER_SIZE = 64
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        # (inode, mmap, meta) — заменяются вместе при замене файла
+        self._state = None
+        self._build_lock = None
+
+    def _mapping(self):
+        """(mmap, meta) актуального файла (переоткрывается после замены) или None."""
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return None
+        state = self._state
+        if state is not None and state[0] == inode:
+            return state[1], state[2]
+        with self.lock:
+            state = self._state
+            if state is not None and state[0] == inode:
+                return state[1], state[2]
+            with open(self.path, 'r+b') as handle:
+                mapping = mmap.mmap(handle.fileno(), 0)
+            magic, version, m, k, capacity = self.HEADER.unpack_from(mapping, 0)[:5]
+            if magic != self.MAGIC or version != self.VERSION or len(mapping) < self.HEADER_SIZE + m // 8:
+                mapping.close()
+                logger.warning(f"Фильтр токенов: повреждённый файл {self.path}")
+                return None
+            # Старое отображение не закрываем: его может читать другой поток
+            meta = {'m': m, 'k': k, 'capacity': capacity}
+            self._state = (inode, mapping, meta)
+            return mapping, meta
+
+    def _bits(self, mapping, meta):
+        return memoryview(mapping)[self.HEADER_SIZE:self.HEADER_SIZE + meta['m'] // 8]
+
+    def info(self):
+        current = self._mapping()
+        if current is None:
+            return None
+        mapping, meta = current
+        info = dict(meta)
+        info['count'], info['ids'], info['built'] = self.HEADER.unpack_from(mapping, 0)[5:]
+        return info
+
+    def contains(self, h1, h2):
+        current = self._mapping()
+        if current is None:
+            return None
+        mapping, meta = current
+        bits = self._bits(mapping, meta)
+        try:
+            return _test_bits(bits, meta['m'], meta['k'], h1, h2)
+        finally:
+            bits.release()
+
+    def _file_lock(self):
+        """Эксклюзивная блокировка <path>.lock (снимается закрытием файла)."""
+        handle = open(f"{self.path}.lock", 'a+b')
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        return handle
+
+    def add(self, h1, h2, pk=None):
+        handle = self._file_lock()
+        try:
+            # Под блокировкой: файл мог быть заменён перестроением
+            current = self._mapping()
+            if current is None:
+                return False
+            mapping, meta = current
+            bits = self._bits(mapping, meta)
+            try:
+                _set_bits(bits, meta['m'], meta['k'], h1, h2)
+            finally:
+                bits.release()
+            if pk is not None:
+                header = list(self.HEADER.unpack_from(mapping, 0))
+                header[5] += 1
+                header[6] += pk
+                self.HEADER.pack_into(mapping, 0, *header)
+            return True
+        finally:
+            handle.close()
+
+    def replace(self, meta, bits, after_replace=None):
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.token_filter.')
+        with os.fdopen(fd, 'wb') as handle:
+            header = self.HEADER.pack(
+                self.MAGIC, self.VERSION, meta['m'], meta['k'], meta['capacity'],
+                meta['count'], meta['ids'], meta['built'],
+            )
+            handle.write(header.ljust(self.HEADER_SIZE, b'\0'))
+            handle.write(bits)
+        lock = self._file_lock()
+        try:
+            os.replace(tmp_path, self.path)
+        finally:
+            lock.close()
+        if after_replace:
+            after_replace()
+
+    def discard(self):
+        lock = self._file_lock()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        finally:
+            lock.close()
+
+    def snapshot(self):
+        current = self._mapping()
+        if current is None:
+            return None
+        bits = self._bits(*current)
+        try:
+            return bytes(bits)
+        finally:
+            bits.release()
+
+    def try_lock_build(self):
+        if fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        handle = open(f"{self.path}.build", 'a+b')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._build_lock = handle
+        return True
+
+    def unlock_build(self):
+        if self._build_lock is not None:
+            self._build_lock.close()
+            self._build_lock = None
+
+
+# KEYS[1] — хеш с параметрами фильтра; ARGV: h1, h2 (для добавления ещё
+# приращения числа токенов и суммы id). -1 — фильтр не построен, 0 — точно нет, 1 — возможно
+_CONTAINS_SCRIPT = """
+local meta = redis.call('HMGET', KEYS[1], 'bits', 'm', 'k')
+if not meta[1] then
+    return -1
+end
+local m, k = tonumber(meta[2]), tonumber(meta[3])
+local h1, h2 = tonumber(ARGV[1]), tonumber(ARGV[2])
+for i = 0, k - 1 do
+    if redis.call('GETBIT', meta[1], (h1 + i * h2) % m) == 0 then
+        return 0
+    end
+end
+return 1
+"""
+
+_ADD_SCRIPT = """
+local meta = redis.call('HMGET', KEYS[1], 'bits', 'm', 'k')
+if not meta[1] then
+    return -1
+end
+local m, k = tonumber(meta[2]), tonumber(meta[3])
+local h1, h2 = tonumber(ARGV[1]), tonumber(ARGV[2])
+for i = 0, k - 1 do
+    redis.call('SETBIT', meta[1], (h1 + i * h2) % m, 1)
+end
+redis.call('HINCRBY', KEYS[1], 'count', tonumber(ARGV[3]))
+redis.call('HINCRBY', KEYS[1], 'ids', tonumber(ARGV[4]))
+return 1
+"""
+
+
+class _RedisStore:
+    """Битовая карта в Redis; параметры — в хеше token_filter:meta."""
+
+    name = BACKEND_REDIS
+    META_KEY = 'token_filter:meta'
+    LOCK_KEY = 'token_filter:build_lock'
+
+    def __init__(self, connection):
+        self.redis = connection
+        self._contains = connection.register_script(_CONTAINS_SCRIPT)
+        self._add = connection.register_script(_ADD_SCRIPT)
+
+    def info(self):
+        meta = self.redis.hgetall(self.META_KEY)
+        if not meta:
+            return None
+        meta = {key.decode(): value.decode() for key, value in meta.items()}
+        return {
+            'm': int(meta['m']), 'k': int(meta['k']),
+            'capacity': int(meta['capacity']), 'count': int(meta['count']),
+            'ids': int(meta['ids']), 'built': float(meta['built']),
+        }
+
+    def contains(self, h1, h2):
+        result = int(self._contains(keys=[self.META_KEY], args=[h1, h2]))
+        return None if result < 0 else bool(result)
+
+    def add(self, h1, h2, pk=None):
+        counted = pk is not None
+        return int(self._add(keys=[self.META_KEY], args=[h1, h2, int(counted), pk if counted else 0])) > 0
+
+    def replace(self, meta, bits, after_replace=None):
+        old = self.redis.hget(self.META_KEY, 'bits')
+        generation = self.redis.incr('token_filter:generation')
+        key = f"token_filter:bits:{generation}"
+        self.redis.set(key, bytes(bits))
+        pipe = self.redis.pipeline()
+        pipe.delete(self.META_KEY)
+        pipe.hset(self.META_KEY, mapping={
+            'bits': key, 'm': meta['m'], 'k': meta['k'],
+            'capacity': meta['capacity'], 'count': meta['count'],
+            'ids': meta['ids'], 'built': repr(meta['built']),
+        })
+        if old:
+            pipe.delete(old)
+        pipe.execute()
+        if after_replace:
+            after_replace()
+
+    def discard(self):
+        old = self.redis.hget(self.META_KEY, 'bits')
+        self.redis.delete(self.META_KEY, *([old] if old else []))
+
+    def snapshot(self):
+        key = self.redis.hget(self.META_KEY, 'bits')
+        return self.redis.get(key) if key else None
+
+    def try_lock_build(self):
+        return bool(self.redis.set(self.LOCK_KEY, os.getpid(), nx=True, ex=600))
+
+    def unlock_build(self):
+        self.redis.delete(self.LOCK_KEY)
+
+
+class TokenFilter:
+    """
+    Фильтр Блума по UUID токенов, общий для воркеров
+
+    Args:
+        backend: auto, redis, mmap, memory или off (по умолчанию TOKEN_FILTER_BACKEND)
+        path: Файл для mmap (по умолчанию TOKEN_FILTER_PATH)
+        capacity: Минимальная ёмкость (по умолчанию TOKEN_FILTER_CAPACITY)
+        error_rate: Доля ложноположительных ответов при заполнении до ёмкости
+        auto_build: Строить фильтр в фоне, если он не построен или устарел
+        verify_interval: Как часто сверять фильтр с БД, секунды
+            (по умолчанию TOKEN_FILTER_VERIFY_INTERVAL)
+    """
+
+    def __init__(self, backend=None, path=None, capacity=None, error_rate=None, auto_build=True,
+                 verify_interval=None):
+        self.backend = backend
+        self.path = path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.auto_build = auto_build
+        self.verify_interval = verify_interval
+        self._store = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._building = False
+        # Результат последней сверки с БД и её время (time.monotonic)
+        self._complete = False
+        self._verified_at = None
+        # Время (time.time) неудачного добавления: фильтры, построенные раньше, неполны
+        self._stale_since = None
+        self.checks = 0
+        self.rejected = 0
+        self.false_positives = 0
+
+    def _get_store(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return self._store
+        with self._lock:
+            if self._pid != pid:
+                self._store = self._configure()
+                self._building = False
+                self._verified_at = None
+                self._pid = pid
+        return self._store
+
+    def _configure(self):
+        self.backend = self.backend or getattr(settings, 'TOKEN_FILTER_BACKEND', BACKEND_OFF)
+        self.capacity = self.capacity or getattr(settings, 'TOKEN_FILTER_CAPACITY', 1000000)
+        self.error_rate = self.error_rate or getattr(settings, 'TOKEN_FILTER_ERROR_RATE', 0.001)
+        if self.verify_interval is None:
+            self.verify_interval = getattr(settings, 'TOKEN_FILTER_VERIFY_INTERVAL', 10)
+        self.path = self.path or getattr(settings, 'TOKEN_FILTER_PATH', None) or os.path.join(
+            tempfile.gettempdir(), 'ghostwriter_token_filter.bin'
+        )
+        if self.backend in (BACKEND_AUTO, BACKEND_REDIS):
+            # Без Redis фильтр выключается во всех процессах одинаково
+            connection = redis_backend.connect(owner='Фильтр токенов', fallback='фильтр выключен')
+            if connection is not None:
+                self.backend = BACKEND_REDIS
+                return _RedisStore(connection)
+            self.backend = BACKEND_OFF
+            return None
+        if self.backend == BACKEND_MMAP:
+            return _MmapStore(self.path)
+        if self.backend == BACKEND_MEMORY:
+            return _MemoryStore()
+        self.backend = BACKEND_OFF
+        return None
+
+    def might_contain(self, token):
+        """
+        Может ли токен существовать
+
+        Args:
+            token: UUID или строка
+
+        Returns:
+            bool: False — токена точно нет (запрос к БД не нужен);
+            True — возможно есть, или фильтр недоступен либо не сверен с БД
+        """
+        store = self._get_store()
+        if store is None:
+            return True
+        try:
+            h1, h2 = _hashes(token)
+        except (ValueError, TypeError, AttributeError):
+            self.rejected += 1
+            return False
+        try:
+            if not self._known_complete(store):
+                return True
+            result = store.contains(h1, h2)
+        except Exception as e:
+            logger.warning(f"Фильтр токенов: ошибка проверки ({e})")
+            return True
+        if result is None:
+            self._schedule_build()
+            return True
+        self.checks += 1
+        if not result:
+            self.rejected += 1
+        return result
+
+    def _matches_db(self, info):
+        """Совпадают ли число токенов и сумма их id в фильтре и в БД."""
+        from django.db.models import Count, Sum
+        from .models import TemporaryAccessToken
+
+        if self._stale_since is not None and info['built'] < self._stale_since:
+            return False
+        db = TemporaryAccessToken.objects.aggregate(count=Count('pk'), ids=Sum('pk'))
+        return info['count'] == db['count'] and info['ids'] == (db['ids'] or 0)
+
+    def _known_complete(self, store):
+        """
+        Известно ли, что в фильтре есть все токены из БД
+
+        Сверка с БД выполняется не чаще раза в verify_interval секунд;
+        неполный фильтр перестраивается в фоне.
+        """
+        now = time.monotonic()
+        if self._verified_at is not None and now - self._verified_at < self.verify_interval:
+            return self._complete
+        info = store.info()
+        complete = info is not None and self._matches_db(info)
+        if complete:
+            self._stale_since = None
+        else:
+            self._schedule_build()
+        self._complete = complete
+        self._verified_at = now
+        return complete
+
+    def add(self, token, pk=None):
+        """
+        Добавляет токен (при создании TemporaryAccessToken)
+
+        Если добавить не удалось, фильтр удаляется из хранилища (его
+        перестроят), а этот процесс отвечает «возможно», пока не увидит
+        фильтр, построенный после ошибки.
+
+        Args:
+            token: UUID токена
+            pk: id токена в БД (учитывается при сверке с БД)
+        """
+        store = self._get_store()
+        if store is None:
+            return
+        try:
+            store.add(*_hashes(token), pk=pk)
+        except Exception as e:
+            logger.warning(f"Фильтр токенов: не удалось добавить токен ({e}), фильтр устарел")
+            self._stale_since = time.time()
+            self._verified_at = None
+            try:
+                store.discard()
+            except Exception as e:
+                logger.warning(f"Фильтр токенов: не удалось удалить устаревший фильтр ({e})")
+
+    def record_false_positive(self):
+        """Отмечает ответ «возможно» для токена, которого не оказалось в БД."""
+        self.false_positives += 1
+
+    def rebuild(self):
+        """
+        Строит фильтр заново по всем токенам в БД
+
+        Ёмкость — не меньше полуторного числа токенов, чтобы после роста
+        таблицы доля ошибок не превышала заданную.
+
+        Returns:
+            dict: Параметры нового фильтра (m, k, capacity, count)
+        """
+        from django.utils import timezone
+        from .models import TemporaryAccessToken
+
+        store = self._get_store()
+        if store is None:
+            return None
+        built = time.time()
+        started = timezone.now()
+        recent_since = started - REBUILD_OVERLAP
+        tokens = TemporaryAccessToken.objects.values_list('pk', 'token', 'created_at')
+        count = tokens.count()
+        capacity = max(self.capacity, int(count * 1.5))
+        m, k = optimal_params(capacity, self.error_rate)
+        bits = bytearray(m // 8)
+        added = 0
+        ids = 0
+        included = set()
+        for pk, token, created_at in tokens.iterator(chunk_size=10000):
+            _set_bits(bits, m, k, *_hashes(token))
+            added += 1
+            ids += pk
+            if created_at >= recent_since:
+                included.add(pk)
+        meta = {'m': m, 'k': k, 'capacity': capacity, 'count': added, 'ids': ids, 'built': built}
+
+        def add_recent():
+            # Токены, созданные во время перестроения, могли попасть в старый фильтр
+            recent = TemporaryAccessToken.objects.filter(
+                created_at__gte=recent_since
+            ).values_list('pk', 'token')
+            for pk, token in recent.iterator():
+                store.add(*_hashes(token), pk=None if pk in included else pk)
+
+        store.replace(meta, bits, after_replace=add_recent)
+        self._verified_at = None
+        logger.info(f"Фильтр токенов перестроен: {added} токенов, {m // 8} байт, k={k} ({store.name})")
+        return meta
+
+    def _schedule_build(self):
+        if not self.auto_build or self._building:
+            return
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+        threading.Thread(target=self._build_once, name='token-filter-build', daemon=True).start()
+
+    def _build_once(self):
+        from django.db import close_old_connections
+
+        store = self._store
+        try:
+            # Строит один процесс; остальные ждут готовый фильтр
+            if store is not None and store.try_lock_build():
+                try:
+                    # Другой процесс мог перестроить фильтр, пока этот ждал
+                    info = store.info()
+                    if info is None or not self._matches_db(info):
+                        self.rebuild()
+                finally:
+                    store.unlock_build()
+        except Exception as e:
+            logger.warning(f"Фильтр токенов: ошибка построения ({e})")
+        finally:
+            close_old_connections()
+            self._building = False
+
+    def measure_fp_rate(self, probes=100000):
+        """
+        Измеренная доля ложноположительных ответов
+
+        Проверяет случайные UUID4 (которых нет среди токенов) по снимку
+        битового массива, без обращений к Redis на каждую проверку.
+
+        Returns:
+            float или None, если фильтр не построен
+        """
+        store = self._get_store()
+        info = store.info() if store is not None else None
+        bits = store.snapshot() if info else None
+        if not bits:
+            return None
+        hits = sum(
+            1 for _ in range(probes)
+            if _test_bits(bits, info['m'], info['k'], *_hashes(uuid.uuid4()))
+        )
+        return hits / probes
+
+    def get_stats(self, include_fill=True):
+        """
+        Состояние фильтра
+
+        Returns:
+            dict: backend, complete (итог последней сверки с БД), m, k,
+            capacity, count, ids, built, memory_bytes, fill_ratio,
+            estimated_fp_rate (по заполнению), счётчики процесса checks,
+            rejected, false_positives и observed_fp_rate
+        """
+        store = self._get_store()
+        stats = {
+            'backend': self.backend,
+            'complete': self._complete,
+            'checks': self.checks,
+            'rejected': self.rejected,
+            'false_positives': self.false_positives,
+            'observed_fp_rate': (
+                self.false_positives / (self.false_positives + self.rejected)
+                if self.false_positives + self.rejected else None
+            ),
+        }
+        try:
+            info = store.info() if store is not None else None
+        except Exception as e:
+            logger.warning(f"Фильтр токенов: ошибка чтения состояния ({e})")
+            info = None
+        if not info:
+            return stats
+        stats.update(info)
+        stats['memory_bytes'] = info['m'] // 8
+        if include_fill:
+            bits = store.snapshot()
+            if bits:
+                fill = int.from_bytes(bits, 'big').bit_count() / info['m']
+                stats['fill_ratio'] = fill
+                stats['estimated_fp_rate'] = fill ** info['k']
+        return stats
+
+
+token_filter = TokenFilter()
@@ -0,0 +1,318 @@
+"""
+Индекс почти одинаковых тем генерации (MinHash + LSH)
+
+Кэш ответов (response_cache.py) срабатывает только при точном совпадении
+темы. В логах много тем, которые отличаются пунктуацией, порядком слов или
+лишним предлогом: "скидки на кофе" и "кофе — скидки". Индекс хранит
+MinHash-сигнатуры нормализованных тем недавних генераций, разложенные по
+LSH-корзинам, и находит похожую тему с теми же критериями формы за доли
+миллисекунды.
+
+Кандидаты из корзин проверяются точным коэффициентом Жаккара по множеству
+слов темы, поэтому порог TOPIC_DEDUP_THRESHOLD соблюдается точно, а LSH
+только сужает перебор. Число записей ограничено (самые старые вытесняются),
+индекс живёт в памяти процесса.
+"""
+
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .response_cache import make_cache_key
+
+# Параметры MinHash: 64 перестановки = 16 корзин по 4 строки
+NUM_PERM = 64
+BANDS = 16
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# Слова короче этой длины (предлоги, союзы) не влияют на смысл темы
+_MIN_WORD_LENGTH = 3
+
+# Грубая нормализация словоформ: "скидки" и "скидка" дают "скидк"
+_STEM_LENGTH = 5
+
+
+def _permutations(num_perm, seed=1):
+    """Детерминированные коэффициенты (a, b) универсального хеширования."""
+    import random
+
+    rng = random.Random(seed)
+    return [
+        (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+        for _ in range(num_perm)
+    ]
+
+
+_PERMUTATIONS = _permutations(NUM_PERM)
+
+
+def topic_shingles(topic):
+    """
+    Множество нормализованных слов темы (без учёта порядка и пунктуации)
+
+    Args:
+        topic: Тема генерации
+
+    Returns:
+        frozenset: Основы слов темы
+    """
+    text = str(topic or '').lower().replace('ё', 'е')
+    words = _WORD_RE.findall(text)
+    shingles = frozenset(w[:_STEM_LENGTH] for w in words if len(w) >= _MIN_WORD_LENGTH)
+    # Тема только из коротких слов — сравниваем как есть
+    return shingles or frozenset(words)
+
+
+def minhash_signature(shingles, permutations=_PERMUTATIONS):
+    """
+    MinHash-сигнатура множества
+
+    Returns:
+        tuple: Минимальные значения хеша для каждой перестановки
+    """
+    hashes = [zlib.crc32(s.encode('utf-8')) for s in shingles]
+    if not hashes:
+        return tuple([_MAX_HASH] * len(permutations))
+    prime = _MERSENNE_PRIME
+    mask = _MAX_HASH
+    return tuple(
+        min(((a * h + b) % prime) & mask for h in hashes)
+        for a, b in permutations
+    )
+
+
+def jaccard(first, second):
+    """Коэффициент Жаккара двух множеств."""
+    if not first and not second:
+        return 1.0
+    return len(first & second) / len(first | second)
+
+
+class TopicMatch:
+    """
+    Найденная похожая генерация
+
+    Attributes:
+        topic: Тема найденной генерации
+        similarity: Коэффициент Жаккара (0..1)
+        result: Текст поста
+        image_prompt: Промпт изображения (если уже был сгенерирован)
+        generation_id: ID Generation
+    """
+
+    __slots__ = ('topic', 'similarity', 'result', 'image_prompt', 'generation_id')
+
+    def __init__(self, entry, similarity):
+        self.topic = entry.topic
+        self.similarity = similarity
+        self.result = entry.result
+        self.image_prompt = entry.image_prompt
+        self.generation_id = entry.generation_id
+
+    def as_dict(self):
+        """Метаданные для JSON-ответа генератора."""
+        return {
+            'topic': self.topic,
+            'similarity': round(self.similarity, 3),
+            'generation_id': self.generation_id,
+        }
+
+
+class _Entry:
+    __slots__ = ('topic', 'shingles', 'bucket_keys', 'result', 'image_prompt',
+                 'generation_id', 'created_at')
+
+    def __init__(self, topic, shingles, bucket_keys, result, image_prompt, generation_id):
+        self.topic = topic
+        self.shingles = shingles
+        self.bucket_keys = bucket_keys
+        self.result = result
+        self.image_prompt = image_prompt
+        self.generation_id = generation_id
+        self.created_at = time.time()
+
+
+class NearDuplicateIndex:
+    """
+    LSH-индекс тем с ограничением по числу записей и времени жизни
+
+    Записи с разными критериями формы и провайдером не сравниваются:
+    хеш критериев входит в ключ каждой корзины.
+
+    Args:
+        threshold: Минимальный коэффициент Жаккара для совпадения
+        max_entries: Максимальное число записей
+        ttl: Время жизни записи (секунды)
+        bands: Число LSH-корзин на запись
+    """
+
+    def __init__(self, threshold=0.8, max_entries=5000, ttl=86400, bands=BANDS):
+        if NUM_PERM % bands:
+            raise ValueError("NUM_PERM должно делиться на число корзин")
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self._entries = OrderedDict()
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _criteria_key(form_data, provider):
+        return make_cache_key(dict(form_data or {}, topic=''), provider, '')
+
+    def _bucket_keys(self, criteria, shingles):
+        signature = minhash_signature(shingles)
+        rows = self.rows
+        return [
+            (criteria, band, signature[band * rows:(band + 1) * rows])
+            for band in range(self.bands)
+        ]
+
+    def _entry_key(self, criteria, shingles):
+        return (criteria, shingles)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for bucket_key in entry.bucket_keys:
+            bucket = self._buckets.get(bucket_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[bucket_key]
+
+    def add(self, topic, form_data, provider, result, image_prompt=None, generation_id=None):
+        """
+        Добавляет генерацию в индекс (повтор темы заменяет старую запись)
+
+        Args:
+            topic: Тема генерации
+            form_data: Параметры формы
+            provider: 'gigachat' или 'openai'
+            result: Текст поста
+            image_prompt: Промпт изображения (опционально)
+            generation_id: ID Generation (опционально)
+        """
+        shingles = topic_shingles(topic)
+        if not shingles or not result:
+            return
+        criteria = self._criteria_key(form_data, provider)
+        key = self._entry_key(criteria, shingles)
+        bucket_keys = self._bucket_keys(criteria, shingles)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = _Entry(topic, shingles, bucket_keys, result, image_prompt, generation_id)
+            for bucket_key in bucket_keys:
+                self._buckets.setdefault(bucket_key, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def query(self, topic, form_data, provider):
+        """
+        Ищет самую похожую тему с теми же критериями
+
+        Returns:
+            TopicMatch или None
+        """
+        shingles = topic_shingles(topic)
+        if not shingles:
+            return None
+        criteria = self._criteria_key(form_data, provider)
+        bucket_keys = self._bucket_keys(criteria, shingles)
+        expired_before = time.time() - self.ttl
+        best = None
+        best_similarity = 0.0
+        with self._lock:
+            candidates = set()
+            for bucket_key in bucket_keys:
+                candidates.update(self._buckets.get(bucket_key, ()))
+            for key in candidates:
+                entry = self._entries[key]
+                if entry.created_at < expired_before:
+                    continue
+                similarity = jaccard(shingles, entry.shingles)
+                if similarity >= self.threshold and similarity > best_similarity:
+                    best, best_similarity = entry, similarity
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return TopicMatch(best, best_similarity)
+
+    def set_image_prompt(self, topic, form_data, provider, image_prompt):
+        """Запоминает промпт изображения для уже проиндексированной темы."""
+        key = self._entry_key(self._criteria_key(form_data, provider), topic_shingles(topic))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.image_prompt = image_prompt
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self):
+        """
+        Статистика индекса
+
+        Returns:
+            dict: entries, buckets, hits, misses, threshold
+        """
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'buckets': len(self._buckets),
+                'hits': self.hits,
+                'misses': self.misses,
+                'threshold': self.threshold,
+            }
+
+
+def is_enabled_for(token=None):
+    """
+    Включён ли поиск похожих тем для токена
+
+    Использует тот же флаг тарифа 'response_cache', что и кэш ответов.
+    """
+    if not getattr(settings, 'TOPIC_DEDUP_ENABLED', False):
+        return False
+    from .tariffs import get_tariff_config
+
+    token_type = getattr(token, 'token_type', None) or 'DEMO_FREE'
+    config = get_tariff_config(token_type) or {}
+    return bool(config.get('response_cache', False))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_topic_index():
+    """Индекс текущего процесса (создаётся при первом обращении)."""
+    global _index
+
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = NearDuplicateIndex(
+                    threshold=getattr(settings, 'TOPIC_DEDUP_THRESHOLD', 0.8),
+                    max_entries=getattr(settings, 'TOPIC_DEDUP_MAX_ENTRIES', 5000),
+                    ttl=getattr(settings, 'TOPIC_DEDUP_TTL', 86400),
+                )
+    return _index
@@ -0,0 +1,309 @@
+"""
+Буферизованная запись GigaChatTokenUsage
+
+log_token_usage вызывается до трёх раз на генерацию, и каждый раз делал в
+запросе SELECT Generation и INSERT GigaChatTokenUsage. Теперь запись
+ставится в очередь (словарь полей с generation_id/user_id/token_id, без
+загрузки связанных объектов), а фоновый поток процесса сохраняет очередь
+через bulk_create, когда набирается TOKEN_USAGE_BATCH_SIZE записей или
+проходит TOKEN_USAGE_FLUSH_INTERVAL секунд.
+
+Режимы (настройка TOKEN_USAGE_BUFFER):
+    'off'    — синхронная запись, как раньше (по умолчанию)
+    'memory' — очередь в памяти процесса; при остановке процесса
+               остаток сохраняется (atexit), но при аварийном завершении
+               (kill, перезапуск воркера по таймауту) теряется
+    'redis'  — общий список в Redis: записи переживают падение процесса,
+               очередь разбирает любой процесс
+
+Записи удаляются из очереди только после успешного bulk_create: при
+ошибке БД пачка остаётся в очереди (memory — возвращается в её начало,
+redis — LTRIM не выполняется) и сохраняется при следующем сбросе.
+
+created_at записи — время сохранения (auto_now_add), то есть отстаёт от
+вызова не больше чем на интервал сброса.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from . import redis_backend
+
+logger = logging.getLogger(__name__)
+
+MODE_MEMORY = 'memory'
+MODE_REDIS = 'redis'
+MODE_OFF = 'off'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class _MemoryQueue:
+    """Очередь в памяти процесса (deque потокобезопасна для append/popleft)."""
+
+    name = MODE_MEMORY
+
+    def __init__(self):
+        self._items = deque()
+
+    def push(self, record):
+        self._items.append(record)
+        return len(self._items)
+
+    def take_batch(self, size):
+        batch = []
+        try:
+            for _ in range(size):
+                batch.append(self._items.popleft())
+        except IndexError:
+            pass
+        return batch
+
+    def ack(self, batch):
+        pass
+
+    def restore(self, batch):
+        # Несохранённая пачка возвращается в начало очереди
+        self._items.extendleft(reversed(batch))
+
+    def try_lock(self):
+        return True
+
+    def unlock(self):
+        pass
+
+    def size(self):
+        return len(self._items)
+
+
+class _RedisQueue:
+    """
+    Список в Redis: RPUSH при записи; при сбросе LRANGE, запись в БД и
+    только после неё LTRIM
+
+    Сбрасывает один процесс за раз (блокировка SET NX EX), иначе LTRIM
+    одного процесса удалил бы записи, прочитанные другим.
+    """
+
+    name = MODE_REDIS
+    KEY = 'usage_sink:queue'
+    LOCK_KEY = 'usage_sink:flush_lock'
+    LOCK_TTL = 60
+
+    def __init__(self, connection):
+        self.redis = connection
+        self._lock_value = f"{os.getpid()}:{threading.get_ident()}"
+
+    def push(self, record):
+        return self.redis.rpush(self.KEY, json.dumps(record, ensure_ascii=False))
+
+    def take_batch(self, size):
+        return [json.loads(item) for item in self.redis.lrange(self.KEY, 0, size - 1)]
+
+    def ack(self, batch):
+        # Новые записи добавляются в хвост (RPUSH), поэтому голова — ровно прочитанная пачка
+        self.redis.ltrim(self.KEY, len(batch), -1)
+
+    def restore(self, batch):
+        pass
+
+    def try_lock(self):
+        return bool(self.redis.set(self.LOCK_KEY, self._lock_value, nx=True, ex=self.LOCK_TTL))
+
+    def unlock(self):
+        if self.redis.get(self.LOCK_KEY) == self._lock_value.encode():
+            self.redis.delete(self.LOCK_KEY)
+
+    def size(self):
+        return self.redis.llen(self.KEY)
+
+
+class UsageSink:
+    """
+    Очередь записей расхода токенов с фоновым сбросом в БД
+
+    Args:
+        batch_size: Размер пачки bulk_create и порог досрочного сброса
+        flush_interval: Максимальная задержка записи (секунды)
+        mode: MODE_MEMORY, MODE_REDIS или MODE_OFF (по умолчанию — из настроек)
+    """
+
+    def __init__(self, batch_size=None, flush_interval=None, mode=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.mode = mode
+        self._queue = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._atexit_registered = False
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+
+    def _configure(self):
+        self.batch_size = self.batch_size or _setting('TOKEN_USAGE_BATCH_SIZE', 100)
+        self.flush_interval = self.flush_interval or _setting('TOKEN_USAGE_FLUSH_INTERVAL', 2.0)
+        self.mode = self.mode or _setting('TOKEN_USAGE_BUFFER', MODE_OFF)
+        if self.mode == MODE_REDIS:
+            connection = redis_backend.connect(
+                _setting('TOKEN_USAGE_REDIS_ALIAS', 'default'), 'Очередь расхода токенов', 'используем память процесса'
+            )
+            if connection is not None:
+                return _RedisQueue(connection)
+            self.mode = MODE_MEMORY
+        return _MemoryQueue()
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            if self._queue is None:
+                self._queue = self._configure()
+            if self.mode != MODE_OFF:
+                # После fork поток родителя не существует — запускаем свой
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._run, name='usage-sink', daemon=True)
+                self._thread.start()
+                if not self._atexit_registered:
+                    atexit.register(self.close)
+                    self._atexit_registered = True
+            self._pid = pid
+
+    def enqueue(self, record):
+        """
+        Ставит запись в очередь (без обращения к БД)
+
+        Args:
+            record: Поля GigaChatTokenUsage; связи — через *_id
+        """
+        self._ensure_started()
+        if self.mode == MODE_OFF:
+            self._write([record])
+            return
+        size = self._queue.push(record)
+        self.enqueued += 1
+        if size >= self.batch_size:
+            self._wakeup.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                # Остаток сохраняет close() в вызывающем потоке
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Ошибка сброса расхода токенов: {e}")
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """
+        Сохраняет всю очередь пачками по batch_size
+
+        Пачка удаляется из очереди только после успешной записи; при
+        ошибке БД она остаётся в очереди, а сброс прекращается до
+        следующего раза.
+
+        Returns:
+            int: Число сохранённых записей
+        """
+        if self._queue is None or self.mode == MODE_OFF:
+            return 0
+        total = 0
+        with self._flush_lock:
+            if not self._queue.try_lock():
+                # Очередь Redis сейчас сбрасывает другой процесс
+                return 0
+            try:
+                while True:
+                    batch = self._queue.take_batch(self.batch_size)
+                    if not batch:
+                        break
+                    written = self._write(batch)
+                    if not written:
+                        self._queue.restore(batch)
+                        break
+                    self._queue.ack(batch)
+                    total += written
+            finally:
+                self._queue.unlock()
+        return total
+
+    def _write(self, records):
+        from .models import Generation, GigaChatTokenUsage
+
+        objects = [GigaChatTokenUsage(**record) for record in records]
+        # Генерацию могли удалить, пока запись ждала в очереди. Внешние ключи
+        # проверяются при COMMIT, поэтому проверяем их заранее одним запросом
+        ids = {obj.generation_id for obj in objects if obj.generation_id}
+        if ids:
+            existing = set(Generation.objects.filter(id__in=ids).values_list('id', flat=True))
+            for obj in objects:
+                if obj.generation_id not in existing:
+                    obj.generation_id = None
+        try:
+            # Точка сохранения: ошибка не ломает транзакцию запроса в режиме 'off'
+            with transaction.atomic():
+                GigaChatTokenUsage.objects.bulk_create(objects, batch_size=self.batch_size)
+        except Exception as e:
+            self.failed += len(objects)
+            logger.warning(f"Не удалось сохранить {len(objects)} записей расхода токенов: {e}")
+            return 0
+        self.written += len(objects)
+        return len(objects)
+
+    def close(self):
+        """Останавливает фоновый поток и сохраняет остаток очереди."""
+        self._stopped.set()
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout=self.flush_interval or 5)
+        try:
+            self.flush()
+        except Exception as e:
+            logger.warning(f"Ошибка сброса расхода токенов при остановке: {e}")
+        self._pid = None
+
+    def get_stats(self):
+        """
+        Статистика очереди
+
+        Returns:
+            dict: mode, pending, enqueued, written, failed
+        """
+        pending = 0
+        if self._queue is not None:
+            try:
+                pending = self._queue.size()
+            except Exception:
+                pending = None
+        return {
+            'mode': self.mode or _setting('TOKEN_USAGE_BUFFER', MODE_OFF),
+            'pending': pending,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'failed': self.failed,
+        }
+
+
+usage_sink = UsageSink()
@@ -4,6 +4,7 @@
 
 from django.utils import timezone
 from .models import TemporaryAccessToken
+from .token_cache import get_request_token
 
 
 def is_temporary_token_access(request):
@@ -26,10 +27,7 @@ def is_temporary_token_access(request):
     
     # Проверяем что токен существует и активен
     try:
-        token = TemporaryAccessToken.objects.get(
-            token=token_str,
-            is_active=True
-        )
+        token = get_request_token(request)
         return not token.is_expired()
     except TemporaryAccessToken.DoesNotExist:
         return False
@@ -53,10 +51,7 @@ def get_token_from_request(request):
         return None
     
     try:
-        return TemporaryAccessToken.objects.get(
-            token=token_str,
-            is_active=True
-        )
+        return get_request_token(request)
     except TemporaryAccessToken.DoesNotExist:
         return None
 
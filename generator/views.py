@@ -2,8 +2,10 @@
 # DJANGO IMPORTS
 # =============================================================================
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
+from django.urls import reverse
 from django.conf import settings
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.contrib.auth import login, authenticate, logout
 # from django.contrib.auth.decorators import login_required  # Не используется в системе токенов
 from django.contrib.auth.models import User
@@ -17,19 +19,25 @@ from datetime import datetime
 # PROJECT IMPORTS
 # =============================================================================
 from .forms import GenerationForm, LoginForm
-from .models import Generation, UserProfile, GenerationTemplate, SupportTicket, Review, SupportChat
-from .gigachat_api import generate_text, generate_image_gigachat
+from .models import Generation, UserProfile, GenerationTemplate, SupportTicket, Review, SupportChat, GenerationJob
+from .gigachat_api import generate_text, generate_image_gigachat, stream_text as stream_gigachat_text
 from .yandex_image_api import generate_image as generate_image_yandex
-from .fastapi_client import generate_text_and_prompt, generate_image
+from .fastapi_client import generate_text_and_prompt, generate_image, stream_text as stream_openai_text
 from .decorators import consume_generation, token_required
+from .jobs import enqueue_generation_job, jobs_enabled
+from .topic_index import get_topic_index, is_enabled_for as topic_dedup_enabled_for
+from .image_store import persist_image
+from .image_pipeline import PIPELINE_OFF, ImagePipeline, pipeline_mode as image_pipeline_mode, run_text_and_image
+from .session_sync import recall_form_data, remember_form_data, sync_token_usage
+from .wall_feed import fetch_wall_page, wall_queryset
+from .generation_search import search_generations
+from .token_cache import invalidate_token_state
 
 # =============================================================================
 # THIRD PARTY IMPORTS
 # =============================================================================
 import os
-import base64
 import re
-import time
 import requests
 
 # =============================================================================
@@ -122,6 +130,205 @@ def quick_login(request, username):
 # CONTENT GENERATION VIEWS
 # =============================================================================
 
+def _find_similar_topic(form_data, provider, token=None):
+    """
+    Ищет недавнюю генерацию с почти такой же темой и теми же критериями
+    
+    Returns:
+        TopicMatch или None
+    """
+    if not topic_dedup_enabled_for(token):
+        return None
+    match = get_topic_index().query(form_data.get('topic', ''), form_data, provider)
+    if match:
+        print(f"Найдена похожая тема: '{match.topic}' (сходство {match.similarity:.2f})")
+    return match
+
+
+def _index_topic(form_data, provider, result, image_prompt=None, generation_id=None, token=None):
+    """Добавляет успешную генерацию в индекс похожих тем."""
+    if not result or str(result).startswith(('WARNING', 'ERROR')):
+        return
+    if not topic_dedup_enabled_for(token):
+        return
+    get_topic_index().add(
+        form_data.get('topic', ''), form_data, provider, result,
+        image_prompt=image_prompt, generation_id=generation_id
+    )
+
+
+def _log_similar_hit(form_data, response_text, operation_type='TEXT_GENERATION',
+                     user=None, token=None, generation_id=None):
+    """
+    Логирует ответ из генерации с похожей темой как попадание в кэш
+    
+    Токены за такой ответ не расходуются, но запись с from_cache=True
+    попадает в статистику (cache_hits, tokens_saved), как и попадания
+    в кэш ответов.
+    """
+    import json
+    from .gigachat_api import log_token_usage
+    
+    log_token_usage(
+        operation_type=operation_type,
+        prompt_text=json.dumps(form_data, ensure_ascii=False, default=str),
+        response_text=response_text,
+        generation_id=generation_id,
+        user=user,
+        token=token,
+        topic=form_data.get('topic'),
+        platform=form_data.get('platform'),
+        from_cache=True
+    )
+
+
+def run_generation_pipeline(form_data, generator_type='gigachat', generate_image_flag=False,
+                            user=None, token=None, base_url='', allow_similar=True):
+    """
+    Пайплайн генерации контента: текст, промпт изображения и изображение
+    
+    Используется синхронно из generator_view и фоновыми воркерами очереди
+    задач (generator/jobs.py), поэтому не зависит от request.
+    
+    Args:
+        form_data: Очищенные данные GenerationForm
+        generator_type: 'gigachat' или 'openai'
+        generate_image_flag: Генерировать ли изображение
+        user: Пользователь Django (опционально)
+        token: TemporaryAccessToken (опционально)
+        base_url: Абсолютный URL сайта для ссылок на сохранённые изображения
+        allow_similar: Разрешить ответ из недавней генерации с похожей темой
+    
+    Returns:
+        dict: Ответ в формате JSON generator_view
+    """
+    result = None
+    image_url = None
+    match = _find_similar_topic(form_data, generator_type, token) if allow_similar else None
+    
+    if generator_type == 'openai':
+        # Проверяем доступность Flask API
+        if not check_flask_api_status():
+            return {
+                'success': False,
+                'error': 'Flask Generator не запущен. Запустите Flask приложение на порту 5000.'
+            }
+        try:
+            if match:
+                result, image_prompt = match.result, match.image_prompt
+            else:
+                # Генератор через Flask API
+                gen_result = generate_text_and_prompt(form_data, token=token, user=user)
+                result = gen_result.get('text')
+                image_prompt = gen_result.get('image_prompt')
+            image_url = generate_image(image_prompt, token=token) if image_prompt else None
+        except Exception as e:
+            print(f"Ошибка Flask API: {e}")
+            return {'success': False, 'error': f'Ошибка Flask API: {str(e)}'}
+        gen = Generation.objects.create(
+            user=user,
+            topic=form_data.get('topic', ''),
+            result=result,
+            image_url=image_url or ""
+        )
+        if match:
+            _log_similar_hit(form_data, result, user=user, token=token, generation_id=gen.id)
+        else:
+            _index_topic(form_data, 'openai', result, image_prompt, gen.id, token)
+    else:
+        image_data = None
+        pipeline = image_pipeline_mode() if generate_image_flag and not match else PIPELINE_OFF
+        if pipeline != PIPELINE_OFF:
+            # Черновик промпта изображения готовится параллельно с текстом
+            gen = Generation.objects.create(
+                user=user,
+                topic=form_data.get('topic', ''),
+                result="",
+                image_url=""
+            )
+            result, image_prompt, image_data, _ = run_text_and_image(
+                form_data, gen, user=user, token=token, mode=pipeline
+            )
+            gen.result = result or ""
+            gen.save(update_fields=['result'])
+            _index_topic(form_data, 'gigachat', result, image_prompt, gen.id, token)
+        else:
+            # Генерируем текст (или берём его из генерации с похожей темой)
+            result = match.result if match else generate_text(form_data, user=user, token=token)
+        
+            # Создаем запись генерации для связи с токенами
+            gen = Generation.objects.create(
+                user=user,
+                topic=form_data.get('topic', ''),
+                result=result or "",
+                image_url=""
+            )
+            generation_id = gen.id
+            if match:
+                _log_similar_hit(form_data, result, user=user, token=token, generation_id=generation_id)
+            else:
+                _index_topic(form_data, 'gigachat', result, generation_id=generation_id, token=token)
+        
+            # Генерируем изображение только если чекбокс выбран
+            if generate_image_flag and result:
+                from .gigachat_api import generate_image_prompt_from_text
+                if match and match.image_prompt:
+                    image_prompt = match.image_prompt
+                    _log_similar_hit(form_data, image_prompt, 'IMAGE_PROMPT',
+                                     user=user, token=token, generation_id=generation_id)
+                else:
+                    image_prompt = generate_image_prompt_from_text(result, form_data, user=user, token=token, generation_id=generation_id)
+                    if image_prompt and topic_dedup_enabled_for(token):
+                        get_topic_index().set_image_prompt(form_data.get('topic', ''), form_data, 'gigachat', image_prompt)
+                if image_prompt:
+                    image_data = generate_image_gigachat(image_prompt, user=user, token=token, generation_id=generation_id)
+                else:
+                    image_data = generate_image_gigachat(form_data.get('topic', ''), user=user, token=token, generation_id=generation_id)
+        
+        if image_data:
+            try:
+                image_url = persist_image(image_data, base_url)
+            except Exception as e:
+                print(f"Ошибка при сохранении изображения: {e}")
+        
+        # Обновляем запись генерации с изображением
+        if image_url:
+            gen.image_url = image_url
+            gen.save(update_fields=['image_url'])
+    
+    response_data = {
+        'success': True,
+        'result': result,
+        'image_url': image_url,
+        'limit_reached': False,
+        'generation_id': gen.id,
+        'generate_image_flag': generate_image_flag,
+        'gigachat_tokens_used': token.gigachat_tokens_used if token else 0,
+        'openai_tokens_used': token.openai_tokens_used if token else 0
+    }
+    if match:
+        # Клиент может предложить перегенерацию, если похожий пост не подходит
+        response_data['near_duplicate'] = match.as_dict()
+    return response_data
+
+
+def _remember_generation(request, response_data, form_data):
+    """
+    Сохраняет в сессии данные завершённой генерации
+    
+    ID генерации нужен для последующих перегенераций, form_data —
+    для генерации изображения по тексту (хранится в кэше, не в сессии).
+    """
+    generation_id = response_data.get('generation_id')
+    request.session['current_generation_id'] = generation_id
+    remember_form_data(request.session, generation_id, form_data)
+    token = getattr(request, 'token', None)
+    if token:
+        sync_token_usage(request.session, token)
+    response_data['gigachat_tokens_used'] = request.session.get('gigachat_tokens_used', 0)
+    response_data['openai_tokens_used'] = request.session.get('openai_tokens_used', 0)
+
+
 @consume_generation
 def generator_view(request):
     """
@@ -148,140 +355,57 @@ def generator_view(request):
     form = GenerationForm(request.POST or None)
     generator_type = request.POST.get('generator_type', 'gigachat')  # Новый параметр
     generate_image_flag = request.POST.get('generate_image', 'off') == 'on'  # Чекбокс генерации изображения
+    allow_similar = request.POST.get('skip_similar') != '1'  # Разрешить пост по похожей теме
     if request.method == 'POST':
         is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
         if form.is_valid():
             try:
                 form_data = form.cleaned_data.copy()
-                if generator_type == 'openai':
-                    # Проверяем доступность Flask API
-                    if not check_flask_api_status():
-                        if is_ajax:
-                            return JsonResponse({
-                                'success': False, 
-                                'error': 'Flask Generator не запущен. Запустите Flask приложение на порту 5000.'
-                            })
-                        else:
-                            result = "ERROR: Flask Generator не запущен. Запустите Flask приложение на порту 5000."
-                            image_url = None
-                    else:
-                        try:
-                            # Получаем токен для учёта OpenAI токенов
-                            token = getattr(request, 'token', None)
-                            
-                            # Генератор через Flask API
-                            gen_result = generate_text_and_prompt(form_data, token=token)
-                            result = gen_result.get('text')
-                            image_prompt = gen_result.get('image_prompt')
-                            image_url = generate_image(image_prompt, token=token) if image_prompt else None
-                            
-                            # Обновляем информацию о токенах в сессии после использования
-                            if token and is_ajax:
-                                request.session['gigachat_tokens_used'] = token.gigachat_tokens_used
-                                request.session['openai_tokens_used'] = token.openai_tokens_used
-                        except Exception as e:
-                            print(f"Ошибка Flask API: {e}")
-                            if is_ajax:
-                                return JsonResponse({
-                                    'success': False, 
-                                    'error': f'Ошибка Flask API: {str(e)}'
-                                })
-                            else:
-                                result = f"ERROR: Ошибка Flask API: {str(e)}"
-                                image_url = None
-                else:
-                    # Старый генератор Gigachat
-                    # Получаем данные для логирования токенов
-                    user = request.user if request.user.is_authenticated else None
-                    token = getattr(request, 'token', None)
-                    
-                    # Генерируем текст
-                    result = generate_text(form_data, user=user, token=token)
-                    
-                    # Создаем запись генерации для связи с токенами
-                    gen = Generation.objects.create(
+                user = request.user if request.user.is_authenticated else None
+                token = getattr(request, 'token', None)
+                
+                if is_ajax and jobs_enabled():
+                    # Асинхронный режим: ставим задачу в очередь и сразу отвечаем.
+                    # Задача без токена и пользователя привязывается к сессии
+                    if not request.session.session_key:
+                        request.session.save()
+                    job = enqueue_generation_job(
+                        form_data,
+                        generator_type=generator_type,
+                        generate_image_flag=generate_image_flag,
                         user=user,
-                        topic=form_data.get('topic', ''),
-                        result=result or "",
-                        image_url=""
-                    )
-                    generation_id = gen.id
-                    
-                    # Генерируем изображение только если чекбокс выбран
-                    image_data = None
-                    image_url = None
-                    if generate_image_flag and result:
-                        from .gigachat_api import generate_image_prompt_from_text
-                        image_prompt = generate_image_prompt_from_text(result, form_data, user=user, token=token, generation_id=generation_id) if result else None
-                        if image_prompt:
-                            image_data = generate_image_gigachat(image_prompt, user=user, token=token, generation_id=generation_id)
-                        else:
-                            image_data = generate_image_gigachat(form_data.get('topic', ''), user=user, token=token, generation_id=generation_id)
-                    
-                    # Обновляем информацию о токенах в сессии после использования GigaChat
-                    if token and is_ajax:
-                        request.session['gigachat_tokens_used'] = token.gigachat_tokens_used
-                        request.session['openai_tokens_used'] = token.openai_tokens_used
-                    
-                    if image_data:
-                        if image_data.startswith("data:image"):
-                            import uuid
-                            filename = f"generated_{uuid.uuid4().hex[:8]}.jpg"
-                            full_path = os.path.join(settings.MEDIA_ROOT, filename)
-                            os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
-                            base64_data = image_data.split(',')[1]
-                            image_bytes = base64.b64decode(base64_data)
-                            with open(full_path, "wb") as f:
-                                f.write(image_bytes)
-                            image_url = request.build_absolute_uri(settings.MEDIA_URL + filename)
-                        elif image_data.startswith("http"):
-                            image_url = image_data
-                        else:
-                            filename = f"generated_{form_data.get('topic', '')[:20].replace(' ', '_')}.jpg"
-                            full_path = os.path.join(settings.MEDIA_ROOT, filename)
-                            os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
-                            try:
-                                image_bytes = base64.b64decode(image_data)
-                                with open(full_path, "wb") as f:
-                                    f.write(image_bytes)
-                                image_url = request.build_absolute_uri(settings.MEDIA_URL + filename)
-                            except Exception as e:
-                                image_url = None
-                # Обновляем запись генерации с изображением (если она уже создана)
-                if 'generation_id' not in locals():
-                    gen = Generation.objects.create(
-                        user=request.user if request.user.is_authenticated else None,
-                        topic=form_data.get('topic', ''),
-                        result=result,
-                        image_url=image_url or ""
+                        token=token,
+                        base_url=request.build_absolute_uri('/'),
+                        allow_similar=allow_similar,
+                        session_key=request.session.session_key
                     )
-                else:
-                    # Обновляем существующую запись
-                    gen.image_url = image_url or ""
-                    gen.save()
-                
-                # Сохраняем ID генерации в сессии для последующих перегенераций
-                request.session['current_generation_id'] = gen.id
-                # Сохраняем form_data для последующей генерации изображения
-                request.session['last_form_data'] = form_data
-                if is_ajax:
-                    # Обновляем информацию о токенах из сессии перед отправкой ответа
-                    token = getattr(request, 'token', None)
-                    if token:
-                        # Обновляем данные в сессии из актуального токена
-                        request.session['gigachat_tokens_used'] = token.gigachat_tokens_used
-                        request.session['openai_tokens_used'] = token.openai_tokens_used
-                    
                     return JsonResponse({
                         'success': True,
-                        'result': result,
-                        'image_url': image_url,
-                        'limit_reached': limit_reached,
-                        'generation_id': gen.id,
-                        'generate_image_flag': generate_image_flag,
-                        'gigachat_tokens_used': request.session.get('gigachat_tokens_used', 0),
-                        'openai_tokens_used': request.session.get('openai_tokens_used', 0)
-                    })
+                        'job_id': str(job.id),
+                        'status': job.status,
+                        'status_url': reverse('generation_job_status', args=[job.id])
+                    }, status=202)
+                
+                response_data = run_generation_pipeline(
+                    form_data,
+                    generator_type=generator_type,
+                    generate_image_flag=generate_image_flag,
+                    user=user,
+                    token=token,
+                    base_url=request.build_absolute_uri('/'),
+                    allow_similar=allow_similar
+                )
+                if not response_data.get('success'):
+                    if is_ajax:
+                        return JsonResponse(response_data)
+                    result = f"ERROR: {response_data.get('error')}"
+                    image_url = None
+                else:
+                    result = response_data.get('result')
+                    image_url = response_data.get('image_url')
+                    _remember_generation(request, response_data, form_data)
+                    if is_ajax:
+                        return JsonResponse(response_data)
             except Exception as e:
                 print(f"Ошибка генерации: {e}")
                 if is_ajax:
@@ -313,9 +437,190 @@ def generator_view(request):
         'gigachat_tokens_limit': gigachat_tokens_limit,
         'gigachat_tokens_used': gigachat_tokens_used,
         'openai_tokens_limit': openai_tokens_limit,
-        'openai_tokens_used': openai_tokens_used
+        'openai_tokens_used': openai_tokens_used,
+        'streaming_enabled': getattr(settings, 'GENERATION_STREAMING_ENABLED', False),
+        'image_pipeline_enabled': image_pipeline_mode() != PIPELINE_OFF
     })
 
+@require_POST
+@consume_generation
+def generator_stream_view(request):
+    """
+    Потоковая генерация текста поста (Server-Sent Events)
+
+    Передаёт браузеру дельты текста GigaChat или OpenAI по мере генерации,
+    поэтому первый фрагмент приходит через доли секунды, а не после
+    полного ответа модели. Черновики и блоки критика GigaChat
+    отфильтровываются на лету.
+
+    События:
+        delta — {"text": "..."} очередной фрагмент поста
+        reset — показанный черновик нужно очистить
+        done  — итоговый JSON в формате generator_view
+        error — {"error": "..."}
+
+    Если отмечена генерация изображения и включён GENERATION_IMAGE_PIPELINE,
+    изображение GigaChat готовится параллельно с потоком текста и
+    приходит в событии done.
+
+    Args:
+        request: HTTP запрос с параметрами генерации
+
+    Returns:
+        StreamingHttpResponse: Поток событий text/event-stream
+    """
+    import json
+
+    form = GenerationForm(request.POST)
+    if not form.is_valid():
+        errors = {field: [str(err) for err in errs] for field, errs in form.errors.items()}
+        return JsonResponse({'success': False, 'error': 'Некорректно заполнена форма', 'form_errors': errors})
+
+    form_data = form.cleaned_data.copy()
+    generator_type = request.POST.get('generator_type', 'gigachat')
+    user = request.user if request.user.is_authenticated else None
+    token = getattr(request, 'token', None)
+
+    if generator_type == 'openai' and not check_flask_api_status():
+        return JsonResponse({
+            'success': False,
+            'error': 'Flask Generator не запущен. Запустите Flask приложение на порту 5000.'
+        })
+
+    def sse(event, data):
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    match = _find_similar_topic(form_data, generator_type, token) if request.POST.get('skip_similar') != '1' else None
+    generate_image_flag = request.POST.get('generate_image', 'off') == 'on'
+    pipeline_mode = image_pipeline_mode() if generate_image_flag and generator_type == 'gigachat' and not match else PIPELINE_OFF
+    base_url = request.build_absolute_uri('/')
+
+    def events():
+        # Комментарий SSE сразу открывает поток у клиента и прокси
+        yield ": stream\n\n"
+        result = None
+        gen = None
+        pipeline = None
+        if pipeline_mode != PIPELINE_OFF:
+            # Запись создаётся заранее, чтобы все этапы ссылались на одну генерацию
+            gen = Generation.objects.create(user=user, topic=form_data.get('topic', ''), result="", image_url="")
+            pipeline = ImagePipeline(form_data, gen, user=user, token=token, mode=pipeline_mode).start()
+        try:
+            if match:
+                result = match.result
+                yield sse('delta', {'text': result})
+            elif generator_type == 'openai':
+                parts = []
+                try:
+                    for delta in stream_openai_text(form_data, token=token):
+                        parts.append(delta)
+                        yield sse('delta', {'text': delta})
+                except Exception as e:
+                    print(f"Ошибка Flask API: {e}")
+                    yield sse('error', {'error': f'Ошибка Flask API: {str(e)}'})
+                    return
+                result = ''.join(parts).strip()
+            else:
+                generation_id = gen.id if gen else None
+                for kind, value in stream_gigachat_text(form_data, user=user, token=token, generation_id=generation_id):
+                    if kind in ('done', 'error'):
+                        # Ошибки GigaChat, как и в generator_view, показываются текстом WARNING
+                        result = value
+                    elif kind == 'reset':
+                        yield sse('reset', {})
+                    else:
+                        yield sse('delta', {'text': value})
+        except BaseException:
+            # Клиент закрыл поток (GeneratorExit) или ошибка: платные этапы изображения не запускаем
+            if pipeline:
+                pipeline.cancel()
+            raise
+
+        image_url = None
+        image_prompt = None
+        if pipeline:
+            image_prompt, image_data = pipeline.finish(result)
+            try:
+                image_url = persist_image(image_data, base_url)
+            except Exception as e:
+                print(f"Ошибка при сохранении изображения: {e}")
+            gen.result = result or ""
+            gen.image_url = image_url or ""
+            gen.save(update_fields=['result', 'image_url'])
+        else:
+            gen = Generation.objects.create(
+                user=user,
+                topic=form_data.get('topic', ''),
+                result=result or "",
+                image_url=""
+            )
+        response_data = {
+            'success': True,
+            'result': result,
+            'image_url': image_url,
+            'limit_reached': False,
+            'generation_id': gen.id,
+            'generate_image_flag': bool(pipeline),
+        }
+        if match:
+            response_data['near_duplicate'] = match.as_dict()
+            _log_similar_hit(form_data, result, user=user, token=token, generation_id=gen.id)
+        else:
+            _index_topic(form_data, generator_type, result, image_prompt, gen.id, token)
+        _remember_generation(request, response_data, form_data)
+        # Ответ уже отправлен, поэтому сессию сохраняем явно
+        request.session.save()
+        yield sse('done', response_data)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@require_GET
+def generation_job_status(request, job_id):
+    """
+    Статус фоновой задачи генерации
+    
+    Пока задача выполняется, возвращает её статус. После завершения
+    возвращает тот же JSON, что и синхронный generator_view.
+    
+    Args:
+        request: HTTP запрос
+        job_id: UUID задачи
+    
+    Returns:
+        JsonResponse: Статус или результат задачи
+    """
+    token = getattr(request, 'token', None)
+    user = request.user if request.user.is_authenticated else None
+    job = GenerationJob.objects.filter(id=job_id).first()
+    
+    # Задачу видит только её владелец: по токену или пользователю, а задачу
+    # без них — сессия, которая её создала
+    session_key = request.session.session_key
+    is_owner = job is not None and (
+        (job.token_id and token and job.token_id == token.id) or
+        (job.user_id and user and job.user_id == user.id) or
+        (not job.token_id and not job.user_id and job.session_key and job.session_key == session_key)
+    )
+    if not is_owner:
+        return JsonResponse({'success': False, 'error': 'Задача не найдена'}, status=404)
+    
+    if not job.is_finished:
+        return JsonResponse({
+            'success': True,
+            'job_id': str(job.id),
+            'status': job.status,
+            'done': False
+        })
+    
+    response_data = dict(job.result or {'success': False, 'error': job.error})
+    if response_data.get('success'):
+        _remember_generation(request, response_data, (job.payload or {}).get('form_data') or {})
+    response_data.update({'job_id': str(job.id), 'status': job.status, 'done': True})
+    return JsonResponse(response_data)
+
 # =============================================================================
 # REGENERATION FUNCTIONS
 # =============================================================================
@@ -325,8 +630,8 @@ def regenerate_text(request):
     """
     Перегенерация только текста для существующей записи
     
-    Обновляет существующую запись Generation, добавляя новую версию текста
-    с разделителем. Использует ID генерации из сессии для обновления.
+    Добавляет к существующей записи Generation новую версию текста
+    (GenerationVersion). Использует ID генерации из сессии.
     
     Args:
         request: AJAX POST запрос с темой
@@ -353,22 +658,20 @@ def regenerate_text(request):
                 'topic': topic
                 # Добавить новые критерии, если нужно
             }
-            # Генерируем новый текст
-            result = generate_text(form_data, user=user, token=token)
+            # Генерируем новый текст (явная перегенерация — без кэша ответов)
+            result = generate_text(form_data, user=user, token=token, use_cache=False)
             
             # Обновляем информацию о токенах в сессии
             if token:
-                request.session['gigachat_tokens_used'] = token.gigachat_tokens_used
-                request.session['openai_tokens_used'] = token.openai_tokens_used
+                sync_token_usage(request.session, token)
             
             # Обновляем существующую запись или создаем новую
             generation_id = request.session.get('current_generation_id')
             if generation_id:
                 try:
-                    gen = Generation.objects.get(id=generation_id)
-                    # Добавляем разделитель и новый текст
-                    gen.result += f"\n\n--- Перегенерация {gen.result.count('--- Перегенерация') + 1} ---\n\n{result}"
-                    gen.save()
+                    gen = Generation.objects.only('id').get(id=generation_id)
+                    # Новая версия — одна вставка, текст генерации не перечитывается
+                    gen.add_version(result)
                 except Generation.DoesNotExist:
                     # Если запись не найдена, создаем новую
                     gen = Generation.objects.create(
@@ -409,8 +712,8 @@ def update_generation_image(request, topic, image_url):
     """
     Вспомогательная функция для обновления изображения в существующей генерации
     
-    Добавляет новое изображение к существующей записи Generation, используя
-    символ '|' как разделитель между URL изображений. Если записи нет,
+    Добавляет новое изображение к существующей записи Generation
+    (первое — в image_url, следующие — в GenerationImage). Если записи нет,
     создает новую.
     
     Args:
@@ -422,13 +725,9 @@ def update_generation_image(request, topic, image_url):
     
     if generation_id:
         try:
-            gen = Generation.objects.get(id=generation_id)
+            gen = Generation.objects.only('id', 'image_url').get(id=generation_id)
             # Добавляем новое изображение к существующим
-            if gen.image_url:
-                gen.image_url += f"|{image_url}"
-            else:
-                gen.image_url = image_url
-            gen.save()
+            gen.add_image(image_url)
         except Generation.DoesNotExist:
             # Создаем новую запись, если старая не найдена
             gen = Generation.objects.create(
@@ -448,6 +747,44 @@ def update_generation_image(request, topic, image_url):
         )
         request.session['current_generation_id'] = gen.id
 
+def _saved_image_response(request, topic, image_data, message):
+    """
+    Сохраняет изображение GigaChat и добавляет его к текущей генерации
+    
+    Args:
+        request: HTTP запрос (сессия с current_generation_id)
+        topic: Тема генерации
+        image_data: Данные изображения от провайдера (bytes, base64 или URL)
+        message: Сообщение для успешного ответа
+    
+    Returns:
+        JsonResponse: URL изображения или ошибка сохранения
+    """
+    try:
+        image_url = persist_image(image_data, request.build_absolute_uri('/'))
+    except Exception as e:
+        print(f"Ошибка при сохранении изображения: {e}")
+        return JsonResponse({
+            'success': False,
+            'error': f'Ошибка при сохранении изображения: {str(e)}'
+        })
+    
+    # Обновляем изображение в существующей записи
+    update_generation_image(request, topic, image_url)
+    
+    # Обновляем информацию о токенах в сессии
+    token = getattr(request, 'token', None)
+    if token:
+        sync_token_usage(request.session, token)
+    
+    return JsonResponse({
+        'success': True,
+        'image_url': image_url,
+        'message': message,
+        'gigachat_tokens_used': request.session.get('gigachat_tokens_used', 0),
+        'openai_tokens_used': request.session.get('openai_tokens_used', 0)
+    })
+
 @csrf_exempt
 @token_required
 def generate_image_from_text(request):
@@ -479,94 +816,45 @@ def generate_image_from_text(request):
             token = getattr(request, 'token', None)
             generation_id = request.session.get('current_generation_id')
             
-            # Получаем form_data из сессии или создаем минимальный набор
-            form_data = request.session.get('last_form_data', {})
+            # Получаем form_data последней генерации или создаем минимальный набор
+            form_data = recall_form_data(request.session, generation_id)
             if not form_data:
                 form_data = {'topic': topic} if topic else {}
             
-            try:
-                from .gigachat_api import generate_image_prompt_from_text
-                # Генерируем промпт на основе сгенерированного текста
-                image_prompt = generate_image_prompt_from_text(result_text, form_data, user=user, token=token, generation_id=generation_id)
-            except Exception as e:
-                print(f"Ошибка при генерации промпта: {e}")
-                image_prompt = None
+            # Промпт изображения для похожей темы уже мог быть сгенерирован
+            match = _find_similar_topic(dict(form_data, topic=topic or form_data.get('topic', '')), 'gigachat', token)
+            image_prompt = match.image_prompt if match else None
+            if image_prompt:
+                _log_similar_hit(form_data, image_prompt, 'IMAGE_PROMPT',
+                                 user=user, token=token, generation_id=generation_id)
             
-            # Если не удалось сгенерировать промпт, используем простое описание
             if not image_prompt:
-                image_prompt = f"Сделай яркую иллюстрацию для социальной сети на тему: '{topic or result_text[:100]}'. Стиль: цифровая живопись, яркие цвета."
-            
-            # Пауза между запросом промпта и запросом изображения, чтобы не упираться в 429 GigaChat
-            time.sleep(5)
+                try:
+                    from .gigachat_api import generate_image_prompt_from_text
+                    # Генерируем промпт на основе сгенерированного текста
+                    image_prompt = generate_image_prompt_from_text(result_text, form_data, user=user, token=token, generation_id=generation_id)
+                except Exception as e:
+                    print(f"Ошибка при генерации промпта: {e}")
+                    image_prompt = None
+                
+                if image_prompt and topic_dedup_enabled_for(token):
+                    get_topic_index().set_image_prompt(topic or form_data.get('topic', ''), form_data, 'gigachat', image_prompt)
+                
+                # Если не удалось сгенерировать промпт, используем простое описание
+                if not image_prompt:
+                    image_prompt = f"Сделай яркую иллюстрацию для социальной сети на тему: '{topic or result_text[:100]}'. Стиль: цифровая живопись, яркие цвета."
             
             # Запускаем генерацию изображения
             from .gigachat_api import generate_image_gigachat
             image_data = generate_image_gigachat(image_prompt, user=user, token=token, generation_id=generation_id)
             
-            if image_data:
-                if image_data.startswith("data:image"):
-                    # Это base64 данные от GigaChat - сохраняем локально
-                    try:
-                        import uuid
-                        filename = f"generated_{uuid.uuid4().hex[:8]}.jpg"
-                        full_path = os.path.join(settings.MEDIA_ROOT, filename)
-                        os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
-                        
-                        base64_data = image_data.split(',')[1]
-                        image_bytes = base64.b64decode(base64_data)
-                        
-                        with open(full_path, "wb") as f:
-                            f.write(image_bytes)
-                        
-                        image_url = request.build_absolute_uri(settings.MEDIA_URL + filename)
-                        print(f"Изображение сохранено: {filename}, URL: {image_url[:80]}...")
-                        
-                        # Обновляем изображение в существующей записи
-                        update_generation_image(request, topic or result_text[:50], image_url)
-                        
-                        # Обновляем информацию о токенах в сессии
-                        if token:
-                            request.session['gigachat_tokens_used'] = token.gigachat_tokens_used
-                            request.session['openai_tokens_used'] = token.openai_tokens_used
-                        
-                        return JsonResponse({
-                            'success': True,
-                            'image_url': image_url,
-                            'message': 'Изображение успешно сгенерировано',
-                            'gigachat_tokens_used': request.session.get('gigachat_tokens_used', 0),
-                            'openai_tokens_used': request.session.get('openai_tokens_used', 0)
-                        })
-                    except Exception as e:
-                        print(f"Ошибка при сохранении base64 изображения: {e}")
-                        return JsonResponse({
-                            'success': False,
-                            'error': f'Ошибка при сохранении изображения: {str(e)}'
-                        })
-                elif image_data.startswith("http"):
-                    # Это URL
-                    update_generation_image(request, topic or result_text[:50], image_data)
-                    
-                    if token:
-                        request.session['gigachat_tokens_used'] = token.gigachat_tokens_used
-                        request.session['openai_tokens_used'] = token.openai_tokens_used
-                    
-                    return JsonResponse({
-                        'success': True,
-                        'image_url': image_data,
-                        'message': 'Изображение успешно сгенерировано',
-                        'gigachat_tokens_used': request.session.get('gigachat_tokens_used', 0),
-                        'openai_tokens_used': request.session.get('openai_tokens_used', 0)
-                    })
-                else:
-                    return JsonResponse({
-                        'success': False,
-                        'error': 'Неизвестный формат данных изображения'
-                    })
-            else:
+            if not image_data:
                 return JsonResponse({
                     'success': False,
                     'error': 'Не удалось сгенерировать изображение'
                 })
+            return _saved_image_response(request, topic or result_text[:50], image_data,
+                                         'Изображение успешно сгенерировано')
         except Exception as e:
             print(f"Ошибка при генерации изображения из текста: {e}")
             return JsonResponse({
@@ -621,118 +909,13 @@ def regenerate_image(request):
             # Запускаем генерацию изображения
             image_data = generate_image_gigachat(image_prompt, user=user, token=token, generation_id=generation_id)
             
-            if image_data:
-                if image_data.startswith("data:image"):
-                    # Это base64 данные от GigaChat - сохраняем локально
-                    try:
-                        # Создаем уникальное имя файла
-                        import uuid
-                        filename = f"generated_{uuid.uuid4().hex[:8]}.jpg"
-                        full_path = os.path.join(settings.MEDIA_ROOT, filename)
-                        os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
-                        
-                        # Извлекаем base64 данные
-                        base64_data = image_data.split(',')[1]
-                        image_bytes = base64.b64decode(base64_data)
-                        
-                        with open(full_path, "wb") as f:
-                            f.write(image_bytes)
-                        
-                        image_url = request.build_absolute_uri(settings.MEDIA_URL + filename)
-                        print(f"Изображение сохранено локально: {image_url}")
-                        print(f"Размер файла: {len(image_bytes)} байт")
-                        
-                        # Обновляем изображение в существующей записи
-                        update_generation_image(request, topic, image_url)
-                        
-                        # Обновляем информацию о токенах в сессии
-                        if token:
-                            request.session['gigachat_tokens_used'] = token.gigachat_tokens_used
-                            request.session['openai_tokens_used'] = token.openai_tokens_used
-                        
-                        return JsonResponse({
-                            'success': True,
-                            'image_url': image_url,
-                            'message': 'Изображение успешно перегенерировано',
-                            'gigachat_tokens_used': request.session.get('gigachat_tokens_used', 0),
-                            'openai_tokens_used': request.session.get('openai_tokens_used', 0)
-                        })
-                        
-                    except Exception as e:
-                        print(f"Ошибка при сохранении base64 изображения: {e}")
-                        # Возвращаемся к base64 как fallback
-                        # Обновляем изображение в существующей записи
-                        update_generation_image(request, topic, image_data)
-                        
-                        # Обновляем информацию о токенах в сессии
-                        if token:
-                            request.session['gigachat_tokens_used'] = token.gigachat_tokens_used
-                            request.session['openai_tokens_used'] = token.openai_tokens_used
-                        
-                        return JsonResponse({
-                            'success': True,
-                            'image_url': image_data,
-                            'message': 'Изображение перегенерировано (base64)',
-                            'gigachat_tokens_used': request.session.get('gigachat_tokens_used', 0),
-                            'openai_tokens_used': request.session.get('openai_tokens_used', 0)
-                        })
-                elif image_data.startswith("http"):
-                    # Это URL (если вдруг вернется)
-                    # Обновляем изображение в существующей записи
-                    update_generation_image(request, topic, image_data)
-                    
-                    # Обновляем информацию о токенах в сессии
-                    if token:
-                        request.session['gigachat_tokens_used'] = token.gigachat_tokens_used
-                        request.session['openai_tokens_used'] = token.openai_tokens_used
-                    
-                    return JsonResponse({
-                        'success': True,
-                        'image_url': image_data,
-                        'message': 'Изображение перегенерировано (URL)',
-                        'gigachat_tokens_used': request.session.get('gigachat_tokens_used', 0),
-                        'openai_tokens_used': request.session.get('openai_tokens_used', 0)
-                    })
-                else:
-                    # Сохраняем локально, если это base64 без префикса
-                    filename = f"regenerated_{topic[:20].replace(' ', '_')}.jpg"
-                    full_path = os.path.join(settings.MEDIA_ROOT, filename)
-                    os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
-                    
-                    # Декодируем base64 и сохраняем
-                    try:
-                        image_bytes = base64.b64decode(image_data)
-                        with open(full_path, "wb") as f:
-                            f.write(image_bytes)
-                        image_url = request.build_absolute_uri(settings.MEDIA_URL + filename)
-                        print(f"Изображение сохранено локально: {image_url}")
-                        
-                        # Обновляем изображение в существующей записи
-                        update_generation_image(request, topic, image_url)
-                        
-                        # Обновляем информацию о токенах в сессии
-                        if token:
-                            request.session['gigachat_tokens_used'] = token.gigachat_tokens_used
-                            request.session['openai_tokens_used'] = token.openai_tokens_used
-                        
-                        return JsonResponse({
-                            'success': True,
-                            'image_url': image_url,
-                            'message': 'Изображение успешно перегенерировано',
-                            'gigachat_tokens_used': request.session.get('gigachat_tokens_used', 0),
-                            'openai_tokens_used': request.session.get('openai_tokens_used', 0)
-                        })
-                    except Exception as e:
-                        print(f"Ошибка при сохранении изображения: {e}")
-                        return JsonResponse({
-                            'success': False,
-                            'error': 'Ошибка при сохранении изображения'
-                        })
-            else:
+            if not image_data:
                 return JsonResponse({
                     'success': False,
                     'error': 'GigaChat вернул текст без изображения. Попробуйте изменить тему или повторить позже.'
                 })
+            return _saved_image_response(request, topic, image_data,
+                                         'Изображение успешно перегенерировано')
             
         except Exception as e:
             print(f"Ошибка при перегенерации изображения: {e}")
@@ -902,13 +1085,82 @@ def edit_profile_view(request):
 def user_wall_view(request):
     # Показываем все генерации (в системе токенов user может быть null)
     # Можно фильтровать по токену, но в модели нет прямой связи
-    # Показываем все генерации без пользователя или все, если пользователь авторизован
-    if request.user.is_authenticated:
-        generations = Generation.objects.filter(user=request.user).order_by('-created_at')
-    else:
-        # Показываем генерации без пользователя (анонимные)
-        generations = Generation.objects.filter(user__isnull=True).order_by('-created_at')
-    return render(request, 'generator/wall.html', {'generations': generations})
+    # Первая страница стены; следующие подгружаются через user_wall_feed
+    generations, next_cursor = fetch_wall_page(wall_queryset(request))
+    return render(request, 'generator/wall.html', {
+        'generations': generations,
+        'next_cursor': next_cursor,
+    })
+
+@token_required
+@require_GET
+def user_wall_feed(request):
+    """
+    JSON-лента стены для бесконечной прокрутки
+
+    GET /wall/feed/?cursor=<курсор>&limit=<N>
+
+    Returns:
+        JsonResponse: items (карточки), html (разметка карточек), next_cursor
+    """
+    try:
+        limit = min(max(int(request.GET.get('limit', 0)), 0), 100) or None
+        generations, next_cursor = fetch_wall_page(
+            wall_queryset(request), request.GET.get('cursor') or None, limit
+        )
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'success': True,
+        **_wall_cards_payload(request, generations),
+        'next_cursor': next_cursor,
+    })
+
+@token_required
+@require_GET
+def user_wall_search(request):
+    """
+    Полнотекстовый поиск по генерациям стены
+
+    GET /wall/search/?q=<запрос>&page=<N>
+
+    Returns:
+        JsonResponse: items и html карточек по релевантности, page, has_next
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Некорректный номер страницы'}, status=400)
+    if not query:
+        return JsonResponse({'success': False, 'error': 'Пустой запрос'}, status=400)
+
+    generations, has_next = search_generations(request.user, query, page)
+    return JsonResponse({
+        'success': True,
+        **_wall_cards_payload(request, generations),
+        'page': max(page, 1),
+        'has_next': has_next,
+    })
+
+def _wall_cards_payload(request, generations):
+    """Карточки стены для JSON: данные (items) и готовая разметка (html)."""
+    items = [
+        {
+            'id': gen.id,
+            'created_at': gen.created_at.isoformat(),
+            'topic': gen.topic,
+            'excerpt': gen.excerpt[:100],
+            'versions': gen.version_count,
+            'image_url': gen.image_url,
+            'image_count': gen.image_count,
+            'url': reverse('generation_detail', args=[gen.id]),
+        }
+        for gen in generations
+    ]
+    html = render_to_string('generator/wall_cards.html', {'generations': generations}, request=request)
+    return {'items': items, 'html': html}
 
 @token_required
 def delete_generation_view(request, gen_id):
@@ -930,7 +1182,11 @@ def generation_detail_view(request, gen_id):
         gen = get_object_or_404(Generation, id=gen_id, user=request.user)
     else:
         gen = get_object_or_404(Generation, id=gen_id, user__isnull=True)
-    return render(request, 'generator/generation_detail.html', {'gen': gen})
+    return render(request, 'generator/generation_detail.html', {
+        'gen': gen,
+        'text_versions': gen.text_versions(),
+        'image_urls': gen.image_urls(),
+    })
 
 # --- API для шаблонов генератора ---
 # В системе токенов шаблоны недоступны (требуют User)
@@ -1073,8 +1329,15 @@ def token_auth_view(request, token):
     """
     try:
         from .models import TemporaryAccessToken
+        from .token_filter import token_filter
         from django.utils import timezone
         
+        # Несуществующий UUID (перебор) — без запроса к БД
+        if not token_filter.might_contain(token):
+            return render(request, 'generator/invalid_token.html', {
+                'token': token
+            })
+        
         # Пытаемся найти активный токен
         from django.db.models import Q
         access_token = TemporaryAccessToken.objects.filter(
@@ -1107,7 +1370,7 @@ def token_auth_view(request, token):
         # Обновляем информацию о последнем использовании
         access_token.last_used = timezone.now()
         access_token.current_ip = request.META.get('REMOTE_ADDR')
-        access_token.save()
+        access_token.save(update_fields=['last_used', 'current_ip'])
         
         # Привязка к пользователю Django по telegram_user_id (для сохранения истории)
         # Демо-токены из manual_token_generator (без telegram_user_id) остаются без привязки
@@ -1518,9 +1781,12 @@ def api_create_token(request):
                 ).filter(
                     Q(expires_at__isnull=True) | Q(expires_at__gte=now_check)
                 )
-                if active_demo.exists():
+                demo_values = list(active_demo.values_list('token', flat=True))
+                if demo_values:
                     # Деактивируем все активные демо-токены при покупке платного тарифа
                     active_demo.update(is_active=False)
+                    # update() минует save(): кэш состояния токенов очищается явно
+                    invalidate_token_state(*demo_values)
                 
                 # Проверяем активные платные подписки
                 paid_tokens = existing_tokens.filter(
@@ -1653,9 +1919,17 @@ def api_token_info(request, token):
         JSON с информацией о токене
     """
     from .models import TemporaryAccessToken
+    from .token_filter import token_filter
     
     try:
-        token_obj = TemporaryAccessToken.objects.get(token=token)
+        # Несуществующий UUID (перебор) — без запроса к БД
+        if not token_filter.might_contain(token):
+            raise TemporaryAccessToken.DoesNotExist
+        try:
+            token_obj = TemporaryAccessToken.objects.get(token=token)
+        except TemporaryAccessToken.DoesNotExist:
+            token_filter.record_false_positive()
+            raise
         
         response_data = {
             'token': str(token_obj.token),
@@ -0,0 +1,121 @@
+"""
+Курсорная (keyset) пагинация стены генераций
+
+user_wall_view отдавал все генерации пользователя (для анонимных
+токенов — все анонимные генерации системы) вместе с полным текстом result
+на каждый просмотр стены. Теперь страница — WALL_PAGE_SIZE карточек,
+упорядоченных по (created_at, id) по убыванию; следующая страница
+начинается строго после последней карточки (курсор), поэтому запрос
+использует индекс generation_wall_idx и не зависит от размера таблицы
+(в отличие от OFFSET).
+
+Поле result в список не загружается: карточке нужны только начало текста
+(excerpt), число версий текста и число изображений. Версии и изображения
+хранятся в дочерних таблицах (GenerationVersion, GenerationImage), сами
+строки для карточек не читаются — считаются подзапросом по индексу.
+"""
+
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Substr
+
+from .models import Generation, GenerationImage, GenerationVersion
+
+# Карточке нужно начало текста (до 100 символов) — с запасом
+EXCERPT_LENGTH = 400
+
+CARD_FIELDS = ('id', 'user', 'created_at', 'topic', 'image_url')
+
+
+def _child_count(model):
+    """Число дочерних строк генерации (подзапрос, без GROUP BY по странице)."""
+    rows = (
+        model.objects.filter(generation=OuterRef('pk'))
+        .order_by()
+        .values('generation')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(rows, output_field=IntegerField()), Value(0))
+
+
+def _page_size():
+    return getattr(settings, 'WALL_PAGE_SIZE', 24)
+
+
+def encode_cursor(generation):
+    """Курсор позиции после генерации (base64 от created_at и id)."""
+    raw = f"{generation.created_at.isoformat()}|{generation.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    (created_at, id) из курсора
+
+    Raises:
+        ValueError: Некорректный курсор
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, generation_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(generation_id)
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Некорректный курсор: {cursor!r}") from e
+
+
+def wall_queryset(request):
+    """Генерации стены: пользователя или анонимные (в системе токенов user может быть null)."""
+    if request.user.is_authenticated:
+        return Generation.objects.filter(user=request.user)
+    return Generation.objects.filter(user__isnull=True)
+
+
+def card_queryset(queryset):
+    """
+    Поля карточки стены без полного текста
+
+    Args:
+        queryset: Запрос генераций
+
+    Returns:
+        QuerySet: только CARD_FIELDS + excerpt, version_count, image_count
+    """
+    return queryset.only(*CARD_FIELDS).annotate(
+        excerpt=Substr('result', 1, EXCERPT_LENGTH),
+        version_count=_child_count(GenerationVersion) + Value(1),
+        image_count=_child_count(GenerationImage) + Case(
+            When(Q(image_url__isnull=True) | Q(image_url=''), then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        ),
+    )
+
+
+def fetch_wall_page(queryset, cursor=None, limit=None):
+    """
+    Страница стены после курсора
+
+    Args:
+        queryset: wall_queryset(request)
+        cursor: Курсор из предыдущей страницы (None — первая страница)
+        limit: Размер страницы (по умолчанию WALL_PAGE_SIZE)
+
+    Returns:
+        (generations, next_cursor): next_cursor — None на последней странице
+
+    Raises:
+        ValueError: Некорректный курсор
+    """
+    limit = limit or _page_size()
+    if cursor:
+        created_at, generation_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=generation_id)
+        )
+    page = list(card_queryset(queryset.order_by('-created_at', '-id'))[:limit + 1])
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    return page[:limit], next_cursor
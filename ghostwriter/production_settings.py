@@ -34,6 +34,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'generator.session_sync.SessionSyncMiddleware',  # Продление сессии по интервалу, учёт записей
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -218,6 +219,77 @@ if os.environ.get('EMAIL_HOST'):
 # Flask микросервис URL (зарубежный сервер)
 FLASK_GEN_URL = os.environ.get('FLASK_EXTERNAL_URL', 'http://localhost:5000')
 
+# Очередь задач генерации (см. generator/jobs.py), по умолчанию выключена
+GENERATION_JOBS_ENABLED = os.environ.get('GENERATION_JOBS_ENABLED', 'False').lower() in ('true', '1', 'yes')
+GENERATION_JOBS_INPROCESS = os.environ.get('GENERATION_JOBS_INPROCESS', 'False').lower() in ('true', '1', 'yes')
+GENERATION_STREAMING_ENABLED = os.environ.get('GENERATION_STREAMING_ENABLED', 'True').lower() in ('true', '1', 'yes')
+
+# Кэш ответов для одинаковых запросов (см. generator/response_cache.py)
+RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'False').lower() in ('true', '1', 'yes')
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', '86400'))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '5000'))
+
+# Поиск недавних генераций с почти такой же темой (см. generator/topic_index.py)
+TOPIC_DEDUP_ENABLED = os.environ.get('TOPIC_DEDUP_ENABLED', 'False').lower() in ('true', '1', 'yes')
+TOPIC_DEDUP_THRESHOLD = float(os.environ.get('TOPIC_DEDUP_THRESHOLD', '0.8'))
+TOPIC_DEDUP_MAX_ENTRIES = int(os.environ.get('TOPIC_DEDUP_MAX_ENTRIES', '5000'))
+TOPIC_DEDUP_TTL = int(os.environ.get('TOPIC_DEDUP_TTL', '86400'))
+
+# Промпт изображения готовится параллельно с текстом (см. generator/image_pipeline.py):
+# 'draft' — изображение по черновику, 'refine' — черновик уточняется по тексту,
+# 'off' (по умолчанию) — последовательно: текст, промпт по тексту, изображение
+GENERATION_IMAGE_PIPELINE = os.environ.get('GENERATION_IMAGE_PIPELINE', 'off').lower()
+
+# Уменьшенные копии изображений (JPEG/WebP) для стены (см. generator/image_derivatives.py)
+IMAGE_DERIVATIVES_ENABLED = os.environ.get('IMAGE_DERIVATIVES_ENABLED', 'True').lower() in ('true', '1', 'yes')
+
+# Буферизованная запись расхода токенов (см. generator/usage_sink.py): 'off' (синхронно), 'memory' или 'redis'
+TOKEN_USAGE_BUFFER = os.environ.get('TOKEN_USAGE_BUFFER', 'off').lower()
+TOKEN_USAGE_BATCH_SIZE = int(os.environ.get('TOKEN_USAGE_BATCH_SIZE', '100'))
+TOKEN_USAGE_FLUSH_INTERVAL = float(os.environ.get('TOKEN_USAGE_FLUSH_INTERVAL', '2'))  # секунды
+
+# Время жизни незакрытого резерва токенов до вызова провайдера (TemporaryAccessToken.reserve_tokens)
+TOKEN_RESERVATION_TTL = int(os.environ.get('TOKEN_RESERVATION_TTL', '300'))  # секунды
+
+# Кэш состояния токенов доступа между запросами (см. generator/token_cache.py), 0 — отключить
+TOKEN_STATE_CACHE_TTL = int(os.environ.get('TOKEN_STATE_CACHE_TTL', '30'))  # секунды
+
+# Сессии пишутся только при изменении данных (см. generator/session_sync.py)
+SESSION_REFRESH_INTERVAL = int(os.environ.get('SESSION_REFRESH_INTERVAL', '3600'))  # продление срока сессии, секунды
+SESSION_SYNC_REPORT = os.environ.get('SESSION_SYNC_REPORT', 'False').lower() in ('true', '1', 'yes')  # заголовок X-Session-Write
+FORM_DATA_CACHE_TTL = int(os.environ.get('FORM_DATA_CACHE_TTL', '86400'))  # форма последней генерации, секунды
+
+# Ограничение частоты входящих запросов (см. generator/rate_limit.py): 'gcra' или 'fixed' (прежнее окно)
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'gcra').lower()
+
+# Заголовок Server-Timing с временем этапов SecurityPipelineMiddleware (для профилирования)
+SECURITY_TIMINGS = os.environ.get('SECURITY_TIMINGS', 'False').lower() == 'true'
+
+# Блоклист IP и подсетей в памяти воркера (см. generator/ip_blocklist.py): период проверки версии, секунды
+IP_BLOCKLIST_REFRESH_INTERVAL = int(os.environ.get('IP_BLOCKLIST_REFRESH_INTERVAL', '30'))
+
+# Фильтр Блума по UUID токенов (см. generator/token_filter.py): auto (Redis, иначе выключен), redis, mmap (один хост), memory, off
+TOKEN_FILTER_BACKEND = os.environ.get('TOKEN_FILTER_BACKEND', 'auto').lower()
+TOKEN_FILTER_PATH = os.environ.get('TOKEN_FILTER_PATH', '')  # файл для mmap; по умолчанию во временном каталоге
+TOKEN_FILTER_CAPACITY = int(os.environ.get('TOKEN_FILTER_CAPACITY', '1000000'))
+TOKEN_FILTER_ERROR_RATE = float(os.environ.get('TOKEN_FILTER_ERROR_RATE', '0.001'))
+TOKEN_FILTER_VERIFY_INTERVAL = int(os.environ.get('TOKEN_FILTER_VERIFY_INTERVAL', '10'))  # сверка с БД, секунды
+
+# Карточек на странице стены (курсорная пагинация, см. generator/wall_feed.py)
+WALL_PAGE_SIZE = int(os.environ.get('WALL_PAGE_SIZE', '24'))
+
+# Выбор лидера планировщика (generator/leader_election.py): задачи выполняет один процесс кластера.
+# Хранилище аренды: auto (redis, если кэш — django_redis, иначе db), redis, db.
+# Выбор по настройкам, общим для кластера; без Redis процесс не становится лидером
+SCHEDULER_LEADER_BACKEND = os.environ.get('SCHEDULER_LEADER_BACKEND', 'auto').lower()
+SCHEDULER_LEADER_TTL = int(os.environ.get('SCHEDULER_LEADER_TTL', '30'))  # секунды до перехода лидерства
+SCHEDULER_LEADER_HEARTBEAT = int(os.environ.get('SCHEDULER_LEADER_HEARTBEAT', '10'))
+SCHEDULER_RUN_HISTORY_DAYS = int(os.environ.get('SCHEDULER_RUN_HISTORY_DAYS', '30'))
+
+# Пакетное обслуживание токенов и генераций (generator/maintenance.py)
+MAINTENANCE_BATCH_SIZE = int(os.environ.get('MAINTENANCE_BATCH_SIZE', '1000'))
+MAINTENANCE_BATCH_PAUSE = float(os.environ.get('MAINTENANCE_BATCH_PAUSE', '0.05'))  # секунды между пачками
+
 # Настройки для соблюдения 152-ФЗ
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
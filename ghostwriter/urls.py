@@ -24,9 +24,11 @@ urlpatterns = [
     path('', views.landing_view, name='landing'),
     path('home/', views.home_view, name='home'),
     path('generator/', views.generator_view, name='index'),
+    path('generator/stream/', views.generator_stream_view, name='generator_stream'),
     path('regenerate-text/', views.regenerate_text, name='regenerate_text'),
     path('regenerate-image/', views.regenerate_image, name='regenerate_image'),
     path('generate-image-from-text/', views.generate_image_from_text, name='generate_image_from_text'),
+    path('generation-jobs/<uuid:job_id>/', views.generation_job_status, name='generation_job_status'),
     
     # DEPRECATED: Старая система регистрации/входа (заглушки)
     # Теперь используем систему токенов для доступа
@@ -38,6 +40,8 @@ urlpatterns = [
     path('profile/', views.profile_view, name='profile'),
     path('profile/edit/', views.edit_profile_view, name='edit_profile'),
     path('wall/', views.user_wall_view, name='user_wall'),
+    path('wall/feed/', views.user_wall_feed, name='user_wall_feed'),
+    path('wall/search/', views.user_wall_search, name='user_wall_search'),
     path('delete-generation/<int:gen_id>/', views.delete_generation_view, name='delete_generation'),
     path('generation/<int:gen_id>/', views.generation_detail_view, name='generation_detail'),
     
@@ -171,8 +171,8 @@ class IsolatedDjangoTests(TestCase):
         
         # Проверяем обновление в БД
         generation.refresh_from_db()
-        self.assertIn('--- Перегенерация 1 ---', generation.result)
-        self.assertIn('Новый перегенерированный текст', generation.result)
+        self.assertEqual(generation.result, 'Исходный текст')
+        self.assertEqual(generation.text_versions(), [(1, 'Исходный текст'), (2, 'Новый перегенерированный текст')])
     
     def test_user_wall(self):
         """Тест стены пользователя"""
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Тесты очереди задач генерации
+
+Проверяют постановку задачи в очередь, однократный захват задачи
+воркером, сохранение результата в формате generator_view и доступ к
+статусу задачи без токена и пользователя только из создавшей её сессии
+"""
+
+from datetime import timedelta
+from unittest.mock import patch
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from generator.models import GenerationJob, TemporaryAccessToken
+from generator.jobs import enqueue_generation_job, claim_next_job, execute_job, fail_stale_jobs, GenerationJobWorker
+
+
+def _token_client():
+    """Клиент с токеном доступа в сессии (проходит TokenAccessMiddleware)"""
+    client = Client()
+    token = TemporaryAccessToken.objects.create(token_type='BASIC', gigachat_tokens_limit=100)
+    session = client.session
+    session['access_token'] = str(token.token)
+    session.save()
+    return client, session
+
+
+@override_settings(USE_TZ=False)
+class GenerationJobQueueTests(TestCase):
+    """Тесты очереди задач генерации"""
+
+    def test_job_is_claimed_once(self):
+        job = enqueue_generation_job({'topic': 'Тест'}, generate_image_flag=False)
+
+        claimed = claim_next_job('worker-1')
+
+        self.assertEqual(claimed.id, job.id)
+        self.assertEqual(claimed.status, GenerationJob.STATUS_RUNNING)
+        self.assertEqual(claimed.worker, 'worker-1')
+        self.assertIsNone(claim_next_job('worker-2'))
+
+    @patch('generator.views.run_generation_pipeline')
+    def test_execute_job_stores_view_response(self, mock_pipeline):
+        response = {'success': True, 'result': 'Текст', 'image_url': None, 'generation_id': 1}
+        mock_pipeline.return_value = response
+        enqueue_generation_job({'topic': 'Тест'}, base_url='http://testserver/')
+
+        self.assertTrue(GenerationJobWorker(threads=1).run_once())
+
+        job = GenerationJob.objects.get()
+        self.assertEqual(job.status, GenerationJob.STATUS_DONE)
+        self.assertEqual(job.result, response)
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(mock_pipeline.call_args.kwargs['base_url'], 'http://testserver/')
+
+    @patch('generator.views.run_generation_pipeline', side_effect=RuntimeError('boom'))
+    def test_failed_pipeline_marks_job_failed(self, mock_pipeline):
+        enqueue_generation_job({'topic': 'Тест'})
+        job = execute_job(claim_next_job('worker-1'))
+
+        self.assertEqual(job.status, GenerationJob.STATUS_FAILED)
+        self.assertEqual(job.result, {'success': False, 'error': 'boom'})
+
+    @patch('generator.views.run_generation_pipeline', return_value={'success': True, 'result': 'Текст'})
+    def test_late_worker_does_not_overwrite_stale_job(self, mock_pipeline):
+        enqueue_generation_job({'topic': 'Тест'})
+        job = claim_next_job('worker-1')
+        GenerationJob.objects.filter(id=job.id).update(started_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(fail_stale_jobs(), 1)
+
+        job = execute_job(job)
+
+        self.assertEqual(job.status, GenerationJob.STATUS_FAILED)
+        self.assertEqual(GenerationJob.objects.get().status, GenerationJob.STATUS_FAILED)
+
+    def test_anonymous_job_is_bound_to_session(self):
+        # Задача без токена и пользователя; токены в сессиях клиентов нужны
+        # только TokenAccessMiddleware, если он включён в настройках
+        owner, session = _token_client()
+        job = enqueue_generation_job({'topic': 'Тест'}, session_key=session.session_key)
+        url = reverse('generation_job_status', args=[job.id])
+
+        response = owner.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], GenerationJob.STATUS_PENDING)
+        self.assertEqual(_token_client()[0].get(url).status_code, 404)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Тесты полнотекстового поиска по генерациям (generator/generation_search.py)
+
+Проверяют ранжирование (тема важнее текста), поиск по форме слова,
+синхронизацию индекса при изменении и удалении, границы владельца,
+устойчивый порядок страниц и JSON-эндпоинт поиска стены
+"""
+
+import importlib
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from generator import generation_search
+from generator.models import Generation, TemporaryAccessToken
+
+migration = importlib.import_module('generator.migrations.0027_generation_search')
+
+
+class GenerationSearchTests(TestCase):
+    """Тесты search_ids, search_generations и user_wall_search"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # С DisableMigrations индекса нет — создаём его SQL миграции 0027;
+        # в БД после миграций он уже есть
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                missing = generation_search.FTS_TABLE not in connection.introspection.table_names(cursor)
+                statements = migration.SQLITE_FORWARD
+            elif connection.vendor == 'postgresql':
+                columns = connection.introspection.get_table_description(cursor, 'generator_generation')
+                missing = 'search_vector' not in {column.name for column in columns}
+                statements = migration.POSTGRES_FORWARD
+            else:
+                missing, statements = False, []
+            if missing:
+                for statement in statements:
+                    cursor.execute(statement)
+
+    def setUp(self):
+        self.in_topic = Generation.objects.create(topic='Открытие кофейни', result='Приглашаем всех гостей')
+        self.in_text = Generation.objects.create(topic='Новости', result='В нашей кофейне новое меню')
+        self.other = Generation.objects.create(topic='Фитнес', result='Тренировки каждый день')
+        self.user = User.objects.create_user('search-user', password='x')
+        self.private = Generation.objects.create(user=self.user, topic='Кофейня у дома', result='Текст')
+
+    def test_ranking_word_forms_and_owner_scope(self):
+        self.assertEqual(generation_search.fts5_query('Кофейни "x" OR'), '"кофей"* "x"* "or"*')
+        self.assertEqual(generation_search.search_ids(None, 'кофейня', 10), [self.in_topic.id, self.in_text.id])
+        self.assertEqual(generation_search.search_ids(self.user, 'кофейня', 10), [self.private.id])
+        self.assertEqual(generation_search.search_ids(None, '"', 10), [])
+
+    def test_index_follows_update_and_delete(self):
+        Generation.objects.filter(id=self.other.id).update(result='Кофейня открылась')
+        self.assertIn(self.other.id, generation_search.search_ids(None, 'кофейня', 10))
+        self.in_topic.delete()
+        self.assertNotIn(self.in_topic.id, generation_search.search_ids(None, 'кофейня', 10))
+
+    def test_pages_follow_one_order(self):
+        # Старые совпадения по теме релевантнее новых совпадений по тексту
+        older = [Generation.objects.create(topic=f'Кофейня {i}', result='Текст') for i in range(3)]
+        newer = [Generation.objects.create(topic='Новости', result=f'Кофейня {i}') for i in range(3)]
+        full = generation_search.search_ids(None, 'кофейня', 100)
+
+        pages = [generation_search.search_ids(None, 'кофейня', 2, offset) for offset in range(0, len(full), 2)]
+        self.assertEqual([pk for page in pages for pk in page], full)
+        self.assertEqual(len(set(full)), len(full))
+        self.assertLess(full.index(older[0].id), full.index(newer[-1].id))
+        # При равном ранге новые раньше
+        self.assertLess(full.index(newer[2].id), full.index(newer[0].id))
+
+    @override_settings(WALL_PAGE_SIZE=1)
+    def test_wall_search_endpoint_pages(self):
+        token = TemporaryAccessToken.objects.create(token_type='BASIC', gigachat_tokens_limit=100)
+        session = self.client.session
+        session['access_token'] = str(token.token)
+        session.save()
+
+        first = self.client.get(reverse('user_wall_search'), {'q': 'кофейня'}).json()
+        self.assertEqual(([item['id'] for item in first['items']], first['has_next']), ([self.in_topic.id], True))
+        second = self.client.get(reverse('user_wall_search'), {'q': 'кофейня', 'page': 2}).json()
+        self.assertEqual(([item['id'] for item in second['items']], second['has_next']), ([self.in_text.id], False))
+        self.assertIn('wall-card', second['html'])
+        self.assertEqual(self.client.get(reverse('user_wall_search'), {'q': ''}).status_code, 400)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Тесты версий текста и изображений генерации (GenerationVersion, GenerationImage)
+
+Проверяют перенос склеенных строк legacy формата в дочерние таблицы
+(миграция 0026) и обратно, а также страницу генерации
+"""
+
+import importlib
+
+from django.apps import apps
+from django.test import TestCase
+from django.urls import reverse
+
+from generator.models import Generation, GenerationImage, GenerationVersion, TemporaryAccessToken
+
+migration = importlib.import_module('generator.migrations.0026_generation_versions')
+
+LEGACY_TEXT = (
+    "Первый\n\n--- Перегенерация 1 ---\n\nВторой\n\n--- Перегенерация 2 ---\n\nТретий"
+)
+
+
+class GenerationVersionsTests(TestCase):
+    """Тесты миграции legacy формата и отображения версий"""
+
+    def test_legacy_blobs_split_and_join(self):
+        legacy = Generation.objects.create(topic='t', result=LEGACY_TEXT, image_url='/media/a.png|/media/b.png')
+        plain = Generation.objects.create(topic='t', result='Без версий', image_url='/media/c.png')
+
+        migration.split_legacy_blobs(apps, None)
+        legacy.refresh_from_db()
+        self.assertEqual(legacy.text_versions(), [(1, 'Первый'), (2, 'Второй'), (3, 'Третий')])
+        self.assertEqual(legacy.image_urls(), ['/media/a.png', '/media/b.png'])
+        self.assertEqual(GenerationVersion.objects.filter(generation=plain).count(), 0)
+
+        migration.join_legacy_blobs(apps, None)
+        legacy.refresh_from_db()
+        self.assertEqual((legacy.result, legacy.image_url), (LEGACY_TEXT, '/media/a.png|/media/b.png'))
+
+    def test_add_version_and_image_numbering(self):
+        gen = Generation.objects.create(topic='t', result='Первый')
+        self.assertIsNone(gen.add_image('/media/a.png'))
+        self.assertEqual(gen.add_image('/media/b.png').position, 2)
+        self.assertEqual([gen.add_version(text).number for text in ('2', '3')], [2, 3])
+        self.assertEqual(GenerationImage.objects.filter(generation=gen).count(), 1)
+
+    def test_detail_view_renders_all_versions(self):
+        token = TemporaryAccessToken.objects.create(token_type='BASIC', gigachat_tokens_limit=100)
+        session = self.client.session
+        session['access_token'] = str(token.token)
+        session.save()
+        gen = Generation.objects.create(topic='t', result='Первый', image_url='/media/a.png')
+        gen.add_version('Второй')
+        gen.add_image('/media/b.png')
+
+        response = self.client.get(reverse('generation_detail', args=[gen.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Второй')
+        self.assertContains(response, '2 версий')
+        self.assertContains(response, 'Изображения (2)')
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Тесты пула клиентов GigaChat
+
+Проверяют переиспользование клиентов, заблаговременное обновление
+токена и пересоздание клиента после ошибки авторизации
+"""
+
+import time
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from generator.gigachat_pool import GigaChatClientPool
+
+
+def _make_client(expires_in=3600):
+    """Создаёт фиктивный прямой клиент SDK с токеном"""
+    client = MagicMock(spec=['chat', 'close', 'get_token', '_reset_token', '_access_token'])
+    client._access_token = MagicMock(expires_at=int((time.time() + expires_in) * 1000))
+    return client
+
+
+class GigaChatClientPoolTests(TestCase):
+    """Тесты реестра клиентов GigaChat"""
+
+    def test_client_is_reused(self):
+        factory = MagicMock(side_effect=_make_client)
+        pool = GigaChatClientPool({'image': factory})
+
+        first = pool.get('image')
+        second = pool.get('image')
+
+        self.assertIs(first, second)
+        self.assertEqual(factory.call_count, 1)
+        stats = pool.get_stats()
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['reused'], 1)
+        self.assertEqual(stats['handshakes_saved'], 1)
+
+    def test_token_refreshed_before_expiry(self):
+        client = _make_client(expires_in=10)
+        pool = GigaChatClientPool({'image': lambda: client}, refresh_margin=60)
+
+        pool.get('image')
+
+        client._reset_token.assert_called_once()
+        client.get_token.assert_called_once()
+        self.assertEqual(pool.get_stats()['token_refreshes'], 1)
+
+    def test_rebuild_after_auth_error(self):
+        clients = [_make_client(), _make_client()]
+        clients[0].chat.side_effect = Exception("401 Unauthorized")
+        clients[1].chat.return_value = 'ok'
+        pool = GigaChatClientPool({'image': MagicMock(side_effect=clients)})
+
+        result = pool.call('image', lambda giga: giga.chat('payload'))
+
+        self.assertEqual(result, 'ok')
+        clients[0].close.assert_called_once()
+        self.assertEqual(pool.get_stats()['rebuilds'], 1)
+        self.assertIs(pool.get('image'), clients[1])
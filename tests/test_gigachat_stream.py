@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Тесты инкрементального фильтра финального поста
+
+Проверяют, что потоковая обработка по частям даёт тот же результат,
+что и postprocess_final_result для полного ответа, и что оборванный
+поток не кэшируется и не выдаётся за готовый пост
+"""
+
+from unittest import TestCase, mock
+
+from generator import gigachat_api
+from generator.gigachat_api import FinalResultFilter, postprocess_final_result
+
+
+RESPONSE = (
+    "Агент 1: Черновик поста\n"
+    "Черновик: первая версия\n"
+    "Финальный Результат\n"
+    "Заголовок: Весна\n"
+    "Весна пришла в город.\n"
+    "\n\n\n"
+    "Гуляйте больше!\n"
+    "Критик: хорошо\n"
+    "Оценка: 9/10\n"
+)
+
+
+class FinalResultFilterTests(TestCase):
+    """Тесты FinalResultFilter"""
+
+    def _stream(self, text, size):
+        result_filter = FinalResultFilter()
+        events = []
+        for i in range(0, len(text), size):
+            events.extend(result_filter.feed(text[i:i + size]))
+        events.extend(result_filter.finish())
+        return result_filter, events
+
+    def test_chunked_result_matches_full_postprocess(self):
+        expected = postprocess_final_result(RESPONSE)
+        self.assertEqual(expected, "Весна пришла в город.\n\nГуляйте больше!")
+        for size in (1, 3, 7, 64):
+            result_filter, _ = self._stream(RESPONSE, size)
+            self.assertEqual(result_filter.result(), expected)
+
+    def test_drafts_are_reset_and_critic_dropped(self):
+        _, events = self._stream(RESPONSE, 5)
+        kinds = [kind for kind, _ in events]
+        self.assertIn('reset', kinds)
+        after_reset = ''.join(text for kind, text in events[kinds.index('reset') + 1:] if kind == 'delta')
+        self.assertEqual(after_reset, "Весна пришла в город.\n\nГуляйте больше!\n")
+
+    def test_text_without_final_marker_is_streamed_as_is(self):
+        result_filter, events = self._stream("Просто пост\nбез этапов", 4)
+        self.assertEqual(''.join(text for _, text in events), "Просто пост\nбез этапов\n")
+        self.assertEqual(result_filter.result(), "Просто пост\nбез этапов")
+
+
+class StreamTextErrorTests(TestCase):
+    """Обрыв потока GigaChat после части текста"""
+
+    def test_partial_text_is_not_cached_or_done(self):
+        def chunks():
+            yield mock.Mock(content="Финальный Результат\nНачало поста ")
+            raise ConnectionError('stream reset')
+
+        giga = mock.Mock()
+        giga.stream.return_value = chunks()
+        with mock.patch.object(gigachat_api, '_client_pool') as pool, \
+                mock.patch.object(gigachat_api, '_rate_governor'), \
+                mock.patch.object(gigachat_api, 'usage_from_response', return_value=None), \
+                mock.patch.object(gigachat_api, '_text_cache_key', return_value='text:key'), \
+                mock.patch.object(gigachat_api, '_get_cached_text', return_value=None), \
+                mock.patch.object(gigachat_api, '_reserve_tokens', return_value=(True, None)), \
+                mock.patch.object(gigachat_api, '_finalize_text_usage', return_value=True) as finalize, \
+                mock.patch.object(gigachat_api, '_store_cached_text') as store:
+            pool.get.return_value = giga
+            events = list(gigachat_api.stream_text({'topic': 'Весна'}))
+
+        self.assertEqual(events[-1][0], 'error')
+        self.assertNotIn('done', [kind for kind, _ in events])
+        store.assert_not_called()
+        # Полученная часть ответа всё равно учитывается
+        finalize.assert_called_once()
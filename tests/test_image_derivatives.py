@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Тесты уменьшенных копий изображений (generator/image_derivatives.py)
+
+Проверяют создание JPEG/WebP копий при сохранении, srcset для шаблонов
+и досоздание копий для старых изображений командой
+"""
+
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from generator import image_derivatives
+from generator.image_store import persist_image
+from generator.models import Generation
+from generator.templatetags import custom_filters
+
+
+def _jpeg(size=(1024, 1024)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 80, 40)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+class ImageDerivativesTests(TestCase):
+    """Тесты image_derivatives"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_URL='/media/')
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+
+    def _derivative(self, url, width, extension):
+        rel_path = image_derivatives.media_path_from_url(url)
+        return os.path.join(self.media_root, image_derivatives.derivative_path(rel_path, width, extension))
+
+    def test_derivatives_created_on_save(self):
+        url = persist_image(_jpeg(), 'http://testserver/')
+
+        for width in image_derivatives.DERIVATIVE_WIDTHS:
+            with Image.open(self._derivative(url, width, 'webp')) as image:
+                self.assertEqual(image.format, 'WEBP')
+                self.assertEqual(image.size, (width, width))
+            self.assertTrue(os.path.exists(self._derivative(url, width, 'jpg')))
+
+        srcset = image_derivatives.srcset(url, 'webp')
+        self.assertIn('http://testserver/media/derivatives/generated/', srcset)
+        self.assertTrue(srcset.endswith('_640.webp 640w'))
+
+    def test_templates_do_not_create_derivatives(self):
+        with open(os.path.join(self.media_root, 'generated_legacy.jpg'), 'wb') as f:
+            f.write(_jpeg((800, 400)))
+        url = 'http://testserver/media/generated_legacy.jpg'
+
+        # Копий ещё нет: шаблон показывает оригинал и ничего не декодирует
+        with mock.patch.object(Image, 'open', side_effect=AssertionError('decoded during render')):
+            self.assertEqual(image_derivatives.srcset(url, 'jpg'), '')
+            self.assertEqual(custom_filters.image_thumb(url, 320), url)
+        self.assertFalse(os.path.exists(self._derivative(url, 320, 'jpg')))
+
+        Generation.objects.create(topic='t', result='r', image_url=url)
+        call_command('generate_image_derivatives', stdout=io.StringIO())
+        self.assertEqual(custom_filters.image_thumb(url, 320), image_derivatives.derivative_url(url, 320, 'jpg'))
+
+    def test_external_urls_are_left_alone(self):
+        self.assertEqual(image_derivatives.srcset('https://cdn.example.com/img.png'), '')
+        self.assertIsNone(image_derivatives.media_path_from_url('http://testserver/media/../settings.py'))
+
+    def test_backfill_command_for_legacy_images(self):
+        with open(os.path.join(self.media_root, 'generated_legacy.jpg'), 'wb') as f:
+            f.write(_jpeg((800, 400)))
+        url = 'http://testserver/media/generated_legacy.jpg'
+        # Генерации без изображения: image_url NULL и пустая строка
+        Generation.objects.create(topic='t', result='r', image_url=None)
+        Generation.objects.create(topic='t', result='r', image_url='')
+        Generation.objects.create(topic='t', result='r', image_url=f'{url}|https://cdn.example.com/x.png')
+
+        call_command('generate_image_derivatives', stdout=io.StringIO())
+
+        with Image.open(self._derivative(url, 320, 'jpg')) as image:
+            self.assertEqual(image.size, (320, 160))
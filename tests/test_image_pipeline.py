@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Тесты конвейера текст + изображение
+
+Проверяют, что черновик промпта и изображение готовятся параллельно
+с текстом, в режиме refine черновик уточняется по готовому тексту, а без
+текста (ошибка, закрытый клиентом поток) изображение не генерируется
+(вызовы GigaChat подменены)
+"""
+
+import time
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import patch
+
+from generator.image_pipeline import PIPELINE_DRAFT, PIPELINE_REFINE, ImagePipeline, run_text_and_image
+
+DELAY = 0.2
+
+
+def _slow(value):
+    def call(*args, **kwargs):
+        time.sleep(DELAY)
+        return value
+    return call
+
+
+class ImagePipelineTests(TestCase):
+    """Тесты run_text_and_image"""
+
+    def setUp(self):
+        self.form_data = {'topic': 'Кофейня у моря'}
+        self.generation = SimpleNamespace(id=1)
+        patches = [
+            patch('generator.gigachat_api.generate_text', side_effect=_slow('Текст поста')),
+            patch('generator.gigachat_api.generate_image_prompt_draft', side_effect=_slow('черновик')),
+            patch('generator.gigachat_api.generate_image_prompt_from_text', side_effect=_slow('уточнённый')),
+            patch('generator.gigachat_api.generate_image_gigachat', side_effect=_slow('data:image/jpeg;base64,AA==')),
+        ]
+        self.mocks = [p.start() for p in patches]
+        for p in patches:
+            self.addCleanup(p.stop)
+
+    def test_draft_mode_runs_image_alongside_text(self):
+        started = time.monotonic()
+        result, image_prompt, image_data, timings = run_text_and_image(
+            self.form_data, self.generation, mode=PIPELINE_DRAFT
+        )
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(result, 'Текст поста')
+        self.assertEqual(image_prompt, 'черновик')
+        self.assertTrue(image_data.startswith('data:image'))
+        # Последовательно было бы 3 * DELAY (текст, черновик, изображение)
+        self.assertLess(elapsed, 2.7 * DELAY)
+        self.mocks[2].assert_not_called()
+        self.assertIn('image_prompt_draft', timings)
+
+    def test_refine_mode_passes_draft(self):
+        _, image_prompt, _, timings = run_text_and_image(
+            self.form_data, self.generation, mode=PIPELINE_REFINE
+        )
+
+        self.assertEqual(image_prompt, 'уточнённый')
+        refine = self.mocks[2]
+        self.assertEqual(refine.call_args.kwargs['draft'], 'черновик')
+        self.assertEqual(refine.call_args.kwargs['generation_id'], 1)
+        self.assertEqual(self.mocks[3].call_args.args[0], 'уточнённый')
+        self.assertIn('image_prompt', timings)
+
+    def test_failed_text_skips_image(self):
+        for mode in (PIPELINE_DRAFT, PIPELINE_REFINE):
+            self.mocks[0].side_effect = lambda *args, **kwargs: 'WARNING: Лимит токенов исчерпан'
+            result, image_prompt, image_data, _ = run_text_and_image(
+                self.form_data, self.generation, mode=mode
+            )
+            # Фоновый черновик завершается сам; изображение после него не запускается
+            time.sleep(DELAY * 1.5)
+
+            self.assertTrue(result.startswith('WARNING'))
+            self.assertIsNone(image_prompt)
+            self.assertIsNone(image_data)
+            self.mocks[2].assert_not_called()
+            self.mocks[3].assert_not_called()
+
+    def test_text_error_skips_image(self):
+        self.mocks[0].side_effect = RuntimeError('boom')
+        with self.assertRaises(RuntimeError):
+            run_text_and_image(self.form_data, self.generation, mode=PIPELINE_DRAFT)
+        time.sleep(DELAY * 1.5)
+
+        self.mocks[3].assert_not_called()
+
+    def test_cancel_when_stream_closed(self):
+        pipeline = ImagePipeline(self.form_data, self.generation, mode=PIPELINE_DRAFT).start()
+        # Клиент закрыл SSE-поток, пока готовился черновик
+        pipeline.cancel()
+        time.sleep(DELAY * 1.5)
+
+        self.assertEqual(pipeline.finish('Текст поста'), (None, None))
+        self.mocks[3].assert_not_called()
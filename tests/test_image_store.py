@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Тесты сохранения изображений (generator/image_store.py)
+
+Проверяют запись по хешу содержимого, дедупликацию одинаковых
+изображений, потоковое декодирование base64 (в том числе с переносами
+строк) и пиковое потребление памяти
+"""
+
+import base64
+import io
+import os
+import shutil
+import tempfile
+import tracemalloc
+
+from django.test import SimpleTestCase, override_settings
+
+from generator.image_store import CHUNK_SIZE, persist_image, save_image
+
+JPEG = b'\xff\xd8\xff\xe0' + bytes(range(256)) * 4096  # ~1 МБ
+
+
+class ImageStoreTests(SimpleTestCase):
+    """Тесты save_image и persist_image"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_URL='/media/')
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+
+    def _read(self, path):
+        with open(os.path.join(self.media_root, path), 'rb') as f:
+            return f.read()
+
+    def test_all_input_forms_produce_same_file(self):
+        encoded = base64.b64encode(JPEG).decode()
+        inputs = [
+            JPEG,
+            f'data:image/jpeg;base64,{encoded}',
+            encoded,
+            # Переносы строк по 76 символов (base64.encodebytes, MIME)
+            base64.encodebytes(JPEG).decode(),
+            io.BytesIO(JPEG),
+            iter([JPEG[:1000], JPEG[1000:]]),
+        ]
+        stored = [save_image(data) for data in inputs]
+
+        self.assertEqual(len({s.path for s in stored}), 1)
+        self.assertTrue(stored[0].path.endswith('.jpg'))
+        self.assertFalse(stored[0].deduplicated)
+        self.assertTrue(all(s.deduplicated for s in stored[1:]))
+        self.assertEqual(self._read(stored[0].path), JPEG)
+
+    def test_persist_image_urls(self):
+        url = persist_image(JPEG, 'http://testserver/')
+        self.assertTrue(url.startswith('http://testserver/media/generated/'))
+        self.assertEqual(persist_image('https://cdn/img.jpg'), 'https://cdn/img.jpg')
+        self.assertIsNone(persist_image(b''))
+
+    def test_invalid_base64_leaves_no_partial_file(self):
+        with self.assertRaises(ValueError):
+            save_image('data:image/jpeg;base64,' + 'A' * 1000 + '!!')
+        leftovers = [name for _, _, files in os.walk(self.media_root) for name in files]
+        self.assertEqual(leftovers, [])
+
+    def test_peak_memory_is_bounded_by_chunk(self):
+        encoded = 'data:image/jpeg;base64,' + base64.b64encode(JPEG).decode()
+        tracemalloc.start()
+        try:
+            save_image(encoded)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        # split + b64decode держали бы в памяти ещё ~2.3 МБ
+        self.assertLess(peak, 4 * CHUNK_SIZE)
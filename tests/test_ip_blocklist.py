@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Тесты блоклиста IP и подсетей (generator/ip_blocklist.py)
+
+Проверяют поиск самого длинного префикса, обновление воркера по версии
+и массовый импорт командой import_blocklist
+"""
+
+import os
+import tempfile
+import time
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from generator.ip_blocklist import BlockEntry, IPBlocklist, PrefixTree
+from generator.models import BlockedNetwork
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def _entry(network, reason='', expires_at=None):
+    return BlockEntry(network, reason, 'test', expires_at)
+
+
+class PrefixTreeTests(TestCase):
+    """Тесты PrefixTree.lookup"""
+
+    def test_longest_prefix_match(self):
+        tree = PrefixTree()
+        tree.add('10.0.0.0/8', _entry('10.0.0.0/8', 'wide'))
+        tree.add('10.1.0.0/16', _entry('10.1.0.0/16', 'narrow'))
+        tree.add('192.0.2.7', _entry('192.0.2.7/32', 'single'))
+        tree.add('2001:db8::/32', _entry('2001:db8::/32', 'v6'))
+        tree.add('198.51.100.0/24', _entry('198.51.100.0/24', 'expired', time.time() - 1))
+
+        self.assertEqual(tree.lookup('10.1.2.3').reason, 'narrow')
+        self.assertEqual(tree.lookup('10.2.0.1').reason, 'wide')
+        self.assertEqual(tree.lookup('::ffff:10.1.2.3').reason, 'narrow')
+        self.assertEqual(tree.lookup('192.0.2.7').reason, 'single')
+        self.assertEqual(tree.lookup('2001:db8:1::5').reason, 'v6')
+        self.assertIsNone(tree.lookup('192.0.2.8'))
+        self.assertIsNone(tree.lookup('198.51.100.1'))
+        self.assertIsNone(tree.lookup('unknown'))
+
+        tree.remove('10.1.0.0/16')
+        self.assertEqual(tree.lookup('10.1.2.3').reason, 'wide')
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class IPBlocklistTests(TestCase):
+    """Тесты обновления блоклиста и импорта"""
+
+    def test_worker_refreshes_on_version_change(self):
+        worker = IPBlocklist(refresh_interval=0)
+        self.assertFalse(worker.is_blocked('203.0.113.9'))
+        self.assertFalse(worker.refresh())
+
+        # Изменение в другом процессе: запись в БД и новая версия в кэше
+        BlockedNetwork.objects.create(network='203.0.113.0/24', reason='scan')
+        self.assertTrue(worker.refresh())
+        self.assertEqual(worker.lookup('203.0.113.9').reason, 'scan')
+        self.assertFalse(worker.refresh())
+
+    def test_import_command_upserts_and_replaces(self):
+        def write(lines):
+            handle = tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False, encoding='utf-8')
+            handle.write('\n'.join(lines))
+            handle.close()
+            self.addCleanup(os.unlink, handle.name)
+            return handle.name
+
+        first = write(['# AS64500', '198.51.100.0/24 hosting', '192.0.2.1', 'not-an-ip', '10.0.0.0/8,internal'])
+        call_command('import_blocklist', first, source='asn:AS64500', stdout=open(os.devnull, 'w'))
+        self.assertEqual(BlockedNetwork.objects.filter(source='asn:AS64500').count(), 3)
+        self.assertEqual(BlockedNetwork.objects.get(network='10.0.0.0/8').reason, 'internal')
+
+        second = write(['198.51.100.0/24 updated'])
+        call_command('import_blocklist', second, source='asn:AS64500', replace=True, stdout=open(os.devnull, 'w'))
+        self.assertEqual(
+            list(BlockedNetwork.objects.filter(source='asn:AS64500').values_list('network', 'reason')),
+            [('198.51.100.0/24', 'updated')],
+        )
+        worker = IPBlocklist(refresh_interval=0)
+        self.assertTrue(worker.is_blocked('198.51.100.77'))
+        self.assertFalse(worker.is_blocked('10.1.1.1'))
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Тесты пакетного обслуживания (generator/maintenance.py)
+
+Проверяют продление подписок одним UPDATE на пачку, обход пачками по pk,
+продолжение с контрольной точки после падения и пакетное удаление с
+каскадом
+"""
+
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from generator import maintenance
+from generator.models import Generation, GenerationVersion, TemporaryAccessToken
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class MaintenanceTests(TestCase):
+    """Тесты задач generator.maintenance"""
+
+    def setUp(self):
+        cache.clear()
+        self.due = timezone.now() - timedelta(hours=1)
+
+    def make_token(self, token_type='BASIC', **fields):
+        defaults = {
+            'next_renewal': self.due,
+            'gigachat_tokens_limit': 100,
+            'gigachat_tokens_used': 40,
+        }
+        defaults.update(fields)
+        return TemporaryAccessToken.objects.create(token_type=token_type, **defaults)
+
+    def test_renewal_bulk_updates_due_subscriptions(self):
+        tokens = [self.make_token() for _ in range(5)]
+        later = self.make_token(next_renewal=timezone.now() + timedelta(days=3))
+        demo = self.make_token(token_type='DEMO_FREE')
+
+        stats = maintenance.renew_subscriptions(batch_size=2, pause=0)
+
+        self.assertEqual(stats['rows'], 5)
+        self.assertEqual(stats['batches'], 3)
+        self.assertFalse(stats['resumed'])
+        for token in tokens:
+            token.refresh_from_db()
+            self.assertEqual(token.gigachat_tokens_used, 0)
+            self.assertEqual(token.next_renewal, self.due + timedelta(days=30))
+        for token in (later, demo):
+            used = token.gigachat_tokens_used
+            token.refresh_from_db()
+            self.assertEqual(token.gigachat_tokens_used, used)
+
+        # Повторный запуск ничего не меняет: продлённые подписки больше не попадают в выборку
+        self.assertEqual(maintenance.renew_subscriptions(pause=0)['rows'], 0)
+
+    def test_resume_from_checkpoint(self):
+        tokens = [self.make_token() for _ in range(4)]
+        # Прерванный запуск успел обработать две первые строки
+        cache.set('maintenance:renew_subscriptions', {
+            'last_pk': tokens[1].pk,
+            'cutoff': timezone.now().isoformat(),
+        })
+
+        stats = maintenance.renew_subscriptions(pause=0)
+
+        self.assertTrue(stats['resumed'])
+        self.assertEqual(stats['rows'], 2)
+        renewed = TemporaryAccessToken.objects.filter(gigachat_tokens_used=0)
+        self.assertEqual(set(renewed.values_list('pk', flat=True)), {tokens[2].pk, tokens[3].pk})
+        self.assertIsNone(cache.get('maintenance:renew_subscriptions'))
+
+    def test_batched_delete_cascades(self):
+        old = timezone.now() - timedelta(days=120)
+        generations = [Generation.objects.create(topic=f'Тема {i}', result='Текст') for i in range(3)]
+        for generation in generations:
+            generation.add_version('Вторая версия')
+        Generation.objects.filter(pk__in=[g.pk for g in generations[:2]]).update(created_at=old)
+
+        stats = maintenance.delete_old_generations(days=90, batch_size=1, pause=0)
+
+        self.assertEqual(stats['rows'], 2)
+        self.assertEqual(list(Generation.objects.values_list('pk', flat=True)), [generations[2].pk])
+        self.assertEqual(GenerationVersion.objects.count(), 1)
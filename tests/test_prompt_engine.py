@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Тесты общего компилятора промптов
+
+Проверяют канонизацию критериев, порядок фрагментов и статистику LRU-кэша
+"""
+
+from unittest import TestCase
+
+from flask_generator.prompt_engine import PromptCompiler, VOICE_TONE_PROMPTS, CTA_PROMPTS
+
+
+class PromptCompilerTests(TestCase):
+    """Тесты PromptCompiler"""
+
+    def setUp(self):
+        self.compiler = PromptCompiler('Вступление')
+
+    def test_string_and_list_share_canonical_key(self):
+        key_str = self.compiler.canonical_key({'voice_tone': 'Дружелюбный', 'audience': []})
+        key_list = self.compiler.canonical_key({'voice_tone': ['Дружелюбный', '', 'Неизвестный']})
+        self.assertEqual(key_str, key_list)
+
+    def test_prompt_keeps_field_and_value_order(self):
+        prompt = self.compiler.compile({
+            'cta': 'Купить',
+            'voice_tone': ['Серьезный', 'Дружелюбный'],
+        })
+        self.assertEqual(prompt, '\n'.join([
+            'Вступление',
+            VOICE_TONE_PROMPTS['Серьезный'],
+            VOICE_TONE_PROMPTS['Дружелюбный'],
+            CTA_PROMPTS['Купить'],
+        ]))
+
+    def test_cache_hits_and_misses_are_counted(self):
+        data = {'voice_tone': ['Дружелюбный']}
+        self.compiler.compile(data)
+        self.compiler.compile({'voice_tone': 'Дружелюбный'})
+        info = self.compiler.cache_info()
+        self.assertEqual((info['hits'], info['misses'], info['size']), (1, 1, 1))
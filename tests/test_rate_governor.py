@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Тесты регулятора частоты запросов к GigaChat
+
+Проверяют token bucket, AIMD-подстройку скорости, Retry-After,
+освобождение очереди от упавшего ожидающего (в памяти процесса и
+Lua-скриптами на fakeredis) и переподключение к Redis после ошибки
+"""
+
+import time
+from unittest import TestCase, mock, skipIf
+
+from generator import redis_backend
+from generator.rate_governor import RateGovernor, retry_after_from_error
+
+try:
+    import fakeredis
+except ImportError:  # fakeredis[lua] — из requirements-test.txt
+    fakeredis = None
+
+
+class _RateLimitError(Exception):
+    """Аналог gigachat.exceptions.ResponseError с кодом 429"""
+
+    def __init__(self, retry_after):
+        super().__init__('https://gigachat/api', 429, b'Too Many Requests', {'retry-after': str(retry_after)})
+
+
+def _governor(**kwargs):
+    params = dict(rate=100.0, burst=2, min_rate=1.0, max_rate=200.0, increase=1.0, decrease=0.5, max_wait=5,
+                  heartbeat=0.2, redis_client=False)
+    params.update(kwargs)
+    return RateGovernor('test', **params)
+
+
+class RateGovernorTests(TestCase):
+    """Тесты RateGovernor"""
+
+    def test_burst_passes_without_waiting(self):
+        governor = _governor(rate=1.0)
+        self.assertLess(governor.acquire(), 0.05)
+        self.assertLess(governor.acquire(), 0.05)
+        self.assertEqual(governor.get_stats()['acquired'], 2)
+
+    def test_aimd_rate_adjustment(self):
+        governor = _governor()
+        self.assertEqual(governor.report(), 101.0)
+        self.assertEqual(governor.report(throttled=True), 50.5)
+        self.assertEqual(governor.get_stats()['throttled'], 1)
+
+    def test_retry_after_blocks_next_call(self):
+        governor = _governor()
+        with self.assertRaises(_RateLimitError):
+            governor.call(lambda: (_ for _ in ()).throw(_RateLimitError(0.2)))
+
+        started = time.time()
+        governor.call(lambda: 'ok')
+
+        self.assertGreaterEqual(time.time() - started, 0.15)
+        self.assertGreater(governor.get_stats()['wait_seconds'], 0)
+
+    def test_retry_after_parsed_from_sdk_error(self):
+        self.assertEqual(retry_after_from_error(_RateLimitError(7)), 7.0)
+        self.assertIsNone(retry_after_from_error(Exception('boom')))
+
+    def test_dead_caller_does_not_stall_queue(self):
+        governor = _governor(rate=10.0, burst=1)
+        governor.acquire()
+        # Ожидающий встал первым в очередь и упал, не дождавшись разрешения
+        self.assertFalse(governor._try_acquire('dead')[0])
+        time.sleep(0.3)
+
+        self.assertLess(governor.acquire(), 1.0)
+        self.assertEqual(governor.get_stats()['queue_depth'], 0)
+
+
+@skipIf(fakeredis is None, 'fakeredis не установлен')
+class RedisRateGovernorTests(TestCase):
+    """Lua-скрипты регулятора на fakeredis"""
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+
+    def test_shared_bucket_and_aimd(self):
+        first = _governor(rate=1.0, redis_client=self.redis)
+        second = _governor(rate=1.0, redis_client=self.redis)
+        self.assertTrue(first._try_acquire('a')[0])
+        self.assertTrue(second._try_acquire('b')[0])
+        # Корзина общая: третий запрос ждёт токен
+        granted, wait = first._try_acquire('c')
+        self.assertFalse(granted)
+        self.assertGreater(wait, 0)
+
+        self.assertEqual(second.report(throttled=True), 1.0)
+        self.assertGreater(first.get_stats()['blocked_for'], 0)
+        self.assertEqual(first.get_stats()['backend'], 'redis')
+
+    def test_bucket_uses_redis_clock(self):
+        first = _governor(rate=1.0, redis_client=self.redis)
+        self.assertTrue(first._try_acquire('a')[0])
+        self.assertTrue(first._try_acquire('b')[0])
+        # Часы второго воркера убежали на час вперёд: корзина не наполняется
+        skewed = _governor(rate=1.0, redis_client=self.redis)
+        clock = mock.Mock(time=lambda: time.time() + 3600, sleep=time.sleep)
+        with mock.patch('generator.rate_governor.time', clock):
+            self.assertFalse(skewed._try_acquire('c')[0])
+
+    def test_dead_caller_does_not_stall_queue(self):
+        governor = _governor(rate=10.0, burst=1, redis_client=self.redis)
+        governor.acquire()
+        self.assertFalse(governor._try_acquire('dead')[0])
+        time.sleep(0.3)
+
+        self.assertLess(governor.acquire(), 1.0)
+        self.assertEqual(self.redis.zcard(governor._queue_key), 0)
+
+    def test_reconnects_after_redis_error(self):
+        broken = mock.Mock()
+        broken.register_script.return_value = mock.Mock(side_effect=ConnectionError('down'))
+        governor = _governor(redis_client=None)
+        with mock.patch.object(redis_backend, 'connect', side_effect=[broken, None, self.redis]):
+            self.assertTrue(governor._try_acquire('a')[0])
+            self.assertEqual(governor.get_stats()['backend'], 'local')
+            # Повтор после паузы: первая попытка неудачна, вторая подключается
+            governor._link._retry_at = 0
+            self.assertEqual(governor.get_stats()['backend'], 'local')
+            governor._link._retry_at = 0
+            self.assertEqual(governor.get_stats()['backend'], 'redis')
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Тесты ограничителя частоты GCRA (generator/rate_limit.py)
+
+Проверяют скользящее окно (без всплеска на границе окон), выбор политики
+по пути и тарифу (состояние в памяти процесса, без Redis) и возврат на
+Redis после ошибки (fakeredis)
+"""
+
+import time
+from unittest import TestCase, mock, skipIf
+
+from generator import rate_limit, redis_backend
+from generator.rate_limit import GCRALimiter, RatePolicy, resolve_policy
+
+try:
+    import fakeredis
+except ImportError:  # fakeredis[lua] — из requirements-test.txt
+    fakeredis = None
+
+
+def _limiter():
+    return GCRALimiter(prefix='test', redis_client=False)
+
+
+class GCRALimiterTests(TestCase):
+    """Тесты GCRALimiter.hit"""
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(rate_limit.time, 'time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_limit_and_retry_after(self):
+        limiter = _limiter()
+        policy = RatePolicy('p', 5, 60)
+        results = [limiter.hit('ip:1', policy) for _ in range(6)]
+        self.assertEqual([r.allowed for r in results], [True] * 5 + [False])
+        self.assertEqual(results[4].remaining, 0)
+        self.assertAlmostEqual(results[5].retry_after, 12.0)
+        # Другой клиент не затронут
+        self.assertTrue(limiter.hit('ip:2', policy).allowed)
+
+    def test_no_burst_at_window_boundary(self):
+        limiter = _limiter()
+        policy = RatePolicy('p', 10, 60)
+        self.now = 1059.0
+        self.assertTrue(all(limiter.hit('ip:1', policy).allowed for _ in range(10)))
+        # Фиксированное окно пропустило бы ещё 10 запросов через секунду
+        self.now = 1061.0
+        self.assertFalse(limiter.hit('ip:1', policy).allowed)
+        # Через период между запросами (6 с) освобождается одно место
+        self.now = 1065.0
+        self.assertTrue(limiter.hit('ip:1', policy).allowed)
+        self.assertFalse(limiter.hit('ip:1', policy).allowed)
+
+
+@skipIf(fakeredis is None, 'fakeredis не установлен')
+class RedisGCRALimiterTests(TestCase):
+    """Lua-скрипт GCRA на fakeredis"""
+
+    def test_reconnects_after_redis_error(self):
+        redis = fakeredis.FakeRedis()
+        broken = mock.Mock()
+        broken.register_script.return_value = mock.Mock(side_effect=ConnectionError('down'))
+        limiter = GCRALimiter(prefix='test')
+        policy = RatePolicy('p', 1, 60)
+        with mock.patch.object(redis_backend, 'connect', side_effect=[broken, redis]):
+            # Ошибка Redis: запрос учтён в памяти процесса
+            self.assertTrue(limiter.hit('ip:1', policy).allowed)
+            self.assertEqual(limiter.backend, 'local')
+            # После паузы ограничитель возвращается на общий Redis
+            limiter._link._retry_at = 0
+            self.assertEqual(limiter.backend, 'redis')
+            self.assertTrue(limiter.hit('ip:1', policy).allowed)
+            self.assertFalse(limiter.hit('ip:1', policy).allowed)
+        self.assertTrue(redis.exists('test:p:ip:1'))
+
+    def test_window_uses_redis_clock(self):
+        redis = fakeredis.FakeRedis()
+        policy = RatePolicy('p', 1, 60)
+        self.assertTrue(GCRALimiter(prefix='test', redis_client=redis).hit('ip:1', policy).allowed)
+        # Часы другого воркера убежали на час вперёд: окно от этого не сдвигается
+        clock = mock.Mock(time=lambda: time.time() + 3600)
+        with mock.patch.object(rate_limit, 'time', clock):
+            result = GCRALimiter(prefix='test', redis_client=redis).hit('ip:1', policy)
+        self.assertFalse(result.allowed)
+        self.assertGreater(result.retry_after, 50)
+
+
+class ResolvePolicyTests(TestCase):
+    """Тесты resolve_policy"""
+
+    def test_path_and_tariff(self):
+        self.assertEqual(resolve_policy('/api/token-info/').limit, 30)
+        self.assertEqual(resolve_policy('/generator/', 'PRO').limit, 40)
+        self.assertEqual(resolve_policy('/wall/').limit, 60)
+        self.assertIsNone(resolve_policy('/generator/', 'DEVELOPER'))
+        self.assertNotEqual(resolve_policy('/generator/', 'PRO').name, resolve_policy('/generator/').name)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Тесты кэша ответов генерации
+
+Проверяют ключ по содержимому запроса, TTL и вытеснение в памяти процесса,
+возврат на Redis после ошибки, обход кэша при явной перегенерации и
+логирование попаданий для обоих провайдеров
+"""
+
+from unittest import TestCase, skipIf
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase, override_settings
+
+from generator import fastapi_client, gigachat_api, redis_backend
+from generator.response_cache import ResponseCache, _LocalBackend, make_cache_key
+
+try:
+    import fakeredis
+except ImportError:  # fakeredis[lua] — из requirements-test.txt
+    fakeredis = None
+
+
+def _local_cache(max_entries=10):
+    """Кэш ответов без Redis"""
+    return ResponseCache(ttl=60, max_entries=max_entries, redis_client=False)
+
+
+class CacheKeyTests(TestCase):
+    """Тесты ключа кэша"""
+
+    def test_key_ignores_whitespace_case_and_defaults(self):
+        first = make_cache_key({'topic': 'Весна  в городе', 'voice_tone': ['Дружелюбный']}, 'gigachat', 'GigaChat')
+        second = make_cache_key({'topic': ' весна в городе ', 'voice_tone': ['Дружелюбный'], 'style': ''}, 'gigachat', 'GigaChat')
+        self.assertEqual(first, second)
+
+    def test_key_depends_on_provider_and_criteria(self):
+        base = {'topic': 'Весна', 'voice_tone': ['Дружелюбный']}
+        key = make_cache_key(base, 'gigachat', 'GigaChat')
+        self.assertNotEqual(key, make_cache_key(base, 'openai', 'gpt-4o-mini'))
+        self.assertNotEqual(key, make_cache_key(dict(base, voice_tone=['Профессиональный']), 'gigachat', 'GigaChat'))
+
+
+class LocalBackendTests(TestCase):
+    """Тесты хранилища в памяти процесса"""
+
+    def test_oldest_entry_is_evicted(self):
+        cache = _local_cache(max_entries=2)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, {'result': key})
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('c'), {'result': 'c'})
+        self.assertEqual(cache.get_stats()['size'], 2)
+
+    def test_expired_entry_is_dropped(self):
+        backend = _LocalBackend(10)
+        backend.set('a', {'result': 'a'}, ttl=-1)
+        self.assertIsNone(backend.get('a'))
+
+
+@skipIf(fakeredis is None, 'fakeredis не установлен')
+class RedisBackendTests(TestCase):
+    """Кэш ответов на fakeredis"""
+
+    def test_reconnects_after_redis_error(self):
+        redis = fakeredis.FakeRedis()
+        broken = MagicMock()
+        broken.get.side_effect = ConnectionError('down')
+        cache = ResponseCache(ttl=60, max_entries=10)
+        with patch.object(redis_backend, 'connect', side_effect=[broken, redis]):
+            # Ошибка Redis: промах и память процесса до повторного подключения
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual(cache.get_stats()['backend'], 'local')
+            cache._link._retry_at = 0
+            cache.set('a', {'result': 'a'})
+            self.assertEqual(cache.get_stats()['backend'], 'redis')
+        self.assertEqual(cache.get('a'), {'result': 'a'})
+        self.assertTrue(redis.exists('response_cache:a'))
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=True)
+class GenerateTextCacheTests(SimpleTestCase):
+    """Тесты кэша в generate_text"""
+
+    def setUp(self):
+        self.cache = _local_cache()
+        self.call = MagicMock(return_value=MagicMock(content='Пост про весну'))
+        for target, value in (
+            ('response_cache', self.cache),
+            ('log_token_usage', MagicMock()),
+        ):
+            patcher = patch.object(gigachat_api, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch.object(gigachat_api._client_pool, 'call', self.call)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_repeated_request_is_served_from_cache(self):
+        data = {'topic': 'Весна'}
+        self.assertEqual(gigachat_api.generate_text(data), 'Пост про весну')
+        self.assertEqual(gigachat_api.generate_text(data), 'Пост про весну')
+        self.assertEqual(self.call.call_count, 1)
+        self.assertEqual(self.cache.hits, 1)
+        last_log = gigachat_api.log_token_usage.call_args
+        self.assertTrue(last_log.kwargs['from_cache'])
+
+    def test_regenerate_bypasses_cache(self):
+        data = {'topic': 'Весна'}
+        gigachat_api.generate_text(data)
+        gigachat_api.generate_text(data, use_cache=False)
+        self.assertEqual(self.call.call_count, 2)
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=True)
+class OpenAICacheTests(SimpleTestCase):
+    """Тесты кэша в generate_text_and_prompt"""
+
+    @patch('generator.fastapi_client.requests.post')
+    def test_cache_hit_is_logged_like_gigachat(self, mock_post):
+        cache = _local_cache()
+        payload = {'topic': 'Весна', 'platform': 'Telegram'}
+        cache.set(
+            make_cache_key(payload, 'openai', fastapi_client.OPENAI_MODEL),
+            {'text': 'Пост про весну', 'image_prompt': 'весна'},
+        )
+        with patch('generator.response_cache.response_cache', cache), \
+                patch.object(gigachat_api, 'log_token_usage') as log_usage:
+            result = fastapi_client.generate_text_and_prompt(payload)
+
+        self.assertEqual(result['text'], 'Пост про весну')
+        self.assertTrue(result['from_cache'])
+        mock_post.assert_not_called()
+        log_usage.assert_called_once()
+        self.assertTrue(log_usage.call_args.kwargs['from_cache'])
+        self.assertEqual(log_usage.call_args.kwargs['response_text'], 'Пост про весну')
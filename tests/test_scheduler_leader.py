@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Тесты выбора лидера планировщика (generator/leader_election.py)
+
+Проверяют, что аренду держит один процесс, переход лидерства при снятии
+и истечении аренды, выбор хранилища аренды по настройкам (без перехода
+на БД при недоступном Redis), пропуск задач не-лидером, историю запусков
+в get_scheduler_status() и выполнение пропущенных без лидера запусков
+"""
+
+from datetime import timedelta
+from functools import partial
+from unittest import mock
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.cron import CronTrigger
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from generator import redis_backend, scheduler
+from generator.leader_election import BACKEND_DB, BACKEND_REDIS, LeaderElector
+from generator.models import SchedulerLease, SchedulerRun
+
+
+def make_elector(**kwargs):
+    return LeaderElector('test', backend='db', ttl=30, heartbeat=10, **kwargs)
+
+
+class LeaderElectionTests(TestCase):
+    """Тесты LeaderElector с арендой в БД"""
+
+    def test_single_leader_and_failover(self):
+        demoted = mock.Mock()
+        first, second = make_elector(on_demoted=demoted), make_elector()
+        self.assertTrue(first.tick())
+        self.assertFalse(second.tick())
+        self.assertTrue(first.tick())
+        self.assertEqual(SchedulerLease.objects.get(name='test').holder, first.holder)
+
+        # Лидер завис: аренда истекла — её забирает другой процесс, старый лидер узнаёт об этом
+        SchedulerLease.objects.filter(name='test').update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(second.tick())
+        self.assertFalse(first.tick())
+        self.assertFalse(first.is_leader())
+        demoted.assert_called_once()
+
+        # Корректное завершение снимает аренду сразу
+        second.stop(release=True)
+        self.assertTrue(first.tick())
+        self.assertEqual(first.get_status()['leader']['holder'], first.holder)
+
+    def test_auto_backend_follows_settings_without_db_fallback(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=locmem):
+            elector = LeaderElector('test', backend='auto', ttl=30, heartbeat=10)
+            self.assertTrue(elector.tick())
+        self.assertEqual(elector.backend, BACKEND_DB)
+
+        redis_cache = {'default': {'BACKEND': 'django_redis.cache.RedisCache', 'LOCATION': 'redis://localhost:1/0'}}
+        with override_settings(CACHES=redis_cache), \
+                mock.patch.object(redis_backend, 'connect', return_value=None):
+            elector = LeaderElector('redis-test', backend='auto', ttl=30, heartbeat=10)
+            # Redis недоступен: процесс не лидер и не захватывает аренду в БД
+            self.assertFalse(elector.tick())
+        self.assertEqual(elector.backend, BACKEND_REDIS)
+        self.assertEqual(elector.errors, 1)
+        self.assertFalse(SchedulerLease.objects.filter(name='redis-test').exists())
+
+
+class SchedulerRunTests(TestCase):
+    """Тесты run_job и get_scheduler_status"""
+
+    def setUp(self):
+        self.elector = make_elector()
+        patcher = mock.patch.object(scheduler, 'elector', self.elector)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_only_leader_runs_and_history_is_recorded(self):
+        job = mock.Mock(return_value=3)
+        self.assertIsNone(scheduler.run_job('cleanup_expired_tokens', job))
+        job.assert_not_called()
+
+        self.elector.tick()
+        self.assertEqual(scheduler.run_job('cleanup_expired_tokens', job), 3)
+        scheduler.run_job('renew_subscriptions', mock.Mock(side_effect=RuntimeError('boom')))
+
+        status = scheduler.get_scheduler_status()
+        self.assertEqual(
+            [(run['job_id'], run['status'], run['result']) for run in status['history']],
+            [('renew_subscriptions', 'failed', None), ('cleanup_expired_tokens', 'success', 3)],
+        )
+        self.assertEqual(status['history'][0]['error'], 'boom')
+        self.assertEqual(SchedulerRun.objects.filter(holder=self.elector.holder).count(), 2)
+
+    def test_new_leader_catches_up_missed_runs(self):
+        jobs = BackgroundScheduler(timezone='UTC')
+        hourly = mock.Mock(return_value=1)
+        for job_id, trigger in (
+            ('cleanup_expired_tokens', CronTrigger(minute=0, timezone='UTC')),
+            ('renew_subscriptions', CronTrigger(hour=0, minute=1, timezone='UTC')),
+            ('delete_old_tokens', CronTrigger(day_of_week='sun', hour=3, timezone='UTC')),
+        ):
+            jobs.add_job(partial(scheduler.run_job, job_id, hourly), trigger=trigger, id=job_id, name=job_id)
+        now = timezone.now()
+        # Час без лидера: ежечасный запуск пропущен, ежедневный и еженедельный — нет
+        SchedulerRun.objects.create(job_id='cleanup_expired_tokens', holder='old', started_at=now - timedelta(hours=2))
+        SchedulerRun.objects.create(job_id='renew_subscriptions', holder='old', started_at=now)
+        SchedulerRun.objects.create(job_id='delete_old_tokens', holder='old', started_at=now)
+
+        with mock.patch.object(scheduler, 'scheduler', jobs):
+            scheduler._on_elected()
+        catch_up = jobs.get_job('catch_up_cleanup_expired_tokens')
+        self.assertIsNotNone(catch_up)
+        self.assertEqual({job.id for job in jobs.get_jobs()} - {'cleanup_expired_tokens', 'renew_subscriptions',
+                                                               'delete_old_tokens'}, {catch_up.id})
+
+        # Запуск пропущенной задачи записывается под её id
+        self.elector.tick()
+        catch_up.func()
+        hourly.assert_called_once()
+        self.assertEqual(SchedulerRun.objects.filter(job_id='cleanup_expired_tokens').count(), 2)
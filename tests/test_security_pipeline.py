@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Тесты конвейера безопасности (SecurityPipelineMiddleware)
+
+Проверяют, что блокировка и состояние токена читаются одним
+cache.get_many, а отказы и время этапов совпадают с прежними middleware
+"""
+
+from unittest import mock
+
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from generator import rate_limit
+from generator.ip_blocklist import IPBlocklist
+from generator.models import TemporaryAccessToken
+from generator.security import BlockList
+from generator.security_middleware import SecurityPipelineMiddleware, is_suspicious_user_agent
+from generator.token_cache import load_token
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE, SECURITY_TIMINGS=True, TOKEN_STATE_CACHE_TTL=30)
+class SecurityPipelineTests(TestCase):
+    """Тесты SecurityPipelineMiddleware"""
+
+    def setUp(self):
+        cache.clear()
+        self.token = TemporaryAccessToken.objects.create(token_type='BASIC', gigachat_tokens_limit=100)
+        limiter = rate_limit.GCRALimiter(prefix='test-pipeline', redis_client=False)
+        blocklist = IPBlocklist(refresh_interval=0)
+        for patcher in (
+            mock.patch('generator.security_middleware.gcra_limiter', limiter),
+            mock.patch('generator.security_middleware.ip_blocklist', blocklist),
+            mock.patch('generator.ip_blocklist.ip_blocklist', blocklist),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.middleware = SecurityPipelineMiddleware(lambda request: HttpResponse('ok'))
+
+    def _get(self, path='/generator/', with_token=True, **extra):
+        request = RequestFactory().get(path, HTTP_USER_AGENT='Mozilla/5.0', **extra)
+        request.session = SessionStore()
+        if with_token:
+            request.session['access_token'] = str(self.token.token)
+        return request, self.middleware(request)
+
+    def test_single_batched_state_lookup(self):
+        load_token(str(self.token.token))
+        with mock.patch.object(cache, 'get_many', wraps=cache.get_many) as get_many:
+            request, response = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_many.call_count, 1)
+        self.assertEqual(len(get_many.call_args.args[0]), 2)
+        # Состояние токена из того же get_many — без повторного чтения кэша
+        self.assertEqual(request.token.pk, self.token.pk)
+        self.assertIn('state', request.security_timings)
+        self.assertIn('sec-rate;dur=', response['Server-Timing'])
+
+    def test_blocked_ip_and_token(self):
+        BlockList.block_network('127.0.0.0/24', 'test')
+        _, response = self._get(with_token=False)
+        self.assertEqual(response.status_code, 403)
+        BlockList.unblock_network('127.0.0.0/24')
+        self.assertEqual(self._get(with_token=False)[1].status_code, 200)
+
+        BlockList.block_token(str(self.token.token), 'test')
+        request, response = self._get()
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn('access_token', request.session)
+
+    def test_rate_limit_and_matchers(self):
+        statuses = [self._get('/api/token-info/', with_token=False)[1].status_code for _ in range(31)]
+        self.assertEqual(statuses[:30], [200] * 30)
+        self.assertEqual(statuses[30], 429)
+        _, response = self._get('/static/app.js', with_token=False)
+        self.assertNotIn('Server-Timing', response)
+
+        self.assertTrue(is_suspicious_user_agent('sqlmap/1.7'))
+        self.assertTrue(is_suspicious_user_agent('Mozilla NIKTO'))
+        self.assertTrue(is_suspicious_user_agent(''))
+        self.assertFalse(is_suspicious_user_agent('Mozilla/5.0'))
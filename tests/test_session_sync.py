@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Тесты синхронизации сессии (generator/session_sync.py)
+
+Повторные запросы с неизменным токеном не должны помечать сессию
+изменённой, а форма генерации хранится вне сессии
+"""
+
+from django.contrib.sessions.backends.db import SessionStore
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from generator.middleware import TokenAccessMiddleware
+from generator.models import TemporaryAccessToken
+from generator.session_sync import SessionSyncMiddleware, recall_form_data, remember_form_data
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHE, SESSION_SAVE_EVERY_REQUEST=False,
+    SESSION_SYNC_REPORT=True, SESSION_REFRESH_INTERVAL=3600,
+)
+class SessionSyncTests(TestCase):
+    """Тесты sync_session и SessionSyncMiddleware"""
+
+    def setUp(self):
+        self.token = TemporaryAccessToken.objects.create(token_type='BASIC', gigachat_tokens_limit=100)
+        session = SessionStore()
+        session['access_token'] = str(self.token.token)
+        session.save()
+        self.session_key = session.session_key
+        self.middleware = SessionSyncMiddleware(TokenAccessMiddleware(lambda request: HttpResponse('ok')))
+
+    def _get(self):
+        request = RequestFactory().get('/generator/')
+        request.session = SessionStore(self.session_key)
+        response = self.middleware(request)
+        if request.session.modified:
+            request.session.save()
+        return request, response
+
+    def test_unchanged_token_does_not_write_session(self):
+        request, response = self._get()
+        self.assertTrue(request.session.modified)
+        self.assertGreater(int(response['X-Session-Write']), 0)
+
+        request, response = self._get()
+        self.assertFalse(request.session.modified)
+        self.assertEqual(response['X-Session-Write'], '0')
+
+        self.token.consume_gigachat_tokens(10)
+        request, _ = self._get()
+        self.assertTrue(request.session.modified)
+        self.assertEqual(request.session['gigachat_tokens_used'], 10)
+
+    def test_form_data_is_kept_out_of_session(self):
+        session = SessionStore(self.session_key)
+        session['last_form_data'] = {'topic': 'старое'}
+        remember_form_data(session, 42, {'topic': 'Кофе', 'platform': 'VK'})
+        self.assertNotIn('last_form_data', session)
+        self.assertEqual(recall_form_data(session, 42)['platform'], 'VK')
+        self.assertEqual(recall_form_data(session, None), {})
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Тесты учёта токенов
+
+Проверяют приоритет данных провайдера над оценкой и локальный
+токенизатор для длинных текстов
+"""
+
+from types import SimpleNamespace
+from unittest import TestCase
+
+from generator.token_accounting import (
+    SOURCE_ESTIMATED, SOURCE_PROVIDER, count_tokens, count_tokens_batch,
+    measure_usage, usage_from_response,
+)
+
+
+class UsageFromResponseTests(TestCase):
+    """Тесты извлечения usage из ответов провайдеров"""
+
+    def test_langchain_usage_metadata(self):
+        message = SimpleNamespace(usage_metadata={'input_tokens': 120, 'output_tokens': 30, 'total_tokens': 150})
+        usage = usage_from_response(message)
+        self.assertEqual((usage.prompt_tokens, usage.completion_tokens, usage.total_tokens), (120, 30, 150))
+        self.assertEqual(usage.source, SOURCE_PROVIDER)
+
+    def test_sdk_usage_object(self):
+        completion = SimpleNamespace(usage=SimpleNamespace(prompt_tokens=40, completion_tokens=2, total_tokens=42))
+        self.assertEqual(usage_from_response(completion).total_tokens, 42)
+
+    def test_missing_usage_falls_back_to_estimate(self):
+        usage = measure_usage('Напиши пост про весну', 'Весна пришла', SimpleNamespace(content='x'))
+        self.assertEqual(usage.source, SOURCE_ESTIMATED)
+        self.assertGreater(usage.total_tokens, 0)
+
+    def test_extra_tokens_only_for_estimate(self):
+        response = SimpleNamespace(usage={'prompt_tokens': 10, 'completion_tokens': 5, 'total_tokens': 15})
+        self.assertEqual(measure_usage('a', 'b', response, extra_completion_tokens=1000).total_tokens, 15)
+        estimated = measure_usage('', '', None, extra_completion_tokens=1000)
+        self.assertEqual(estimated.total_tokens, 1000)
+
+
+class CountTokensTests(TestCase):
+    """Тесты локального токенизатора"""
+
+    def test_words_and_punctuation(self):
+        # "скидки" — 2 токена, "на" — 1, "кофе" — 1, "!" — 1
+        self.assertEqual(count_tokens('скидки на кофе!'), 5)
+        self.assertEqual(count_tokens(''), 0)
+
+    def test_long_text_counted_in_chunks(self):
+        text = 'весна пришла в город. ' * 20000
+        self.assertEqual(count_tokens(text), count_tokens('весна пришла в город. ') * 20000)
+
+    def test_batch(self):
+        self.assertEqual(count_tokens_batch(['кофе', 'coffee'], 'openai'), [2, 2])
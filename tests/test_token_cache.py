@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Тесты кэша состояния токенов (generator/token_cache.py)
+
+Middleware, декораторы и utils в одном запросе загружают токен один раз,
+а следующие запросы берут его из кэша до первого изменения токена
+"""
+
+from django.contrib.admin.sites import AdminSite
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from generator.admin import TemporaryAccessTokenAdmin
+from generator.decorators import token_required
+from generator.middleware import TokenAccessMiddleware
+from generator.models import TemporaryAccessToken
+from generator.token_cache import load_token
+from generator.utils import get_token_from_request
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@token_required
+def _view(request):
+    return HttpResponse(get_token_from_request(request).token_type)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, TOKEN_STATE_CACHE_TTL=30)
+class TokenStateCacheTests(TestCase):
+    """Тесты load_token / get_request_token / invalidate_token_state"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.token = TemporaryAccessToken.objects.create(token_type='BASIC', gigachat_tokens_limit=100)
+        self.middleware = TokenAccessMiddleware(_view)
+
+    def _request(self):
+        request = RequestFactory().get('/generator/')
+        request.session = {'access_token': str(self.token.token)}
+        return request
+
+    def _token_selects(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.middleware(self._request())
+        self.assertEqual(response.status_code, 200)
+        return sum(
+            1 for q in queries.captured_queries
+            if q['sql'].startswith('SELECT') and 'generator_temporaryaccesstoken' in q['sql']
+        )
+
+    def test_one_load_per_request_then_cache(self):
+        self.assertEqual(self._token_selects(), 1)
+        self.assertEqual(self._token_selects(), 0)
+
+    def test_counter_change_invalidates(self):
+        self._token_selects()
+        self.token.consume_gigachat_tokens(10)
+        self.assertEqual(self._token_selects(), 1)
+        self.assertEqual(self._request_token().gigachat_tokens_used, 10)
+
+    def test_deactivated_token_is_not_served_from_cache(self):
+        self._token_selects()
+        self.token.is_active = False
+        self.token.save(update_fields=['is_active'])
+        response = self.middleware(self._request())
+        self.assertEqual(response.status_code, 302)
+
+    def _request_token(self):
+        request = self._request()
+        self.middleware(request)
+        return request.token
+
+
+@override_settings(CACHES=LOCMEM_CACHE, TOKEN_STATE_CACHE_TTL=30)
+class AdminBulkActionTests(TestCase):
+    """Действия админки меняют токены через update() и очищают кэш"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.token = TemporaryAccessToken.objects.create(
+            token_type='BASIC', gigachat_tokens_limit=100, gigachat_tokens_used=40
+        )
+        self.admin = TemporaryAccessTokenAdmin(TemporaryAccessToken, AdminSite())
+        self.admin.message_user = lambda *args, **kwargs: None
+
+    def _run(self, action):
+        load_token(str(self.token.token))
+        getattr(self.admin, action)(None, TemporaryAccessToken.objects.filter(pk=self.token.pk))
+        return load_token(str(self.token.token))
+
+    def test_deactivate_invalidates_cache(self):
+        with self.assertRaises(TemporaryAccessToken.DoesNotExist):
+            self._run('deactivate_tokens')
+
+    def test_reset_usage_invalidates_cache(self):
+        self.assertEqual(self._run('reset_token_usage').gigachat_tokens_used, 0)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Тесты фильтра Блума по токенам (generator/token_filter.py)
+
+Проверяют отсутствие ложноотрицательных ответов (в том числе для токенов,
+записанных в БД мимо save, и после ошибки добавления), общий файл для
+процессов (mmap) и ответ на несуществующий UUID без запроса к БД
+"""
+
+import os
+import tempfile
+import uuid
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from generator import redis_backend
+from generator.models import TemporaryAccessToken
+from generator.token_cache import load_token
+from generator.token_filter import BACKEND_OFF, TokenFilter
+
+
+def _create_token():
+    return TemporaryAccessToken.objects.create(token_type='BASIC', gigachat_tokens_limit=100)
+
+
+class TokenFilterTests(TestCase):
+    """Тесты TokenFilter"""
+
+    def _patch(self, token_filter):
+        for target in ('generator.token_filter.token_filter', 'generator.models.token_filter',
+                       'generator.token_cache.token_filter'):
+            patcher = mock.patch(target, token_filter)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_no_false_negatives_and_measured_fp_rate(self):
+        existing = [_create_token() for _ in range(20)]
+        token_filter = TokenFilter(backend='memory', capacity=1000, error_rate=0.01, auto_build=False)
+        self._patch(token_filter)
+        # Пока фильтр не построен, ответ — «возможно»
+        self.assertTrue(token_filter.might_contain(uuid.uuid4()))
+
+        token_filter.rebuild()
+        created = _create_token()
+        for token in existing + [created]:
+            self.assertTrue(token_filter.might_contain(token.token))
+            self.assertTrue(token_filter.might_contain(str(token.token)))
+        self.assertFalse(token_filter.might_contain('not-a-uuid'))
+        self.assertLess(token_filter.measure_fp_rate(20000), 0.03)
+
+        stats = token_filter.get_stats()
+        self.assertEqual(stats['count'], 21)
+        self.assertEqual(stats['memory_bytes'], stats['m'] // 8)
+        self.assertLess(stats['estimated_fp_rate'], 0.01)
+
+    def test_mmap_file_is_shared_between_processes(self):
+        path = os.path.join(tempfile.mkdtemp(), 'tokens.bin')
+        builder = TokenFilter(backend='mmap', path=path, capacity=100, auto_build=False)
+        worker = TokenFilter(backend='mmap', path=path, capacity=100, auto_build=False)
+        token = _create_token()
+        builder.rebuild()
+        self.assertTrue(worker.might_contain(token.token))
+
+        probe = uuid.uuid4()
+        worker.add(probe)
+        self.assertTrue(builder.might_contain(probe))
+
+        # Перестроение заменяет файл; второй процесс переоткрывает его
+        builder.capacity = 5000
+        builder.rebuild()
+        self.assertEqual(worker.get_stats(include_fill=False)['capacity'], 5000)
+        self.assertTrue(worker.might_contain(token.token))
+
+    def test_unknown_uuid_skips_database(self):
+        _create_token()
+        token_filter = TokenFilter(backend='memory', capacity=1000, auto_build=False)
+        self._patch(token_filter)
+        token_filter.rebuild()
+        probe = uuid.UUID(int=0)
+        self.assertFalse(token_filter.might_contain(probe))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('api_token_info', args=[probe]))
+            with self.assertRaises(TemporaryAccessToken.DoesNotExist):
+                load_token(str(probe))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(token_filter.get_stats()['rejected'], 3)
+
+    def test_rows_bypassing_save_fall_through_to_database(self):
+        _create_token()
+        token_filter = TokenFilter(backend='memory', capacity=1000, auto_build=False, verify_interval=0)
+        self._patch(token_filter)
+        token_filter.rebuild()
+        self.assertFalse(token_filter.might_contain(uuid.uuid4()))
+
+        # loaddata, миграции и восстановление из копии минуют save()
+        restored = TemporaryAccessToken.objects.bulk_create([
+            TemporaryAccessToken(token_type='BASIC', gigachat_tokens_limit=100)
+        ])[0]
+        self.assertTrue(token_filter.might_contain(restored.token))
+        self.assertEqual(load_token(str(restored.token)).pk, restored.pk)
+        self.assertFalse(token_filter.get_stats(include_fill=False)['complete'])
+
+        token_filter.rebuild()
+        self.assertFalse(token_filter.might_contain(uuid.uuid4()))
+        self.assertTrue(token_filter.might_contain(restored.token))
+
+    def test_failed_add_marks_filter_stale(self):
+        token_filter = TokenFilter(backend='memory', capacity=1000, auto_build=False)
+        self._patch(token_filter)
+        token_filter.rebuild()
+        store = token_filter._get_store()
+        with mock.patch.object(store, 'add', side_effect=OSError('store down')):
+            token = _create_token()
+
+        self.assertTrue(token_filter.might_contain(token.token))
+        self.assertTrue(token_filter.might_contain(uuid.uuid4()))
+        self.assertEqual(load_token(str(token.token)).pk, token.pk)
+
+        token_filter.rebuild()
+        self.assertTrue(token_filter.might_contain(token.token))
+        self.assertFalse(token_filter.might_contain(uuid.uuid4()))
+
+    def test_auto_without_redis_is_off(self):
+        with mock.patch.object(redis_backend, 'connect', return_value=None):
+            token_filter = TokenFilter(backend='auto', auto_build=False)
+            self.assertTrue(token_filter.might_contain(uuid.uuid4()))
+        self.assertEqual(token_filter.backend, BACKEND_OFF)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Тесты резервирования токенов (TemporaryAccessToken.reserve_tokens)
+
+Оценка расхода резервируется до вызова провайдера, после ответа резерв
+закрывается фактическим расходом, а незакрытые резервы освобождаются по TTL
+"""
+
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from generator import gigachat_api
+from generator.models import TemporaryAccessToken, TokenReservation
+
+
+class TokenReservationTests(TestCase):
+    """Тесты reserve_tokens / settle_reservation / release_expired"""
+
+    def setUp(self):
+        self.token = TemporaryAccessToken.objects.create(token_type='BASIC', gigachat_tokens_limit=10000)
+
+    def test_reserve_rejects_overspend_and_settle_charges_actual(self):
+        first = self.token.reserve_tokens('gigachat', 7000)
+        self.assertIsNotNone(first)
+        # 7000 + 4000 > 10000: второй запрос отклоняется до вызова провайдера
+        self.assertIsNone(self.token.reserve_tokens('gigachat', 4000))
+
+        self.assertTrue(self.token.settle_reservation(first, 250))
+        self.assertFalse(self.token.settle_reservation(first, 250))
+        self.token.refresh_from_db()
+        self.assertEqual(self.token.gigachat_tokens_used, 250)
+        self.assertEqual(self.token.gigachat_tokens_reserved, 0)
+        self.assertIsNotNone(self.token.reserve_tokens('gigachat', 4000))
+
+    def test_expired_reservation_is_released(self):
+        reservation = self.token.reserve_tokens('gigachat', 9000, ttl=60)
+        later = timezone.now() + timedelta(seconds=61)
+        self.assertEqual(TokenReservation.release_expired(now=later), 1)
+        self.token.refresh_from_db()
+        self.assertEqual(self.token.gigachat_tokens_reserved, 0)
+
+        # Ответ пришёл после TTL: расход всё равно списывается, резерв не снимается дважды
+        self.assertTrue(self.token.settle_reservation(reservation, 300))
+        self.token.refresh_from_db()
+        self.assertEqual((self.token.gigachat_tokens_used, self.token.gigachat_tokens_reserved), (300, 0))
+
+    def test_unmetered_token_has_no_reservation_row(self):
+        token = TemporaryAccessToken.objects.create(token_type='DEVELOPER', gigachat_tokens_limit=-1)
+        reservation = token.reserve_tokens('gigachat', 10 ** 6)
+        self.assertIsNone(reservation.pk)
+        self.assertTrue(token.settle_reservation(reservation, 10 ** 6))
+        self.assertFalse(TokenReservation.objects.exists())
+
+    def test_generate_text_rejected_before_provider_call(self):
+        self.token.reserve_tokens('gigachat', 9990)
+        with mock.patch.object(gigachat_api, '_call_gigachat') as call:
+            result = gigachat_api.generate_text({'topic': 'Тест'}, token=self.token, use_cache=False)
+        self.assertEqual(result, gigachat_api.TEXT_LIMIT_WARNING)
+        call.assert_not_called()
+
+    def test_failed_provider_call_releases_reservation(self):
+        with mock.patch.object(gigachat_api, '_call_gigachat', side_effect=RuntimeError('boom')):
+            gigachat_api.generate_text({'topic': 'Тест'}, token=self.token, use_cache=False)
+        self.token.refresh_from_db()
+        self.assertEqual((self.token.gigachat_tokens_used, self.token.gigachat_tokens_reserved), (0, 0))
+        self.assertEqual(TokenReservation.objects.get().status, TokenReservation.STATUS_RELEASED)
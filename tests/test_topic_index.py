@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Тесты индекса похожих тем (MinHash + LSH)
+
+Проверяют устойчивость к пунктуации и порядку слов, разделение по
+критериям формы, ограничение размера индекса и учёт ответа по похожей
+теме как попадания в кэш
+"""
+
+from unittest import TestCase, mock
+
+from django.test import TestCase as DjangoTestCase
+
+from generator import gigachat_api, views
+from generator.topic_index import NearDuplicateIndex, topic_shingles
+
+
+FORM = {'platform': 'Telegram', 'voice_tone': ['Дружелюбный']}
+
+
+class TopicIndexTests(TestCase):
+    """Тесты NearDuplicateIndex"""
+
+    def test_word_order_and_punctuation_ignored(self):
+        self.assertEqual(topic_shingles('скидки на кофе'), topic_shingles('Кофе — скидки!'))
+
+    def test_similar_topic_found(self):
+        index = NearDuplicateIndex(threshold=0.8)
+        index.add('скидки на кофе', FORM, 'gigachat', 'Пост про кофе', generation_id=1)
+
+        match = index.query('кофе — скидки', FORM, 'gigachat')
+
+        self.assertIsNotNone(match)
+        self.assertEqual(match.result, 'Пост про кофе')
+        self.assertEqual(match.generation_id, 1)
+        self.assertIsNone(index.query('скидки на чай', FORM, 'gigachat'))
+
+    def test_criteria_and_provider_separate_entries(self):
+        index = NearDuplicateIndex()
+        index.add('скидки на кофе', FORM, 'gigachat', 'Пост')
+
+        self.assertIsNone(index.query('скидки на кофе', dict(FORM, platform='VK'), 'gigachat'))
+        self.assertIsNone(index.query('скидки на кофе', FORM, 'openai'))
+
+    def test_size_is_bounded(self):
+        index = NearDuplicateIndex(max_entries=3)
+        topics = ['весна в городе', 'рецепт борща', 'утренняя пробежка', 'скидки на кофе', 'новый курс']
+        for topic in topics:
+            index.add(topic, FORM, 'gigachat', 'Пост')
+
+        self.assertEqual(index.get_stats()['entries'], 3)
+        self.assertIsNone(index.query(topics[0], FORM, 'gigachat'))
+        self.assertIsNotNone(index.query(topics[-1], FORM, 'gigachat'))
+
+    def test_image_prompt_is_remembered(self):
+        index = NearDuplicateIndex()
+        index.add('скидки на кофе', FORM, 'gigachat', 'Пост')
+        index.set_image_prompt('скидки на кофе', FORM, 'gigachat', 'Чашка кофе')
+
+        self.assertEqual(index.query('кофе, скидки', FORM, 'gigachat').image_prompt, 'Чашка кофе')
+
+
+class SimilarTopicPipelineTests(DjangoTestCase):
+    """Ответ по похожей теме в run_generation_pipeline"""
+
+    def test_similar_topic_hit_is_logged_as_cache_hit(self):
+        index = NearDuplicateIndex()
+        index.add('скидки на кофе', FORM, 'gigachat', 'Пост про кофе', generation_id=1)
+        match = index.query('кофе — скидки', FORM, 'gigachat')
+
+        with mock.patch.object(views, '_find_similar_topic', return_value=match), \
+                mock.patch.object(views, 'generate_text') as generate_text, \
+                mock.patch.object(gigachat_api, 'log_token_usage') as log_usage:
+            response = views.run_generation_pipeline(dict(FORM, topic='кофе — скидки'))
+
+        generate_text.assert_not_called()
+        self.assertEqual(response['result'], 'Пост про кофе')
+        log_usage.assert_called_once()
+        kwargs = log_usage.call_args.kwargs
+        self.assertTrue(kwargs['from_cache'])
+        self.assertEqual(kwargs['response_text'], 'Пост про кофе')
+        self.assertEqual(kwargs['generation_id'], response['generation_id'])
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Тесты буферизованной записи расхода токенов (generator/usage_sink.py)
+
+Проверяют, что постановка в очередь не обращается к БД, сброс идёт одним
+bulk_create, запись удалённой генерации сохраняется без связи, а при
+ошибке БД записи остаются в очереди (память процесса и Redis)
+"""
+
+import threading
+from unittest import skipIf
+from unittest.mock import patch
+
+from django.db import DatabaseError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from generator import redis_backend
+from generator.models import Generation, GigaChatTokenUsage
+from generator.usage_sink import MODE_MEMORY, MODE_REDIS, UsageSink
+
+try:
+    import fakeredis
+except ImportError:  # fakeredis[lua] — из requirements-test.txt
+    fakeredis = None
+
+
+def _record(generation_id=None, tokens=10):
+    return dict(
+        generation_id=generation_id, user_id=None, token_id=None,
+        operation_type='TEXT_GENERATION', estimated_prompt_tokens=tokens,
+        estimated_completion_tokens=0, estimated_total_tokens=tokens,
+        source='provider', prompt_length=1, response_length=1,
+        topic=None, platform=None, from_cache=False,
+    )
+
+
+class UsageSinkTests(TestCase):
+    """Тесты UsageSink (очередь в памяти процесса)"""
+
+    def setUp(self):
+        # Фоновый поток не сбрасывает очередь сам: интервал больше времени теста
+        self.sink = UsageSink(batch_size=50, flush_interval=3600, mode=MODE_MEMORY)
+        self.addCleanup(self.sink.close)
+
+    def test_enqueue_without_queries_and_bulk_flush(self):
+        gen = Generation.objects.create(topic='t', result='r')
+        with self.assertNumQueries(0):
+            for _ in range(30):
+                self.sink.enqueue(_record(gen.id))
+        self.assertEqual(GigaChatTokenUsage.objects.count(), 0)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.sink.flush(), 30)
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(GigaChatTokenUsage.objects.filter(generation=gen).count(), 30)
+
+    def test_deleted_generation_is_unlinked(self):
+        gen = Generation.objects.create(topic='t', result='r')
+        self.sink.enqueue(_record(gen.id))
+        self.sink.enqueue(_record(gen.id + 1000))
+        self.assertEqual(self.sink.flush(), 2)
+        self.assertEqual(
+            sorted(GigaChatTokenUsage.objects.values_list('generation_id', flat=True), key=str),
+            sorted([gen.id, None], key=str),
+        )
+
+    def test_batch_size_wakes_flusher(self):
+        flushed = threading.Event()
+        with patch.object(self.sink, 'flush', side_effect=lambda: flushed.set() or 0):
+            for _ in range(self.sink.batch_size):
+                self.sink.enqueue(_record())
+            self.assertTrue(flushed.wait(2))
+
+    def test_failed_write_keeps_records_queued(self):
+        for tokens in range(3):
+            self.sink.enqueue(_record(tokens=tokens))
+        with patch.object(GigaChatTokenUsage.objects, 'bulk_create', side_effect=DatabaseError('down')):
+            self.assertEqual(self.sink.flush(), 0)
+        self.assertEqual(self.sink.get_stats()['pending'], 3)
+
+        self.assertEqual(self.sink.flush(), 3)
+        self.assertEqual(
+            sorted(GigaChatTokenUsage.objects.values_list('estimated_prompt_tokens', flat=True)), [0, 1, 2]
+        )
+
+
+@skipIf(fakeredis is None, 'fakeredis не установлен')
+class RedisUsageSinkTests(TestCase):
+    """Тесты UsageSink с очередью в Redis (fakeredis)"""
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        with patch.object(redis_backend, 'connect', return_value=self.redis):
+            self.sink = UsageSink(batch_size=10, flush_interval=3600, mode=MODE_REDIS)
+            self.sink._ensure_started()
+        self.addCleanup(self.sink.close)
+
+    def test_queue_is_trimmed_only_after_write(self):
+        for _ in range(3):
+            self.sink.enqueue(_record())
+        with patch.object(GigaChatTokenUsage.objects, 'bulk_create', side_effect=DatabaseError('down')):
+            self.assertEqual(self.sink.flush(), 0)
+        self.assertEqual(self.redis.llen('usage_sink:queue'), 3)
+
+        self.assertEqual(self.sink.flush(), 3)
+        self.assertEqual(self.redis.llen('usage_sink:queue'), 0)
+        self.assertEqual(GigaChatTokenUsage.objects.count(), 3)
+        self.assertFalse(self.redis.exists('usage_sink:flush_lock'))
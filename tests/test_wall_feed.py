@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Тесты курсорной пагинации стены (generator/wall_feed.py)
+
+Проверяют обход всех генераций без пропусков и повторов (в том числе при
+одинаковом created_at), отсутствие поля result в списке и JSON-ленту
+"""
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from generator.models import Generation, TemporaryAccessToken
+from generator.wall_feed import fetch_wall_page, wall_queryset
+
+
+@override_settings(WALL_PAGE_SIZE=4)
+class WallFeedTests(TestCase):
+    """Тесты fetch_wall_page и user_wall_feed"""
+
+    def setUp(self):
+        self.token = TemporaryAccessToken.objects.create(token_type='BASIC', gigachat_tokens_limit=100)
+        session = self.client.session
+        session['access_token'] = str(self.token.token)
+        session.save()
+        Generation.objects.bulk_create([
+            Generation(topic=f'Тема {i}', result=f'Текст {i}') for i in range(10)
+        ])
+        # Одинаковое время у нескольких записей: порядок решает id
+        same_time = timezone.now()
+        Generation.objects.filter(id__in=list(Generation.objects.values_list('id', flat=True)[:5])).update(
+            created_at=same_time
+        )
+        with_versions = Generation.objects.create(topic='С версиями', result='Первый', image_url='/media/a.png')
+        with_versions.add_version('Второй')
+        with_versions.add_version('Третий')
+        with_versions.add_image('/media/b.png')
+
+    def test_cursor_walks_all_rows_once(self):
+        seen, cursor = [], None
+        while True:
+            page, cursor = fetch_wall_page(wall_queryset(self.client.get('/').wsgi_request), cursor)
+            self.assertTrue(all('result' in gen.get_deferred_fields() for gen in page))
+            seen.extend(gen.id for gen in page)
+            if cursor is None:
+                break
+        expected = list(Generation.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_wall_page_and_json_feed(self):
+        response = self.client.get(reverse('user_wall'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['generations']), 4)
+        self.assertContains(response, 'data-cursor=')
+
+        response = self.client.get(reverse('user_wall_feed'), {'cursor': response.context['next_cursor']})
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(len(data['items']), 4)
+        self.assertIn('wall-card', data['html'])
+
+        versions = Generation.objects.get(topic='С версиями')
+        first = self.client.get(reverse('user_wall_feed'), {'limit': 1}).json()['items'][0]
+        self.assertEqual(
+            (first['id'], first['versions'], first['image_count'], first['excerpt']),
+            (versions.id, 3, 2, 'Первый'),
+        )
+
+        self.assertEqual(self.client.get(reverse('user_wall_feed'), {'cursor': '%%%'}).status_code, 400)